@@ -0,0 +1,99 @@
+# Compares the BeautifulSoup-based image substitution with the tokenizer-based
+# rewriter over the mock pages in mock_llm.py.
+#
+# Usage: poetry run python benchmark_image_rewriter.py [--iterations 50]
+
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+import mock_llm
+from image_generation.core import create_alt_url_mapping, extract_dimensions, generate_images
+from image_generation.html_rewriter import find_img_tags
+
+MOCK_PAGES = [
+    "APPLE_MOCK_CODE",
+    "NYTIMES_MOCK_CODE",
+    "NO_IMAGES_NYTIMES_MOCK_CODE",
+    "MORTGAGE_CALCULATOR_VIDEO_PROMPT_MOCK",
+    "GOOGLE_FORM_VIDEO_PROMPT_MOCK",
+    "TALLY_FORM_VIDEO_PROMPT_MOCK",
+]
+
+
+def legacy_substitute(code: str, image_cache: Dict[str, str]) -> str:
+    """Reproduction of the previous substitution step (without generating images)"""
+    soup = BeautifulSoup(code, "html.parser")
+    for img in soup.find_all("img"):
+        if not img["src"].startswith("https://placehold.co"):
+            continue
+        new_url = image_cache.get(img.get("alt"))
+        if new_url:
+            width, height = extract_dimensions(img["src"])
+            img["width"] = width
+            img["height"] = height
+            img["src"] = new_url
+    return soup.prettify()
+
+
+def legacy_alt_url_mapping(code: str) -> Dict[str, str]:
+    soup = BeautifulSoup(code, "html.parser")
+    return {
+        image["alt"]: image["src"]
+        for image in soup.find_all("img")
+        if not image["src"].startswith("https://placehold.co")
+    }
+
+
+def time_per_call(fn: Callable[[], object], iterations: int) -> float:
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def pages() -> List[Tuple[str, str]]:
+    result = [(name, getattr(mock_llm, name)) for name in MOCK_PAGES]
+    # Generated pages are often 30-60 KB; approximate one by joining the mocks
+    result.append(("ALL_MOCKS_JOINED", "\n".join(code for _, code in result)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark <img> substitution over the mock pages")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print(f"{'page':<40} {'KB':>6} {'imgs':>5} {'bs4 ms':>9} {'new ms':>9} {'speedup':>8} {'size delta':>11}")
+    for name, code in pages():
+        alts = {tag.get("alt") for tag in find_img_tags(code)}
+        cache = {alt: f"https://images.example.com/{i}.png" for i, alt in enumerate(alts) if alt}
+
+        legacy_ms = time_per_call(lambda: legacy_substitute(code, cache), args.iterations)
+        new_ms = time_per_call(
+            lambda: loop.run_until_complete(
+                generate_images(code, api_key=None, base_url=None, image_cache=cache)
+            ),
+            args.iterations,
+        )
+        legacy_ms += time_per_call(lambda: legacy_alt_url_mapping(code), args.iterations)
+        new_ms += time_per_call(lambda: create_alt_url_mapping(code), args.iterations)
+
+        rewritten = loop.run_until_complete(
+            generate_images(code, api_key=None, base_url=None, image_cache=cache)
+        )
+        print(
+            f"{name:<40} {len(code) / 1024:>6.1f} {len(find_img_tags(code)):>5} "
+            f"{legacy_ms:>9.2f} {new_ms:>9.2f} {legacy_ms / new_ms:>7.1f}x "
+            f"{len(rewritten) - len(code):>+11}"
+        )
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
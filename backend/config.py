@@ -19,8 +19,60 @@ AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", None)
 AZURE_OPENAI_RESOURCE_NAME = os.environ.get("AZURE_OPENAI_RESOURCE_NAME", None)
 AZURE_OPENAI_DEPLOYMENT_NAME = os.environ.get("AZURE_OPENAI_DEPLOYMENT_NAME", None)
 
+# Shared LLM client pools (see llm_clients.py)
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 100))
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", 20))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", 120))
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "true").lower() != "false"
+LLM_CLIENT_IDLE_TTL = float(os.environ.get("LLM_CLIENT_IDLE_TTL", 900))
+LLM_CLIENT_MAX_CLIENTS = int(os.environ.get("LLM_CLIENT_MAX_CLIENTS", 32))
+
+# Generation result cache (see generation_cache/core.py)
+GENERATION_CACHE_ENABLED = os.environ.get("GENERATION_CACHE_ENABLED", "true").lower() != "false"
+GENERATION_CACHE_DIR = os.environ.get("GENERATION_CACHE_DIR", os.path.join(os.getcwd(), "generation_cache_data"))
+GENERATION_CACHE_TTL = float(os.environ.get("GENERATION_CACHE_TTL", 7 * 24 * 3600))
+GENERATION_CACHE_MAX_ENTRIES = int(os.environ.get("GENERATION_CACHE_MAX_ENTRIES", 2000))
+GENERATION_CACHE_MAX_BYTES = int(os.environ.get("GENERATION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Use Redis instead of local disk when set (requires the redis package)
+GENERATION_CACHE_REDIS_URL = os.environ.get("GENERATION_CACHE_REDIS_URL", None)
+
+# Alt text -> generated image cache shared across sessions (see image_generation/cache.py)
+IMAGE_CACHE_ENABLED = os.environ.get("IMAGE_CACHE_ENABLED", "true").lower() != "false"
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(os.getcwd(), "image_cache_data"))
+# OpenAI and Replicate image URLs expire after about an hour
+IMAGE_CACHE_TTL = float(os.environ.get("IMAGE_CACHE_TTL", 50 * 60))
+IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", 5000))
+# Use Redis instead of local disk when set (requires the redis package)
+IMAGE_CACHE_REDIS_URL = os.environ.get("IMAGE_CACHE_REDIS_URL", None)
+
+# Video frame sampling (see video/frame_sampler.py)
+# "uniform" spaces frames evenly; "scene" keeps the frames where the screen changes most
+VIDEO_FRAME_SAMPLING = os.environ.get("VIDEO_FRAME_SAMPLING", "uniform")
+VIDEO_DECODE_WORKERS = int(os.environ.get("VIDEO_DECODE_WORKERS", 4))
+
 # Image generation (optional)
 REPLICATE_API_KEY = os.environ.get("REPLICATE_API_KEY", None)
+REPLICATE_BASE_URL = os.environ.get("REPLICATE_BASE_URL", "https://api.replicate.com/v1")
+# Predictions running at once, across all requests
+REPLICATE_MAX_CONCURRENCY = int(os.environ.get("REPLICATE_MAX_CONCURRENCY", 8))
+# Seconds Replicate may hold the create request open for the result (0 disables, max 60)
+REPLICATE_PREFER_WAIT = int(os.environ.get("REPLICATE_PREFER_WAIT", 10))
+# Give up on a prediction (and cancel it) after this many seconds
+REPLICATE_DEADLINE = float(os.environ.get("REPLICATE_DEADLINE", 60))
+REPLICATE_POLL_INITIAL = float(os.environ.get("REPLICATE_POLL_INITIAL", 0.25))
+REPLICATE_POLL_MAX = float(os.environ.get("REPLICATE_POLL_MAX", 2.0))
+
+# Streaming to the client (see ws/coalescer.py)
+# Code chunks are batched per variant for this many milliseconds (0 sends every chunk)
+WS_CHUNK_FLUSH_MS = float(os.environ.get("WS_CHUNK_FLUSH_MS", 24))
+# ...or until this many characters are buffered
+WS_CHUNK_FLUSH_CHARS = int(os.environ.get("WS_CHUNK_FLUSH_CHARS", 4096))
+
+# Run logs (see fs_logging/core.py), written under $LOGS_PATH/run_logs
+# Runs waiting to be written; beyond this they are dropped and counted
+RUN_LOG_QUEUE_SIZE = int(os.environ.get("RUN_LOG_QUEUE_SIZE", 256))
+RUN_LOG_SEGMENT_MAX_BYTES = int(os.environ.get("RUN_LOG_SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+RUN_LOG_MAX_SEGMENTS = int(os.environ.get("RUN_LOG_MAX_SEGMENTS", 20))
 
 # Debugging-related
 SHOULD_MOCK_AI_RESPONSE = bool(os.environ.get("MOCK", False))
@@ -1 +1,15 @@
+import os
+
 EVALS_DIR = "./evals_data"
+
+# Maximum concurrent generations per provider while running evals. Runs for
+# several models share these caps, so e.g. two Claude models never exceed the
+# Anthropic limit together.
+EVAL_PROVIDER_CONCURRENCY = {
+    "anthropic": int(os.environ.get("EVAL_CONCURRENCY_ANTHROPIC", 4)),
+    "openai": int(os.environ.get("EVAL_CONCURRENCY_OPENAI", 8)),
+    "gemini": int(os.environ.get("EVAL_CONCURRENCY_GEMINI", 4)),
+}
+
+# Written next to the outputs of every eval run
+EVAL_SUMMARY_FILENAME = "eval_summary.json"
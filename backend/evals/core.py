@@ -10,6 +10,7 @@ from config import (
     AZURE_OPENAI_DEPLOYMENT_NAME,
 )
 from llm import (
+    Completion,
     Llm,
     stream_claude_response,
     stream_gemini_response,
@@ -20,7 +21,7 @@ from prompts.types import Stack
 from openai.types.chat import ChatCompletionMessageParam
 
 
-async def generate_code_for_image(image_url: str, stack: Stack, model: Llm) -> str:
+async def generate_code_for_image(image_url: str, stack: Stack, model: Llm) -> Completion:
     """
     Assemble prompt messages từ image_url và stack,
     sau đó gọi hàm generate_code_core để lấy code.
@@ -31,7 +32,7 @@ async def generate_code_for_image(image_url: str, stack: Stack, model: Llm) -> s
 
 async def generate_code_core(
     prompt_messages: list[ChatCompletionMessageParam], model: Llm
-) -> str:
+) -> Completion:
     """
     Dựa vào model được chỉ định, gọi provider tương ứng để stream kết quả:
       - Với các model thuộc nhóm Anthropic (Claude): sử dụng stream_claude_response.
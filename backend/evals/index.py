@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from .config import EVALS_DIR
+
+# Bump when the on-disk index format changes
+INDEX_FORMAT_VERSION = 1
+
+# Upper bound on cached input data URLs (full size and thumbnails), in characters
+INPUT_CACHE_MAX_CHARS = 256 * 1024 * 1024
+
+
+def output_base_name(filename: str) -> str:
+    """`page_0.html` -> `page`; names without an output number keep their stem"""
+    return filename.rsplit("_", 1)[0] if "_" in filename else filename.replace(".html", "")
+
+
+@dataclass
+class FolderIndex:
+    folder: str
+    # Directory mtime the index was built from. Creating, deleting or renaming
+    # a file changes it; rewriting a file in place doesn't, but contents are
+    # always read fresh.
+    mtime_ns: int
+    # Base name -> sorted output filenames
+    outputs: Dict[str, List[str]] = field(default_factory=dict)
+
+    def first_output(self, base_name: str) -> Optional[str]:
+        files = self.outputs.get(base_name)
+        return os.path.join(self.folder, files[0]) if files else None
+
+
+class EvalIndex:
+    """Indexes eval output folders and the inputs directory
+
+    Each folder is scanned once and re-scanned only when its mtime changes.
+    Folder indexes are persisted under `<EVALS_DIR>/.index`, so a restart
+    doesn't rescan thousands of outputs. Input screenshots are base64-encoded
+    once per (file, mtime, thumbnail width) and kept in a bounded LRU.
+    """
+
+    def __init__(self, evals_dir: str = EVALS_DIR, input_cache_max_chars: int = INPUT_CACHE_MAX_CHARS):
+        self.evals_dir = evals_dir
+        self.index_dir = os.path.join(evals_dir, ".index")
+        self.input_cache_max_chars = input_cache_max_chars
+        self._folders: Dict[str, FolderIndex] = {}
+        self._inputs: "OrderedDict[tuple[str, int, Optional[int]], str]" = OrderedDict()
+        self._inputs_chars = 0
+        self._input_names_cache: Optional[tuple[int, set[str]]] = None
+        # Index and cache updates happen on worker threads
+        self._lock = threading.Lock()
+        self.stats = {"scans": 0, "disk_loads": 0, "input_hits": 0, "input_misses": 0}
+
+    @property
+    def input_dir(self) -> str:
+        return os.path.join(self.evals_dir, "inputs")
+
+    # Folder indexes
+
+    async def get_folder(self, folder: str) -> FolderIndex:
+        return await asyncio.to_thread(self.folder_index, folder)
+
+    def folder_index(self, folder: str) -> FolderIndex:
+        folder = os.path.abspath(folder)
+        mtime_ns = os.stat(folder).st_mtime_ns
+
+        with self._lock:
+            cached = self._folders.get(folder)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+
+        index = self._load(folder)
+        if index is None or index.mtime_ns != mtime_ns:
+            index = self._scan(folder, mtime_ns)
+            self._save(index)
+        with self._lock:
+            self._folders[folder] = index
+        return index
+
+    def _scan(self, folder: str, mtime_ns: int) -> FolderIndex:
+        self.stats["scans"] += 1
+        outputs: Dict[str, List[str]] = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".html"):
+                    outputs.setdefault(output_base_name(entry.name), []).append(entry.name)
+        for files in outputs.values():
+            files.sort()
+        return FolderIndex(folder=folder, mtime_ns=mtime_ns, outputs=outputs)
+
+    def _index_path(self, folder: str) -> str:
+        digest = hashlib.sha256(folder.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.index_dir, f"{digest}.json")
+
+    def _load(self, folder: str) -> Optional[FolderIndex]:
+        try:
+            with open(self._index_path(folder)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_FORMAT_VERSION or data.get("folder") != folder:
+            return None
+        self.stats["disk_loads"] += 1
+        return FolderIndex(folder=folder, mtime_ns=data["mtime_ns"], outputs=data["outputs"])
+
+    def _save(self, index: FolderIndex) -> None:
+        # Stored outside the indexed folder so that writing it doesn't change
+        # the folder's mtime and invalidate itself
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            path = self._index_path(index.folder)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {
+                        "version": INDEX_FORMAT_VERSION,
+                        "folder": index.folder,
+                        "mtime_ns": index.mtime_ns,
+                        "outputs": index.outputs,
+                    },
+                    f,
+                )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[EVAL INDEX] could not persist index for {index.folder}: {e}")
+
+    # Inputs
+
+    def input_path(self, base_name: str) -> str:
+        return os.path.join(self.input_dir, f"{base_name}.png")
+
+    async def get_input_names(self) -> set[str]:
+        """Base names of all input screenshots"""
+        return await asyncio.to_thread(self._input_names)
+
+    def _input_names(self) -> set[str]:
+        try:
+            mtime_ns = os.stat(self.input_dir).st_mtime_ns
+        except FileNotFoundError:
+            return set()
+        with self._lock:
+            cached = self._input_names_cache
+        if cached is None or cached[0] != mtime_ns:
+            with os.scandir(self.input_dir) as entries:
+                names = {e.name[: -len(".png")] for e in entries if e.name.endswith(".png")}
+            cached = (mtime_ns, names)
+            with self._lock:
+                self._input_names_cache = cached
+        return cached[1]
+
+    async def input_data_url(self, base_name: str, thumbnail_width: Optional[int] = None) -> Optional[str]:
+        return await asyncio.to_thread(self._input_data_url, base_name, thumbnail_width)
+
+    def _input_data_url(self, base_name: str, thumbnail_width: Optional[int]) -> Optional[str]:
+        path = self.input_path(base_name)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        key = (path, mtime_ns, thumbnail_width)
+        with self._lock:
+            cached = self._inputs.get(key)
+            if cached is not None:
+                self._inputs.move_to_end(key)
+                self.stats["input_hits"] += 1
+                return cached
+        self.stats["input_misses"] += 1
+
+        with open(path, "rb") as f:
+            data = f.read()
+        media_type = "image/png"
+        if thumbnail_width:
+            with Image.open(io.BytesIO(data)) as img:
+                if img.width > thumbnail_width:
+                    img.thumbnail((thumbnail_width, img.height), Image.Resampling.LANCZOS)
+                    img = img.convert("RGB")
+                    output = io.BytesIO()
+                    img.save(output, format="JPEG", quality=85)
+                    data = output.getvalue()
+                    media_type = "image/jpeg"
+        data_url = f"data:{media_type};base64,{base64.b64encode(data).decode()}"
+
+        with self._lock:
+            self._inputs[key] = data_url
+            self._inputs_chars += len(data_url)
+            while self._inputs_chars > self.input_cache_max_chars and len(self._inputs) > 1:
+                _, evicted = self._inputs.popitem(last=False)
+                self._inputs_chars -= len(evicted)
+        return data_url
+
+    # Outputs
+
+    async def read_output(self, path: str) -> str:
+        return await asyncio.to_thread(_read_text, path)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+eval_index = EvalIndex()
@@ -1,23 +1,220 @@
-from typing import Any, Coroutine, List, Optional
+from typing import Dict, List, Literal, Optional
 import asyncio
+import json
 import os
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from llm import Llm
 from prompts.types import Stack
 from .core import generate_code_for_image
 from .utils import image_to_data_url
-from .config import EVALS_DIR
+from .config import EVAL_PROVIDER_CONCURRENCY, EVAL_SUMMARY_FILENAME, EVALS_DIR
 
+# Rough output token estimate; the streaming helpers don't report usage
+CHARS_PER_TOKEN = 4
 
-async def run_image_evals(
-    stack: Optional[Stack] = None, model: Optional[str] = None, n: int = 1
-) -> List[str]:
+
+@dataclass
+class EvalTask:
+    input_path: str
+    model: Llm
+    output_path: str
+
+
+@dataclass
+class EvalResult:
+    task: EvalTask
+    status: Literal["completed", "skipped", "failed"]
+    # Time spent in the model call, from its Completion
+    latency: float = 0.0
+    output_chars: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class EvalRun:
+    model: Llm
+    output_folder: str
+    tasks: List[EvalTask] = field(default_factory=list)
+
+
+def provider_for(model: Llm) -> str:
+    if model.value.startswith("claude"):
+        return "anthropic"
+    if model.value.startswith("gemini"):
+        return "gemini"
+    return "openai"
+
+
+def plan_eval_run(
+    model: Llm, stack: Stack, n: int, run_id: str, input_files: List[str]
+) -> EvalRun:
     INPUT_DIR = EVALS_DIR + "/inputs"
     OUTPUT_DIR = EVALS_DIR + "/outputs"
 
+    # Create output subfolder with run id (date by default), model and stack
+    output_subfolder = os.path.join(OUTPUT_DIR, f"{run_id}_{model.value}_{stack}")
+    os.makedirs(output_subfolder, exist_ok=True)
+
+    run = EvalRun(model=model, output_folder=output_subfolder)
+    for filename in input_files:
+        for n_idx in range(n):  # Generate N tasks for each input
+            # File name is derived from the original filename in evals with an added output number
+            output_filename = f"{os.path.splitext(filename)[0]}_{n_idx}.html"
+            run.tasks.append(
+                EvalTask(
+                    input_path=os.path.join(INPUT_DIR, filename),
+                    model=model if n_idx == 0 else Llm.GPT_4O_2024_05_13,
+                    output_path=os.path.join(output_subfolder, output_filename),
+                )
+            )
+    return run
+
+
+def _write_output(path: str, content: str) -> None:
+    # Write then rename, so an interrupted run never leaves a partial output
+    # that a resumed run would mistake for a finished one
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+async def run_eval_task(
+    task: EvalTask, stack: Stack, semaphore: asyncio.Semaphore, resume: bool
+) -> EvalResult:
+    if resume and os.path.exists(task.output_path):
+        return EvalResult(task, "skipped")
+
+    async with semaphore:
+        try:
+            # Inputs are read only once a slot is free, so a large suite
+            # doesn't hold every screenshot in memory at once
+            data_url = await image_to_data_url(task.input_path)
+            completion = await generate_code_for_image(
+                image_url=data_url, stack=stack, model=task.model
+            )
+        except Exception as e:
+            print(f"[EVALS] {task.model.value} failed on {task.input_path}: {e}")
+            return EvalResult(task, "failed", error=str(e))
+
+    # Stream each output to disk as soon as it completes
+    await asyncio.to_thread(_write_output, task.output_path, completion["code"])
+    print(
+        f"[EVALS] {task.model.value} finished {os.path.basename(task.output_path)} "
+        f"in {completion['duration']:.1f}s"
+    )
+    return EvalResult(
+        task,
+        "completed",
+        latency=completion["duration"],
+        output_chars=len(completion["code"]),
+    )
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize_results(
+    run: EvalRun, stack: Stack, results: List[EvalResult], wall_time: float
+) -> Dict[str, object]:
+    completed = [r for r in results if r.status == "completed"]
+    latencies = [r.latency for r in completed]
+    tokens = [r.output_chars / CHARS_PER_TOKEN for r in completed]
+    tokens_per_sec = [t / r.latency for t, r in zip(tokens, completed) if r.latency > 0]
+    return {
+        "model": run.model.value,
+        "stack": stack,
+        "total": len(results),
+        "completed": len(completed),
+        "skipped": sum(r.status == "skipped" for r in results),
+        "failed": sum(r.status == "failed" for r in results),
+        "wall_time_s": round(wall_time, 2),
+        "latency_s": {
+            "p50": round(_percentile(latencies, 0.5), 2),
+            "p95": round(_percentile(latencies, 0.95), 2),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        },
+        "estimated_output_tokens": round(sum(tokens)),
+        "tokens_per_sec": {
+            "p50": round(_percentile(tokens_per_sec, 0.5), 1),
+            "p95": round(_percentile(tokens_per_sec, 0.95), 1),
+            # Output tokens per second of wall time, across concurrent generations
+            "aggregate": round(sum(tokens) / wall_time, 1) if wall_time > 0 else 0.0,
+        },
+        "errors": {
+            os.path.basename(r.task.output_path): r.error
+            for r in results
+            if r.status == "failed"
+        },
+    }
+
+
+async def run_evals_for_models(
+    models: List[str],
+    stack: Stack,
+    n: int = 1,
+    resume: bool = True,
+    run_id: Optional[str] = None,
+) -> Dict[str, List[str]]:
+    """Run evals for several models at once under per-provider concurrency caps
+
+    Outputs are written as they complete. With `resume`, outputs that already
+    exist in the run's folder are skipped, so re-running an interrupted run
+    (same `run_id`, today's date by default) only generates what is missing.
+    A failed generation is recorded in the run summary and doesn't affect the
+    others. Returns the output filenames per model.
+    """
+    INPUT_DIR = EVALS_DIR + "/inputs"
+
     # Get all the files in the directory (only grab pngs)
-    evals = [f for f in os.listdir(INPUT_DIR) if f.endswith(".png")]
+    input_files = sorted(f for f in os.listdir(INPUT_DIR) if f.endswith(".png"))
+    run_id = run_id or datetime.now().strftime("%b_%d_%Y")
+
+    runs = [
+        plan_eval_run(Llm(model), stack, n, run_id, input_files)
+        for model in dict.fromkeys(models)
+    ]
+    semaphores = {
+        provider: asyncio.Semaphore(limit)
+        for provider, limit in EVAL_PROVIDER_CONCURRENCY.items()
+    }
 
+    async def run_model(run: EvalRun) -> List[str]:
+        start_time = time.time()
+        print(f"Running {len(run.tasks)} evals for {run.model.value} model")
+        results = await asyncio.gather(
+            *(
+                run_eval_task(task, stack, semaphores[provider_for(task.model)], resume)
+                for task in run.tasks
+            )
+        )
+        summary = summarize_results(run, stack, results, time.time() - start_time)
+        with open(os.path.join(run.output_folder, EVAL_SUMMARY_FILENAME), "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[EVALS] summary for {run.model.value}: {json.dumps(summary)}")
+        return [
+            os.path.basename(r.task.output_path)
+            for r in results
+            if r.status != "failed"
+        ]
+
+    outputs = await asyncio.gather(*(run_model(run) for run in runs))
+    return {run.model.value: files for run, files in zip(runs, outputs)}
+
+
+async def run_image_evals(
+    stack: Optional[Stack] = None,
+    model: Optional[str] = None,
+    n: int = 1,
+    resume: bool = True,
+    run_id: Optional[str] = None,
+) -> List[str]:
     if not stack:
         raise ValueError("No stack was provided")
 
@@ -31,45 +228,7 @@ async def run_image_evals(
     selected_model = Llm(model)
     print(f"Running evals for {selected_model} model")
 
-    # Create output subfolder with date, model and stack
-    today = datetime.now().strftime("%b_%d_%Y")
-    output_subfolder = os.path.join(
-        OUTPUT_DIR, f"{today}_{selected_model.value}_{stack}"
+    output_files = await run_evals_for_models(
+        [selected_model.value], stack, n=n, resume=resume, run_id=run_id
     )
-    os.makedirs(output_subfolder, exist_ok=True)
-
-    tasks: list[Coroutine[Any, Any, str]] = []
-    for filename in evals:
-        filepath = os.path.join(INPUT_DIR, filename)
-        data_url = await image_to_data_url(filepath)
-        for n_idx in range(n):  # Generate N tasks for each input
-            if n_idx == 0:
-                task = generate_code_for_image(
-                    image_url=data_url,
-                    stack=stack,
-                    model=selected_model,
-                )
-            else:
-                task = generate_code_for_image(
-                    image_url=data_url, stack=stack, model=Llm.GPT_4O_2024_05_13
-                )
-            tasks.append(task)
-
-    print(f"Generating {len(tasks)} codes")
-
-    results = await asyncio.gather(*tasks)
-
-    output_files: List[str] = []
-    for i, content in enumerate(results):
-        # Calculate index for filename and output number
-        eval_index = i // n
-        output_number = i % n
-        filename = evals[eval_index]
-        # File name is derived from the original filename in evals with an added output number
-        output_filename = f"{os.path.splitext(filename)[0]}_{output_number}.html"
-        output_filepath = os.path.join(output_subfolder, output_filename)
-        with open(output_filepath, "w") as file:
-            file.write(content)
-        output_files.append(output_filename)
-
-    return output_files
+    return output_files[selected_model.value]
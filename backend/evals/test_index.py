@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from PIL import Image
+
+from evals.index import EvalIndex, output_base_name
+
+
+def touch(path: str, content: str = "<html></html>") -> None:
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def bump_mtime(path: str) -> None:
+    # Some filesystems have coarse mtimes; make sure a change is visible
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestEvalIndex(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.evals_dir = self.tmp.name
+        self.folder = os.path.join(self.evals_dir, "outputs", "run")
+        os.makedirs(self.folder)
+        os.makedirs(os.path.join(self.evals_dir, "inputs"))
+        self.index = EvalIndex(evals_dir=self.evals_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_output_base_name(self):
+        self.assertEqual(output_base_name("page_0.html"), "page")
+        self.assertEqual(output_base_name("my_page_12.html"), "my_page")
+        self.assertEqual(output_base_name("page.html"), "page")
+
+    async def test_outputs_are_grouped_by_exact_base_name(self):
+        for name in ["page_0.html", "page_1.html", "page10_0.html", "notes.txt"]:
+            touch(os.path.join(self.folder, name))
+
+        index = await self.index.get_folder(self.folder)
+
+        self.assertEqual(index.outputs, {"page": ["page_0.html", "page_1.html"], "page10": ["page10_0.html"]})
+        self.assertEqual(index.first_output("page"), os.path.join(self.folder, "page_0.html"))
+        self.assertIsNone(index.first_output("missing"))
+
+    async def test_folder_is_rescanned_only_when_it_changes(self):
+        touch(os.path.join(self.folder, "a_0.html"))
+        await self.index.get_folder(self.folder)
+        await self.index.get_folder(self.folder)
+        self.assertEqual(self.index.stats["scans"], 1)
+
+        touch(os.path.join(self.folder, "b_0.html"))
+        bump_mtime(self.folder)
+        index = await self.index.get_folder(self.folder)
+
+        self.assertEqual(self.index.stats["scans"], 2)
+        self.assertEqual(sorted(index.outputs), ["a", "b"])
+
+    async def test_persisted_index_is_reused_after_restart(self):
+        touch(os.path.join(self.folder, "a_0.html"))
+        await self.index.get_folder(self.folder)
+
+        restarted = EvalIndex(evals_dir=self.evals_dir)
+        index = await restarted.get_folder(self.folder)
+
+        self.assertEqual(restarted.stats["scans"], 0)
+        self.assertEqual(restarted.stats["disk_loads"], 1)
+        self.assertEqual(index.outputs, {"a": ["a_0.html"]})
+
+        # A stale persisted index is ignored
+        touch(os.path.join(self.folder, "b_0.html"))
+        bump_mtime(self.folder)
+        index = await EvalIndex(evals_dir=self.evals_dir).get_folder(self.folder)
+        self.assertEqual(sorted(index.outputs), ["a", "b"])
+
+    async def test_input_data_urls_are_cached(self):
+        Image.new("RGB", (800, 600), (200, 50, 50)).save(os.path.join(self.evals_dir, "inputs", "page.png"))
+
+        self.assertEqual(await self.index.get_input_names(), {"page"})
+        first = await self.index.input_data_url("page")
+        second = await self.index.input_data_url("page")
+        self.assertIsNotNone(first)
+        self.assertTrue(first.startswith("data:image/png;base64,"))  # type: ignore
+        self.assertIs(first, second)
+        self.assertEqual(self.index.stats["input_hits"], 1)
+        self.assertIsNone(await self.index.input_data_url("missing"))
+
+    async def test_thumbnail_is_smaller_than_full_input(self):
+        Image.effect_noise((1600, 1200), 40).convert("RGB").save(os.path.join(self.evals_dir, "inputs", "page.png"))
+
+        full = await self.index.input_data_url("page")
+        thumbnail = await self.index.input_data_url("page", thumbnail_width=200)
+
+        self.assertTrue(thumbnail.startswith("data:image/jpeg;base64,"))  # type: ignore
+        self.assertLess(len(thumbnail), len(full))  # type: ignore
+
+    async def test_input_cache_is_bounded(self):
+        inputs = os.path.join(self.evals_dir, "inputs")
+        for name in ["a", "b", "c"]:
+            Image.new("RGB", (64, 64), (10, 20, 30)).save(os.path.join(inputs, f"{name}.png"))
+        size = len(await self.index.input_data_url("a"))  # type: ignore
+        self.index.input_cache_max_chars = size * 2
+
+        await self.index.input_data_url("b")
+        await self.index.input_data_url("c")
+
+        self.assertLessEqual(self.index._inputs_chars, size * 2)
+        self.assertEqual(len(self.index._inputs), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
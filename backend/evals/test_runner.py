@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from evals import runner
+from evals.config import EVAL_SUMMARY_FILENAME
+from llm import Completion, Llm
+
+
+class TestEvalRunner(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, "inputs"))
+        for name in ("a.png", "b.png", "c.png"):
+            with open(os.path.join(self.tmp.name, "inputs", name), "wb") as f:
+                f.write(b"\x89PNG")
+        self.in_flight = {"anthropic": 0, "openai": 0}
+        self.peak = {"anthropic": 0, "openai": 0}
+        self.calls: list[tuple[str, Llm]] = []
+        patches = [
+            patch.object(runner, "EVALS_DIR", self.tmp.name),
+            patch.object(runner, "EVAL_PROVIDER_CONCURRENCY", {"anthropic": 1, "openai": 2, "gemini": 1}),
+            patch.object(runner, "generate_code_for_image", self.fake_generate),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.fail_on: set[str] = set()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def fake_generate(self, image_url: str, stack: str, model: Llm) -> Completion:
+        provider = runner.provider_for(model)
+        self.in_flight[provider] += 1
+        self.peak[provider] = max(self.peak[provider], self.in_flight[provider])
+        try:
+            await asyncio.sleep(0.01)
+            self.calls.append((image_url, model))
+            if model.value in self.fail_on:
+                raise RuntimeError("provider error")
+            return Completion(duration=0.5, code="<html>" + "x" * 400 + "</html>")
+        finally:
+            self.in_flight[provider] -= 1
+
+    def output_folder(self, model: Llm) -> str:
+        return os.path.join(self.tmp.name, "outputs", f"run1_{model.value}_html_tailwind")
+
+    async def test_models_run_concurrently_within_provider_caps(self):
+        models = [Llm.CLAUDE_3_5_SONNET_2024_10_22.value, Llm.CLAUDE_3_5_SONNET_2024_06_20.value, Llm.GPT_4O_2024_11_20.value]
+        outputs = await runner.run_evals_for_models(models, "html_tailwind", run_id="run1")
+
+        self.assertEqual(len(self.calls), 9)
+        self.assertEqual(self.peak["anthropic"], 1)
+        self.assertEqual(self.peak["openai"], 2)
+        self.assertEqual(outputs[models[2]], ["a_0.html", "b_0.html", "c_0.html"])
+
+    async def test_resume_skips_existing_outputs(self):
+        model = Llm.GPT_4O_2024_11_20
+        os.makedirs(self.output_folder(model))
+        with open(os.path.join(self.output_folder(model), "a_0.html"), "w") as f:
+            f.write("<html></html>")
+
+        await runner.run_image_evals("html_tailwind", model.value, run_id="run1")
+
+        self.assertEqual(len(self.calls), 2)
+        with open(os.path.join(self.output_folder(model), EVAL_SUMMARY_FILENAME)) as f:
+            summary = json.load(f)
+        self.assertEqual((summary["completed"], summary["skipped"]), (2, 1))
+        self.assertEqual(summary["latency_s"]["p50"], 0.5)
+        self.assertGreater(summary["tokens_per_sec"]["p50"], 0)
+
+    async def test_failures_do_not_abort_other_models(self):
+        self.fail_on = {Llm.CLAUDE_3_5_SONNET_2024_10_22.value}
+        models = [Llm.CLAUDE_3_5_SONNET_2024_10_22.value, Llm.GPT_4O_2024_11_20.value]
+
+        outputs = await runner.run_evals_for_models(models, "html_tailwind", run_id="run1")
+
+        self.assertEqual(outputs[models[0]], [])
+        self.assertEqual(len(outputs[models[1]]), 3)
+        self.assertFalse(any(f.endswith(".html") for f in os.listdir(self.output_folder(Llm(models[0])))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,13 @@
+import asyncio
 import base64
 
 
-async def image_to_data_url(filepath: str):
+def _read_data_url(filepath: str) -> str:
     with open(filepath, "rb") as image_file:
         encoded_string = base64.b64encode(image_file.read()).decode()
     return f"data:image/png;base64,{encoded_string}"
+
+
+async def image_to_data_url(filepath: str):
+    # Read and encode off the event loop; eval inputs are full-size screenshots
+    return await asyncio.to_thread(_read_data_url, filepath)
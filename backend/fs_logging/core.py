@@ -1,23 +1,279 @@
-from datetime import datetime
+# Run logs: the prompt and completion of every generation.
+#
+# write_logs only enqueues; a background task does the writing, in a thread.
+# Runs are appended as JSON lines to gzip segments
+# (run_logs/runs_<timestamp>_<pid>.jsonl.gz), which rotate once they reach
+# RUN_LOG_SEGMENT_MAX_BYTES, keeping the newest RUN_LOG_MAX_SEGMENTS.
+#
+# Screenshots make up nearly all of a prompt and repeat across runs (every
+# update resends the original), so data URLs are stored once under
+# run_logs/images/ by content hash and replaced in the log by
+# "run-log-image:<hash>.<ext>". read_run_logs puts them back.
+#
+# When the disk can't keep up the queue fills; further runs are dropped and
+# counted, and the count is recorded with the next run that gets written.
+
+import asyncio
+import base64
+import binascii
+import gzip
+import hashlib
 import json
 import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterator
+
 from openai.types.chat import ChatCompletionMessageParam
 
+from config import RUN_LOG_MAX_SEGMENTS, RUN_LOG_QUEUE_SIZE, RUN_LOG_SEGMENT_MAX_BYTES
 
-def write_logs(prompt_messages: list[ChatCompletionMessageParam], completion: str):
+IMAGE_REF_PREFIX = "run-log-image:"
+SEGMENT_PREFIX = "runs_"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+# Runs written per segment append (one gzip member each)
+_BATCH_SIZE = 32
+
+
+def logs_directory() -> str:
     # Get the logs path from environment, default to the current working directory
     logs_path = os.environ.get("LOGS_PATH", os.getcwd())
+    return os.path.join(logs_path, "run_logs")
+
+
+@dataclass
+class RunLogStats:
+    written: int = 0
+    dropped: int = 0
+    images_stored: int = 0
+    images_deduplicated: int = 0
+    bytes_written: int = 0
+
+
+class ImageStore:
+    """Content-addressed image files: images/<hash[:2]>/<hash>.<ext>"""
+
+    def __init__(self, directory: str, stats: RunLogStats):
+        self.directory = directory
+        self.stats = stats
+        self._known: set[str] = set()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def put(self, data_url: str) -> str | None:
+        """Stores the image of a base64 data URL; returns its reference, or None
+        if it isn't one"""
+        header, sep, payload = data_url.partition(",")
+        if not sep or not header.endswith(";base64"):
+            return None
+        try:
+            data = base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+
+        media_type = header[len("data:") : -len(";base64")]
+        extension = media_type.rpartition("/")[2] or "bin"
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        if name in self._known or os.path.exists(self.path(name)):
+            self.stats.images_deduplicated += 1
+        else:
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+            self.stats.images_stored += 1
+            self.stats.bytes_written += len(data)
+        self._known.add(name)
+        return IMAGE_REF_PREFIX + name
+
+    def get_data_url(self, reference: str) -> str | None:
+        name = reference[len(IMAGE_REF_PREFIX) :]
+        try:
+            with open(self.path(name), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        extension = name.rpartition(".")[2]
+        return f"data:image/{extension};base64," + base64.b64encode(data).decode()
+
+
+def _map_strings(value: Any, replace) -> Any:
+    # Copies lists and dicts instead of changing the caller's messages
+    if isinstance(value, str):
+        return replace(value)
+    if isinstance(value, dict):
+        return {k: _map_strings(v, replace) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_map_strings(v, replace) for v in value]
+    return value
+
+
+class RunLogWriter:
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_queue: int = RUN_LOG_QUEUE_SIZE,
+        segment_max_bytes: int = RUN_LOG_SEGMENT_MAX_BYTES,
+        max_segments: int = RUN_LOG_MAX_SEGMENTS,
+    ):
+        # Resolved on first write so LOGS_PATH can be set after import
+        self._directory = directory
+        self.max_queue = max_queue
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.stats = RunLogStats()
+        self._queue: asyncio.Queue[dict[str, Any]] | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._images: ImageStore | None = None
+        self._segment: str | None = None
+        self._dropped_unreported = 0
+        # Writes come from the writer thread, or the caller when no loop runs
+        self._write_lock = threading.Lock()
 
-    # Create run_logs directory if it doesn't exist within the specified logs path
-    logs_directory = os.path.join(logs_path, "run_logs")
-    if not os.path.exists(logs_directory):
-        os.makedirs(logs_directory)
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = logs_directory()
+        return self._directory
 
-    print("Writing to logs directory:", logs_directory)
+    def submit(self, prompt_messages: list[ChatCompletionMessageParam], completion: str) -> None:
+        """Queues a run for writing without blocking"""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "prompt": list(prompt_messages),
+            "completion": completion,
+        }
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Scripts without an event loop write directly
+            self._write_batch([entry])
+            return
 
-    # Generate a unique filename using the current timestamp within the logs directory
-    filename = datetime.now().strftime(f"{logs_directory}/messages_%Y%m%d_%H%M%S.json")
+        if self._queue is None or self._task is None or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = loop.create_task(self._run(self._queue))
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            self._dropped_unreported += 1
+            print(f"[RUN LOGS] queue full, dropped run {entry['id']} ({self.stats.dropped} dropped so far)")
 
-    # Write the messages dict into a new file for each run
-    with open(filename, "w") as f:
-        f.write(json.dumps({"prompt": prompt_messages, "completion": completion}))
+    async def _run(self, queue: asyncio.Queue[dict[str, Any]]) -> None:
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < _BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                print(f"[RUN LOGS] could not write {len(batch)} run(s): {e}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def flush(self) -> None:
+        """Waits until every queued run is written"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+        self._queue = self._task = None
+
+    # Writing (off the event loop)
+
+    def _write_batch(self, batch: list[dict[str, Any]]) -> None:
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self._images is None:
+                self._images = ImageStore(os.path.join(self.directory, "images"), self.stats)
+            images = self._images
+
+            def replace(value: str) -> str:
+                if value.startswith("data:"):
+                    return images.put(value) or value
+                return value
+
+            lines = []
+            for entry in batch:
+                entry = dict(entry, prompt=_map_strings(entry["prompt"], replace))
+                if self._dropped_unreported:
+                    entry["dropped_before"] = self._dropped_unreported
+                    self._dropped_unreported = 0
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            segment = self._current_segment()
+            data = gzip.compress("".join(lines).encode("utf-8"))
+            # Each append is a complete gzip member; gzip readers concatenate them
+            with open(segment, "ab") as f:
+                f.write(data)
+            self.stats.written += len(batch)
+            self.stats.bytes_written += len(data)
+            print(f"[RUN LOGS] wrote {len(batch)} run(s) to {segment}")
+
+    def _current_segment(self) -> str:
+        if self._segment is None or (
+            os.path.exists(self._segment) and os.path.getsize(self._segment) >= self.segment_max_bytes
+        ):
+            name = f"{SEGMENT_PREFIX}{datetime.now():%Y%m%d_%H%M%S_%f}_{os.getpid()}{SEGMENT_SUFFIX}"
+            self._segment = os.path.join(self.directory, name)
+            self._remove_old_segments()
+        return self._segment
+
+    def _remove_old_segments(self) -> None:
+        # The new segment doesn't exist yet, so keep one fewer
+        for old in list_segments(self.directory)[: -self.max_segments + 1 or None]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def list_segments(directory: str) -> list[str]:
+    """Segment paths, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(names)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    ]
+
+
+def read_run_logs(directory: str | None = None, with_images: bool = True) -> Iterator[dict[str, Any]]:
+    """Runs in the order they were written, with image references resolved back
+    to data URLs unless `with_images` is False"""
+    directory = directory or logs_directory()
+    images = ImageStore(os.path.join(directory, "images"), RunLogStats())
+
+    def resolve(value: str) -> str:
+        if with_images and value.startswith(IMAGE_REF_PREFIX):
+            return images.get_data_url(value) or value
+        return value
+
+    for segment in list_segments(directory):
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                entry["prompt"] = _map_strings(entry["prompt"], resolve)
+                yield entry
+
+
+run_log_writer = RunLogWriter()
+
+
+def write_logs(prompt_messages: list[ChatCompletionMessageParam], completion: str):
+    run_log_writer.submit(prompt_messages, completion)
@@ -0,0 +1,98 @@
+import base64
+import gzip
+import os
+import tempfile
+import unittest
+
+from fs_logging.core import RunLogWriter, list_segments, read_run_logs
+
+
+def screenshot_url(seed: int) -> str:
+    return "data:image/png;base64," + base64.b64encode(bytes([seed]) * 50_000).decode()
+
+
+def prompt(image_url: str, text: str = "Build this page") -> list:
+    return [
+        {"role": "system", "content": "You are an expert Tailwind developer"},
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": image_url, "detail": "high"}},
+                {"type": "text", "text": text},
+            ],
+        },
+    ]
+
+
+class TestRunLogWriter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    async def test_writes_in_background_and_reads_back(self):
+        writer = RunLogWriter(self.directory)
+        messages = prompt(screenshot_url(1))
+
+        writer.submit(messages, "<html>1</html>")
+        writer.submit(prompt(screenshot_url(2)), "<html>2</html>")
+        self.assertEqual(list_segments(self.directory), [])
+        await writer.close()
+
+        runs = list(read_run_logs(self.directory))
+        self.assertEqual([r["completion"] for r in runs], ["<html>1</html>", "<html>2</html>"])
+        self.assertEqual(runs[0]["prompt"], messages)
+        self.assertNotEqual(runs[0]["id"], runs[1]["id"])
+        # The caller's messages are left as they were
+        self.assertTrue(messages[1]["content"][0]["image_url"]["url"].startswith("data:"))
+
+    async def test_images_are_stored_once(self):
+        writer = RunLogWriter(self.directory)
+        image = screenshot_url(3)
+
+        for i in range(10):
+            writer.submit(prompt(image, f"update {i}"), "<html></html>")
+        await writer.close()
+
+        self.assertEqual(writer.stats.images_stored, 1)
+        self.assertEqual(writer.stats.images_deduplicated, 9)
+        logged = list(read_run_logs(self.directory, with_images=False))
+        self.assertTrue(logged[0]["prompt"][1]["content"][0]["image_url"]["url"].startswith("run-log-image:"))
+        # Ten runs cost far less than ten copies of the screenshot
+        total = sum(os.path.getsize(p) for p in list_segments(self.directory))
+        self.assertLess(total, len(image))
+
+    async def test_full_queue_drops_and_counts(self):
+        writer = RunLogWriter(self.directory, max_queue=2)
+
+        for i in range(5):
+            writer.submit(prompt(screenshot_url(4), str(i)), "")
+        await writer.close()
+
+        self.assertEqual(writer.stats.dropped, 3)
+        runs = list(read_run_logs(self.directory, with_images=False))
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(sum(r.get("dropped_before", 0) for r in runs), 3)
+
+    async def test_segments_rotate(self):
+        writer = RunLogWriter(self.directory, segment_max_bytes=1, max_segments=2)
+
+        for i in range(4):
+            writer.submit(prompt(screenshot_url(i), str(i)), str(i))
+            await writer.flush()
+        await writer.close()
+
+        segments = list_segments(self.directory)
+        self.assertEqual(len(segments), 2)
+        with gzip.open(segments[-1], "rt") as f:
+            self.assertIn('"completion": "3"', f.read())
+
+    def test_writes_synchronously_without_event_loop(self):
+        writer = RunLogWriter(self.directory)
+
+        writer.submit(prompt(screenshot_url(5)), "sync")
+
+        self.assertEqual([r["completion"] for r in read_run_logs(self.directory)], ["sync"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Protocol
+
+from openai.types.chat import ChatCompletionMessageParam
+
+from config import (
+    GENERATION_CACHE_DIR,
+    GENERATION_CACHE_ENABLED,
+    GENERATION_CACHE_MAX_BYTES,
+    GENERATION_CACHE_MAX_ENTRIES,
+    GENERATION_CACHE_REDIS_URL,
+    GENERATION_CACHE_TTL,
+)
+
+# Bump when the cached entry format or the meaning of a key changes
+CACHE_FORMAT_VERSION = 1
+
+
+@dataclass
+class CachedGeneration:
+    # Chunks exactly as the model streamed them, so a replay looks like a live generation
+    chunks: list[str]
+    code: str
+    model: str
+    created_at: float
+
+
+@dataclass(frozen=True)
+class GenerationKey:
+    # Digest of every image in the prompt (screenshots, video frames, result images)
+    image_digest: str
+    # Digest of all prompt text: system prompt (which varies with the stack), user
+    # prompt and update history. Editing a prompt template changes it, so it doubles
+    # as the prompt version.
+    prompt_digest: str
+    stack: str
+    input_mode: str
+    generation_type: str
+    model: str
+    variant_index: int
+
+    @property
+    def digest(self) -> str:
+        payload = json.dumps({"v": CACHE_FORMAT_VERSION, **asdict(self)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def generation_key(
+    prompt_messages: list[ChatCompletionMessageParam],
+    stack: str,
+    input_mode: str,
+    generation_type: str,
+    model: str,
+    variant_index: int,
+) -> GenerationKey:
+    image_hash = hashlib.sha256()
+    prompt_hash = hashlib.sha256()
+    for message in prompt_messages:
+        prompt_hash.update(f"\x00{message['role']}\x00".encode("utf-8"))
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part["type"] == "image_url":
+                url = part["image_url"]["url"]  # type: ignore
+                image_hash.update(hashlib.sha256(url.encode("utf-8")).digest())
+                prompt_hash.update(b"\x00image\x00")
+            else:
+                prompt_hash.update(str(part.get("text", "")).encode("utf-8"))  # type: ignore
+    return GenerationKey(
+        image_digest=image_hash.hexdigest(),
+        prompt_digest=prompt_hash.hexdigest(),
+        stack=stack,
+        input_mode=input_mode,
+        generation_type=generation_type,
+        model=model,
+        variant_index=variant_index,
+    )
+
+
+class GenerationStore(Protocol):
+    async def get(self, digest: str) -> CachedGeneration | None: ...
+
+    async def put(self, digest: str, entry: CachedGeneration) -> None: ...
+
+
+def _encode(entry: CachedGeneration) -> bytes:
+    return gzip.compress(json.dumps(asdict(entry)).encode("utf-8"), compresslevel=5)
+
+
+def _decode(data: bytes) -> CachedGeneration:
+    return CachedGeneration(**json.loads(gzip.decompress(data)))
+
+
+class DiskGenerationStore:
+    """One gzipped JSON file per entry; least recently used entries are evicted
+    once the entry count or total size exceeds its limit"""
+
+    def __init__(self, directory: str, ttl: float, max_entries: int, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = asyncio.Lock()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json.gz")
+
+    async def get(self, digest: str) -> CachedGeneration | None:
+        return await asyncio.to_thread(self._get, digest)
+
+    def _get(self, digest: str) -> CachedGeneration | None:
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                entry = _decode(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, EOFError):
+            # Corrupt or partially written entry; drop it
+            self._remove(path)
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            self._remove(path)
+            return None
+        # Eviction removes the oldest mtime first; bumping it on read makes that LRU
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            pass
+        return entry
+
+    async def put(self, digest: str, entry: CachedGeneration) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._put, digest, entry)
+
+    def _put(self, digest: str, entry: CachedGeneration) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(digest)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_encode(entry))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json.gz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+
+        total_bytes = sum(size for _, size, _ in files)
+        files.sort()
+        while files and (len(files) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, name = files.pop(0)
+            self._remove(os.path.join(self.directory, name))
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisGenerationStore:
+    """Entries with a TTL; eviction beyond that is left to Redis' maxmemory policy"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis  # optional dependency
+
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, digest: str) -> CachedGeneration | None:
+        data = await self.redis.get(f"generation:{digest}")
+        return _decode(data) if data else None
+
+    async def put(self, digest: str, entry: CachedGeneration) -> None:
+        await self.redis.set(f"generation:{digest}", _encode(entry), ex=int(self.ttl))
+
+
+class GenerationCache:
+    def __init__(self, store: GenerationStore, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    async def get(self, key: GenerationKey) -> CachedGeneration | None:
+        if not self.enabled:
+            return None
+        try:
+            entry = await self.store.get(key.digest)
+        except Exception as e:
+            # The cache must never break a generation
+            self.stats["errors"] += 1
+            print(f"[GENERATION CACHE] lookup failed: {e}")
+            return None
+        self.stats["hits" if entry else "misses"] += 1
+        return entry
+
+    async def put(self, key: GenerationKey, chunks: list[str], code: str) -> None:
+        if not self.enabled or not code:
+            return
+        entry = CachedGeneration(chunks=chunks, code=code, model=key.model, created_at=time.time())
+        try:
+            await self.store.put(key.digest, entry)
+            self.stats["stores"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[GENERATION CACHE] store failed: {e}")
+
+    def get_stats(self) -> dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+def create_generation_cache() -> GenerationCache:
+    store: GenerationStore
+    if GENERATION_CACHE_REDIS_URL:
+        store = RedisGenerationStore(GENERATION_CACHE_REDIS_URL, GENERATION_CACHE_TTL)
+    else:
+        store = DiskGenerationStore(
+            GENERATION_CACHE_DIR,
+            ttl=GENERATION_CACHE_TTL,
+            max_entries=GENERATION_CACHE_MAX_ENTRIES,
+            max_bytes=GENERATION_CACHE_MAX_BYTES,
+        )
+    return GenerationCache(store, enabled=GENERATION_CACHE_ENABLED)
+
+
+generation_cache = create_generation_cache()
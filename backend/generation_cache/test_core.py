@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+import unittest
+
+from generation_cache.core import (
+    CachedGeneration,
+    DiskGenerationStore,
+    GenerationCache,
+    generation_key,
+)
+
+
+def messages(image: str = "data:image/png;base64,AAAA", system: str = "You are an expert"):
+    return [
+        {"role": "system", "content": system},
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": image, "detail": "high"}},
+                {"type": "text", "text": "Generate code for a web page that looks exactly like this."},
+            ],
+        },
+    ]
+
+
+def key(**overrides):
+    args = {
+        "prompt_messages": messages(),
+        "stack": "html_tailwind",
+        "input_mode": "image",
+        "generation_type": "create",
+        "model": "gpt-5-mini",
+        "variant_index": 0,
+        **overrides,
+    }
+    return generation_key(**args)
+
+
+class TestGenerationKey(unittest.TestCase):
+
+    def test_same_inputs_give_same_digest(self):
+        self.assertEqual(key().digest, key().digest)
+
+    def test_every_component_changes_the_digest(self):
+        base = key().digest
+        variants = [
+            key(prompt_messages=messages(image="data:image/png;base64,BBBB")),
+            key(prompt_messages=messages(system="You are a React expert")),
+            key(stack="react_tailwind"),
+            key(generation_type="update"),
+            key(model="claude-3-5-sonnet-20241022"),
+            key(variant_index=1),
+        ]
+        self.assertEqual(len({base, *(k.digest for k in variants)}), len(variants) + 1)
+
+
+class TestGenerationCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DiskGenerationStore(self.tmp.name, ttl=60, max_entries=2, max_bytes=1024 * 1024)
+        self.cache = GenerationCache(self.store)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_round_trip_keeps_chunks(self):
+        await self.cache.put(key(), ["<html>", "<body></body>", "</html>"], "<html><body></body></html>")
+        cached = await self.cache.get(key())
+        assert cached is not None
+        self.assertEqual(cached.chunks, ["<html>", "<body></body>", "</html>"])
+        self.assertEqual(cached.code, "<html><body></body></html>")
+        self.assertIsNone(await self.cache.get(key(variant_index=1)))
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    async def test_expired_entries_are_misses(self):
+        digest = key().digest
+        await self.store.put(digest, CachedGeneration(["x"], "x", "gpt-5-mini", time.time() - 120))
+        self.assertIsNone(await self.cache.get(key()))
+        self.assertFalse(os.listdir(self.tmp.name))
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        await self.cache.put(key(variant_index=0), ["a"], "a")
+        await self.cache.put(key(variant_index=1), ["b"], "b")
+        # Make variant 0 the most recently used
+        os.utime(os.path.join(self.tmp.name, f"{key(variant_index=1).digest}.json.gz"), (0, 0))
+        await self.cache.get(key(variant_index=0))
+        await self.cache.put(key(variant_index=2), ["c"], "c")
+
+        self.assertIsNotNone(await self.cache.get(key(variant_index=0)))
+        self.assertIsNone(await self.cache.get(key(variant_index=1)))
+        self.assertIsNotNone(await self.cache.get(key(variant_index=2)))
+
+    async def test_corrupt_entry_is_dropped(self):
+        with open(os.path.join(self.tmp.name, f"{key().digest}.json.gz"), "wb") as f:
+            f.write(b"not gzip")
+        self.assertIsNone(await self.cache.get(key()))
+        self.assertFalse(os.listdir(self.tmp.name))
+
+
+if __name__ == "__main__":
+    unittest.main()
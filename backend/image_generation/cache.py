@@ -0,0 +1,238 @@
+# Alt text -> generated image cache shared by every session.
+#
+# The same alt texts ("company logo", "user avatar", "hero banner") come up
+# across many users, and each one costs a DALL-E or Flux call of several
+# seconds. Entries are keyed by normalised alt text, image model and image
+# size. Concurrent requests for the same key share one generation.
+#
+# Provider image URLs expire (OpenAI and Replicate links last about an hour),
+# so the default TTL stays below that.
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Protocol
+
+from config import (
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_ENABLED,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_REDIS_URL,
+    IMAGE_CACHE_TTL,
+)
+
+# Bump when the cached entry format or the meaning of a key changes
+CACHE_FORMAT_VERSION = 1
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_alt_text(alt: str) -> str:
+    """`"  Company  Logo. "` -> `"company logo"`"""
+    return _WHITESPACE.sub(" ", alt).strip().strip(".!,;:").strip().lower()
+
+
+@dataclass(frozen=True)
+class ImageCacheKey:
+    alt: str
+    model: str
+    size: str
+
+    @property
+    def digest(self) -> str:
+        payload = json.dumps({"v": CACHE_FORMAT_VERSION, **asdict(self)}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def image_cache_key(alt: str, model: str, size: str) -> ImageCacheKey:
+    return ImageCacheKey(alt=normalize_alt_text(alt), model=model, size=size)
+
+
+@dataclass
+class CachedImage:
+    url: str
+    created_at: float
+
+
+class ImageStore(Protocol):
+    async def get(self, digest: str) -> CachedImage | None: ...
+
+    async def put(self, digest: str, entry: CachedImage) -> None: ...
+
+
+class DiskImageStore:
+    """An LRU of image URLs kept in memory and persisted as one JSON file
+
+    Entries are tiny, so the whole cache is loaded once and rewritten
+    (atomically) after each change.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedImage] | None = None
+        self._lock = asyncio.Lock()
+
+    def _load(self) -> OrderedDict[str, CachedImage]:
+        entries: OrderedDict[str, CachedImage] = OrderedDict()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_FORMAT_VERSION:
+                for digest, entry in data["entries"]:
+                    entries[digest] = CachedImage(**entry)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            print(f"[IMAGE CACHE] ignoring unreadable cache file {self.path}: {e}")
+        return entries
+
+    def _save(self, entries: list[tuple[str, dict[str, Any]]]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CACHE_FORMAT_VERSION, "entries": entries}, f)
+        os.replace(tmp_path, self.path)
+
+    async def _ensure_loaded(self) -> OrderedDict[str, CachedImage]:
+        if self._entries is None:
+            self._entries = await asyncio.to_thread(self._load)
+        return self._entries
+
+    async def get(self, digest: str) -> CachedImage | None:
+        async with self._lock:
+            entries = await self._ensure_loaded()
+            entry = entries.get(digest)
+            if entry is None:
+                return None
+            if time.time() - entry.created_at > self.ttl:
+                del entries[digest]
+                return None
+            entries.move_to_end(digest)
+            return entry
+
+    async def put(self, digest: str, entry: CachedImage) -> None:
+        async with self._lock:
+            entries = await self._ensure_loaded()
+            entries[digest] = entry
+            entries.move_to_end(digest)
+            now = time.time()
+            for expired in [d for d, e in entries.items() if now - e.created_at > self.ttl]:
+                del entries[expired]
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            snapshot = [(d, asdict(e)) for d, e in entries.items()]
+            await asyncio.to_thread(self._save, snapshot)
+
+
+class RedisImageStore:
+    """Entries with a TTL; eviction beyond that is left to Redis' maxmemory policy"""
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis  # optional dependency
+
+        self.redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, digest: str) -> CachedImage | None:
+        data = await self.redis.get(f"image:{digest}")
+        return CachedImage(**json.loads(data)) if data else None
+
+    async def put(self, digest: str, entry: CachedImage) -> None:
+        await self.redis.set(f"image:{digest}", json.dumps(asdict(entry)), ex=int(self.ttl))
+
+
+class ImageCache:
+    def __init__(self, store: ImageStore, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self._in_flight: dict[str, asyncio.Future[str | None]] = {}
+        self.stats = {"hits": 0, "misses": 0, "in_flight_joins": 0, "stores": 0, "errors": 0}
+
+    async def get_or_generate(
+        self, key: ImageCacheKey, generate: Callable[[], Awaitable[str | None]]
+    ) -> str | None:
+        if not self.enabled:
+            return await generate()
+
+        digest = key.digest
+        while (in_flight := self._in_flight.get(digest)) is not None:
+            self.stats["in_flight_joins"] += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # The request generating it was cancelled; take over unless we were too
+                if not in_flight.cancelled():
+                    raise
+
+        future: asyncio.Future[str | None] = asyncio.get_running_loop().create_future()
+        self._in_flight[digest] = future
+        try:
+            url = await self._lookup_or_generate(digest, generate)
+            future.set_result(url)
+            return url
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Only waiters see the exception; don't warn about an unretrieved one
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[digest]
+
+    async def _lookup_or_generate(
+        self, digest: str, generate: Callable[[], Awaitable[str | None]]
+    ) -> str | None:
+        try:
+            entry = await self.store.get(digest)
+        except Exception as e:
+            # The cache must never break image generation
+            self.stats["errors"] += 1
+            print(f"[IMAGE CACHE] lookup failed: {e}")
+            entry = None
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry.url
+
+        self.stats["misses"] += 1
+        url = await generate()
+        if url:
+            try:
+                await self.store.put(digest, CachedImage(url=url, created_at=time.time()))
+                self.stats["stores"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[IMAGE CACHE] store failed: {e}")
+        return url
+
+    def get_stats(self) -> dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["in_flight_joins"]
+        served_without_generating = self.stats["hits"] + self.stats["in_flight_joins"]
+        return {
+            **self.stats,
+            "hit_ratio": served_without_generating / lookups if lookups else 0.0,
+        }
+
+
+def create_image_cache() -> ImageCache:
+    store: ImageStore
+    if IMAGE_CACHE_REDIS_URL:
+        store = RedisImageStore(IMAGE_CACHE_REDIS_URL, IMAGE_CACHE_TTL)
+    else:
+        store = DiskImageStore(
+            os.path.join(IMAGE_CACHE_DIR, "images.json"),
+            ttl=IMAGE_CACHE_TTL,
+            max_entries=IMAGE_CACHE_MAX_ENTRIES,
+        )
+    return ImageCache(store, enabled=IMAGE_CACHE_ENABLED)
+
+
+shared_image_cache = create_image_cache()
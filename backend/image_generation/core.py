@@ -3,10 +3,14 @@ import re
 from typing import Dict, List, Literal, Union
 
 from openai import AsyncOpenAI, AsyncAzureOpenAI
-from bs4 import BeautifulSoup
 
+from image_generation.cache import image_cache_key, shared_image_cache
+from image_generation.html_rewriter import ImgTag, iter_img_tags, rewrite_img_tags
 from image_generation.replicate import call_replicate
 
+# Size (or aspect ratio) of the generated images, per image model
+IMAGE_SIZES = {"dalle3": "1024x1024", "flux": "1:1"}
+
 
 async def process_tasks(
     prompts: List[str],
@@ -24,21 +28,19 @@ async def process_tasks(
     Nếu có cung cấp Azure OpenAI key, ưu tiên sử dụng Azure để tạo ảnh.
     Nếu không, sử dụng API key thông thường (cho trường hợp model "dalle3") hoặc chuyển sang replicate.
     """
-    if azure_openai_api_key is not None:
-        tasks = [
-            generate_image_azure(
-                prompt,
-                azure_openai_api_key,
-                azure_openai_dalle3_api_version,
-                azure_openai_resource_name,
-                azure_openai_dalle3_deployment_name,
-            )
-            for prompt in prompts
-        ]
-    elif api_key is not None and model == "dalle3":
-        tasks = [generate_image_dalle(prompt, api_key, base_url) for prompt in prompts]
-    else:
-        tasks = [generate_image_replicate(prompt, api_key) for prompt in prompts]
+    tasks = [
+        generate_image(
+            prompt,
+            api_key,
+            base_url,
+            azure_openai_api_key,
+            azure_openai_dalle3_api_version,
+            azure_openai_resource_name,
+            azure_openai_dalle3_deployment_name,
+            model,
+        )
+        for prompt in prompts
+    ]
 
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
@@ -53,6 +55,43 @@ async def process_tasks(
     return processed_results
 
 
+async def generate_image(
+    prompt: str,
+    api_key: str | None,
+    base_url: str | None,
+    azure_openai_api_key: str | None = None,
+    azure_openai_dalle3_api_version: str | None = None,
+    azure_openai_resource_name: str | None = None,
+    azure_openai_dalle3_deployment_name: str | None = None,
+    model: Literal["dalle3", "flux"] = "dalle3",
+) -> Union[str, None]:
+    """
+    Tạo một ảnh từ một prompt.
+
+    Ưu tiên Azure OpenAI nếu có key, sau đó là DALL-E 3, cuối cùng là Replicate.
+    Kết quả được dùng chung giữa các phiên qua shared_image_cache, và các
+    prompt giống nhau đang chạy đồng thời chỉ tạo ảnh một lần.
+    """
+    if azure_openai_api_key is not None:
+        generate = lambda: generate_image_azure(
+            prompt,
+            azure_openai_api_key,
+            azure_openai_dalle3_api_version,  # type: ignore
+            azure_openai_resource_name,  # type: ignore
+            azure_openai_dalle3_deployment_name,  # type: ignore
+        )
+        image_model = "dalle3"
+    elif api_key is not None and model == "dalle3":
+        generate = lambda: generate_image_dalle(prompt, api_key, base_url)
+        image_model = "dalle3"
+    else:
+        generate = lambda: generate_image_replicate(prompt, api_key)  # type: ignore
+        image_model = "flux"
+
+    key = image_cache_key(prompt, image_model, IMAGE_SIZES[image_model])
+    return await shared_image_cache.get_or_generate(key, generate)
+
+
 async def generate_image_dalle(
     prompt: str, api_key: str, base_url: str | None
 ) -> Union[str, None]:
@@ -135,17 +174,19 @@ def create_alt_url_mapping(code: str) -> Dict[str, str]:
     Tạo mapping từ thuộc tính alt đến URL của các ảnh trong HTML.
     Chỉ mapping những ảnh không có URL bắt đầu bằng https://placehold.co.
     """
-    soup = BeautifulSoup(code, "html.parser")
-    images = soup.find_all("img")
-
     mapping: Dict[str, str] = {}
-    for image in images:
-        if not image["src"].startswith("https://placehold.co"):
-            mapping[image["alt"]] = image["src"]
+    for image in iter_img_tags(code):
+        src, alt = image.get("src"), image.get("alt")
+        if src is not None and alt is not None and not src.startswith("https://placehold.co"):
+            mapping[alt] = src
 
     return mapping
 
 
+def is_placeholder(image: ImgTag) -> bool:
+    return (image.get("src") or "").startswith("https://placehold.co")
+
+
 async def generate_images(
     code: str,
     api_key: str | None,
@@ -160,38 +201,42 @@ async def generate_images(
     """
     Quét HTML để tìm các thẻ <img> có src là placeholder (https://placehold.co),
     sau đó tạo ảnh mới dựa trên alt text và thay thế URL cũ bằng URL của ảnh được tạo.
-    
-    Hỗ trợ cả trường hợp sử dụng OpenAI thông thường và Azure OpenAI.
-    """
-    soup = BeautifulSoup(code, "html.parser")
-    images = soup.find_all("img")
 
-    # Lấy danh sách alt text của các ảnh cần thay thế (chỉ lấy những ảnh chưa có trong cache)
-    alts: List[str | None] = []
-    for img in images:
-        if (
-            img["src"].startswith("https://placehold.co")
-            and image_cache.get(img.get("alt")) is None
-        ):
-            alts.append(img.get("alt", None))
+    Chỉ các thuộc tính src, width và height được sửa; phần còn lại của HTML
+    được giữ nguyên từng byte.
 
-    # Loại bỏ giá trị None và lặp lại (unique)
-    filtered_alts: List[str] = [alt for alt in alts if alt is not None]
-    prompts = list(set(filtered_alts))
+    Hỗ trợ cả trường hợp sử dụng OpenAI thông thường và Azure OpenAI.
+    """
+    images = [img for img in iter_img_tags(code) if is_placeholder(img)]
 
-    # Nếu không có ảnh cần thay thế, trả về code ban đầu
-    if len(prompts) == 0:
+    # Nếu không có ảnh placeholder nào, trả về code ban đầu
+    if not images:
         return code
 
-    results = await process_tasks(
-        prompts,
-        api_key,
-        base_url,
-        azure_openai_api_key,
-        azure_openai_dalle3_api_version,
-        azure_openai_resource_name,
-        azure_openai_dalle3_deployment_name,
-        model,
+    # Lấy danh sách alt text của các ảnh cần thay thế (chỉ lấy những ảnh chưa có trong cache),
+    # bỏ giá trị None và lặp lại (unique)
+    prompts = list(
+        {
+            alt: None
+            for alt in (img.get("alt") for img in images)
+            if alt is not None and image_cache.get(alt) is None
+        }
+    )
+
+    # Ảnh đã có sẵn trong cache (ví dụ được tạo trong lúc stream code) thì không cần tạo lại
+    results = (
+        await process_tasks(
+            prompts,
+            api_key,
+            base_url,
+            azure_openai_api_key,
+            azure_openai_dalle3_api_version,
+            azure_openai_resource_name,
+            azure_openai_dalle3_deployment_name,
+            model,
+        )
+        if prompts
+        else []
     )
 
     # Tạo mapping từ alt text sang URL ảnh được tạo
@@ -199,16 +244,15 @@ async def generate_images(
     mapped_image_urls = {**mapped_image_urls, **image_cache}
 
     # Thay thế URL ảnh trong HTML
-    for img in images:
-        if not img["src"].startswith("https://placehold.co"):
-            continue
-
-        new_url = mapped_image_urls.get(img.get("alt"))
-        if new_url:
-            width, height = extract_dimensions(img["src"])
-            img["width"] = width
-            img["height"] = height
-            img["src"] = new_url
-        else:
+    def replace(img: ImgTag) -> Dict[str, str] | None:
+        if not is_placeholder(img):
+            return None
+
+        new_url = mapped_image_urls.get(img.get("alt"))  # type: ignore
+        if not new_url:
             print("Image generation failed for alt text: " + str(img.get("alt")))
-    return soup.prettify()
\ No newline at end of file
+            return None
+        width, height = extract_dimensions(img.get("src"))  # type: ignore
+        return {"width": str(width), "height": str(height), "src": new_url}
+
+    return rewrite_img_tags(code, replace)
@@ -0,0 +1,100 @@
+# A local stand-in for the parts of the Replicate HTTP API that
+# image_generation/replicate.py uses, for tests and offline development.
+#
+# In tests, mount it in-process with httpx.ASGITransport(app=fake.app). To run it
+# as a server: uvicorn image_generation.fake_replicate:app --port 8099, then
+# set REPLICATE_BASE_URL=http://localhost:8099/v1.
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import FastAPI, HTTPException, Request
+
+
+@dataclass
+class FakePrediction:
+    id: str
+    input: dict[str, Any]
+    created_at: float
+    latency: float
+    canceled: bool = False
+
+    def view(self, include_output: bool = True) -> dict[str, Any]:
+        prompt = str(self.input.get("prompt", ""))
+        done = time.monotonic() - self.created_at >= self.latency
+        prediction: dict[str, Any] = {"id": self.id, "status": "processing"}
+        if self.canceled:
+            prediction["status"] = "canceled"
+        elif done and prompt.startswith("fail"):
+            prediction.update(status="failed", error=f"could not generate {prompt!r}")
+        elif done:
+            prediction["status"] = "succeeded"
+            if include_output:
+                prediction["output"] = [f"https://replicate.delivery/fake/{self.id}.png"]
+        return prediction
+
+
+@dataclass
+class FakeReplicate:
+    # Seconds until a prediction finishes
+    latency: float = 0.5
+    predictions: dict[str, FakePrediction] = field(default_factory=dict)
+    requests: Counter[str] = field(default_factory=Counter)
+    running: int = 0
+    max_running: int = 0
+
+    def __post_init__(self):
+        self.app = FastAPI()
+        self.app.post("/v1/models/{owner}/{name}/predictions")(self.create)
+        self.app.get("/v1/predictions")(self.list)
+        self.app.get("/v1/predictions/{prediction_id}")(self.get)
+        self.app.post("/v1/predictions/{prediction_id}/cancel")(self.cancel)
+
+    async def create(self, owner: str, name: str, request: Request) -> dict[str, Any]:
+        self.requests["create"] += 1
+        body = await request.json()
+        prediction = FakePrediction(
+            id=uuid.uuid4().hex, input=body["input"], created_at=time.monotonic(), latency=self.latency
+        )
+        self.predictions[prediction.id] = prediction
+
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            # Prefer: wait=N holds the response until the prediction finishes or N seconds pass
+            prefer = request.headers.get("prefer", "")
+            if prefer.startswith("wait"):
+                wait = float(prefer.partition("=")[2] or 60)
+                remaining = prediction.latency - (time.monotonic() - prediction.created_at)
+                await asyncio.sleep(max(0.0, min(wait, remaining)))
+            return prediction.view()
+        finally:
+            self.running -= 1
+
+    async def list(self) -> dict[str, Any]:
+        self.requests["list"] += 1
+        newest_first = sorted(self.predictions.values(), key=lambda p: p.created_at, reverse=True)
+        return {"results": [p.view(include_output=False) for p in newest_first[:100]], "next": None}
+
+    async def get(self, prediction_id: str) -> dict[str, Any]:
+        self.requests["get"] += 1
+        return self._find(prediction_id).view()
+
+    async def cancel(self, prediction_id: str) -> dict[str, Any]:
+        self.requests["cancel"] += 1
+        prediction = self._find(prediction_id)
+        prediction.canceled = True
+        return prediction.view()
+
+    def _find(self, prediction_id: str) -> FakePrediction:
+        prediction = self.predictions.get(prediction_id)
+        if prediction is None:
+            raise HTTPException(status_code=404, detail="Prediction not found")
+        return prediction
+
+
+app = FakeReplicate().app
@@ -0,0 +1,129 @@
+# Finds and rewrites <img> tags without parsing the whole document.
+#
+# BeautifulSoup's html.parser builds a tree of the entire page in pure Python,
+# and prettify() then re-serialises (and reformats) everything the model wrote.
+# Here a single regex pass tokenizes only what matters: comments and
+# <script>/<style> bodies are skipped the same way html.parser skips them, and
+# each <img> tag's attributes are located by position. Rewriting splices the
+# new attribute values into the original text, so everything else stays
+# byte-for-byte intact.
+
+import html
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+_QUOTED = r"""(?:[^>"']|"[^"]*"|'[^']*')*"""
+
+_TOKEN = re.compile(
+    r"<!--.*?(?:-->|\Z)"
+    rf"|<(?P<raw>script|style)\b{_QUOTED}>.*?(?:</(?P=raw)\s*>|\Z)"
+    rf"|<img\b(?P<attributes>{_QUOTED})>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+_ATTRIBUTE = re.compile(
+    r"""(?P<name>[^\s"'<>/=]+)(?:\s*=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)'|(?P<bare>[^\s>]+)))?"""
+)
+
+
+@dataclass
+class Attribute:
+    name: str
+    value: str
+    # Span of the whole `name="value"` in the document
+    start: int
+    end: int
+
+
+@dataclass
+class ImgTag:
+    start: int
+    end: int
+    # Where new attributes go: after the last attribute, before any `/`
+    insert_at: int
+    attributes: Dict[str, Attribute] = field(default_factory=dict)
+
+    def get(self, name: str) -> Optional[str]:
+        attribute = self.attributes.get(name)
+        return attribute.value if attribute is not None else None
+
+
+def parse_attributes(text: str, offset: int = 0) -> Dict[str, Attribute]:
+    """Attributes of a tag body, with values unescaped like html.parser does
+
+    The first occurrence of a repeated attribute wins, as in browsers.
+    """
+    attributes: Dict[str, Attribute] = {}
+    for match in _ATTRIBUTE.finditer(text):
+        raw = next(
+            (v for v in match.group("double", "single", "bare") if v is not None), ""
+        )
+        name = match.group("name").lower()
+        if name not in attributes:
+            attributes[name] = Attribute(
+                name=name,
+                value=html.unescape(raw),
+                start=offset + match.start(),
+                end=offset + match.end(),
+            )
+    return attributes
+
+
+def iter_img_tags(code: str) -> Iterator[ImgTag]:
+    for match in _TOKEN.finditer(code):
+        body = match.group("attributes")
+        if body is None:
+            continue
+        body_start = match.start("attributes")
+        stripped = body.rstrip().rstrip("/").rstrip()
+        yield ImgTag(
+            start=match.start(),
+            end=match.end(),
+            insert_at=body_start + len(stripped),
+            attributes=parse_attributes(body, body_start),
+        )
+
+
+def find_img_tags(code: str) -> List[ImgTag]:
+    return list(iter_img_tags(code))
+
+
+def _format_attribute(name: str, value: str) -> str:
+    return f'{name}="{html.escape(value, quote=True)}"'
+
+
+def rewrite_img_tags(
+    code: str, rewrite: Callable[[ImgTag], Optional[Dict[str, str]]]
+) -> str:
+    """Applies the attribute updates returned by `rewrite` for each <img>
+
+    Existing attributes are replaced in place, new ones are appended to the
+    tag, and tags for which `rewrite` returns nothing are left untouched.
+    """
+    edits: List[Tuple[int, int, str]] = []
+    for tag in iter_img_tags(code):
+        updates = rewrite(tag)
+        if not updates:
+            continue
+        appended: List[str] = []
+        for name, value in updates.items():
+            attribute = tag.attributes.get(name.lower())
+            if attribute is not None:
+                edits.append((attribute.start, attribute.end, _format_attribute(name, value)))
+            else:
+                appended.append(" " + _format_attribute(name, value))
+        if appended:
+            edits.append((tag.insert_at, tag.insert_at, "".join(appended)))
+
+    if not edits:
+        return code
+    edits.sort(key=lambda edit: edit[0])
+    parts: List[str] = []
+    position = 0
+    for start, end, replacement in edits:
+        parts.append(code[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(code[position:])
+    return "".join(parts)
@@ -1,65 +1,303 @@
 import asyncio
+import contextvars
+import random
+import time
+from dataclasses import dataclass
+from typing import Any
+
 import httpx
 
+from config import (
+    REPLICATE_BASE_URL,
+    REPLICATE_DEADLINE,
+    REPLICATE_MAX_CONCURRENCY,
+    REPLICATE_POLL_INITIAL,
+    REPLICATE_POLL_MAX,
+    REPLICATE_PREFER_WAIT,
+)
 
-async def call_replicate(input: dict[str, str | int], api_token: str) -> str:
-    headers = {
-        "Authorization": f"Bearer {api_token}",
-        "Content-Type": "application/json",
-    }
+FLUX_SCHNELL = "black-forest-labs/flux-schnell"
+
+TERMINAL_STATUSES = {"succeeded", "failed", "canceled"}
+
+# With at least this many predictions pending, one list request replaces the
+# per-prediction status checks
+BATCH_POLL_THRESHOLD = 2
+
+
+@dataclass
+class ReplicatePageStats:
+    """Replicate usage while generating one page's images"""
+
+    predictions: int = 0
+    # Predictions that had to wait for a free slot under the concurrency cap
+    queued: int = 0
+    queue_wait_s: float = 0.0
+    # Predictions that finished within the Prefer: wait window (no polling)
+    finished_while_waiting: int = 0
+    # Status requests: per-prediction GETs and batched list requests
+    status_checks: int = 0
+    batched_checks: int = 0
+    failed: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.predictions} predictions, {self.queued} queued "
+            f"({self.queue_wait_s:.1f}s waiting), {self.finished_while_waiting} finished "
+            f"without polling, {self.status_checks} status checks "
+            f"({self.batched_checks} batched), {self.failed} failed"
+        )
+
+
+_page_stats: contextvars.ContextVar[ReplicatePageStats | None] = contextvars.ContextVar(
+    "replicate_page_stats", default=None
+)
+
+
+def start_page_stats() -> ReplicatePageStats:
+    """Collects stats for the Replicate calls made from the current task (and the
+    tasks it starts from now on)"""
+    stats = ReplicatePageStats()
+    _page_stats.set(stats)
+    return stats
 
-    data = {"input": input}
 
-    async with httpx.AsyncClient() as client:
+@dataclass
+class _Pending:
+    prediction_id: str
+    future: asyncio.Future[dict[str, Any]]
+    deadline: float
+    stats: ReplicatePageStats | None
+    checks: int = 0
+
+
+@dataclass
+class SchedulerStats:
+    created: int = 0
+    finished_while_waiting: int = 0
+    status_checks: int = 0
+    batched_checks: int = 0
+    timeouts: int = 0
+
+
+class ReplicateScheduler:
+    """Runs Replicate predictions over one pooled client
+
+    - Predictions are created with `Prefer: wait`, so most fast models return
+      their output in the creation response.
+    - Predictions still running after that are polled by a single background
+      loop with jittered exponential back-off. With several pending, one list
+      request checks them all.
+    - At most `max_concurrency` predictions run at once; the rest queue.
+    """
+
+    def __init__(
+        self,
+        api_token: str,
+        base_url: str = REPLICATE_BASE_URL,
+        max_concurrency: int = REPLICATE_MAX_CONCURRENCY,
+        prefer_wait: int = REPLICATE_PREFER_WAIT,
+        deadline: float = REPLICATE_DEADLINE,
+        poll_initial: float = REPLICATE_POLL_INITIAL,
+        poll_max: float = REPLICATE_POLL_MAX,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_token}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(prefer_wait + 10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=max_concurrency + 2, max_keepalive_connections=max_concurrency + 2),
+            transport=transport,
+        )
+        self.prefer_wait = prefer_wait
+        self.deadline = deadline
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending: dict[str, _Pending] = {}
+        self._reset_backoff = False
+        self._poller: asyncio.Task[None] | None = None
+        self.stats = SchedulerStats()
+
+    async def run(self, model: str, input: dict[str, Any]) -> dict[str, Any]:
+        """Creates a prediction and returns it once it has succeeded"""
+        page_stats = _page_stats.get()
+        if page_stats is not None:
+            page_stats.predictions += 1
+
+        queued_at = time.monotonic()
+        if self._slots.locked() and page_stats is not None:
+            page_stats.queued += 1
+        async with self._slots:
+            if page_stats is not None:
+                page_stats.queue_wait_s += time.monotonic() - queued_at
+            try:
+                return await self._run(model, input, page_stats, time.monotonic() + self.deadline)
+            except Exception:
+                if page_stats is not None:
+                    page_stats.failed += 1
+                raise
+
+    async def _run(
+        self,
+        model: str,
+        input: dict[str, Any],
+        page_stats: ReplicatePageStats | None,
+        deadline: float,
+    ) -> dict[str, Any]:
+        headers = {}
+        if self.prefer_wait > 0:
+            headers["Prefer"] = f"wait={self.prefer_wait}"
+        response = await self.client.post(f"models/{model}/predictions", json={"input": input}, headers=headers)
+        response.raise_for_status()
+        prediction = response.json()
+        self.stats.created += 1
+
+        prediction_id = prediction.get("id")
+        if not prediction_id:
+            raise ValueError("Prediction ID not found in initial response.")
+        if prediction.get("status") in TERMINAL_STATUSES:
+            self.stats.finished_while_waiting += 1
+            if page_stats is not None:
+                page_stats.finished_while_waiting += 1
+            return _result(prediction)
+
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._pending[prediction_id] = _Pending(prediction_id, future, deadline, page_stats)
+        self._ensure_poller()
         try:
-            response = await client.post(
-                "https://api.replicate.com/v1/models/black-forest-labs/flux-schnell/predictions",
-                headers=headers,
-                json=data,
-            )
+            return _result(await future)
+        finally:
+            self._pending.pop(prediction_id, None)
+
+    # Polling
+
+    def _ensure_poller(self) -> None:
+        # A new prediction restarts the back-off
+        self._reset_backoff = True
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        interval = self.poll_initial
+        while self._pending:
+            if self._reset_backoff:
+                self._reset_backoff = False
+                interval = self.poll_initial
+            # Jitter keeps workers sharing an account from polling in lockstep
+            await asyncio.sleep(random.uniform(interval / 2, interval))
+
+            try:
+                await self._poll_once()
+            except Exception as e:
+                print(f"[REPLICATE] status check failed: {e}")
+            self._expire()
+            interval = min(interval * 2, self.poll_max)
+
+    async def _poll_once(self) -> None:
+        pending = [p for p in self._pending.values() if not p.future.done()]
+        if not pending:
+            return
+
+        unresolved = pending
+        if len(pending) >= BATCH_POLL_THRESHOLD:
+            response = await self.client.get("predictions")
             response.raise_for_status()
-            response_json = response.json()
-
-            # Extract the id from the response
-            prediction_id = response_json.get("id")
-            if not prediction_id:
-                raise ValueError("Prediction ID not found in initial response.")
-
-            # Polling every 0.1 seconds until the status is succeeded or error (upto 10s)
-            num_polls = 0
-            max_polls = 100
-            while num_polls < max_polls:
-                num_polls += 1
-
-                await asyncio.sleep(0.1)
-
-                # Check the status
-                status_check_url = (
-                    f"https://api.replicate.com/v1/predictions/{prediction_id}"
-                )
-                status_response = await client.get(status_check_url, headers=headers)
-                status_response.raise_for_status()
-                status_response_json = status_response.json()
-                status = status_response_json.get("status")
-
-                # If status is succeeded or if there's an error, break out of the loop
-                if status == "succeeded":
-                    return status_response_json["output"][0]
-                elif status == "error":
-                    raise ValueError(
-                        f"Inference errored out: {status_response_json.get('error', 'Unknown error')}"
-                    )
-                elif status == "failed":
-                    raise ValueError("Inference failed")
-
-            # If we've reached here, it means we've exceeded the max number of polls
-            raise TimeoutError("Inference timed out")
-
-        except httpx.HTTPStatusError as e:
-            raise ValueError(f"HTTP error occurred: {e}")
-        except httpx.RequestError as e:
-            raise ValueError(f"An error occurred while requesting: {e}")
-        except asyncio.TimeoutError:
-            raise TimeoutError("Request timed out")
-        except Exception as e:
-            raise ValueError(f"An unexpected error occurred: {e}")
+            self._count_check(pending, batched=True)
+            listed = {p["id"]: p for p in response.json().get("results", [])}
+            unresolved = []
+            for entry in pending:
+                prediction = listed.get(entry.prediction_id)
+                if prediction is None:
+                    # Older than the first page of the listing; check it directly
+                    unresolved.append(entry)
+                elif prediction.get("status") in TERMINAL_STATUSES:
+                    # The listing doesn't include outputs
+                    unresolved.append(entry)
+
+        await asyncio.gather(*(self._check(entry) for entry in unresolved))
+
+    async def _check(self, entry: _Pending) -> None:
+        response = await self.client.get(f"predictions/{entry.prediction_id}")
+        response.raise_for_status()
+        self._count_check([entry], batched=False)
+        prediction = response.json()
+        if prediction.get("status") in TERMINAL_STATUSES and not entry.future.done():
+            entry.future.set_result(prediction)
+
+    def _count_check(self, entries: list[_Pending], batched: bool) -> None:
+        self.stats.status_checks += 1
+        if batched:
+            self.stats.batched_checks += 1
+        # Each page counts a request once, however many of its predictions it covered
+        for stats in {id(e.stats): e.stats for e in entries if e.stats is not None}.values():
+            stats.status_checks += 1
+            if batched:
+                stats.batched_checks += 1
+        for entry in entries:
+            entry.checks += 1
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for entry in list(self._pending.values()):
+            if now >= entry.deadline and not entry.future.done():
+                self.stats.timeouts += 1
+                entry.future.set_exception(TimeoutError("Inference timed out"))
+                # Stop paying for a prediction nobody is waiting for
+                asyncio.create_task(self._cancel(entry.prediction_id))
+
+    async def _cancel(self, prediction_id: str) -> None:
+        try:
+            await self.client.post(f"predictions/{prediction_id}/cancel")
+        except httpx.HTTPError as e:
+            print(f"[REPLICATE] could not cancel {prediction_id}: {e}")
+
+    async def close(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+        for entry in self._pending.values():
+            if not entry.future.done():
+                entry.future.cancel()
+        await self.client.aclose()
+
+
+def _result(prediction: dict[str, Any]) -> dict[str, Any]:
+    status = prediction.get("status")
+    if status == "succeeded":
+        return prediction
+    if status == "failed" and prediction.get("error"):
+        raise ValueError(f"Inference errored out: {prediction['error']}")
+    raise ValueError(f"Inference {status}")
+
+
+# One scheduler (and connection pool) per API token
+_schedulers: dict[str, ReplicateScheduler] = {}
+
+
+def get_scheduler(api_token: str) -> ReplicateScheduler:
+    scheduler = _schedulers.get(api_token)
+    if scheduler is None:
+        scheduler = _schedulers[api_token] = ReplicateScheduler(api_token)
+    return scheduler
+
+
+async def close_schedulers() -> None:
+    schedulers = list(_schedulers.values())
+    _schedulers.clear()
+    await asyncio.gather(*(s.close() for s in schedulers), return_exceptions=True)
+
+
+async def call_replicate(input: dict[str, str | int], api_token: str) -> str:
+    try:
+        prediction = await get_scheduler(api_token).run(FLUX_SCHNELL, input)
+        return prediction["output"][0]
+    except httpx.HTTPStatusError as e:
+        raise ValueError(f"HTTP error occurred: {e}")
+    except httpx.RequestError as e:
+        raise ValueError(f"An error occurred while requesting: {e}")
+    except (asyncio.TimeoutError, TimeoutError):
+        raise TimeoutError("Inference timed out")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"An unexpected error occurred: {e}")
@@ -0,0 +1,100 @@
+# Starts image generation while the code is still streaming.
+#
+# Waiting for every variant to finish before generating images puts the whole
+# image wall time on top of the LLM latency. Instead, each variant's chunks are
+# scanned for placeholder <img> tags as they arrive, and an image is requested
+# as soon as its tag closes. The same alt text is only requested once across
+# variants. The final substitution pass (generate_images) receives the
+# prefetched URLs as its image cache, so it only generates what the scanner
+# missed or what failed.
+
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List
+
+from image_generation.html_rewriter import parse_attributes
+
+PLACEHOLDER_PREFIX = "https://placehold.co"
+
+_IMG_TAG = re.compile(r"""<img\b((?:[^>"']|"[^"]*"|'[^']*')*)>""", re.IGNORECASE)
+
+
+class ImgTagScanner:
+    """Finds complete <img> tags in a stream of chunks
+
+    Only the tail that may still become a tag is kept between chunks, so memory
+    stays bounded by the longest tag rather than the whole document.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        self._buffer += chunk
+        tags: List[Dict[str, str]] = []
+        end = 0
+        for match in _IMG_TAG.finditer(self._buffer):
+            # Parsed like the final pass does, so alt texts match
+            attributes = parse_attributes(match.group(1))
+            tags.append({name: attribute.value for name, attribute in attributes.items()})
+            end = match.end()
+        rest = self._buffer[end:]
+        start = rest.rfind("<")
+        self._buffer = rest[start:] if start != -1 else ""
+        return tags
+
+
+class ImagePrefetcher:
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[str | None]],
+        image_cache: Dict[str, str] | None = None,
+    ):
+        self._generate = generate
+        # Alt texts that already have an image (e.g. from a previous generation)
+        self._known = dict(image_cache or {})
+        self._scanners: Dict[int, ImgTagScanner] = {}
+        self._tasks: Dict[str, asyncio.Task[str | None]] = {}
+        self.stats = {"requested": 0, "deduplicated": 0}
+
+    def feed(self, chunk: str, variant_index: int) -> None:
+        scanner = self._scanners.setdefault(variant_index, ImgTagScanner())
+        for attributes in scanner.feed(chunk):
+            alt = attributes.get("alt")
+            if alt and attributes.get("src", "").startswith(PLACEHOLDER_PREFIX):
+                self.request(alt)
+
+    def request(self, alt: str) -> None:
+        if alt in self._known or alt in self._tasks:
+            self.stats["deduplicated"] += 1
+            return
+        self.stats["requested"] += 1
+        self._tasks[alt] = asyncio.create_task(self._generate(alt))
+
+    async def results(self) -> Dict[str, str]:
+        """Waits for every requested image; failed ones are left out"""
+        waiting = sum(not task.done() for task in self._tasks.values())
+        if self._tasks:
+            await asyncio.wait(self._tasks.values())
+
+        urls: Dict[str, str] = {}
+        for alt, task in self._tasks.items():
+            if task.cancelled():
+                continue
+            if task.exception() is not None:
+                print(f"[IMAGE PREFETCH] generation failed for {alt!r}: {task.exception()}")
+                continue
+            url = task.result()
+            if url:
+                urls[alt] = url
+        if self._tasks:
+            print(
+                f"[IMAGE PREFETCH] {len(urls)}/{len(self._tasks)} images generated while streaming, "
+                f"{len(self._tasks) - waiting} ready before the code finished, "
+                f"{self.stats['deduplicated']} duplicate tags skipped"
+            )
+        return urls
+
+    def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from image_generation.cache import (
+    CachedImage,
+    DiskImageStore,
+    ImageCache,
+    image_cache_key,
+    normalize_alt_text,
+)
+
+
+class TestImageCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "images.json")
+        self.cache = ImageCache(DiskImageStore(self.path, ttl=3600, max_entries=100))
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def generate(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return f"https://images.test/{self.calls}.png"
+
+    def test_alt_text_is_normalised(self):
+        self.assertEqual(normalize_alt_text("  Company\n Logo. "), "company logo")
+        self.assertEqual(image_cache_key("User Avatar", "flux", "1:1"), image_cache_key("user avatar!", "flux", "1:1"))
+        self.assertNotEqual(image_cache_key("logo", "flux", "1:1"), image_cache_key("logo", "dalle3", "1024x1024"))
+
+    async def test_repeated_alt_text_is_served_from_cache(self):
+        key = image_cache_key("company logo", "dalle3", "1024x1024")
+        first = await self.cache.get_or_generate(key, self.generate)
+        second = await self.cache.get_or_generate(image_cache_key("Company Logo", "dalle3", "1024x1024"), self.generate)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.get_stats()["hit_ratio"], 0.5)
+
+    async def test_concurrent_identical_prompts_generate_once(self):
+        key = image_cache_key("hero banner", "flux", "1:1")
+        urls = await asyncio.gather(*(self.cache.get_or_generate(key, self.generate) for _ in range(5)))
+
+        self.assertEqual(len(set(urls)), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats["in_flight_joins"], 4)
+
+    async def test_failures_are_not_cached(self):
+        key = image_cache_key("broken", "flux", "1:1")
+
+        async def fail() -> str:
+            raise RuntimeError("provider down")
+
+        with self.assertRaises(RuntimeError):
+            await self.cache.get_or_generate(key, fail)
+        self.assertEqual(await self.cache.get_or_generate(key, self.generate), "https://images.test/1.png")
+
+    async def test_waiters_take_over_when_the_generating_request_is_cancelled(self):
+        key = image_cache_key("avatar", "flux", "1:1")
+        leader = asyncio.create_task(self.cache.get_or_generate(key, self.generate))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.cache.get_or_generate(key, self.generate))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertTrue((await waiter).startswith("https://images.test/"))  # type: ignore
+        self.assertTrue(leader.cancelled())
+
+    async def test_entries_persist_expire_and_are_evicted(self):
+        store = DiskImageStore(self.path, ttl=3600, max_entries=2)
+        for name in ["a", "b", "c"]:
+            await store.put(name, CachedImage(url=f"https://images.test/{name}.png", created_at=time.time()))
+
+        reloaded = DiskImageStore(self.path, ttl=3600, max_entries=2)
+        self.assertIsNone(await reloaded.get("a"))
+        self.assertEqual((await reloaded.get("c")).url, "https://images.test/c.png")  # type: ignore
+
+        await store.put("old", CachedImage(url="https://images.test/old.png", created_at=time.time() - 7200))
+        self.assertIsNone(await store.get("old"))
+
+
+if __name__ == "__main__":
+    unittest.main()
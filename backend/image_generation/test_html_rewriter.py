@@ -0,0 +1,70 @@
+import unittest
+
+from image_generation.core import create_alt_url_mapping, generate_images
+from image_generation.html_rewriter import find_img_tags, rewrite_img_tags
+from mock_llm import APPLE_MOCK_CODE, NYTIMES_MOCK_CODE
+
+
+class TestHtmlRewriter(unittest.TestCase):
+
+    def test_finds_img_tags_outside_scripts_and_comments(self):
+        code = """<div>
+<!-- <img src="commented.png" alt="no"> -->
+<script>const tpl = '<img src="script.png" alt="no">';</script>
+<img src="a.png" alt='Say "hi" &amp; wave' data-x=1>
+<IMG SRC=b.png ALT="greater > than"/>
+<img>
+</div>"""
+        tags = find_img_tags(code)
+
+        self.assertEqual([tag.get("src") for tag in tags], ["a.png", "b.png", None])
+        self.assertEqual(tags[0].get("alt"), 'Say "hi" & wave')
+        self.assertEqual(tags[1].get("alt"), "greater > than")
+
+    def test_only_rewritten_attributes_change(self):
+        code = (
+            '<p class="x">  keep   this </p>\n'
+            '<img class="rounded" src="https://placehold.co/300x200" alt="Cat" />\n'
+            "<img src='keep.png' alt=Dog>"
+        )
+
+        rewritten = rewrite_img_tags(
+            code,
+            lambda tag: {"src": "https://img.test/a.png?x=1&y=2", "width": "300"}
+            if tag.get("alt") == "Cat"
+            else None,
+        )
+
+        self.assertEqual(
+            rewritten,
+            '<p class="x">  keep   this </p>\n'
+            '<img class="rounded" src="https://img.test/a.png?x=1&amp;y=2" alt="Cat" width="300" />\n'
+            "<img src='keep.png' alt=Dog>",
+        )
+        self.assertEqual(find_img_tags(rewritten)[0].get("src"), "https://img.test/a.png?x=1&y=2")
+
+    def test_alt_url_mapping_skips_placeholders(self):
+        code = '<img src="https://placehold.co/1x1" alt="a"><img src="https://img.test/b.png" alt="b"><img src="c.png">'
+        self.assertEqual(create_alt_url_mapping(code), {"b": "https://img.test/b.png"})
+
+
+class TestGenerateImagesOutput(unittest.IsolatedAsyncioTestCase):
+
+    async def test_mock_pages_are_only_changed_at_placeholders(self):
+        for page in [APPLE_MOCK_CODE, NYTIMES_MOCK_CODE]:
+            alts = [tag.get("alt") for tag in find_img_tags(page)]
+            cache = {alt: f"https://img.test/{i}.png" for i, alt in enumerate(alts) if alt}
+
+            rewritten = await generate_images(page, api_key=None, base_url=None, image_cache=cache)
+
+            self.assertNotIn("placehold.co", rewritten)
+            # Everything outside the <img> tags is untouched
+            self.assertEqual(
+                [page[t.end : n.start] for t, n in zip(find_img_tags(page), find_img_tags(page)[1:])],
+                [rewritten[t.end : n.start] for t, n in zip(find_img_tags(rewritten), find_img_tags(rewritten)[1:])],
+            )
+            self.assertEqual(page[: find_img_tags(page)[0].start], rewritten[: find_img_tags(rewritten)[0].start])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+
+import httpx
+
+from image_generation.fake_replicate import FakeReplicate
+from image_generation.replicate import FLUX_SCHNELL, ReplicateScheduler, start_page_stats
+
+
+class TestReplicateScheduler(unittest.IsolatedAsyncioTestCase):
+
+    def make_scheduler(self, fake: FakeReplicate, **kwargs) -> ReplicateScheduler:
+        options = dict(prefer_wait=1, deadline=5.0, poll_initial=0.05, poll_max=0.1)
+        options.update(kwargs)
+        scheduler = ReplicateScheduler(
+            "token",
+            base_url="http://replicate.test/v1",
+            transport=httpx.ASGITransport(app=fake.app),
+            **options,
+        )
+        self.addAsyncCleanup(scheduler.close)
+        return scheduler
+
+    async def run_all(self, scheduler: ReplicateScheduler, prompts: list[str]):
+        return await asyncio.gather(
+            *(scheduler.run(FLUX_SCHNELL, {"prompt": p}) for p in prompts),
+            return_exceptions=True,
+        )
+
+    async def test_finishes_within_prefer_wait_without_polling(self):
+        fake = FakeReplicate(latency=0.05)
+        scheduler = self.make_scheduler(fake)
+        stats = start_page_stats()
+
+        predictions = await self.run_all(scheduler, ["a", "b", "c"])
+
+        self.assertTrue(all(p["output"][0].startswith("https://") for p in predictions))
+        self.assertEqual(fake.requests["create"], 3)
+        self.assertEqual(fake.requests["get"] + fake.requests["list"], 0)
+        self.assertEqual(stats.finished_while_waiting, 3)
+
+    async def test_polls_pending_predictions_with_one_list_request(self):
+        fake = FakeReplicate(latency=0.4)
+        scheduler = self.make_scheduler(fake, prefer_wait=0)
+        stats = start_page_stats()
+
+        predictions = await self.run_all(scheduler, [str(i) for i in range(5)])
+
+        self.assertEqual(len({p["output"][0] for p in predictions}), 5)
+        self.assertGreater(fake.requests["list"], 0)
+        # Individual requests are only needed to fetch the outputs of finished predictions
+        self.assertLessEqual(fake.requests["get"], 5 * 2)
+        self.assertEqual(stats.batched_checks, fake.requests["list"])
+        self.assertEqual(stats.status_checks, fake.requests["list"] + fake.requests["get"])
+
+    async def test_concurrency_cap_queues_extra_predictions(self):
+        fake = FakeReplicate(latency=0.1)
+        scheduler = self.make_scheduler(fake, max_concurrency=2)
+        stats = start_page_stats()
+
+        predictions = await self.run_all(scheduler, [str(i) for i in range(6)])
+
+        self.assertFalse(any(isinstance(p, Exception) for p in predictions))
+        self.assertEqual(fake.max_running, 2)
+        self.assertEqual(stats.queued, 4)
+        self.assertGreater(stats.queue_wait_s, 0)
+
+    async def test_deadline_times_out_and_cancels(self):
+        fake = FakeReplicate(latency=10)
+        scheduler = self.make_scheduler(fake, prefer_wait=0, deadline=0.2)
+        stats = start_page_stats()
+
+        [error] = await self.run_all(scheduler, ["slow"])
+
+        self.assertIsInstance(error, TimeoutError)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(scheduler.stats.timeouts, 1)
+        for _ in range(20):
+            if fake.requests["cancel"]:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(fake.requests["cancel"], 1)
+        self.assertTrue(all(p.canceled for p in fake.predictions.values()))
+
+    async def test_failed_prediction_raises_value_error(self):
+        fake = FakeReplicate(latency=0.05)
+        scheduler = self.make_scheduler(fake)
+
+        ok, failed = await self.run_all(scheduler, ["fine", "fail this"])
+
+        self.assertEqual(ok["status"], "succeeded")
+        self.assertIsInstance(failed, ValueError)
+        self.assertIn("fail this", str(failed))
+
+
+if __name__ == "__main__":
+    unittest.main()
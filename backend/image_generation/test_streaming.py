@@ -0,0 +1,99 @@
+import asyncio
+import time
+import unittest
+
+from image_generation.core import generate_images
+from image_generation.streaming import ImagePrefetcher, ImgTagScanner
+
+
+def split_into_chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+PAGE = """<html><body>
+<img src="https://placehold.co/300x200" alt="A red bicycle">
+<p>Some text</p>
+<img alt='Mountain &amp; lake' class="hero" src='https://placehold.co/800x400'>
+<img src="https://example.com/logo.png" alt="Logo">
+<IMG SRC="https://placehold.co/50x50" ALT="A red bicycle" />
+</body></html>"""
+
+
+class TestImgTagScanner(unittest.TestCase):
+
+    def test_tags_split_across_chunks_are_found_once(self):
+        for size in [1, 3, 7, 50, len(PAGE)]:
+            scanner = ImgTagScanner()
+            tags = [tag for chunk in split_into_chunks(PAGE, size) for tag in scanner.feed(chunk)]
+            self.assertEqual(
+                [tag["alt"] for tag in tags],
+                ["A red bicycle", "Mountain & lake", "Logo", "A red bicycle"],
+                f"chunk size {size}",
+            )
+
+    def test_buffer_does_not_keep_the_whole_stream(self):
+        scanner = ImgTagScanner()
+        for _ in range(1000):
+            scanner.feed("<div class='card'><p>text</p></div>")
+        self.assertLess(len(scanner._buffer), 50)
+
+
+class TestImagePrefetcher(unittest.IsolatedAsyncioTestCase):
+
+    async def test_images_are_requested_once_across_variants(self):
+        requested: list[str] = []
+
+        async def generate(alt: str) -> str:
+            requested.append(alt)
+            return f"https://images.test/{len(requested)}.png"
+
+        prefetcher = ImagePrefetcher(generate, image_cache={"Mountain & lake": "https://cached.test/m.png"})
+        for variant in range(2):
+            for chunk in split_into_chunks(PAGE, 5):
+                prefetcher.feed(chunk, variant)
+
+        urls = await prefetcher.results()
+        self.assertEqual(requested, ["A red bicycle"])
+        self.assertEqual(urls, {"A red bicycle": "https://images.test/1.png"})
+
+    async def test_failed_images_are_left_for_the_final_pass(self):
+        async def generate(alt: str) -> str:
+            raise RuntimeError("provider down")
+
+        prefetcher = ImagePrefetcher(generate)
+        prefetcher.feed(PAGE, 0)
+        self.assertEqual(await prefetcher.results(), {})
+
+    async def test_image_generation_overlaps_streaming(self):
+        async def generate(alt: str) -> str:
+            await asyncio.sleep(0.2)
+            return f"https://images.test/{alt}.png"
+
+        # Images early in the page, followed by plenty of markup and scripts
+        page = "".join(f'<div><img src="https://placehold.co/10x10" alt="image {i}"></div>' for i in range(5))
+        page += "<script>console.log('filler');</script>" * 10
+        start = time.perf_counter()
+        prefetcher = ImagePrefetcher(generate)
+        for chunk in split_into_chunks(page, 40):
+            prefetcher.feed(chunk, 0)
+            await asyncio.sleep(0.02)
+        urls = await prefetcher.results()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(urls), 5)
+        # Streaming takes ~0.36s; generating afterwards would add another 0.2s
+        self.assertLess(elapsed, 0.5)
+
+    async def test_final_pass_uses_prefetched_images(self):
+        code = await generate_images(
+            PAGE,
+            api_key=None,
+            base_url=None,
+            image_cache={"A red bicycle": "https://images.test/bike.png", "Mountain & lake": "https://images.test/m.png"},
+        )
+        self.assertNotIn("placehold.co", code)
+        self.assertIn("https://images.test/bike.png", code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import io
+import math
+import time
+from dataclasses import dataclass
+from PIL import Image
+
+# Typical JPEG size at each quality relative to the size at quality 95, measured
+# on UI screenshots and photos with libjpeg's standard tables. Only used to pick
+# the first probe; the search itself works on real encode sizes.
+_RELATIVE_SIZE = (
+    (10, 0.15),
+    (20, 0.22),
+    (30, 0.28),
+    (40, 0.32),
+    (50, 0.36),
+    (60, 0.40),
+    (70, 0.46),
+    (75, 0.50),
+    (80, 0.55),
+    (85, 0.62),
+    (90, 0.75),
+    (95, 1.00),
+    (100, 1.60),
+)
+
+# Quality the first encode after a downscale aims for
+DOWNSCALE_TARGET_QUALITY = 80
+
+
+@dataclass
+class JpegFit:
+    data: bytes
+    quality: int
+    size: tuple[int, int]
+    encodes: int
+    elapsed_ms: float
+    scale: float = 1.0  # 1.0 when the original dimensions were kept
+
+    @property
+    def downscaled(self) -> bool:
+        return self.scale < 1.0
+
+
+def relative_size(quality: float) -> float:
+    """Estimated JPEG size at `quality`, relative to the size at quality 95"""
+    points = _RELATIVE_SIZE
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, s0), (q1, s1) in zip(points, points[1:]):
+        if quality <= q1:
+            return s0 + (s1 - s0) * (quality - q0) / (q1 - q0)
+    return points[-1][1]
+
+
+def estimate_quality(measured_quality: int, measured_bytes: int, max_bytes: int) -> float:
+    """Quality expected to produce `max_bytes`, given one encode at `measured_quality`"""
+    wanted = relative_size(measured_quality) * max_bytes / measured_bytes
+    points = _RELATIVE_SIZE
+    if wanted <= points[0][1]:
+        return points[0][0] * wanted / points[0][1]
+    for (q0, s0), (q1, s1) in zip(points, points[1:]):
+        if wanted <= s1:
+            return q0 + (q1 - q0) * (wanted - s0) / (s1 - s0)
+    return points[-1][0]
+
+
+def fit_jpeg(
+    img: Image.Image,
+    max_bytes: int,
+    max_quality: int = 95,
+    min_quality: int = 10,
+    floor_quality: int = 60,
+    tolerance: int = 2,
+    max_rounds: int = 3,
+    **save_options,
+) -> JpegFit:
+    """Encode `img` (RGB or L) as the highest-quality JPEG of at most `max_bytes`
+
+    One encode at `max_quality` gives the image's bytes per pixel. If that
+    already fits it is returned as is. Otherwise the size/quality curve gives
+    the quality expected to fit, which is the first probe of a binary search
+    refined from each measured size. When even `floor_quality` would not fit
+    at full size, the image is downscaled first: fewer pixels at a readable
+    quality beat heavy block artifacts on screenshot text. If `min_quality`
+    still does not fit, the image is downscaled again (up to `max_rounds`).
+
+    Extra keyword arguments are passed to `Image.save` for every encode.
+    """
+    start_time = time.time()
+    encodes = 0
+    scale = 1.0
+    original_width, original_height = img.size
+
+    def encode(image: Image.Image, quality: int) -> bytes:
+        nonlocal encodes
+        encodes += 1
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, **save_options)
+        return output.getvalue()
+
+    def result(data: bytes, quality: int, size: tuple[int, int]) -> JpegFit:
+        return JpegFit(
+            data=data,
+            quality=quality,
+            size=size,
+            encodes=encodes,
+            elapsed_ms=(time.time() - start_time) * 1000,
+            scale=size[0] / original_width,
+        )
+
+    data = encode(img, max_quality)
+    if len(data) <= max_bytes:
+        return result(data, max_quality, img.size)
+
+    # (quality, bytes) of the last encode, at the current scale
+    measured = (max_quality, len(data))
+    smallest = (max_quality, data, img.size)
+
+    for round_number in range(max_rounds):
+        # Bytes per pixel needed vs. bytes per pixel at the floor quality
+        pixels = img.width * img.height
+        measured_bpp = measured[1] / pixels
+        floor_bpp = measured_bpp * relative_size(floor_quality) / relative_size(measured[0])
+        target_bpp = max_bytes / pixels
+
+        known_fail = measured[0]
+        probe_quality = None
+        if target_bpp < floor_bpp and round_number < max_rounds - 1:
+            # Cheaper to drop pixels than quality: aim for DOWNSCALE_TARGET_QUALITY
+            target_quality = min(DOWNSCALE_TARGET_QUALITY, max_quality)
+            target_area = max_bytes / (
+                measured_bpp * relative_size(target_quality) / relative_size(measured[0])
+            )
+            factor = min(math.sqrt(target_area / pixels) * 0.95, 0.95)
+            scale *= factor
+            img = img.resize(
+                (
+                    max(1, round(original_width * scale)),
+                    max(1, round(original_height * scale)),
+                ),
+                Image.Resampling.LANCZOS,
+                reducing_gap=3.0,
+            )
+            known_fail = max_quality + 1  # nothing measured at this scale yet
+            probe_quality = target_quality
+
+        best: tuple[int, bytes] | None = None
+        lowest_ok = min_quality - 1
+        if probe_quality is None:
+            probe_quality = round(estimate_quality(measured[0], measured[1], max_bytes))
+
+        # Keep going until the fitting and failing qualities are within `tolerance`,
+        # and never give up on a scale without trying min_quality
+        while known_fail - lowest_ok > tolerance or (best is None and known_fail > min_quality):
+            probe_quality = min(max(probe_quality, lowest_ok + 1), known_fail - 1)
+            data = encode(img, probe_quality)
+            measured = (probe_quality, len(data))
+            if len(data) <= max_bytes:
+                best = (probe_quality, data)
+                lowest_ok = probe_quality
+            else:
+                known_fail = probe_quality
+                if len(data) < len(smallest[1]):
+                    smallest = (probe_quality, data, img.size)
+            if known_fail <= min_quality:
+                break
+
+            # Refine the estimate from the newest measurement; bisect if it
+            # does not land strictly inside the open interval
+            next_quality = round(estimate_quality(measured[0], measured[1], max_bytes))
+            if not lowest_ok < next_quality < known_fail or next_quality == probe_quality:
+                next_quality = (lowest_ok + known_fail) // 2
+            probe_quality = next_quality
+
+        if best is not None:
+            return result(best[1], best[0], img.size)
+
+        # Nothing fits even at min_quality: downscale from that measurement
+        floor_quality = min_quality
+
+    # Out of rounds; return the smallest encode rather than failing
+    return result(smallest[1], smallest[0], smallest[2])
@@ -0,0 +1,102 @@
+# Images of one request, decoded and converted once for every provider.
+#
+# A generation runs two variants over the same prompt, often both on Claude.
+# Each used to deep-copy the messages (base64 screenshots included) and run
+# process_image on every image for itself; Gemini decoded the same base64 again.
+# The store for the request keeps one NormalizedImage per distinct image (by
+# content hash), which decodes its bytes and builds its Claude payload on first
+# use and hands the same objects to every later caller.
+
+import base64
+import contextvars
+import hashlib
+from dataclasses import dataclass
+
+from image_processing.utils import parse_data_url, process_image_bytes
+
+
+@dataclass(frozen=True)
+class ClaudeImage:
+    media_type: str
+    data: str
+
+    def source(self) -> dict[str, str]:
+        return {"type": "base64", "media_type": self.media_type, "data": self.data}
+
+
+@dataclass
+class ImageStoreStats:
+    images: int = 0
+    hits: int = 0
+    decodes: int = 0
+    claude_conversions: int = 0
+
+
+class NormalizedImage:
+    def __init__(self, key: str, media_type: str, base64_data: str, stats: ImageStoreStats):
+        self.key = key
+        self.media_type = media_type
+        self.base64_data = base64_data
+        self._stats = stats
+        self._bytes: bytes | None = None
+        self._claude: ClaudeImage | None = None
+
+    @property
+    def bytes(self) -> bytes:
+        if self._bytes is None:
+            self._stats.decodes += 1
+            self._bytes = base64.b64decode(self.base64_data)
+        return self._bytes
+
+    @property
+    def claude(self) -> ClaudeImage:
+        """The image within Claude's size and dimension limits"""
+        if self._claude is None:
+            self._stats.claude_conversions += 1
+            self._claude = ClaudeImage(*process_image_bytes(self.media_type, self.base64_data, self.bytes))
+        return self._claude
+
+
+class RequestImageStore:
+    def __init__(self):
+        self.stats = ImageStoreStats()
+        self._by_key: dict[str, NormalizedImage] = {}
+        # Variants share the same message objects, so the same URL string is
+        # usually seen again; this skips hashing it twice. The URL is kept so
+        # its id can't be reused.
+        self._by_url_id: dict[int, tuple[str, NormalizedImage]] = {}
+
+    def get(self, data_url: str) -> NormalizedImage:
+        seen = self._by_url_id.get(id(data_url))
+        if seen is not None and seen[0] is data_url:
+            self.stats.hits += 1
+            return seen[1]
+
+        media_type, base64_data = parse_data_url(data_url)
+        key = hashlib.sha256(base64_data.encode("ascii")).hexdigest()
+        image = self._by_key.get(key)
+        if image is None:
+            self.stats.images += 1
+            image = self._by_key[key] = NormalizedImage(key, media_type, base64_data, self.stats)
+        else:
+            self.stats.hits += 1
+        self._by_url_id[id(data_url)] = (data_url, image)
+        return image
+
+
+_request_images: contextvars.ContextVar[RequestImageStore | None] = contextvars.ContextVar(
+    "request_images", default=None
+)
+
+
+def start_request_images() -> RequestImageStore:
+    """Shares one image store between the current task and the tasks it starts
+    from now on (e.g. the variants of a generation)"""
+    store = RequestImageStore()
+    _request_images.set(store)
+    return store
+
+
+def request_images() -> RequestImageStore:
+    # Callers outside a request (evals, scripts) get a store of their own
+    return _request_images.get() or RequestImageStore()
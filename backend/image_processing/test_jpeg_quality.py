@@ -0,0 +1,57 @@
+import base64
+import io
+import unittest
+from PIL import Image
+
+from image_processing.jpeg_quality import fit_jpeg
+from image_processing.utils import CLAUDE_IMAGE_MAX_SIZE, process_image
+
+
+def noisy_image(width: int, height: int) -> Image.Image:
+    return Image.effect_noise((width, height), 60).convert("RGB")
+
+
+def encoded_size(img: Image.Image, quality: int) -> int:
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    return output.tell()
+
+
+class TestJpegQuality(unittest.TestCase):
+
+    def test_image_under_budget_is_encoded_once(self):
+        img = Image.new("RGB", (400, 300), (30, 120, 200))
+        fit = fit_jpeg(img, 1024 * 1024)
+        self.assertEqual(fit.encodes, 1)
+        self.assertEqual(fit.quality, 95)
+
+    def test_highest_fitting_quality_is_chosen(self):
+        img = noisy_image(600, 400)
+        budget = encoded_size(img, 60)
+        fit = fit_jpeg(img, budget, tolerance=1)
+        self.assertLessEqual(len(fit.data), budget)
+        self.assertGreater(encoded_size(img, fit.quality + 1), budget)
+        self.assertLessEqual(fit.encodes, 6)
+
+    def test_small_budget_downscales_instead_of_dropping_quality(self):
+        img = noisy_image(1200, 900)
+        budget = encoded_size(img, 95) // 8
+        fit = fit_jpeg(img, budget)
+        self.assertLessEqual(len(fit.data), budget)
+        self.assertTrue(fit.downscaled)
+        self.assertGreaterEqual(fit.quality, 60)
+
+    def test_process_image_stays_under_base64_limit(self):
+        img = noisy_image(3000, 2400)
+        output = io.BytesIO()
+        img.save(output, format="PNG")
+        data_url = "data:image/png;base64," + base64.b64encode(output.getvalue()).decode()
+
+        media_type, base64_data = process_image(data_url)
+
+        self.assertEqual(media_type, "image/jpeg")
+        self.assertLessEqual(len(base64_data), CLAUDE_IMAGE_MAX_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
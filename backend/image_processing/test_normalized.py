@@ -0,0 +1,86 @@
+import asyncio
+import base64
+import copy
+import io
+import unittest
+
+from PIL import Image
+
+from image_processing.normalized import request_images, start_request_images
+from image_processing.utils import CLAUDE_MAX_IMAGE_DIMENSION, process_image
+from llm import claude_messages_from_openai
+
+
+def png_data_url(width: int, height: int, color=(30, 120, 200)) -> str:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(output.getvalue()).decode()
+
+
+def messages(image_url: str) -> list:
+    return [
+        {"role": "system", "content": "system prompt"},
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": image_url, "detail": "high"}},
+                {"type": "text", "text": "Build this"},
+            ],
+        },
+        {"role": "assistant", "content": "<html></html>"},
+    ]
+
+
+class TestRequestImageStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_variants_share_one_conversion(self):
+        store = start_request_images()
+        prompt = messages(png_data_url(CLAUDE_MAX_IMAGE_DIMENSION + 10, 50))
+        original = copy.deepcopy(prompt)
+
+        async def variant():
+            return claude_messages_from_openai(prompt[1:])
+
+        first, second = await asyncio.gather(variant(), variant())
+
+        self.assertEqual(store.stats.images, 1)
+        self.assertEqual(store.stats.decodes, 1)
+        self.assertEqual(store.stats.claude_conversions, 1)
+        first_source = first[0]["content"][0]["source"]
+        self.assertIs(first_source["data"], second[0]["content"][0]["source"]["data"])
+        self.assertEqual(first_source["media_type"], "image/jpeg")
+        self.assertEqual(prompt, original)
+
+    async def test_matches_process_image(self):
+        url = png_data_url(64, 32)
+        start_request_images()
+
+        [user, assistant] = claude_messages_from_openai(messages(url)[1:])
+
+        media_type, data = process_image(url)
+        self.assertEqual(
+            user["content"],
+            [
+                {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}},
+                {"type": "text", "text": "Build this"},
+            ],
+        )
+        self.assertEqual(assistant, {"role": "assistant", "content": "<html></html>"})
+
+    async def test_equal_images_in_different_strings_are_deduplicated(self):
+        store = start_request_images()
+        url = png_data_url(10, 10)
+
+        first = store.get(url)
+        second = store.get("".join(list(url)))
+
+        self.assertIs(first, second)
+        self.assertEqual(first.bytes, base64.b64decode(url.split(",")[1]))
+        self.assertEqual(store.stats.images, 1)
+
+    def test_no_request_gets_a_fresh_store(self):
+        self.assertIsNot(request_images(), request_images())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,17 +3,29 @@ import io
 import time
 from PIL import Image
 
+from image_processing.jpeg_quality import fit_jpeg
+
 CLAUDE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
 CLAUDE_MAX_IMAGE_DIMENSION = 7990
 
 
+def parse_data_url(image_data_url: str) -> tuple[str, str]:
+    """(media type, base64 data) of a base64 data URL"""
+    media_type = image_data_url.split(";")[0].split(":")[1]
+    base64_data = image_data_url.split(",")[1]
+    return (media_type, base64_data)
+
+
 # Process image so it meets Claude requirements
 def process_image(image_data_url: str) -> tuple[str, str]:
 
     # Extract bytes and media type from base64 data URL
-    media_type = image_data_url.split(";")[0].split(":")[1]
-    base64_data = image_data_url.split(",")[1]
-    image_bytes = base64.b64decode(base64_data)
+    media_type, base64_data = parse_data_url(image_data_url)
+    return process_image_bytes(media_type, base64_data, base64.b64decode(base64_data))
+
+
+def process_image_bytes(media_type: str, base64_data: str, image_bytes: bytes) -> tuple[str, str]:
+    """process_image for an image that has already been decoded"""
 
     img = Image.open(io.BytesIO(image_bytes))
 
@@ -51,24 +63,20 @@ def process_image(image_data_url: str) -> tuple[str, str]:
 
     # Convert and compress as JPEG
     # We always compress as JPEG (95% at the least) even when we resize and the original image
-    # is under the size limit.
-    quality = 95
-    output = io.BytesIO()
+    # is under the size limit. The base64 limit is converted to a raw byte budget.
     img = img.convert("RGB")  # Ensure image is in RGB mode for JPEG conversion
-    img.save(output, format="JPEG", quality=quality)
-
-    # Reduce quality until image is under max size
-    while (
-        len(base64.b64encode(output.getvalue())) > CLAUDE_IMAGE_MAX_SIZE
-        and quality > 10
-    ):
-        output = io.BytesIO()
-        img.save(output, format="JPEG", quality=quality)
-        quality -= 5
+    fit = fit_jpeg(img, max_bytes=CLAUDE_IMAGE_MAX_SIZE * 3 // 4, max_quality=95)
+    if fit.downscaled:
+        print(
+            f"[CLAUDE IMAGE PROCESSING] image downscaled to fit size limit: width = {fit.size[0]}, height = {fit.size[1]}"
+        )
+    print(
+        f"[CLAUDE IMAGE PROCESSING] jpeg quality = {fit.quality}, encodes = {fit.encodes}, encode time = {fit.elapsed_ms:.0f} ms"
+    )
 
     # Log so we know it was modified
     old_size = len(base64_data)
-    new_size = len(base64.b64encode(output.getvalue()))
+    new_size = len(base64.b64encode(fit.data))
     print(
         f"[CLAUDE IMAGE PROCESSING] image size updated: old size = {old_size} bytes, new size = {new_size} bytes"
     )
@@ -77,4 +85,4 @@ def process_image(image_data_url: str) -> tuple[str, str]:
     processing_time = end_time - start_time
     print(f"[CLAUDE IMAGE PROCESSING] processing time: {processing_time:.2f} seconds")
 
-    return ("image/jpeg", base64.b64encode(output.getvalue()).decode("utf-8"))
+    return ("image/jpeg", base64.b64encode(fit.data).decode("utf-8"))
@@ -1,16 +1,12 @@
-import copy
 from enum import Enum
-import base64
 import time
 from typing import Any, Awaitable, Callable, List, cast, TypedDict
 
-from openai import AsyncOpenAI, AsyncAzureOpenAI
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionChunk
-from anthropic import AsyncAnthropic
 from config import IS_DEBUG_ENABLED
 from debug.DebugFileWriter import DebugFileWriter
-from image_processing.utils import process_image
-from google import genai
+from image_processing.normalized import request_images
+from llm_clients import llm_clients
 from google.genai import types
 
 from utils import pprint_prompt
@@ -63,15 +59,13 @@ async def stream_openai_response(
     """
     start_time = time.time()
     # Nếu thông tin Azure được cung cấp đầy đủ, dùng AsyncAzureOpenAI
+    # Client được lấy từ registry dùng chung để tái sử dụng kết nối giữa các lần gọi
     if azure_api_version and resource_name and deployment_name:
-        client = AsyncAzureOpenAI(
-            api_version=azure_api_version,
-            api_key=api_key,
-            azure_endpoint=f"https://{resource_name}.openai.azure.com/",
-            azure_deployment=deployment_name,
+        lease = llm_clients.azure_openai(
+            api_key, azure_api_version, resource_name, deployment_name
         )
     else:
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        lease = llm_clients.openai(api_key, base_url)
 
     # Base parameters cho việc gọi API
     params: dict[str, Any] = {
@@ -97,32 +91,56 @@ async def stream_openai_response(
     if model == Llm.GPT_5_MINI:
         params["max_completion_tokens"] = 16384
 
-    # Nếu model O1 hoặc GPT-5-mini không hỗ trợ streaming, gọi API theo kiểu blocking
-    if model in (Llm.O1_2024_12_17, Llm.GPT_5_MINI):
-        response = await client.chat.completions.create(**params)  # type: ignore
-        full_response = response.choices[0].message.content  # type: ignore
-        await callback(full_response)
-    else:
-        stream = await client.chat.completions.create(**params)  # type: ignore
-        full_response = ""
-        async for chunk in stream:  # type: ignore
-            assert isinstance(chunk, ChatCompletionChunk)
-            if (
-                chunk.choices
-                and len(chunk.choices) > 0
-                and chunk.choices[0].delta
-                and chunk.choices[0].delta.content
-            ):
-                content = chunk.choices[0].delta.content or ""
-                full_response += content
-                await callback(content)
-
-    await client.close()
+    async with lease as client:
+        # Nếu model O1 hoặc GPT-5-mini không hỗ trợ streaming, gọi API theo kiểu blocking
+        if model in (Llm.O1_2024_12_17, Llm.GPT_5_MINI):
+            response = await client.chat.completions.create(**params)  # type: ignore
+            full_response = response.choices[0].message.content  # type: ignore
+            await callback(full_response)
+        else:
+            stream = await client.chat.completions.create(**params)  # type: ignore
+            full_response = ""
+            async for chunk in stream:  # type: ignore
+                assert isinstance(chunk, ChatCompletionChunk)
+                if (
+                    chunk.choices
+                    and len(chunk.choices) > 0
+                    and chunk.choices[0].delta
+                    and chunk.choices[0].delta.content
+                ):
+                    content = chunk.choices[0].delta.content or ""
+                    full_response += content
+                    await callback(content)
+
     completion_time = time.time() - start_time
     return {"duration": completion_time, "code": full_response}
 
 
-# TODO: Have a separate function that translates OpenAI messages to Claude messages
+def claude_messages_from_openai(messages: List[ChatCompletionMessageParam]) -> list[dict[str, Any]]:
+    """Claude versions of OpenAI messages
+
+    New message dicts and content lists are built instead of deep-copying the
+    originals; text parts are shared and image parts point at the request's
+    normalised images, so no image data is copied.
+    """
+    images = request_images()
+    claude_messages: list[dict[str, Any]] = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, list):
+            claude_messages.append(dict(message))
+            continue
+        parts: list[Any] = []
+        for part in content:
+            if part["type"] == "image_url":
+                image = images.get(cast(str, part["image_url"]["url"]))  # type: ignore
+                parts.append({"type": "image", "source": image.claude.source()})
+            else:
+                parts.append(part)
+        claude_messages.append({**message, "content": parts})
+    return claude_messages
+
+
 async def stream_claude_response(
     messages: List[ChatCompletionMessageParam],
     api_key: str,
@@ -130,48 +148,29 @@ async def stream_claude_response(
     model: Llm,
 ) -> Completion:
     start_time = time.time()
-    client = AsyncAnthropic(api_key=api_key)
 
     # Base parameters
     max_tokens = 8192
     temperature = 0.0
 
-    # Deep copy messages để không làm thay đổi danh sách gốc
-    cloned_messages = copy.deepcopy(messages)
-    system_prompt = cast(str, cloned_messages[0].get("content"))
-    claude_messages = [dict(message) for message in cloned_messages[1:]]
-    for message in claude_messages:
-        if not isinstance(message["content"], list):
-            continue
-        for content in message["content"]:  # type: ignore
-            if content["type"] == "image_url":
-                content["type"] = "image"
-                # Extract base64 data and media type từ data URL
-                image_data_url = cast(str, content["image_url"]["url"])
-                (media_type, base64_data) = process_image(image_data_url)
-                # Loại bỏ tham số OpenAI
-                del content["image_url"]
-                content["source"] = {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": base64_data,
-                }
+    system_prompt = cast(str, messages[0].get("content"))
+    claude_messages = claude_messages_from_openai(messages[1:])
 
     # Stream Claude response
-    async with client.messages.stream(
-        model=model.value,
-        max_tokens=max_tokens,
-        temperature=temperature,
-        system=system_prompt,
-        messages=claude_messages,  # type: ignore
-        extra_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"},
-    ) as stream:
-        async for text in stream.text_stream:
-            await callback(text)
-
-    # Lấy message cuối cùng
-    response = await stream.get_final_message()
-    await client.close()
+    async with llm_clients.anthropic(api_key) as client:
+        async with client.messages.stream(
+            model=model.value,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_prompt,
+            messages=claude_messages,  # type: ignore
+            extra_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"},
+        ) as stream:
+            async for text in stream.text_stream:
+                await callback(text)
+
+        # Lấy message cuối cùng
+        response = await stream.get_final_message()
     completion_time = time.time() - start_time
     return {"duration": completion_time, "code": response.content[0].text}
 
@@ -185,7 +184,6 @@ async def stream_claude_response_native(
     model: Llm = Llm.CLAUDE_3_OPUS,
 ) -> Completion:
     start_time = time.time()
-    client = AsyncAnthropic(api_key=api_key)
 
     # Base model parameters
     max_tokens = 4096
@@ -209,17 +207,18 @@ async def stream_claude_response_native(
         )
         pprint_prompt(messages_to_send)
 
-        async with client.messages.stream(
-            model=model.value,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            system=system_prompt,
-            messages=messages_to_send,  # type: ignore
-        ) as stream:
-            async for text in stream.text_stream:
-                print(text, end="", flush=True)
-                full_stream += text
-                await callback(text)
+        async with llm_clients.anthropic(api_key) as client:
+            async with client.messages.stream(
+                model=model.value,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system_prompt,
+                messages=messages_to_send,  # type: ignore
+            ) as stream:
+                async for text in stream.text_stream:
+                    print(text, end="", flush=True)
+                    full_stream += text
+                    await callback(text)
 
         response = await stream.get_final_message()
         response_text = response.content[0].text
@@ -249,7 +248,6 @@ async def stream_claude_response_native(
             f"Token usage: Input Tokens: {response.usage.input_tokens}, Output Tokens: {response.usage.output_tokens}"
         )
 
-    await client.close()
     completion_time = time.time() - start_time
 
     if IS_DEBUG_ENABLED:
@@ -275,32 +273,32 @@ async def stream_gemini_response(
         if content_part["type"] == "image_url":  # type: ignore
             image_url = content_part["image_url"]["url"]  # type: ignore
             if image_url.startswith("data:"):  # type: ignore
-                mime_type = image_url.split(";")[0].split(":")[1]  # type: ignore
-                base64_data = image_url.split(",")[1]  # type: ignore
-                image_urls = [{"mime_type": mime_type, "data": base64_data}]
+                # Decoded once per request, shared with the other variants
+                image = request_images().get(image_url)  # type: ignore
+                image_urls = [{"mime_type": image.media_type, "data": image.bytes}]
             else:
                 image_urls = [{"uri": image_url}]
             break
 
-    client = genai.Client(api_key=api_key)  # type: ignore
     full_response = ""
-    async for response in client.aio.models.generate_content_stream(  # type: ignore
-        model=model.value,
-        contents={
-            "parts": [
-                {"text": messages[0]["content"]},  # type: ignore
-                types.Part.from_bytes(
-                    data=base64.b64decode(image_urls[0]["data"]),  # type: ignore
-                    mime_type=image_urls[0]["mime_type"],  # type: ignore
-                ),
-            ]
-        },
-        config=types.GenerateContentConfig(
-            temperature=0, max_output_tokens=8192
-        ),
-    ):  # type: ignore
-        if response.text:  # type: ignore
-            full_response += response.text  # type: ignore
-            await callback(response.text)  # type: ignore
+    async with llm_clients.gemini(api_key) as client:
+        async for response in client.aio.models.generate_content_stream(  # type: ignore
+            model=model.value,
+            contents={
+                "parts": [
+                    {"text": messages[0]["content"]},  # type: ignore
+                    types.Part.from_bytes(
+                        data=image_urls[0]["data"],  # type: ignore
+                        mime_type=image_urls[0]["mime_type"],  # type: ignore
+                    ),
+                ]
+            },
+            config=types.GenerateContentConfig(
+                temperature=0, max_output_tokens=8192
+            ),
+        ):  # type: ignore
+            if response.text:  # type: ignore
+                full_response += response.text  # type: ignore
+                await callback(response.text)  # type: ignore
     completion_time = time.time() - start_time
     return {"duration": completion_time, "code": full_response}
\ No newline at end of file
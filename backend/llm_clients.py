@@ -0,0 +1,291 @@
+# Long-lived LLM SDK clients shared across generations and variants.
+#
+# Building an AsyncOpenAI / AsyncAnthropic client per call means every
+# generation (and every variant of it) pays for a new connection pool, DNS
+# lookup and TLS handshake before the first token. The registry below keeps one
+# client per (provider, API key, endpoint), each with its own pooled HTTP
+# client, and closes clients that have been idle for a while.
+
+import asyncio
+import hashlib
+import importlib.util
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient as AnthropicHttpxClient
+from google import genai
+from openai import AsyncAzureOpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from config import (
+    ANTHROPIC_API_KEY,
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_API_VERSION,
+    AZURE_OPENAI_DEPLOYMENT_NAME,
+    AZURE_OPENAI_RESOURCE_NAME,
+    GEMINI_API_KEY,
+    LLM_CLIENT_IDLE_TTL,
+    LLM_CLIENT_MAX_CLIENTS,
+    LLM_HTTP2,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+)
+
+# HTTP/2 multiplexes concurrent streams (e.g. both variants) over one
+# connection, but httpx only supports it when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class PoolLimits:
+    max_connections: int = LLM_HTTP_MAX_CONNECTIONS
+    max_keepalive_connections: int = LLM_HTTP_MAX_KEEPALIVE
+    keepalive_expiry: float = LLM_HTTP_KEEPALIVE_EXPIRY
+    # Clients unused for this long are closed by the eviction loop
+    idle_ttl: float = LLM_CLIENT_IDLE_TTL
+    # Upper bound on distinct (provider, key, endpoint) clients kept open
+    max_clients: int = LLM_CLIENT_MAX_CLIENTS
+    http2: bool = LLM_HTTP2
+
+    def httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+@dataclass(frozen=True)
+class ClientKey:
+    provider: str
+    # Fingerprint rather than the raw key so keys never show up in logs or stats
+    key_fingerprint: str
+    endpoint: str | None = None
+    api_version: str | None = None
+    deployment: str | None = None
+
+
+@dataclass
+class _PooledClient:
+    client: Any
+    close: Callable[[], Awaitable[None]]
+    http_client: httpx.AsyncClient | None = None
+    warm_url: str | None = None
+    active: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class LlmClientRegistry:
+    def __init__(self, limits: PoolLimits | None = None):
+        self.limits = limits or PoolLimits()
+        self._clients: dict[ClientKey, _PooledClient] = {}
+        self._eviction_task: asyncio.Task[None] | None = None
+        self.stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    # Leases. Hold the client only for the duration of one call; a leased
+    # client is never evicted.
+
+    @asynccontextmanager
+    async def openai(self, api_key: str, base_url: str | None) -> AsyncIterator[AsyncOpenAI]:
+        key = ClientKey("openai", fingerprint(api_key), base_url)
+        async with self._lease(key, lambda: self._create_openai(api_key, base_url)) as client:
+            yield client
+
+    @asynccontextmanager
+    async def azure_openai(
+        self,
+        api_key: str,
+        api_version: str,
+        resource_name: str,
+        deployment_name: str,
+    ) -> AsyncIterator[AsyncAzureOpenAI]:
+        endpoint = f"https://{resource_name}.openai.azure.com/"
+        key = ClientKey("azure_openai", fingerprint(api_key), endpoint, api_version, deployment_name)
+        factory = lambda: self._create_azure_openai(api_key, api_version, endpoint, deployment_name)
+        async with self._lease(key, factory) as client:
+            yield client
+
+    @asynccontextmanager
+    async def anthropic(self, api_key: str) -> AsyncIterator[AsyncAnthropic]:
+        key = ClientKey("anthropic", fingerprint(api_key))
+        async with self._lease(key, lambda: self._create_anthropic(api_key)) as client:
+            yield client
+
+    @asynccontextmanager
+    async def gemini(self, api_key: str) -> AsyncIterator[genai.Client]:
+        key = ClientKey("gemini", fingerprint(api_key))
+        async with self._lease(key, lambda: self._create_gemini(api_key)) as client:
+            yield client
+
+    @asynccontextmanager
+    async def _lease(self, key: ClientKey, factory: Callable[[], _PooledClient]) -> AsyncIterator[Any]:
+        pooled = self._get_or_create(key, factory)
+        pooled.active += 1
+        try:
+            yield pooled.client
+        finally:
+            pooled.active -= 1
+            pooled.last_used = time.monotonic()
+
+    def _get_or_create(self, key: ClientKey, factory: Callable[[], _PooledClient]) -> _PooledClient:
+        pooled = self._clients.get(key)
+        if pooled is not None:
+            self.stats["reused"] += 1
+            return pooled
+
+        if len(self._clients) >= self.limits.max_clients:
+            self._evict_least_recently_used()
+        pooled = factory()
+        self._clients[key] = pooled
+        self.stats["created"] += 1
+        return pooled
+
+    # Client construction
+
+    def _http_client(self, sdk_client_class: type[httpx.AsyncClient]) -> httpx.AsyncClient:
+        return sdk_client_class(
+            limits=self.limits.httpx_limits(),
+            http2=self.limits.http2 and HTTP2_AVAILABLE,
+        )
+
+    def _create_openai(self, api_key: str, base_url: str | None) -> _PooledClient:
+        http_client = self._http_client(DefaultAsyncHttpxClient)
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        return _PooledClient(client, client.close, http_client, str(client.base_url))
+
+    def _create_azure_openai(
+        self, api_key: str, api_version: str, endpoint: str, deployment_name: str
+    ) -> _PooledClient:
+        http_client = self._http_client(DefaultAsyncHttpxClient)
+        client = AsyncAzureOpenAI(
+            api_version=api_version,
+            api_key=api_key,
+            azure_endpoint=endpoint,
+            azure_deployment=deployment_name,
+            http_client=http_client,
+        )
+        return _PooledClient(client, client.close, http_client, endpoint)
+
+    def _create_anthropic(self, api_key: str) -> _PooledClient:
+        http_client = self._http_client(AnthropicHttpxClient)
+        client = AsyncAnthropic(api_key=api_key, http_client=http_client)
+        return _PooledClient(client, client.close, http_client, str(client.base_url))
+
+    def _create_gemini(self, api_key: str) -> _PooledClient:
+        # The Gemini SDK manages its own HTTP session; reusing the client keeps it alive
+        client = genai.Client(api_key=api_key)  # type: ignore
+
+        async def close() -> None:
+            pass
+
+        return _PooledClient(client, close)
+
+    # Lifecycle
+
+    async def warm_up(self, timeout: float = 5.0) -> None:
+        """Open a connection (DNS + TCP + TLS) for every registered client
+
+        Register clients first (e.g. by leasing them once); any HTTP response,
+        including 401/404, leaves a kept-alive connection in the pool.
+        """
+
+        async def connect(pooled: _PooledClient) -> None:
+            if pooled.http_client is None or pooled.warm_url is None:
+                return
+            try:
+                await pooled.http_client.head(pooled.warm_url, timeout=timeout)
+            except httpx.HTTPError as e:
+                print(f"[LLM CLIENTS] warm-up failed for {pooled.warm_url}: {e}")
+
+        await asyncio.gather(*(connect(pooled) for pooled in list(self._clients.values())))
+
+    def start(self) -> None:
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._eviction_loop())
+
+    async def close(self) -> None:
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(
+            *(pooled.close() for pooled in clients.values()), return_exceptions=True
+        )
+
+    async def evict_idle(self) -> int:
+        now = time.monotonic()
+        idle = [
+            key
+            for key, pooled in self._clients.items()
+            if pooled.active == 0 and now - pooled.last_used >= self.limits.idle_ttl
+        ]
+        for key in idle:
+            await self._clients.pop(key).close()
+        self.stats["evicted"] += len(idle)
+        return len(idle)
+
+    async def _eviction_loop(self) -> None:
+        interval = max(self.limits.idle_ttl / 4, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"[LLM CLIENTS] eviction failed: {e}")
+
+    def _evict_least_recently_used(self) -> None:
+        candidates = [(p.last_used, k) for k, p in self._clients.items() if p.active == 0]
+        if not candidates:
+            return
+        _, key = min(candidates, key=lambda candidate: candidate[0])
+        pooled = self._clients.pop(key)
+        asyncio.get_running_loop().create_task(pooled.close())
+        self.stats["evicted"] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            **self.stats,
+            "open_clients": len(self._clients),
+            "active_leases": sum(p.active for p in self._clients.values()),
+            "http2": self.limits.http2 and HTTP2_AVAILABLE,
+        }
+
+
+# Process-wide registry used by llm.py
+llm_clients = LlmClientRegistry()
+
+
+async def warm_up_configured_clients() -> None:
+    """Create and connect clients for the API keys configured in the environment"""
+    if OPENAI_API_KEY:
+        async with llm_clients.openai(OPENAI_API_KEY, OPENAI_BASE_URL):
+            pass
+    if (
+        AZURE_OPENAI_API_KEY
+        and AZURE_OPENAI_API_VERSION
+        and AZURE_OPENAI_RESOURCE_NAME
+        and AZURE_OPENAI_DEPLOYMENT_NAME
+    ):
+        async with llm_clients.azure_openai(
+            AZURE_OPENAI_API_KEY,
+            AZURE_OPENAI_API_VERSION,
+            AZURE_OPENAI_RESOURCE_NAME,
+            AZURE_OPENAI_DEPLOYMENT_NAME,
+        ):
+            pass
+    if ANTHROPIC_API_KEY:
+        async with llm_clients.anthropic(ANTHROPIC_API_KEY):
+            pass
+    if GEMINI_API_KEY:
+        async with llm_clients.gemini(GEMINI_API_KEY):
+            pass
+    await llm_clients.warm_up()
@@ -4,13 +4,37 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from routes import screenshot, generate_code, home, evals
+from config import SHOULD_MOCK_AI_RESPONSE
+from llm_clients import llm_clients, warm_up_configured_clients
+from image_generation.replicate import close_schedulers
+from fs_logging.core import run_log_writer
 import os
 
-app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep LLM clients (and their connection pools) alive across requests
+    llm_clients.start()
+    warm_up_task = None
+    if not SHOULD_MOCK_AI_RESPONSE:
+        # Warm in the background so an unreachable provider doesn't delay startup
+        warm_up_task = asyncio.create_task(warm_up_configured_clients())
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    await llm_clients.close()
+    await close_schedulers()
+    # Write out the runs still queued
+    await run_log_writer.close()
+
+
+app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None, lifespan=lifespan)
 
 # Configure CORS settings
 import os
@@ -1,18 +1,19 @@
+import asyncio
 import os
-from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi import APIRouter, Query, Request, HTTPException, Response
 from pydantic import BaseModel
-from evals.utils import image_to_data_url
-from evals.config import EVALS_DIR
-from typing import Set
-from evals.runner import run_image_evals
-from typing import List, Dict
+from evals.index import eval_index
+from evals.runner import run_evals_for_models
+from typing import List, Dict, Optional, cast
 from llm import Llm
 from prompts.types import Stack
 from pathlib import Path
-import base64
 
 router = APIRouter()
 
+# Shown when an output has no matching input screenshot
+MISSING_INPUT_IMAGE = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="  # 1x1 transparent PNG
+
 # Update this if the number of outputs generated per input changes
 N = 1
 
@@ -22,8 +23,18 @@ class Eval(BaseModel):
     outputs: list[str]
 
 
+def paginate(names: List[str], offset: int, limit: Optional[int]) -> List[str]:
+    return names[offset : offset + limit if limit is not None else None]
+
+
 @router.get("/evals", response_model=list[Eval])
-async def get_evals(folder: str):
+async def get_evals(
+    folder: str,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    thumbnail_width: Optional[int] = Query(None, ge=16),
+):
     if not folder:
         raise HTTPException(status_code=400, detail="Folder path is required")
 
@@ -32,43 +43,23 @@ async def get_evals(folder: str):
         raise HTTPException(status_code=404, detail=f"Folder not found: {folder}")
 
     try:
-        evals: list[Eval] = []
-        # Get all HTML files from folder
-        files = {
-            f: os.path.join(folder, f)
-            for f in os.listdir(folder)
-            if f.endswith(".html")
-        }
-
-        # Extract base names
-        base_names: Set[str] = set()
-        for filename in files.keys():
-            base_name = (
-                filename.rsplit("_", 1)[0]
-                if "_" in filename
-                else filename.replace(".html", "")
-            )
-            base_names.add(base_name)
-
-        for base_name in base_names:
-            input_path = os.path.join(EVALS_DIR, "inputs", f"{base_name}.png")
-            if not os.path.exists(input_path):
-                continue
-
-            # Find matching output file
-            output_file = None
-            for filename, filepath in files.items():
-                if filename.startswith(base_name):
-                    output_file = filepath
-                    break
-
-            if output_file:
-                input_data = await image_to_data_url(input_path)
-                with open(output_file, "r", encoding="utf-8") as f:
-                    output_html = f.read()
-                evals.append(Eval(input=input_data, outputs=[output_html]))
-
-        return evals
+        folder_index = await eval_index.get_folder(folder)
+        input_names = await eval_index.get_input_names()
+
+        # Only outputs with a matching input, in a stable order for pagination
+        base_names = sorted(name for name in folder_index.outputs if name in input_names)
+        response.headers["X-Total-Count"] = str(len(base_names))
+
+        async def load(base_name: str) -> Eval | None:
+            input_data = await eval_index.input_data_url(base_name, thumbnail_width)
+            output_file = folder_index.first_output(base_name)
+            if input_data is None or output_file is None:
+                return None
+            output_html = await eval_index.read_output(output_file)
+            return Eval(input=input_data, outputs=[output_html])
+
+        page = await asyncio.gather(*(load(name) for name in paginate(base_names, offset, limit)))
+        return [e for e in page if e is not None]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing evals: {str(e)}")
@@ -78,6 +69,8 @@ class PairwiseEvalResponse(BaseModel):
     evals: list[Eval]
     folder1_name: str
     folder2_name: str
+    # Number of evals across all pages
+    total: int = 0
 
 
 @router.get("/pairwise-evals", response_model=PairwiseEvalResponse)
@@ -90,82 +83,76 @@ async def get_pairwise_evals(
         "..",
         description="Absolute path to second folder",
     ),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    thumbnail_width: Optional[int] = Query(None, ge=16),
 ):
     if not os.path.exists(folder1) or not os.path.exists(folder2):
         return {"error": "One or both folders do not exist"}
 
-    evals: list[Eval] = []
-
-    # Get all HTML files from first folder
-    files1 = {
-        f: os.path.join(folder1, f) for f in os.listdir(folder1) if f.endswith(".html")
-    }
-    files2 = {
-        f: os.path.join(folder2, f) for f in os.listdir(folder2) if f.endswith(".html")
-    }
-
-    # Find common base names (ignoring any suffixes)
-    common_names: Set[str] = set()
-    for f1 in files1.keys():
-        base_name: str = f1.rsplit("_", 1)[0] if "_" in f1 else f1.replace(".html", "")
-        for f2 in files2.keys():
-            if f2.startswith(base_name):
-                common_names.add(base_name)
-
-    # For each matching pair, create an eval
-    for base_name in common_names:
-        # Find the corresponding input image
-        input_image = None
-        input_path = os.path.join(EVALS_DIR, "inputs", f"{base_name}.png")
-        if os.path.exists(input_path):
-            input_image = await image_to_data_url(input_path)
-        else:
-            input_image = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="  # 1x1 transparent PNG
-
-        # Get the HTML contents
-        output1 = None
-        output2 = None
-
-        # Find matching files in folder1
-        for f1 in files1.keys():
-            if f1.startswith(base_name):
-                with open(files1[f1], "r") as f:
-                    output1 = f.read()
-                break
-
-        # Find matching files in folder2
-        for f2 in files2.keys():
-            if f2.startswith(base_name):
-                with open(files2[f2], "r") as f:
-                    output2 = f.read()
-                break
+    index1 = await eval_index.get_folder(folder1)
+    index2 = await eval_index.get_folder(folder2)
+
+    # Find common base names
+    common_names = sorted(set(index1.outputs) & set(index2.outputs))
 
+    async def load(base_name: str) -> Eval | None:
+        # Find the corresponding input image
+        input_image = await eval_index.input_data_url(base_name, thumbnail_width)
+        if input_image is None:
+            input_image = MISSING_INPUT_IMAGE
+
+        output1, output2 = await asyncio.gather(
+            eval_index.read_output(cast(str, index1.first_output(base_name))),
+            eval_index.read_output(cast(str, index2.first_output(base_name))),
+        )
         if output1 and output2:
-            evals.append(Eval(input=input_image, outputs=[output1, output2]))
+            return Eval(input=input_image, outputs=[output1, output2])
+        return None
+
+    page = await asyncio.gather(*(load(name) for name in paginate(common_names, offset, limit)))
+    evals = [e for e in page if e is not None]
 
     # Extract folder names for the UI
     folder1_name = os.path.basename(folder1)
     folder2_name = os.path.basename(folder2)
 
     return PairwiseEvalResponse(
-        evals=evals, folder1_name=folder1_name, folder2_name=folder2_name
+        evals=evals,
+        folder1_name=folder1_name,
+        folder2_name=folder2_name,
+        total=len(common_names),
     )
 
 
 class RunEvalsRequest(BaseModel):
     models: List[str]
     stack: Stack
+    # Skip outputs that already exist in the run's folders
+    resume: bool = True
+    # Output folder prefix; defaults to today's date. Reuse it to resume an older run.
+    run_id: Optional[str] = None
 
 
 @router.post("/run_evals", response_model=List[str])
 async def run_evals(request: RunEvalsRequest) -> List[str]:
     """Run evaluations on all images in the inputs directory for multiple models"""
-    all_output_files: List[str] = []
-
     for model in request.models:
-        output_files = await run_image_evals(model=model, stack=request.stack)
-        all_output_files.extend(output_files)
+        if model not in {m.value for m in Llm}:
+            raise HTTPException(status_code=400, detail=f"Unknown model: {model}")
+
+    # Models run concurrently, within the per-provider concurrency caps
+    output_files = await run_evals_for_models(
+        request.models,
+        request.stack,
+        n=N,
+        resume=request.resume,
+        run_id=request.run_id,
+    )
 
+    all_output_files: List[str] = []
+    for model in request.models:
+        all_output_files.extend(output_files[model])
     return all_output_files
 
 
@@ -190,10 +177,17 @@ async def get_models():
 class BestOfNEvalsResponse(BaseModel):
     evals: list[Eval]
     folder_names: list[str]
+    # Number of evals across all pages
+    total: int = 0
 
 
 @router.get("/best-of-n-evals", response_model=BestOfNEvalsResponse)
-async def get_best_of_n_evals(request: Request):
+async def get_best_of_n_evals(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    thumbnail_width: Optional[int] = Query(None, ge=16),
+):
     # Get all query parameters
     query_params = dict(request.query_params)
 
@@ -212,60 +206,24 @@ async def get_best_of_n_evals(request: Request):
         if not os.path.exists(folder):
             return {"error": f"Folder does not exist: {folder}"}
 
-    evals: list[Eval] = []
     folder_names = [os.path.basename(folder) for folder in folders]
-
-    # Get HTML files from all folders
-    files_by_folder = []
-    for folder in folders:
-        files = {
-            f: os.path.join(folder, f)
-            for f in os.listdir(folder)
-            if f.endswith(".html")
-        }
-        files_by_folder.append(files)
+    indexes = await asyncio.gather(*(eval_index.get_folder(folder) for folder in folders))
 
     # Find common base names across all folders
-    common_names: Set[str] = set()
-    base_names_first_folder = {
-        f.rsplit("_", 1)[0] if "_" in f else f.replace(".html", "")
-        for f in files_by_folder[0].keys()
-    }
-
-    for base_name in base_names_first_folder:
-        found_in_all = True
-        for folder_files in files_by_folder[1:]:
-            if not any(f.startswith(base_name) for f in folder_files.keys()):
-                found_in_all = False
-                break
-        if found_in_all:
-            common_names.add(base_name)
-
-    # For each matching set, create an eval
-    for base_name in common_names:
+    common_names = sorted(set.intersection(*(set(index.outputs) for index in indexes)))
+
+    async def load(base_name: str) -> Eval:
         # Find the corresponding input image
-        input_image = None
-        input_path = os.path.join(EVALS_DIR, "inputs", f"{base_name}.png")
-        if os.path.exists(input_path):
-            input_image = await image_to_data_url(input_path)
-        else:
-            input_image = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+        input_image = await eval_index.input_data_url(base_name, thumbnail_width)
+        if input_image is None:
+            input_image = MISSING_INPUT_IMAGE
 
         # Get HTML contents from all folders
-        outputs = []
-        for folder_files in files_by_folder:
-            output_content = None
-            for filename in folder_files.keys():
-                if filename.startswith(base_name):
-                    with open(folder_files[filename], "r") as f:
-                        output_content = f.read()
-                    break
-            if output_content:
-                outputs.append(output_content)
-            else:
-                outputs.append("<html><body>Output not found</body></html>")
-
-        if len(outputs) == len(folders):  # Only add if we have outputs from all folders
-            evals.append(Eval(input=input_image, outputs=outputs))
-
-    return BestOfNEvalsResponse(evals=evals, folder_names=folder_names)
+        outputs = await asyncio.gather(
+            *(eval_index.read_output(cast(str, index.first_output(base_name))) for index in indexes)
+        )
+        return Eval(input=input_image, outputs=list(outputs))
+
+    evals = list(await asyncio.gather(*(load(name) for name in paginate(common_names, offset, limit))))
+
+    return BestOfNEvalsResponse(evals=evals, folder_names=folder_names, total=len(common_names))
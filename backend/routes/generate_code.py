@@ -19,6 +19,8 @@ from config import (
     OPENAI_BASE_URL,
     REPLICATE_API_KEY,
     SHOULD_MOCK_AI_RESPONSE,
+    WS_CHUNK_FLUSH_CHARS,
+    WS_CHUNK_FLUSH_MS,
 )
 from custom_types import InputMode
 from llm import (
@@ -30,9 +32,13 @@ from llm import (
     stream_openai_response,
 )
 from fs_logging.core import write_logs
+from generation_cache.core import CachedGeneration, generation_cache, generation_key
 from mock_llm import mock_completion
 from openai.types.chat import ChatCompletionMessageParam
-from image_generation.core import generate_images
+from image_generation.core import generate_image, generate_images
+from image_generation.replicate import start_page_stats
+from image_generation.streaming import ImagePrefetcher
+from image_processing.normalized import start_request_images
 from prompts import (
     create_prompt,
     assemble_imported_code_prompt,
@@ -40,12 +46,28 @@ from prompts import (
 )
 from prompts.claude_prompts import VIDEO_PROMPT
 from prompts.types import Stack  # Stack được định nghĩa là Literal[...] trong file này
+from ws.coalescer import ChunkCoalescer
 from ws.constants import APP_ERROR_WEB_SOCKET_CODE  # type: ignore
 from typing import Any, Callable, Coroutine, Dict, List, Literal, cast, get_args
 #from utils import pprint_prompt
 
 router = APIRouter()
 
+def image_generation_settings(
+    should_generate_images: bool, openai_api_key: str | None
+) -> tuple[Literal["dalle3", "flux"], str] | None:
+    """The image model and key to use, or None when images are not generated"""
+    if not should_generate_images:
+        return None
+
+    if REPLICATE_API_KEY:
+        return "flux", REPLICATE_API_KEY
+    if not openai_api_key:
+        print("No OpenAI API key and Replicate key found. Skipping image generation.")
+        return None
+    return "dalle3", openai_api_key
+
+
 # Generate images, if needed
 async def perform_image_generation(
     completion: str,
@@ -54,21 +76,10 @@ async def perform_image_generation(
     openai_base_url: str | None,
     image_cache: dict[str, str],
 ):
-    replicate_api_key = REPLICATE_API_KEY
-    if not should_generate_images:
+    settings = image_generation_settings(should_generate_images, openai_api_key)
+    if settings is None:
         return completion
-
-    if replicate_api_key:
-        image_generation_model = "flux"
-        api_key = replicate_api_key
-    else:
-        if not openai_api_key:
-            print(
-                "No OpenAI API key and Replicate key found. Skipping image generation."
-            )
-            return completion
-        image_generation_model = "dalle3"
-        api_key = openai_api_key
+    image_generation_model, api_key = settings
 
     print("Generating images with model: ", image_generation_model)
 
@@ -103,6 +114,7 @@ class ExtractedParams:
     anthropic_api_key: str | None
     openai_base_url: str | None
     generation_type: Literal["create", "update"]
+    use_generation_cache: bool
 
 
 async def extract_params(
@@ -151,6 +163,9 @@ async def extract_params(
         raise ValueError(f"Invalid generation type: {generation_type}")
     generation_type = cast(Literal["create", "update"], generation_type)
 
+    # Per-request opt-out of the generation cache (e.g. to force a fresh result)
+    use_generation_cache = not params.get("skipGenerationCache", False)
+
     return ExtractedParams(
         stack=validated_stack,
         input_mode=validated_input_mode,
@@ -159,6 +174,7 @@ async def extract_params(
         anthropic_api_key=anthropic_api_key,
         openai_base_url=openai_base_url,
         generation_type=generation_type,
+        use_generation_cache=use_generation_cache,
     )
 
 
@@ -170,8 +186,12 @@ async def stream_code(websocket: WebSocket):
     await websocket.accept()
     print("Incoming websocket connection...")
 
+    # Chunks are batched into fewer frames; other messages go out immediately
+    coalescer = ChunkCoalescer(websocket.send_text, WS_CHUNK_FLUSH_MS / 1000, WS_CHUNK_FLUSH_CHARS)
+
     async def throw_error(message: str):
         print(message)
+        await coalescer.close()
         await websocket.send_json({"type": "error", "value": message})
         await websocket.close(APP_ERROR_WEB_SOCKET_CODE)
 
@@ -184,7 +204,7 @@ async def stream_code(websocket: WebSocket):
             print(f"Error (variant {variantIndex}): {value}")
         elif type == "status":
             print(f"Status (variant {variantIndex}): {value}")
-        await websocket.send_json({"type": type, "value": value, "variantIndex": variantIndex})
+        await coalescer.send(type, value, variantIndex)
 
     # Nhận các tham số từ client
     params: Dict[str, str] = await websocket.receive_json()
@@ -198,6 +218,7 @@ async def stream_code(websocket: WebSocket):
     anthropic_api_key = extracted_params.anthropic_api_key
     should_generate_images = extracted_params.should_generate_images
     generation_type = extracted_params.generation_type
+    use_generation_cache = extracted_params.use_generation_cache
 
     print(f"Generating {stack} code in {input_mode} mode")
     for i in range(NUM_VARIANTS):
@@ -240,9 +261,43 @@ async def stream_code(websocket: WebSocket):
 
     #pprint_prompt(prompt_messages)
 
+    # Variants decode and convert each image of the prompt once between them
+    start_request_images()
+
+    # Start generating images as soon as their <img> tags have streamed in,
+    # so image latency overlaps with code generation
+    image_prefetcher: ImagePrefetcher | None = None
+    # Set before any image task starts so they all report into it
+    replicate_stats = start_page_stats()
+    image_settings = image_generation_settings(should_generate_images, openai_api_key)
+    if image_settings is not None:
+        image_model, image_api_key = image_settings
+        image_prefetcher = ImagePrefetcher(
+            lambda alt: generate_image(alt, image_api_key, openai_base_url, model=image_model),
+            image_cache,
+        )
+
+    def cancel_image_prefetch():
+        if image_prefetcher is not None:
+            image_prefetcher.cancel()
+
+    # Chunks streamed per variant, kept so fresh completions can be cached
+    streamed_chunks: Dict[int, List[str]] = {}
+
     async def process_chunk(content: str, variantIndex: int):
+        streamed_chunks.setdefault(variantIndex, []).append(content)
+        if image_prefetcher is not None:
+            image_prefetcher.feed(content, variantIndex)
         await send_message("chunk", content, variantIndex)
 
+    async def replay_cached_generation(cached: CachedGeneration, variantIndex: int) -> Completion:
+        # Same chunk protocol as a live generation, without waiting on the model
+        for chunk in cached.chunks:
+            if image_prefetcher is not None:
+                image_prefetcher.feed(chunk, variantIndex)
+            await send_message("chunk", chunk, variantIndex)
+        return Completion(duration=0, code=cached.code)
+
     # --------------------------
     # Code Generation
     # --------------------------
@@ -279,7 +334,19 @@ async def stream_code(websocket: WebSocket):
                 raise Exception("No OpenAI, Azure OpenAI, or Anthropic key")
 
             tasks: List[Coroutine[Any, Any, Completion]] = []
+            cache_keys = [
+                generation_key(prompt_messages, stack, input_mode, generation_type, model.value, index)
+                for index, model in enumerate(variant_models)
+            ]
+            cache_hits: set[int] = set()
             for index, model in enumerate(variant_models):
+                # Each variant is cached on its own, so one can hit while the other regenerates
+                cached = await generation_cache.get(cache_keys[index]) if use_generation_cache else None
+                if cached is not None:
+                    print(f"[GENERATION CACHE] replaying cached {model.value} completion for variant {index}")
+                    cache_hits.add(index)
+                    tasks.append(replay_cached_generation(cached, index))
+                    continue
                 if model in (Llm.GPT_4O_2024_11_20, Llm.GPT_5_MINI, Llm.O1_2024_12_17):
                     # Ưu tiên dùng Azure nếu có
                     if os.environ.get("AZURE_OPENAI_API_KEY"):
@@ -345,6 +412,7 @@ async def stream_code(websocket: WebSocket):
             # Kiểm tra lỗi
             all_generations_failed = all(isinstance(comp, BaseException) for comp in completions)
             if all_generations_failed:
+                cancel_image_prefetch()
                 await throw_error("Error generating code. Please contact support.")
                 for comp in completions:
                     if isinstance(comp, BaseException):
@@ -357,9 +425,12 @@ async def stream_code(websocket: WebSocket):
                     print("Generation failed for variant", idx, comp)
                 else:
                     print(f"{variant_models[idx].value} completion took {comp['duration']:.2f} seconds")
+                    if use_generation_cache and idx not in cache_hits:
+                        await generation_cache.put(cache_keys[idx], streamed_chunks.get(idx, []), comp["code"])
             completions = [result["code"] for result in completions if not isinstance(result, BaseException)]
         except openai.AuthenticationError as e:
             print("[GENERATE_CODE] Authentication failed", e)
+            cancel_image_prefetch()
             error_message = (
                 "Incorrect OpenAI key. Please make sure your OpenAI API key is correct, or create a new key on your OpenAI dashboard."
                 + (" Alternatively, you can purchase code generation credits on this website." if IS_PROD else "")
@@ -367,6 +438,7 @@ async def stream_code(websocket: WebSocket):
             return await throw_error(error_message)
         except openai.NotFoundError as e:
             print("[GENERATE_CODE] Model not found", e)
+            cancel_image_prefetch()
             error_message = (
                 e.message
                 + ". Please follow the instructions to obtain an OpenAI key with GPT vision access: https://github.com/abi/screenshot-to-code/blob/main/Troubleshooting.md"
@@ -375,6 +447,7 @@ async def stream_code(websocket: WebSocket):
             return await throw_error(error_message)
         except openai.RateLimitError as e:
             print("[GENERATE_CODE] Rate limit exceeded", e)
+            cancel_image_prefetch()
             error_message = (
                 "OpenAI error - 'You exceeded your current quota, please check your plan and billing details.'"
                 + (" Alternatively, you can purchase code generation credits on this website." if IS_PROD else "")
@@ -389,6 +462,10 @@ async def stream_code(websocket: WebSocket):
     ## Image Generation
     for idx, _ in enumerate(completions):
         await send_message("status", "Generating images...", idx)
+    if image_prefetcher is not None:
+        # Most images were requested while streaming; the final pass only
+        # generates the ones the scanner missed or that failed
+        image_cache = {**await image_prefetcher.results(), **image_cache}
     image_generation_tasks = [
         perform_image_generation(
             comp,
@@ -400,8 +477,11 @@ async def stream_code(websocket: WebSocket):
         for comp in completions
     ]
     updated_completions = await asyncio.gather(*image_generation_tasks)
+    if replicate_stats.predictions:
+        print("[REPLICATE] " + replicate_stats.summary())
     for idx, updated_html in enumerate(updated_completions):
         await send_message("setCode", updated_html, idx)
         await send_message("status", "Code generation complete.", idx)
 
+    print("[WS] " + coalescer.stats.summary())
     await websocket.close()
\ No newline at end of file
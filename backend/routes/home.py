@@ -1,6 +1,9 @@
 from fastapi import APIRouter
 from fastapi.responses import HTMLResponse
 
+from generation_cache.core import generation_cache
+from image_generation.cache import shared_image_cache
+
 
 router = APIRouter()
 
@@ -10,3 +13,12 @@ async def get_status():
     return HTMLResponse(
         content="<h3>Your backend is running correctly. Please open the front-end URL (default is http://localhost:5173) to use screenshot-to-code.</h3>"
     )
+
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    # Hit ratios since the process started
+    return {
+        "generations": generation_cache.get_stats(),
+        "images": shared_image_cache.get_stats(),
+    }
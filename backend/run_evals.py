@@ -4,16 +4,33 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import argparse
 import asyncio
-from evals.runner import run_image_evals
+from evals.runner import run_evals_for_models
 
 async def main():
     """
     Hàm main để chạy các bài eval hình ảnh.
-    Nó gọi hàm run_image_evals từ module evals.runner,
+    Nó gọi hàm run_evals_for_models từ module evals.runner,
     chịu trách nhiệm xử lý các file input và ghi kết quả vào thư mục outputs.
+    Các model chạy song song (giới hạn theo provider); chạy lại cùng --run-id
+    sẽ bỏ qua các output đã có.
     """
-    await run_image_evals()
+    parser = argparse.ArgumentParser(description="Run image evals")
+    parser.add_argument("--models", nargs="+", required=True, help="Model values, e.g. gpt-4o-2024-11-20")
+    parser.add_argument("--stack", default="html_tailwind")
+    parser.add_argument("--n", type=int, default=1, help="Outputs per input")
+    parser.add_argument("--run-id", default=None, help="Output folder prefix (default: today's date)")
+    parser.add_argument("--no-resume", action="store_true", help="Regenerate outputs that already exist")
+    args = parser.parse_args()
+
+    await run_evals_for_models(
+        args.models,
+        args.stack,
+        n=args.n,
+        resume=not args.no_resume,
+        run_id=args.run_id,
+    )
 
 
 # Phần dưới là một ví dụ cho eval text (hiện đang comment lại)
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from llm_clients import LlmClientRegistry, PoolLimits
+
+
+class TestLlmClientRegistry(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.registry = LlmClientRegistry(PoolLimits(idle_ttl=0.05, max_clients=2))
+
+    async def asyncTearDown(self):
+        await self.registry.close()
+
+    async def test_same_key_and_endpoint_reuses_client(self):
+        async with self.registry.openai("sk-a", None) as first:
+            pass
+        async with self.registry.openai("sk-a", None) as second:
+            pass
+        async with self.registry.openai("sk-a", "http://localhost:8080/v1") as other_endpoint:
+            pass
+        async with self.registry.openai("sk-b", None) as other_key:
+            pass
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other_endpoint)
+        self.assertIsNot(first, other_key)
+        self.assertEqual(self.registry.get_stats()["reused"], 1)
+
+    async def test_concurrent_variants_share_one_client(self):
+        async def lease():
+            async with self.registry.anthropic("sk-ant") as client:
+                await asyncio.sleep(0.01)
+                return client
+
+        clients = await asyncio.gather(lease(), lease())
+        self.assertIs(clients[0], clients[1])
+        self.assertEqual(self.registry.get_stats()["created"], 1)
+
+    async def test_idle_clients_are_evicted_but_leased_ones_are_kept(self):
+        async with self.registry.openai("sk-idle", None):
+            pass
+        async with self.registry.anthropic("sk-busy") as busy:
+            await asyncio.sleep(0.1)
+            self.assertEqual(await self.registry.evict_idle(), 1)
+            self.assertEqual(self.registry.get_stats()["open_clients"], 1)
+        async with self.registry.anthropic("sk-busy") as again:
+            self.assertIs(busy, again)
+
+    async def test_max_clients_evicts_least_recently_used(self):
+        async with self.registry.openai("sk-1", None) as first:
+            pass
+        async with self.registry.openai("sk-2", None):
+            pass
+        async with self.registry.openai("sk-3", None):
+            pass
+        async with self.registry.openai("sk-1", None) as recreated:
+            pass
+
+        self.assertIsNot(first, recreated)
+        self.assertLessEqual(self.registry.get_stats()["open_clients"], 2)
+
+    async def test_api_key_is_not_kept_in_registry_keys(self):
+        async with self.registry.openai("sk-secret-value", None):
+            pass
+        self.assertNotIn("sk-secret-value", repr(self.registry._clients.keys()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+# Picks the frames of an uploaded video that are sent to the model.
+#
+# Instead of decoding every frame and keeping every nth one, the sampler seeks
+# straight to each target timestamp, preferring a keyframe when one is close
+# by, so a one-minute recording costs about 20 frame decodes (plus the frames
+# between a target and its keyframe) instead of thousands. Frames are scaled down by ffmpeg to the resolution the model
+# actually uses, and decoding is spread over a small worker pool.
+
+import bisect
+import math
+import os
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, Literal, TypeVar
+
+import numpy as np
+from moviepy.config import get_setting  # type: ignore
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos  # type: ignore
+from PIL import Image
+
+from config import VIDEO_DECODE_WORKERS
+
+SamplingMode = Literal["uniform", "scene"]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Claude downsizes anything larger than this before looking at it, so larger
+# frames only cost upload time and JPEG encoding
+MODEL_MAX_DIMENSION = 1568
+MODEL_MAX_PIXELS = 1_150_000
+
+# In scene mode, this many candidates are decoded per frame that is kept
+SCENE_OVERSAMPLE = 3
+# Side of the colour thumbnail used to compare candidates (colour, because UI
+# states often differ in hue more than in brightness)
+SCENE_THUMBNAIL_SIZE = 32
+
+# A target timestamp moves to a keyframe at most this fraction of the
+# sampling interval away
+KEYFRAME_SNAP = 0.35
+
+_PTS_TIME = re.compile(r"pts_time:\s*(-?[0-9.]+)")
+
+_decode_pool = ThreadPoolExecutor(max_workers=VIDEO_DECODE_WORKERS, thread_name_prefix="video-decode")
+
+
+@dataclass
+class SampledFrame:
+    timestamp: float
+    image: Image.Image
+    # Change from the previous candidate, 0-255 (scene mode only)
+    scene_score: float = 0.0
+
+
+@dataclass
+class VideoInfo:
+    duration: float
+    fps: float
+    width: int
+    height: int
+
+
+def probe_video(path: str) -> VideoInfo:
+    infos = ffmpeg_parse_infos(path)
+    width, height = infos["video_size"]
+    return VideoInfo(
+        duration=float(infos["video_duration"] or infos["duration"] or 0.0),
+        fps=float(infos["video_fps"] or 0.0),
+        width=width,
+        height=height,
+    )
+
+
+def target_size(
+    width: int,
+    height: int,
+    max_dimension: int = MODEL_MAX_DIMENSION,
+    max_pixels: int = MODEL_MAX_PIXELS,
+) -> tuple[int, int]:
+    scale = min(1.0, max_dimension / max(width, height), math.sqrt(max_pixels / (width * height)))
+    # Even dimensions keep every ffmpeg pixel format happy
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def uniform_timestamps(info: VideoInfo, count: int) -> list[float]:
+    if count <= 0 or info.duration <= 0:
+        return [0.0]
+    # Never seek past the last frame
+    last = max(0.0, info.duration - (1.0 / info.fps if info.fps else 0.0))
+    if info.fps:
+        count = min(count, max(1, int(info.duration * info.fps)))
+    step = info.duration / count
+    return [min(i * step, last) for i in range(count)]
+
+
+def probe_keyframes(path: str) -> list[float]:
+    """Timestamps of the video's keyframes
+
+    Only keyframes are decoded (`-skip_frame nokey`), so this takes a fraction
+    of a second even for long recordings.
+    """
+    cmd = [
+        get_setting("FFMPEG_BINARY"),
+        "-hide_banner",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        path,
+        "-map",
+        "0:v:0",
+        "-vf",
+        "showinfo",
+        "-f",
+        "null",
+        "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True, stdin=subprocess.DEVNULL)
+    output = result.stderr.decode("utf-8", errors="replace")
+    return sorted({float(match) for match in _PTS_TIME.findall(output)})
+
+
+def plan_timestamps(targets: list[float], keyframes: list[float], spacing: float) -> list[float]:
+    """Moves each target onto a nearby keyframe where that barely changes the sampling
+
+    Seeking to a keyframe decodes one frame; seeking anywhere else decodes
+    every frame since the previous keyframe.
+    """
+    if not keyframes:
+        return targets
+    tolerance = spacing * KEYFRAME_SNAP
+    used: set[float] = set()
+    planned: list[float] = []
+    for target in targets:
+        i = bisect.bisect_left(keyframes, target)
+        nearby = [k for k in keyframes[max(0, i - 1) : i + 1] if abs(k - target) <= tolerance and k not in used]
+        if nearby:
+            target = min(nearby, key=lambda k: abs(k - target))
+            used.add(target)
+        planned.append(target)
+    return planned
+
+
+def _decode_at(path: str, timestamp: float, size: tuple[int, int]) -> SampledFrame:
+    width, height = size
+    # Input seeking jumps to the keyframe before `timestamp` and decodes only
+    # from there; -frames:v 1 stops ffmpeg as soon as the frame is out
+    cmd = [
+        get_setting("FFMPEG_BINARY"),
+        "-loglevel",
+        "error",
+        "-ss",
+        f"{timestamp:.6f}",
+        "-i",
+        path,
+        "-frames:v",
+        "1",
+        "-vf",
+        f"scale={width}:{height}:flags=area",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True, stdin=subprocess.DEVNULL)
+    expected = width * height * 3
+    if len(result.stdout) != expected:
+        raise IOError(
+            f"Could not decode frame at {timestamp:.2f}s: "
+            f"{result.stderr.decode('utf-8', errors='replace').strip()}"
+        )
+    array = np.frombuffer(result.stdout, dtype=np.uint8).reshape(height, width, 3)
+    return SampledFrame(timestamp, Image.fromarray(array))
+
+
+def decode_frames(path: str, timestamps: list[float], size: tuple[int, int]) -> list[SampledFrame]:
+    """Decodes the frames at `timestamps` on the worker pool"""
+    return list(_decode_pool.map(lambda timestamp: _decode_at(path, timestamp, size), timestamps))
+
+
+def map_in_pool(fn: Callable[[T], R], items: Iterable[T]) -> list[R]:
+    """Runs `fn` over `items` on the decode pool, e.g. to JPEG-encode sampled frames"""
+    return list(_decode_pool.map(fn, items))
+
+
+def _thumbnail(image: Image.Image) -> np.ndarray:
+    small = image.convert("RGB").resize((SCENE_THUMBNAIL_SIZE, SCENE_THUMBNAIL_SIZE), Image.Resampling.BILINEAR)
+    return np.asarray(small, dtype=np.float32)
+
+
+def select_scene_changes(candidates: list[SampledFrame], count: int) -> list[SampledFrame]:
+    """Keeps the `count` candidates that differ most from the one before them
+
+    The first candidate is always kept, so the model sees where the recording
+    starts. The result is in time order.
+    """
+    if len(candidates) <= count:
+        return candidates
+
+    thumbnails = [_thumbnail(frame.image) for frame in candidates]
+    for i in range(1, len(candidates)):
+        candidates[i].scene_score = float(np.mean(np.abs(thumbnails[i] - thumbnails[i - 1])))
+    candidates[0].scene_score = math.inf
+
+    ranked = sorted(range(len(candidates)), key=lambda i: candidates[i].scene_score, reverse=True)
+    return [candidates[i] for i in sorted(ranked[:count])]
+
+
+def sample_frames(
+    path: str,
+    count: int,
+    mode: SamplingMode = "uniform",
+    max_dimension: int = MODEL_MAX_DIMENSION,
+) -> list[SampledFrame]:
+    info = probe_video(path)
+    size = target_size(info.width, info.height, max_dimension)
+    keyframes = probe_keyframes(path)
+
+    num_targets = count * SCENE_OVERSAMPLE if mode == "scene" else count
+    targets = uniform_timestamps(info, num_targets)
+    spacing = info.duration / len(targets) if info.duration > 0 else 0.0
+    frames = decode_frames(path, plan_timestamps(targets, keyframes, spacing), size)
+
+    if mode == "scene":
+        return select_scene_changes(frames, count)
+    return frames
+
+
+def sample_frames_from_bytes(
+    video_bytes: bytes,
+    suffix: str | None,
+    count: int,
+    mode: SamplingMode = "uniform",
+) -> list[SampledFrame]:
+    # ffmpeg needs a seekable file to jump between timestamps
+    fd, path = tempfile.mkstemp(suffix=suffix or "")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(video_bytes)
+        return sample_frames(path, count, mode)
+    finally:
+        os.remove(path)
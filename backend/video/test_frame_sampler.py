@@ -0,0 +1,109 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from moviepy.config import get_setting  # type: ignore
+
+from video.frame_sampler import (
+    VideoInfo,
+    plan_timestamps,
+    probe_keyframes,
+    sample_frames,
+    target_size,
+    uniform_timestamps,
+)
+
+
+def make_video(path: str, source: str, duration: int, gop: int, filters: str = "null") -> None:
+    subprocess.run(
+        [
+            get_setting("FFMPEG_BINARY"),
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"{source}:duration={duration}",
+            "-vf",
+            filters,
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            str(gop),
+            "-pix_fmt",
+            "yuv420p",
+            path,
+        ],
+        check=True,
+    )
+
+
+class TestFrameSampler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, "recording.mp4")
+        make_video(cls.video, "testsrc2=size=1920x1080:rate=10", duration=10, gop=10)
+
+        # Red until 1s, green until 2s, blue until 8s, then white
+        cls.scenes = os.path.join(cls.tmp.name, "scenes.mp4")
+        make_video(
+            cls.scenes,
+            "color=c=black:size=320x240:rate=10",
+            duration=10,
+            gop=100,
+            filters="geq="
+            "r='if(lt(T,1),255,if(lt(T,2),0,if(lt(T,8),0,255)))':"
+            "g='if(lt(T,1),0,if(lt(T,2),255,if(lt(T,8),0,255)))':"
+            "b='if(lt(T,2),0,255)'",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_target_size_respects_model_limits(self):
+        width, height = target_size(3840, 2160)
+        self.assertLessEqual(max(width, height), 1568)
+        self.assertLessEqual(width * height, 1_150_000)
+        self.assertEqual(target_size(800, 600), (800, 600))
+
+    def test_uniform_timestamps_stay_inside_the_video(self):
+        timestamps = uniform_timestamps(VideoInfo(duration=2.0, fps=10, width=10, height=10), 20)
+        self.assertEqual(len(timestamps), 20)
+        self.assertLess(max(timestamps), 2.0)
+        # Never more samples than frames
+        self.assertEqual(len(uniform_timestamps(VideoInfo(1.0, 5, 10, 10), 20)), 5)
+
+    def test_targets_snap_to_nearby_keyframes_once(self):
+        planned = plan_timestamps([0.0, 1.0, 2.0, 3.0], keyframes=[0.0, 1.1, 8.0], spacing=1.0)
+        self.assertEqual(planned, [0.0, 1.1, 2.0, 3.0])
+
+    def test_keyframes_are_probed(self):
+        self.assertEqual(probe_keyframes(self.video)[:3], [0.0, 1.0, 2.0])
+
+    def test_uniform_sampling_downscales_frames(self):
+        frames = sample_frames(self.video, 8)
+        self.assertEqual(len(frames), 8)
+        self.assertEqual(frames[0].image.size, target_size(1920, 1080))
+        self.assertEqual([f.timestamp for f in frames], sorted(f.timestamp for f in frames))
+
+    def test_scene_sampling_finds_short_scenes(self):
+        def colours(frames):
+            return {frame.image.resize((1, 1)).getpixel((0, 0)) for frame in frames}
+
+        uniform = sample_frames(self.scenes, 4, mode="uniform")
+        scene = sample_frames(self.scenes, 4, mode="scene")
+
+        self.assertEqual(len(scene), 4)
+        self.assertEqual(len(colours(scene)), 4)
+        # Evenly spaced frames land mostly in the long blue scene
+        self.assertLess(len(colours(uniform)), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
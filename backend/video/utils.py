@@ -1,27 +1,37 @@
 # Extract HTML content from the completion string
+import asyncio
 import base64
 import io
 import mimetypes
 import os
 import tempfile
+import time
 import uuid
 from typing import Any, Union, cast
-from moviepy.editor import VideoFileClip  # type: ignore
 from PIL import Image
-import math
+
+from config import IS_DEBUG_ENABLED, VIDEO_FRAME_SAMPLING
+from video.frame_sampler import SamplingMode, map_in_pool, sample_frames_from_bytes
 
 
-DEBUG = True
 TARGET_NUM_SCREENSHOTS = (
     20  # Should be max that Claude supports (20) - reduce to save tokens on testing
 )
 
 
 async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
-    images = split_video_into_screenshots(video_data_url)
+    # Decoding and encoding block on ffmpeg and Pillow; keep them off the event loop
+    start_time = time.perf_counter()
+    images, encoded_images = await asyncio.to_thread(
+        _split_and_encode, video_data_url
+    )
+    print(
+        f"[VIDEO] sampled {len(images)} frames ({VIDEO_FRAME_SAMPLING}) "
+        f"in {time.perf_counter() - start_time:.2f}s"
+    )
 
     # Save images to tmp if we're debugging
-    if DEBUG:
+    if IS_DEBUG_ENABLED:
         save_images_to_tmp(images)
 
     # Validate number of images
@@ -32,14 +42,7 @@ async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
 
     # Convert images to the message format for Claude
     content_messages: list[dict[str, Union[dict[str, str], str]]] = []
-    for image in images:
-
-        # Convert Image to buffer
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-
-        # Encode bytes as base64
-        base64_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    for base64_data in encoded_images:
         media_type = "image/jpeg"
 
         content_messages.append(
@@ -61,10 +64,22 @@ async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
     ]
 
 
-# Returns a list of images/frame (RGB format)
-def split_video_into_screenshots(video_data_url: str) -> list[Image.Image]:
-    target_num_screenshots = TARGET_NUM_SCREENSHOTS
+def _encode_jpeg(image: Image.Image) -> str:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def _split_and_encode(video_data_url: str) -> tuple[list[Image.Image], list[str]]:
+    images = split_video_into_screenshots(video_data_url)
+    return images, map_in_pool(_encode_jpeg, images)
+
 
+# Returns a list of images/frame (RGB format), already scaled down to the
+# resolution the model uses
+def split_video_into_screenshots(
+    video_data_url: str, mode: SamplingMode | None = None
+) -> list[Image.Image]:
     # Decode the base64 URL to get the video bytes
     video_encoded_data = video_data_url.split(",")[1]
     video_bytes = base64.b64decode(video_encoded_data)
@@ -72,32 +87,13 @@ def split_video_into_screenshots(video_data_url: str) -> list[Image.Image]:
     mime_type = video_data_url.split(";")[0].split(":")[1]
     suffix = mimetypes.guess_extension(mime_type)
 
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=True) as temp_video_file:
-        print(temp_video_file.name)
-        temp_video_file.write(video_bytes)
-        temp_video_file.flush()
-        clip = VideoFileClip(temp_video_file.name)
-        images: list[Image.Image] = []
-        total_frames = cast(int, clip.reader.nframes)  # type: ignore
-
-        # Calculate frame skip interval by dividing total frames by the target number of screenshots
-        # Ensuring a minimum skip of 1 frame
-        frame_skip = max(1, math.ceil(total_frames / target_num_screenshots))
-
-        # Iterate over each frame in the clip
-        for i, frame in enumerate(clip.iter_frames()):
-            # Save every nth frame
-            if i % frame_skip == 0:
-                frame_image = Image.fromarray(frame)  # type: ignore
-                images.append(frame_image)
-                # Ensure that we don't capture more than the desired number of frames
-                if len(images) >= target_num_screenshots:
-                    break
-
-        # Close the video file to release resources
-        clip.close()
-
-        return images
+    frames = sample_frames_from_bytes(
+        video_bytes,
+        suffix,
+        TARGET_NUM_SCREENSHOTS,
+        mode or cast(SamplingMode, VIDEO_FRAME_SAMPLING),
+    )
+    return [frame.image for frame in frames]
 
 
 # Save a list of PIL images to a random temporary directory
@@ -0,0 +1,121 @@
+# Batches streamed code chunks into fewer websocket frames.
+#
+# Providers stream a chunk per token or so, for each variant at once. Sending
+# each as its own JSON frame costs an encode and a socket write per token; here
+# chunks are buffered per variant and flushed together after a short window
+# (or once enough text has built up). The frames keep the same
+# {"type", "value", "variantIndex"} shape: a flushed "chunk" frame just carries
+# the concatenation of the chunks it replaces, which the client appends as usual.
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Literal
+
+MessageType = Literal["chunk", "status", "setCode", "error"]
+
+
+def encode_message(type: MessageType, value: str, variantIndex: int) -> str:
+    # Same encoding as WebSocket.send_json
+    return json.dumps(
+        {"type": type, "value": value, "variantIndex": variantIndex},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+@dataclass
+class CoalescerStats:
+    chunks: int = 0
+    frames: int = 0
+    chunk_frames: int = 0
+
+    def summary(self) -> str:
+        return f"{self.chunks} chunks sent in {self.chunk_frames} frames ({self.frames} frames in total)"
+
+
+class ChunkCoalescer:
+    """Sends messages through `send_text`, batching "chunk" messages per variant
+
+    A variant's buffered chunks are flushed `flush_interval` seconds after the
+    first of them arrived, or as soon as they reach `flush_chars` characters.
+    Any other message flushes its variant's chunks first, so the client sees
+    everything in order. With `flush_interval` 0 every chunk is sent at once.
+    """
+
+    def __init__(
+        self,
+        send_text: Callable[[str], Awaitable[None]],
+        flush_interval: float,
+        flush_chars: int,
+    ):
+        self.send_text = send_text
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.stats = CoalescerStats()
+        self._buffers: Dict[int, List[str]] = {}
+        self._buffered_chars: Dict[int, int] = {}
+        self._timers: Dict[int, asyncio.Task[None]] = {}
+        # Timer flushes and direct sends come from different tasks
+        self._send_lock = asyncio.Lock()
+        self._error: BaseException | None = None
+
+    async def chunk(self, value: str, variantIndex: int) -> None:
+        self._raise_pending_error()
+        self.stats.chunks += 1
+        if self.flush_interval <= 0:
+            await self._send(encode_message("chunk", value, variantIndex), is_chunk=True)
+            return
+
+        self._buffers.setdefault(variantIndex, []).append(value)
+        self._buffered_chars[variantIndex] = self._buffered_chars.get(variantIndex, 0) + len(value)
+        if self._buffered_chars[variantIndex] >= self.flush_chars:
+            await self.flush(variantIndex)
+        elif variantIndex not in self._timers:
+            self._timers[variantIndex] = asyncio.create_task(self._flush_later(variantIndex))
+
+    async def send(self, type: MessageType, value: str, variantIndex: int) -> None:
+        if type == "chunk":
+            return await self.chunk(value, variantIndex)
+        self._raise_pending_error()
+        await self.flush(variantIndex)
+        await self._send(encode_message(type, value, variantIndex), is_chunk=False)
+
+    async def flush(self, variantIndex: int | None = None) -> None:
+        """Sends the buffered chunks of one variant, or of all of them"""
+        variants = list(self._buffers) if variantIndex is None else [variantIndex]
+        for index in variants:
+            timer = self._timers.pop(index, None)
+            if timer is not None and timer is not asyncio.current_task():
+                timer.cancel()
+            buffered = self._buffers.pop(index, None)
+            self._buffered_chars.pop(index, None)
+            if buffered:
+                await self._send(encode_message("chunk", "".join(buffered), index), is_chunk=True)
+
+    async def close(self) -> None:
+        """Flushes whatever is left; a no-op once the socket is gone"""
+        try:
+            await self.flush()
+        except Exception:
+            pass
+
+    async def _flush_later(self, variantIndex: int) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush(variantIndex)
+        except Exception as e:
+            # Surfaces on the next send, in the task that owns the stream
+            self._error = e
+
+    async def _send(self, frame: str, is_chunk: bool) -> None:
+        async with self._send_lock:
+            await self.send_text(frame)
+        self.stats.frames += 1
+        if is_chunk:
+            self.stats.chunk_frames += 1
+
+    def _raise_pending_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import unittest
+
+from ws.coalescer import ChunkCoalescer
+
+
+class TestChunkCoalescer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.frames: list[dict] = []
+
+        async def send_text(text: str):
+            self.frames.append(json.loads(text))
+
+        self.send_text = send_text
+
+    def received(self, variantIndex: int) -> str:
+        return "".join(
+            f["value"] for f in self.frames if f["type"] == "chunk" and f["variantIndex"] == variantIndex
+        )
+
+    async def test_batches_chunks_per_variant_within_the_window(self):
+        coalescer = ChunkCoalescer(self.send_text, flush_interval=0.02, flush_chars=10_000)
+
+        for i in range(50):
+            await coalescer.chunk(f"a{i} ", 0)
+            await coalescer.chunk(f"b{i} ", 1)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(len(self.frames), 2)
+        self.assertEqual(self.received(0), "".join(f"a{i} " for i in range(50)))
+        self.assertEqual(self.received(1), "".join(f"b{i} " for i in range(50)))
+        self.assertEqual(coalescer.stats.chunks, 100)
+        self.assertEqual(coalescer.stats.chunk_frames, 2)
+
+    async def test_flushes_when_buffer_is_full(self):
+        coalescer = ChunkCoalescer(self.send_text, flush_interval=10, flush_chars=10)
+
+        for _ in range(5):
+            await coalescer.chunk("abcd", 0)
+
+        self.assertEqual([f["value"] for f in self.frames], ["abcdabcdabcd"])
+        await coalescer.close()
+        self.assertEqual(self.received(0), "abcd" * 5)
+
+    async def test_other_messages_flush_their_variant_first(self):
+        coalescer = ChunkCoalescer(self.send_text, flush_interval=10, flush_chars=10_000)
+
+        await coalescer.send("chunk", "<html>", 0)
+        await coalescer.send("chunk", "<body>", 1)
+        await coalescer.send("setCode", "<html></html>", 0)
+
+        self.assertEqual(
+            self.frames,
+            [
+                {"type": "chunk", "value": "<html>", "variantIndex": 0},
+                {"type": "setCode", "value": "<html></html>", "variantIndex": 0},
+            ],
+        )
+        await coalescer.close()
+        self.assertEqual(self.frames[-1], {"type": "chunk", "value": "<body>", "variantIndex": 1})
+
+    async def test_zero_interval_sends_every_chunk(self):
+        coalescer = ChunkCoalescer(self.send_text, flush_interval=0, flush_chars=10_000)
+
+        await coalescer.chunk("a", 0)
+        await coalescer.chunk("b", 0)
+
+        self.assertEqual([f["value"] for f in self.frames], ["a", "b"])
+
+    async def test_send_error_from_timer_surfaces_on_next_call(self):
+        async def broken_send(text: str):
+            raise RuntimeError("socket closed")
+
+        coalescer = ChunkCoalescer(broken_send, flush_interval=0.01, flush_chars=10_000)
+        await coalescer.chunk("a", 0)
+        await asyncio.sleep(0.03)
+
+        with self.assertRaises(RuntimeError):
+            await coalescer.chunk("b", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -254,10 +254,30 @@ class GenerationPipeline:
             # Track request
             self.model_manager.track_request(request)
             
-            # Stream generation
+            # Stream generation, timing the first token and the output rate
+            # for latency-aware routing
+            start_time = time.time()
+            ttft_ms: Optional[float] = None
+            output_chars = 0
+            failed = False
             async for chunk in provider.generate_code_stream(request):
+                if chunk.get("type") == "content":
+                    if ttft_ms is None:
+                        ttft_ms = (time.time() - start_time) * 1000
+                    output_chars += len(chunk.get("content", ""))
+                elif chunk.get("type") == "error" or chunk.get("error"):
+                    failed = True
                 yield chunk
             
+            if ttft_ms is not None and not failed:
+                self.model_manager.track_stream_timing(
+                    model_id,
+                    ttft_ms=ttft_ms,
+                    # About 4 characters per token
+                    output_tokens=max(1, output_chars // 4),
+                    duration_ms=(time.time() - start_time) * 1000
+                )
+            
             # Release model
             await self.model_manager.release_model(model_id)
         
@@ -3,6 +3,8 @@ AI Model Manager
 Central management system for AI models with registry, validation, and load balancing
 """
 import asyncio
+import math
+import time
 from typing import Dict, List, Optional, Any, Set, Tuple
 from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass, field
@@ -58,6 +60,64 @@ class ModelStatus:
         )
 
 
+@dataclass
+class StreamingLatencyStats:
+    """Exponentially decayed latency profile of a model
+    
+    Each sample is blended in with weight 1 - exp(-elapsed / decay_seconds),
+    where elapsed is the time since the previous sample, so estimates follow
+    the model's current behaviour and old samples fade out. Every sample
+    carries at least `min_weight`, so bursts of requests still move them.
+    """
+    ttft_ms: float = 0.0
+    inter_token_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    samples: int = 0
+    last_update: Optional[float] = None
+    
+    def _weight(self, now: float, decay_seconds: float, min_weight: float) -> float:
+        if self.last_update is None:
+            return 1.0
+        elapsed = max(0.0, now - self.last_update)
+        return max(min_weight, 1.0 - math.exp(-elapsed / decay_seconds))
+    
+    def update(self,
+               duration_ms: float,
+               output_tokens: int,
+               ttft_ms: Optional[float] = None,
+               now: Optional[float] = None,
+               decay_seconds: float = 60.0,
+               min_weight: float = 0.1):
+        """Blend in one request; without a measured TTFT (non-streaming
+        responses) only the generation speed is updated"""
+        now = time.monotonic() if now is None else now
+        weight = self._weight(now, decay_seconds, min_weight)
+        
+        if ttft_ms is not None:
+            self.ttft_ms += weight * (ttft_ms - self.ttft_ms)
+            known_ttft = ttft_ms
+        else:
+            known_ttft = min(self.ttft_ms, duration_ms) if self.samples else 0.0
+        
+        generation_ms = duration_ms - known_ttft
+        if output_tokens > 1 and generation_ms > 0:
+            inter_token_ms = generation_ms / (output_tokens - 1)
+            tokens_per_second = output_tokens * 1000.0 / generation_ms
+            if self.tokens_per_second == 0.0:
+                self.inter_token_ms = inter_token_ms
+                self.tokens_per_second = tokens_per_second
+            else:
+                self.inter_token_ms += weight * (inter_token_ms - self.inter_token_ms)
+                self.tokens_per_second += weight * (tokens_per_second - self.tokens_per_second)
+        
+        self.samples += 1
+        self.last_update = now
+    
+    def predict_ms(self, output_tokens: int) -> float:
+        """Expected time to generate `output_tokens` on an idle model"""
+        return self.ttft_ms + max(0, output_tokens - 1) * self.inter_token_ms
+
+
 class ModelRegistry:
     """Registry for managing AI models"""
     
@@ -389,6 +449,7 @@ class ModelPerformanceTracker:
         self._metrics: Dict[str, ModelPerformanceMetrics] = {}
         self._response_times: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
         self._quality_scores: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
+        self._latency: Dict[str, StreamingLatencyStats] = defaultdict(StreamingLatencyStats)
     
     def track_request(self, request: ModelRequest):
         """Track a new request"""
@@ -423,6 +484,28 @@ class ModelPerformanceTracker:
             metrics.p99_response_time_ms = response_times[int(n * 0.99)]
         
         metrics.window_end = datetime.now(timezone.utc)
+        
+        if response.success:
+            self._latency[response.model_id].update(
+                duration_ms=duration_ms,
+                output_tokens=response.metrics.output_tokens
+            )
+    
+    def track_stream_timing(self,
+                            model_id: str,
+                            ttft_ms: float,
+                            output_tokens: int,
+                            duration_ms: float):
+        """Record time to first token and generation speed of a streamed response"""
+        self._latency[model_id].update(
+            duration_ms=duration_ms,
+            output_tokens=output_tokens,
+            ttft_ms=ttft_ms
+        )
+    
+    def get_latency_stats(self, model_id: str) -> Optional[StreamingLatencyStats]:
+        """Decayed TTFT / inter-token latency / tokens per second for a model"""
+        return self._latency.get(model_id)
     
     def get_metrics(self, model_id: str) -> Optional[ModelPerformanceMetrics]:
         """Get performance metrics for a model"""
@@ -441,6 +524,7 @@ class ModelPerformanceTracker:
             )
             self._response_times[model_id].clear()
             self._quality_scores[model_id].clear()
+            self._latency.pop(model_id, None)
     
     def get_model_ranking(self) -> List[Tuple[str, float]]:
         """Get models ranked by performance score"""
@@ -463,17 +547,27 @@ class ModelLoadBalancer:
     
     def __init__(self, registry: ModelRegistry, 
                  performance_tracker: ModelPerformanceTracker,
-                 logger: StructuredLogger):
+                 logger: StructuredLogger,
+                 exploration_rate: float = 0.1,
+                 min_latency_samples: int = 3,
+                 default_output_tokens: int = 2000):
         self.registry = registry
         self.performance_tracker = performance_tracker  
         self.logger = logger
         self._rate_limiters: Dict[str, Dict[str, Any]] = {}
+        
+        # Latency routing: share of requests sent to models with too few
+        # samples to predict, and the output size assumed when unknown
+        self.exploration_rate = exploration_rate
+        self.min_latency_samples = min_latency_samples
+        self.default_output_tokens = default_output_tokens
     
     async def select_model(self, 
                           required_capabilities: Set[AIModelCapability],
                           model_type: Optional[AIModelType] = None,
                           preferred_provider: Optional[ModelProvider] = None,
-                          strategy: str = "performance") -> Optional[str]:
+                          strategy: str = "latency",
+                          expected_output_tokens: Optional[int] = None) -> Optional[str]:
         """Select the best model for a request"""
         
         # Find candidate models
@@ -499,6 +593,8 @@ class ModelLoadBalancer:
             return self._select_least_loaded(candidates)
         elif strategy == "performance":
             return self._select_best_performance(candidates)
+        elif strategy == "latency":
+            return self._select_lowest_latency(candidates, expected_output_tokens)
         elif strategy == "random":
             return random.choice(candidates).model_id
         else:
@@ -552,6 +648,57 @@ class ModelLoadBalancer:
         # Fallback to first candidate
         return candidates[0].model_id
     
+    def predict_latency_ms(self, model_id: str, expected_output_tokens: Optional[int] = None) -> Optional[float]:
+        """Predicted completion time for a request on `model_id` at its current load
+        
+        TTFT plus expected output tokens at the decayed inter-token latency,
+        scaled by the in-flight requests sharing the model's capacity. None
+        until the model has min_latency_samples samples.
+        """
+        stats = self.performance_tracker.get_latency_stats(model_id)
+        if stats is None or stats.samples < self.min_latency_samples:
+            return None
+        
+        output_tokens = expected_output_tokens or self.default_output_tokens
+        predicted_ms = stats.predict_ms(output_tokens)
+        
+        status = self.registry.get_model_status(model_id)
+        if status:
+            predicted_ms *= 1.0 + status.current_load / max(1, status.max_concurrent_requests)
+        return predicted_ms
+    
+    def _select_lowest_latency(self,
+                               candidates: List[ModelConfiguration],
+                               expected_output_tokens: Optional[int] = None) -> str:
+        """Select the model with the lowest predicted completion time
+        
+        Models without enough samples to predict get `exploration_rate` of the
+        traffic, so new or recovered models are measured.
+        """
+        usable = []
+        for candidate in candidates:
+            status = self.registry.get_model_status(candidate.model_id)
+            if status and not status.is_overloaded and status.is_healthy:
+                usable.append(candidate)
+        if not usable:
+            return candidates[0].model_id
+        
+        predictions = {
+            candidate.model_id: self.predict_latency_ms(candidate.model_id, expected_output_tokens)
+            for candidate in usable
+        }
+        measured = {model_id: ms for model_id, ms in predictions.items() if ms is not None}
+        unmeasured = [model_id for model_id, ms in predictions.items() if ms is None]
+        
+        # Nothing measured yet: keep the static ranking
+        if not measured:
+            return self._select_best_performance(usable)
+        
+        if unmeasured and random.random() < self.exploration_rate:
+            return random.choice(unmeasured)
+        
+        return min(measured, key=measured.get)
+    
     async def check_rate_limit(self, model_id: str, user_id: str) -> bool:
         """Check if request is within rate limits"""
         config = self.registry.get_model(model_id)
@@ -710,10 +857,12 @@ class AIModelManager:
                                    required_capabilities: Set[AIModelCapability],
                                    model_type: Optional[AIModelType] = None,
                                    preferred_provider: Optional[ModelProvider] = None,
-                                   user_id: str = "anonymous") -> Optional[str]:
+                                   user_id: str = "anonymous",
+                                   expected_output_tokens: Optional[int] = None) -> Optional[str]:
         """Get the best model for a request"""
         model_id = await self.load_balancer.select_model(
-            required_capabilities, model_type, preferred_provider
+            required_capabilities, model_type, preferred_provider,
+            expected_output_tokens=expected_output_tokens
         )
         
         if not model_id:
@@ -765,6 +914,10 @@ class AIModelManager:
         else:
             self.registry.record_error(response.model_id, response.error_message or "Unknown error")
     
+    def track_stream_timing(self, model_id: str, ttft_ms: float, output_tokens: int, duration_ms: float):
+        """Track time to first token and throughput of a streamed response"""
+        self.performance_tracker.track_stream_timing(model_id, ttft_ms, output_tokens, duration_ms)
+    
     def get_model_metrics(self, model_id: str) -> Optional[ModelPerformanceMetrics]:
         """Get performance metrics for a model"""
         return self.performance_tracker.get_metrics(model_id)
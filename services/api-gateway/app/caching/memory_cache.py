@@ -0,0 +1,219 @@
+"""
+L1 Memory Cache Engine
+O(1) LRU ordering with a lazy expiry heap, byte-size budget and per-namespace limits
+"""
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class MemoryCacheEngine(MutableMapping):
+    """In-process LRU store backing the L1 tier of ``AdvancedRedisCache``
+
+    Entries are ``CacheEntry``-like objects exposing ``created_at``, ``ttl``,
+    ``size_bytes`` and an optional ``namespace``. Recency is tracked with an
+    ``OrderedDict`` (global and per namespace), so touch, insert and evict are
+    O(1). Expiry uses a min-heap with lazy deletion: stale heap items are
+    skipped when popped and the heap is compacted once it grows past twice
+    the live entry count.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        max_items: Optional[int] = None,
+        namespace_max_bytes: Optional[Dict[str, int]] = None,
+        on_evict: Optional[Callable[[str, Any, str], None]] = None
+    ):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.namespace_max_bytes: Dict[str, int] = dict(namespace_max_bytes or {})
+        self.on_evict = on_evict
+
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._namespace_order: Dict[str, "OrderedDict[str, None]"] = {}
+        self._namespace_bytes: Dict[str, int] = {}
+        self._expiry_heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    # Mapping protocol (no recency side effects)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._entries[key]
+
+    def __setitem__(self, key: str, entry: Any) -> None:
+        self.put(key, entry)
+
+    def __delitem__(self, key: str) -> None:
+        if self.discard(key) is None:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._namespace_order.clear()
+        self._namespace_bytes.clear()
+        self._expiry_heap.clear()
+        self.total_bytes = 0
+
+    # Cache operations
+
+    @staticmethod
+    def _expires_at(entry: Any) -> float:
+        return entry.created_at + entry.ttl
+
+    def get_entry(self, key: str, now: Optional[float] = None) -> Optional[Any]:
+        """Return the live entry for ``key`` and mark it most recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        now = time.time() if now is None else now
+        if now > self._expires_at(entry):
+            self._remove(key)
+            self.expirations += 1
+            self._notify_evict(key, entry, "expired")
+            return None
+
+        self.touch(key)
+        return entry
+
+    def touch(self, key: str) -> None:
+        """Mark ``key`` as most recently used"""
+        if key not in self._entries:
+            return
+        self._entries.move_to_end(key)
+        namespace = getattr(self._entries[key], "namespace", None)
+        if namespace is not None:
+            self._namespace_order[namespace].move_to_end(key)
+
+    def put(self, key: str, entry: Any, now: Optional[float] = None) -> bool:
+        """Insert or replace ``key``; returns False if the entry can never fit"""
+        namespace = getattr(entry, "namespace", None)
+        size = entry.size_bytes
+
+        if key in self._entries:
+            self._remove(key)
+
+        namespace_limit = self.namespace_max_bytes.get(namespace) if namespace is not None else None
+        if size > self.max_bytes or (namespace_limit is not None and size > namespace_limit):
+            self.rejections += 1
+            return False
+
+        self.evict_expired(now)
+
+        self._entries[key] = entry
+        self.total_bytes += size
+        if namespace is not None:
+            self._namespace_order.setdefault(namespace, OrderedDict())[key] = None
+            self._namespace_bytes[namespace] = self._namespace_bytes.get(namespace, 0) + size
+
+        heapq.heappush(self._expiry_heap, (self._expires_at(entry), next(self._sequence), key))
+        if len(self._expiry_heap) > 2 * len(self._entries) + 64:
+            self._compact_heap()
+
+        self._enforce_limits(namespace, namespace_limit)
+        return True
+
+    def discard(self, key: str) -> Optional[Any]:
+        """Remove ``key`` without counting it as an eviction"""
+        if key not in self._entries:
+            return None
+        return self._remove(key)
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Drop every expired entry; cost is O(k log n) for k expired entries"""
+        now = time.time() if now is None else now
+        heap = self._expiry_heap
+        expired = 0
+
+        while heap and heap[0][0] < now:
+            expires_at, _, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # Skip heap items left behind by replaced or removed entries
+            if entry is None or self._expires_at(entry) != expires_at:
+                continue
+            self._remove(key)
+            self.expirations += 1
+            expired += 1
+            self._notify_evict(key, entry, "expired")
+
+        return expired
+
+    def namespace_usage(self) -> Dict[str, int]:
+        """Bytes currently held per namespace"""
+        return dict(self._namespace_bytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Engine-level statistics"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_items": self.max_items,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejections": self.rejections,
+            "namespaces": self.namespace_usage()
+        }
+
+    # Internals
+
+    def _enforce_limits(self, namespace: Optional[str], namespace_limit: Optional[int]) -> None:
+        if namespace_limit is not None:
+            order = self._namespace_order[namespace]
+            while self._namespace_bytes[namespace] > namespace_limit and len(order) > 1:
+                self._evict(next(iter(order)))
+
+        while len(self._entries) > 1 and (
+            self.total_bytes > self.max_bytes
+            or (self.max_items is not None and len(self._entries) > self.max_items)
+        ):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        entry = self._remove(key)
+        self.evictions += 1
+        self._notify_evict(key, entry, "capacity")
+
+    def _remove(self, key: str) -> Any:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size_bytes
+
+        namespace = getattr(entry, "namespace", None)
+        if namespace is not None:
+            order = self._namespace_order[namespace]
+            del order[key]
+            self._namespace_bytes[namespace] -= entry.size_bytes
+            if not order:
+                del self._namespace_order[namespace]
+                del self._namespace_bytes[namespace]
+
+        return entry
+
+    def _compact_heap(self) -> None:
+        self._expiry_heap = [
+            (self._expires_at(entry), next(self._sequence), key)
+            for key, entry in self._entries.items()
+        ]
+        heapq.heapify(self._expiry_heap)
+
+    def _notify_evict(self, key: str, entry: Any, reason: str) -> None:
+        if self.on_evict:
+            self.on_evict(key, entry, reason)
@@ -18,6 +18,7 @@ from redis.asyncio import Redis, ConnectionPool
 from redis.exceptions import RedisError, ConnectionError, TimeoutError
 
 from app.core.config import Settings
+from app.caching.memory_cache import MemoryCacheEngine
 from shared.monitoring.structured_logger import StructuredLogger
 
 T = TypeVar('T')
@@ -53,6 +54,8 @@ class CacheConfig:
     enable_metrics: bool = True
     key_prefix: str = "apigw"
     cluster_mode: bool = False
+    max_memory_items: Optional[int] = None  # Optional item cap on top of the byte budget
+    namespace_memory_limits: Dict[str, int] = field(default_factory=dict)  # Bytes per namespace
     
 @dataclass
 class CacheEntry:
@@ -66,6 +69,7 @@ class CacheEntry:
     compressed: bool = False
     size_bytes: int = 0
     tags: List[str] = field(default_factory=list)
+    namespace: Optional[str] = None
 
 @dataclass
 class CacheStats:
@@ -99,14 +103,17 @@ class AdvancedRedisCache:
         self.redis_client: Optional[Redis] = None
         self.connection_pool: Optional[ConnectionPool] = None
         
-        # L1 memory cache (LRU)
-        self.memory_cache: Dict[str, CacheEntry] = {}
-        self.memory_cache_order: List[str] = []
-        self.max_memory_items = 1000
-        
         # Statistics
         self.stats = CacheStats()
         
+        # L1 memory cache (O(1) LRU with expiry heap and byte budget)
+        self.memory_cache = MemoryCacheEngine(
+            max_bytes=self.config.max_memory_mb * 1024 * 1024,
+            max_items=self.config.max_memory_items,
+            namespace_max_bytes=self.config.namespace_memory_limits,
+            on_evict=self._on_memory_evict
+        )
+        
         # Background tasks
         self._cleanup_task: Optional[asyncio.Task] = None
         self._metrics_task: Optional[asyncio.Task] = None
@@ -118,6 +125,20 @@ class AdvancedRedisCache:
         self.logger.info("Advanced Redis cache initialized",
                         config=self.config.__dict__)
     
+    @property
+    def max_memory_items(self) -> Optional[int]:
+        """Optional item cap for the L1 memory cache"""
+        return self.memory_cache.max_items
+    
+    @max_memory_items.setter
+    def max_memory_items(self, value: Optional[int]):
+        self.memory_cache.max_items = value
+    
+    @property
+    def memory_cache_order(self) -> List[str]:
+        """L1 keys from least to most recently used"""
+        return list(self.memory_cache.keys())
+    
     async def start(self):
         """Start cache system"""
         await self._connect_redis()
@@ -251,29 +272,23 @@ class AdvancedRedisCache:
         start_time = time.time()
         
         try:
-            # Try L1 memory cache first
-            if hashed_key in self.memory_cache:
-                entry = self.memory_cache[hashed_key]
+            # Try L1 memory cache first (expired entries are dropped on lookup)
+            entry = self.memory_cache.get_entry(hashed_key)
+            if entry is not None:
+                # Update access info
+                entry.access_count += 1
+                entry.last_accessed = time.time()
                 
-                # Check if expired
-                if time.time() - entry.created_at > entry.ttl:
-                    await self._evict_from_memory(hashed_key)
-                else:
-                    # Update access info
-                    entry.access_count += 1
-                    entry.last_accessed = time.time()
-                    self._update_memory_order(hashed_key)
-                    
-                    self.stats.hits += 1
-                    self.stats.total_operations += 1
-                    
-                    self.logger.debug("Cache hit (L1 memory)",
-                                    key=key,
-                                    namespace=namespace,
-                                    access_count=entry.access_count,
-                                    age_seconds=time.time() - entry.created_at)
-                    
-                    return entry.value
+                self.stats.hits += 1
+                self.stats.total_operations += 1
+                
+                self.logger.debug("Cache hit (L1 memory)",
+                                key=key,
+                                namespace=namespace,
+                                access_count=entry.access_count,
+                                age_seconds=time.time() - entry.created_at)
+                
+                return entry.value
             
             # Try L2 Redis cache
             if self.redis_client:
@@ -283,7 +298,8 @@ class AdvancedRedisCache:
                         value = self._deserialize_value(data)
                         
                         # Store in L1 cache for future access
-                        await self._store_in_memory(hashed_key, value, self.config.default_ttl)
+                        await self._store_in_memory(hashed_key, value, self.config.default_ttl,
+                                                    namespace=namespace)
                         
                         self.stats.hits += 1
                         self.stats.total_operations += 1
@@ -339,7 +355,7 @@ class AdvancedRedisCache:
         
         try:
             # Store in L1 memory cache
-            await self._store_in_memory(hashed_key, value, ttl, tags)
+            await self._store_in_memory(hashed_key, value, ttl, tags, namespace)
             
             # Store in L2 Redis cache
             if self.redis_client:
@@ -500,67 +516,53 @@ class AdvancedRedisCache:
         key: str,
         value: Any,
         ttl: int,
-        tags: Optional[List[str]] = None
+        tags: Optional[List[str]] = None,
+        namespace: Optional[str] = None
     ):
-        """Store value in L1 memory cache with LRU eviction"""
-        # Evict expired and excess entries
-        await self._evict_expired_memory()
-        await self._evict_lru_memory()
-        
-        # Create cache entry
+        """Store value in L1 memory cache; the engine handles expiry and LRU eviction"""
         entry = CacheEntry(
             key=key,
             value=value,
             created_at=time.time(),
             ttl=ttl,
             tags=tags or [],
-            size_bytes=len(str(value))  # Approximate size
+            size_bytes=self._estimate_size(value),
+            namespace=namespace
         )
         
-        self.memory_cache[key] = entry
-        self._update_memory_order(key)
+        if not self.memory_cache.put(key, entry):
+            self.logger.debug("Value exceeds L1 memory budget, skipping",
+                            key=key,
+                            namespace=namespace,
+                            size_bytes=entry.size_bytes)
         
-        # Update memory usage
-        self.stats.memory_usage += entry.size_bytes
+        self.stats.memory_usage = self.memory_cache.total_bytes
+    
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """Approximate in-memory size of a cached value"""
+        if isinstance(value, (bytes, bytearray, str)):
+            return len(value)
+        return len(str(value))
     
     def _update_memory_order(self, key: str):
         """Update LRU order for memory cache"""
-        if key in self.memory_cache_order:
-            self.memory_cache_order.remove(key)
-        self.memory_cache_order.append(key)
+        self.memory_cache.touch(key)
+    
+    def _on_memory_evict(self, key: str, entry: CacheEntry, reason: str):
+        """Account for entries dropped by the L1 engine (expiry or capacity)"""
+        self.stats.evictions += 1
+        self.stats.memory_usage = self.memory_cache.total_bytes
     
     async def _evict_from_memory(self, key: str):
         """Evict entry from memory cache"""
-        if key in self.memory_cache:
-            entry = self.memory_cache[key]
-            del self.memory_cache[key]
-            
-            if key in self.memory_cache_order:
-                self.memory_cache_order.remove(key)
-            
-            self.stats.memory_usage -= entry.size_bytes
+        if self.memory_cache.discard(key) is not None:
+            self.stats.memory_usage = self.memory_cache.total_bytes
             self.stats.evictions += 1
     
     async def _evict_expired_memory(self):
         """Evict expired entries from memory cache"""
-        current_time = time.time()
-        expired_keys = []
-        
-        for key, entry in self.memory_cache.items():
-            if current_time - entry.created_at > entry.ttl:
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            await self._evict_from_memory(key)
-    
-    async def _evict_lru_memory(self):
-        """Evict LRU entries if cache is full"""
-        while len(self.memory_cache) >= self.max_memory_items:
-            if self.memory_cache_order:
-                oldest_key = self.memory_cache_order[0]
-                await self._evict_from_memory(oldest_key)
-            else:
-                break
+        self.memory_cache.evict_expired()
     
     async def _cleanup_loop(self):
         """Background cleanup task"""
@@ -654,7 +656,10 @@ class AdvancedRedisCache:
             "l1_memory_cache": {
                 "entries": len(self.memory_cache),
                 "memory_usage_bytes": self.stats.memory_usage,
-                "max_items": self.max_memory_items
+                "max_bytes": self.memory_cache.max_bytes,
+                "max_items": self.max_memory_items,
+                "expirations": self.memory_cache.expirations,
+                "namespaces": self.memory_cache.namespace_usage()
             },
             "l2_redis_cache": {
                 "connected": self.redis_client is not None,
@@ -683,7 +688,6 @@ class AdvancedRedisCache:
         try:
             # Clear memory cache
             self.memory_cache.clear()
-            self.memory_cache_order.clear()
             self.stats.memory_usage = 0
             
             # Clear Redis cache
@@ -22,6 +22,7 @@ class LoadBalancingStrategy(str, Enum):
     ROUND_ROBIN = "round_robin"
     WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
     LEAST_CONNECTIONS = "least_connections"
+    P2C_EWMA = "p2c_ewma"
     RANDOM = "random"
 
 class Settings(BaseSettings):
@@ -59,9 +60,20 @@ class Settings(BaseSettings):
     
     # Load Balancing
     load_balancing_strategy: LoadBalancingStrategy = Field(
-        default=LoadBalancingStrategy.ROUND_ROBIN, 
+        default=LoadBalancingStrategy.P2C_EWMA, 
         env="LOAD_BALANCING_STRATEGY"
     )
+    # Outlier ejection: instances failing this many requests in a row are taken
+    # out of rotation, for longer each time they are ejected again
+    outlier_consecutive_failures: int = Field(default=5, env="OUTLIER_CONSECUTIVE_FAILURES")
+    outlier_base_ejection_seconds: float = Field(default=30.0, env="OUTLIER_BASE_EJECTION_SECONDS")
+    outlier_max_ejection_percent: float = Field(default=50.0, env="OUTLIER_MAX_EJECTION_PERCENT")
+    
+    # Connection Pools (one per downstream endpoint)
+    connection_pool_http2: bool = Field(default=True, env="CONNECTION_POOL_HTTP2")
+    # Connections opened to each endpoint at startup
+    connection_pool_prewarm_connections: int = Field(default=4, env="CONNECTION_POOL_PREWARM_CONNECTIONS")
+    connection_pool_resize_interval_seconds: float = Field(default=10.0, env="CONNECTION_POOL_RESIZE_INTERVAL_SECONDS")
     
     # Circuit Breaker Configuration
     circuit_breaker_enabled: bool = Field(default=True, env="CIRCUIT_BREAKER_ENABLED")
@@ -73,6 +85,10 @@ class Settings(BaseSettings):
     enable_rate_limiting: bool = Field(default=True, env="ENABLE_RATE_LIMITING")
     rate_limit_requests: int = Field(default=100, env="RATE_LIMIT_REQUESTS")
     rate_limit_window_seconds: int = Field(default=60, env="RATE_LIMIT_WINDOW_SECONDS")
+    rate_limit_algorithm: str = Field(default="gcra", env="RATE_LIMIT_ALGORITHM")  # gcra or token_bucket
+    rate_limit_redis_url: Optional[str] = Field(default="redis://localhost:6379/1", env="RATE_LIMIT_REDIS_URL")
+    rate_limit_local_budget_fraction: float = Field(default=0.1, env="RATE_LIMIT_LOCAL_BUDGET_FRACTION")
+    rate_limit_local_lease_seconds: float = Field(default=1.0, env="RATE_LIMIT_LOCAL_LEASE_SECONDS")
     
     # Request/Response Configuration
     request_timeout_seconds: int = Field(default=120, env="REQUEST_TIMEOUT_SECONDS")
@@ -98,6 +114,7 @@ class Settings(BaseSettings):
         env="APPLICATIONINSIGHTS_CONNECTION_STRING"
     )
     enable_detailed_logging: bool = Field(default=True, env="ENABLE_DETAILED_LOGGING")
+    middleware_benchmark_mode: bool = Field(default=False, env="MIDDLEWARE_BENCHMARK_MODE")
     
     # API Gateway Features
     enable_api_versioning: bool = Field(default=True, env="ENABLE_API_VERSIONING")
@@ -115,6 +132,13 @@ class Settings(BaseSettings):
     enable_security_scanning: bool = Field(default=True, env="ENABLE_SECURITY_SCANNING")
     enable_compliance_monitoring: bool = Field(default=True, env="ENABLE_COMPLIANCE_MONITORING")
     security_log_level: str = Field(default="info", env="SECURITY_LOG_LEVEL")
+    security_scan_max_body_chars: int = Field(default=262_144, env="SECURITY_SCAN_MAX_BODY_CHARS")
+    security_scan_max_fields: int = Field(default=2_000, env="SECURITY_SCAN_MAX_FIELDS")
+    security_scan_opaque_min_length: int = Field(default=1_024, env="SECURITY_SCAN_OPAQUE_MIN_LENGTH")
+    # JSON paths whose base64 values are skipped; "*" matches anything, "[]" any list index
+    security_scan_opaque_paths: Optional[List[str]] = Field(default=None, env="SECURITY_SCAN_OPAQUE_PATHS")
+    # Bodies too large to scan in full are reported as a threat; set to reject them outright
+    security_scan_reject_truncated: bool = Field(default=False, env="SECURITY_SCAN_REJECT_TRUNCATED")
     
     # Service Mesh Configuration
     service_mesh_enabled: bool = Field(default=False, env="SERVICE_MESH_ENABLED")
@@ -26,6 +26,7 @@ from app.middleware.monitoring import MonitoringMiddleware, BusinessMetricsMiddl
 from app.middleware.caching import CachingMiddleware, SmartCachingMiddleware
 from app.middleware.security import SecurityMiddleware, SecurityConfig
 from app.middleware.api_security import APISecurityMiddleware
+from app.middleware.asgi import ASGIPipeline, MiddlewareLayer, PipelineTimings
 from app.monitoring.prometheus_metrics import PrometheusMetrics
 from app.monitoring.opentelemetry_tracing import TracingManager
 from app.monitoring.alerting import AlertManager
@@ -35,6 +36,7 @@ from app.security.advanced_auth import AdvancedAuthManager, AuthConfig
 from app.security.security_scanner import SecurityScanner
 from app.security.compliance import ComplianceManager
 from app.security.api_key_manager import AdvancedAPIKeyManager
+from app.security.rate_limiter import UnifiedRateLimiter, create_rate_limiter
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import set_correlation_id, get_correlation_id
 
@@ -58,6 +60,9 @@ security_middleware: SecurityMiddleware = None
 api_key_manager: AdvancedAPIKeyManager = None
 api_security_middleware: APISecurityMiddleware = None
 
+# One limiter shared by every rate-limiting layer
+rate_limiter: UnifiedRateLimiter = create_rate_limiter(settings, logger)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -129,7 +134,7 @@ async def lifespan(app: FastAPI):
     auth_manager = AdvancedAuthManager(settings, logger, auth_config)
     
     # Initialize security scanner
-    security_scanner = SecurityScanner(logger)
+    security_scanner = SecurityScanner(settings, logger)
     
     # Initialize compliance manager
     compliance_manager = ComplianceManager(settings, logger)
@@ -158,7 +163,8 @@ async def lifespan(app: FastAPI):
         security_scanner,
         compliance_manager,
         logger,
-        security_config
+        security_config,
+        rate_limiter=rate_limiter
     )
     
     # Initialize API security middleware
@@ -168,11 +174,12 @@ async def lifespan(app: FastAPI):
         enable_rate_limiting=True,
         enable_input_validation=True,
         enable_security_headers=True,
-        enable_request_sanitization=True
+        enable_request_sanitization=True,
+        rate_limiter=rate_limiter
     )
     
     # Initialize service client with advanced features
-    service_client = ServiceClient(settings, logger)
+    service_client = ServiceClient(settings, logger, metrics=metrics)
     
     # Start advanced components (connection pool, service discovery, circuit breakers)
     await service_client.start()
@@ -207,6 +214,7 @@ async def lifespan(app: FastAPI):
     app.state.security_middleware = security_middleware
     app.state.api_key_manager = api_key_manager
     app.state.api_security_middleware = api_security_middleware
+    app.state.rate_limiter = rate_limiter
     
     logger.info("API Gateway startup completed successfully")
     
@@ -234,6 +242,8 @@ async def lifespan(app: FastAPI):
     if service_client:
         await service_client.close()
     
+    await rate_limiter.close()
+    
     logger.info("API Gateway shutdown completed")
 
 def create_app() -> FastAPI:
@@ -268,63 +278,71 @@ def create_app() -> FastAPI:
     if settings.enable_gzip_compression:
         app.add_middleware(GZipMiddleware, minimum_size=1000)
     
-    # Add API security middleware first (for API-specific hardening)
-    app.add_middleware(
-        APISecurityMiddleware,
-        logger=logger,
-        enable_rate_limiting=True,
-        enable_input_validation=True,
-        enable_security_headers=True,
-        enable_request_sanitization=True
-    )
-    
-    # Add security middleware second (for comprehensive protection)
-    app.add_middleware(
-        SecurityMiddleware,
-        auth_manager=auth_manager,
-        security_scanner=security_scanner,
-        compliance_manager=compliance_manager,
-        logger=logger,
-        config=SecurityConfig(
-            enable_threat_detection=True,
-            enable_rate_limiting=True,
-            enable_ip_blocking=True,
-            enable_compliance_logging=True,
-            max_requests_per_minute=60,
-            max_requests_per_hour=1000,
-            auto_block_threshold=10
-        )
-    )
-    
-    # Add monitoring middleware second (for comprehensive tracking)
-    app.add_middleware(
-        MonitoringMiddleware,
-        metrics=metrics,
-        tracing=tracing,
-        alerting=alerting,
-        logger=logger
-    )
-    
-    # Add caching middleware (smart caching with performance optimization)
-    app.add_middleware(
-        SmartCachingMiddleware,
-        cache=cache,
-        optimizer=performance_optimizer,
-        logger=logger
-    )
-    
-    # Add business metrics middleware
-    app.add_middleware(BusinessMetricsMiddleware, metrics=metrics, logger=logger)
+    # Application middleware runs as one pure-ASGI pipeline, listed outermost first
+    layers: List[MiddlewareLayer] = []
     
-    # Add other custom middleware
-    app.add_middleware(RequestIDMiddleware)
-    app.add_middleware(LoggingMiddleware, logger=logger)
+    if settings.enable_authentication:
+        layers.append(MiddlewareLayer(AuthenticationMiddleware, {"settings": settings}))
     
     if settings.enable_rate_limiting:
-        app.add_middleware(RateLimitMiddleware, settings=settings)
+        layers.append(MiddlewareLayer(RateLimitMiddleware, {"settings": settings, "rate_limiter": rate_limiter}))
     
-    if settings.enable_authentication:
-        app.add_middleware(AuthenticationMiddleware, settings=settings)
+    layers.extend([
+        MiddlewareLayer(LoggingMiddleware, {"logger": logger}),
+        MiddlewareLayer(RequestIDMiddleware),
+        
+        # Business metrics
+        MiddlewareLayer(BusinessMetricsMiddleware, {"metrics": metrics, "logger": logger}),
+        
+        # Smart caching with performance optimization
+        MiddlewareLayer(SmartCachingMiddleware, {
+            "cache": cache,
+            "optimizer": performance_optimizer,
+            "logger": logger
+        }),
+        
+        # Monitoring (for comprehensive tracking)
+        MiddlewareLayer(MonitoringMiddleware, {
+            "metrics": metrics,
+            "tracing": tracing,
+            "alerting": alerting,
+            "logger": logger
+        }),
+        
+        # Security (for comprehensive protection)
+        MiddlewareLayer(SecurityMiddleware, {
+            "auth_manager": auth_manager,
+            "security_scanner": security_scanner,
+            "compliance_manager": compliance_manager,
+            "logger": logger,
+            "config": SecurityConfig(
+                enable_threat_detection=True,
+                enable_rate_limiting=True,
+                enable_ip_blocking=True,
+                enable_compliance_logging=True,
+                max_requests_per_minute=60,
+                max_requests_per_hour=1000,
+                auto_block_threshold=10
+            ),
+            "rate_limiter": rate_limiter
+        }),
+        
+        # API security (for API-specific hardening)
+        MiddlewareLayer(APISecurityMiddleware, {
+            "logger": logger,
+            "enable_rate_limiting": True,
+            "enable_input_validation": True,
+            "enable_security_headers": True,
+            "enable_request_sanitization": True,
+            "rate_limiter": rate_limiter
+        })
+    ])
+    
+    # Per-layer overhead is only measured in benchmark mode
+    middleware_timings = PipelineTimings() if settings.middleware_benchmark_mode else None
+    app.state.middleware_timings = middleware_timings
+    
+    app.add_middleware(ASGIPipeline, layers=layers, timings=middleware_timings)
     
     # Include routers
     app.include_router(health.router, prefix=settings.api_prefix, tags=["health"])
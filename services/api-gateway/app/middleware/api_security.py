@@ -8,11 +8,10 @@ import time
 import hashlib
 from typing import Dict, List, Optional, Any, Set
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import datetime
 from enum import Enum
 
 from fastapi import Request, Response, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 from starlette.responses import JSONResponse
 import ipaddress
@@ -20,6 +19,9 @@ import ipaddress
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import get_correlation_id
 
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
+from app.security.rate_limiter import RateLimitQuota, RateLimitTarget, UnifiedRateLimiter
+
 
 class RateLimitType(str, Enum):
     """Rate limit types"""
@@ -76,7 +78,7 @@ class InputValidationRule:
     sanitize: bool = True
 
 
-class APISecurityMiddleware(BaseHTTPMiddleware):
+class APISecurityMiddleware(ASGIMiddleware):
     """Advanced API security hardening middleware"""
     
     def __init__(
@@ -86,7 +88,8 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
         enable_rate_limiting: bool = True,
         enable_input_validation: bool = True,
         enable_security_headers: bool = True,
-        enable_request_sanitization: bool = True
+        enable_request_sanitization: bool = True,
+        rate_limiter: Optional[UnifiedRateLimiter] = None
     ):
         super().__init__(app)
         self.logger = logger
@@ -95,11 +98,12 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
         self.enable_security_headers = enable_security_headers
         self.enable_request_sanitization = enable_request_sanitization
         
-        # Rate limiting storage
-        self.rate_limit_storage: Dict[str, List[datetime]] = {}
+        # Shared limiter; standalone instances keep process-local state
+        self.rate_limiter = rate_limiter or UnifiedRateLimiter(logger=logger)
         
         # Initialize rate limiting rules
         self.rate_limit_rules = self._initialize_rate_limit_rules()
+        self._rule_quotas: Dict[str, List[RateLimitQuota]] = {}
         
         # Initialize security policies
         self.security_policies = self._initialize_security_policies()
@@ -270,89 +274,99 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
             ]
         }
     
-    async def dispatch(self, request: Request, call_next):
-        """Process request through API security layers"""
-        start_time = time.time()
-        correlation_id = get_correlation_id()
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Run the request-side API security layers"""
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["start_time"] = time.time()
+        state["correlation_id"] = correlation_id = get_correlation_id()
         
         self.requests_processed += 1
         
-        try:
-            # Get client information
-            client_ip = self._get_client_ip(request)
-            user_agent = request.headers.get("user-agent", "")
-            path = request.url.path
-            method = request.method
-            
-            # Find matching security policy
-            security_policy = self._get_security_policy(path)
-            
-            # Security Layer 1: Method validation
-            if method not in security_policy.allowed_methods:
-                self.requests_blocked += 1
-                return self._create_error_response(
-                    status_code=405,
-                    message="Method not allowed",
-                    correlation_id=correlation_id
-                )
-            
-            # Security Layer 2: Rate limiting
-            if self.enable_rate_limiting:
-                rate_limit_violated = await self._check_rate_limits(
-                    request, client_ip, security_policy
-                )
-                if rate_limit_violated:
-                    self.rate_limit_violations += 1
-                    self.requests_blocked += 1
-                    return self._create_rate_limit_response(correlation_id)
-            
-            # Security Layer 3: Input validation and sanitization
-            if self.enable_input_validation and method in ["POST", "PUT", "PATCH"]:
-                validation_error = await self._validate_and_sanitize_input(request, path)
-                if validation_error:
-                    self.validation_failures += 1
-                    self.requests_blocked += 1
-                    return self._create_validation_error_response(
-                        validation_error, correlation_id
-                    )
-            
-            # Security Layer 4: Request sanitization
-            if self.enable_request_sanitization:
-                await self._sanitize_request(request)
-            
-            # Process the request
-            response = await call_next(request)
-            
-            # Security Layer 5: Response security headers
-            if self.enable_security_headers:
-                await self._add_security_headers(response, security_policy)
-            
-            # Security Layer 6: Response sanitization
-            await self._sanitize_response(response)
-            
-            # Log successful request
-            processing_time = time.time() - start_time
-            self.logger.debug("API security processed request",
-                            correlation_id=correlation_id,
-                            path=path,
-                            method=method,
-                            client_ip=client_ip,
-                            processing_time_ms=processing_time * 1000,
-                            security_level=security_policy.security_level.value)
-            
-            return response
-            
-        except Exception as e:
-            self.logger.error("API security middleware error",
-                            correlation_id=correlation_id,
-                            error=str(e),
-                            path=request.url.path)
-            
+        # Get client information
+        client_ip = self._get_client_ip(request)
+        path = request.url.path
+        method = request.method
+        state["client_ip"] = client_ip
+        
+        # Find matching security policy
+        security_policy = self._get_security_policy(path)
+        state["security_policy"] = security_policy
+        
+        # Security Layer 1: Method validation
+        if method not in security_policy.allowed_methods:
+            self.requests_blocked += 1
             return self._create_error_response(
-                status_code=500,
-                message="Internal security error",
+                status_code=405,
+                message="Method not allowed",
                 correlation_id=correlation_id
             )
+        
+        # Security Layer 2: Rate limiting
+        if self.enable_rate_limiting:
+            rate_limit_violated = await self._check_rate_limits(
+                request, client_ip, security_policy
+            )
+            if rate_limit_violated:
+                self.rate_limit_violations += 1
+                self.requests_blocked += 1
+                return self._create_rate_limit_response(correlation_id)
+        
+        # Security Layer 3: Input validation and sanitization
+        if self.enable_input_validation and method in ["POST", "PUT", "PATCH"]:
+            validation_error = await self._validate_and_sanitize_input(request, path)
+            if validation_error:
+                self.validation_failures += 1
+                self.requests_blocked += 1
+                return self._create_validation_error_response(
+                    validation_error, correlation_id
+                )
+        
+        # Security Layer 4: Request sanitization
+        if self.enable_request_sanitization:
+            await self._sanitize_request(request)
+        
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        """Apply response-side API security layers"""
+        security_policy = ctx.layer_state(self).get("security_policy")
+        
+        # Security Layer 5: Response security headers
+        if self.enable_security_headers and security_policy is not None:
+            await self._add_security_headers(response, security_policy)
+        
+        # Security Layer 6: Response sanitization
+        await self._sanitize_response(response)
+    
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        correlation_id = ctx.layer_state(self).get("correlation_id") or get_correlation_id()
+        self.logger.error("API security middleware error",
+                        correlation_id=correlation_id,
+                        error=str(exc),
+                        path=ctx.request.url.path)
+        
+        return self._create_error_response(
+            status_code=500,
+            message="Internal security error",
+            correlation_id=correlation_id
+        )
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        state = ctx.layer_state(self)
+        security_policy = state.get("security_policy")
+        if error is not None or security_policy is None:
+            return
+        
+        # Log successful request
+        processing_time = time.time() - state["start_time"]
+        self.logger.debug("API security processed request",
+                        correlation_id=state["correlation_id"],
+                        path=ctx.request.url.path,
+                        method=ctx.request.method,
+                        client_ip=state["client_ip"],
+                        processing_time_ms=processing_time * 1000,
+                        security_level=security_policy.security_level.value)
     
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP address"""
@@ -400,8 +414,8 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
         client_ip: str,
         security_policy: SecurityPolicy
     ) -> bool:
-        """Check rate limiting rules"""
-        current_time = datetime.utcnow()
+        """Check every applicable rate limiting rule in one limiter call"""
+        targets: List[RateLimitTarget] = []
         
         for rule_name in security_policy.rate_limit_rules:
             rule = self.rate_limit_rules.get(rule_name)
@@ -429,14 +443,20 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
             else:
                 rate_key = f"user:{client_ip}"  # Default to IP
             
-            # Check rate limits
-            if await self._is_rate_limited(rate_key, rule, current_time):
-                self.logger.warning("Rate limit exceeded",
-                                  rule_name=rule_name,
-                                  rate_key=rate_key,
-                                  client_ip=client_ip,
-                                  path=request.url.path)
-                return True
+            targets.extend((rate_key, quota) for quota in self._get_rule_quotas(rule))
+        
+        if not targets:
+            return False
+        
+        decision = await self.rate_limiter.acquire(targets)
+        if not decision.allowed:
+            self.logger.warning("Rate limit exceeded",
+                              quota=decision.quota,
+                              rate_key=decision.key,
+                              client_ip=client_ip,
+                              path=request.url.path,
+                              retry_after=decision.retry_after)
+            return True
         
         return False
     
@@ -444,45 +464,24 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
         self,
         rate_key: str,
         rule: RateLimitRule,
-        current_time: datetime
+        current_time: Optional[datetime] = None
     ) -> bool:
-        """Check if rate limit is exceeded"""
-        if rate_key not in self.rate_limit_storage:
-            self.rate_limit_storage[rate_key] = []
-        
-        requests = self.rate_limit_storage[rate_key]
-        
-        # Clean old requests
-        requests = [
-            req_time for req_time in requests
-            if current_time - req_time < timedelta(days=1)
-        ]
-        
-        # Check minute limit
-        recent_minute = [
-            req_time for req_time in requests
-            if current_time - req_time < timedelta(minutes=1)
-        ]
-        if len(recent_minute) >= rule.requests_per_minute:
-            return True
-        
-        # Check hour limit
-        recent_hour = [
-            req_time for req_time in requests
-            if current_time - req_time < timedelta(hours=1)
-        ]
-        if len(recent_hour) >= rule.requests_per_hour:
-            return True
-        
-        # Check daily limit
-        if len(requests) >= rule.requests_per_day:
-            return True
-        
-        # Record this request
-        requests.append(current_time)
-        self.rate_limit_storage[rate_key] = requests
-        
-        return False
+        """Check a single rule for ``rate_key``, recording the request if admitted"""
+        decision = await self.rate_limiter.check(rate_key, self._get_rule_quotas(rule))
+        return not decision.allowed
+    
+    def _get_rule_quotas(self, rule: RateLimitRule) -> List[RateLimitQuota]:
+        """Minute, hour and day quotas for a rule (cached per rule name)"""
+        quotas = self._rule_quotas.get(rule.name)
+        if quotas is None:
+            prefix = rule.name.lower().replace(" ", "_")
+            quotas = [
+                RateLimitQuota(f"{prefix}:minute", rule.requests_per_minute, 60),
+                RateLimitQuota(f"{prefix}:hour", rule.requests_per_hour, 3600),
+                RateLimitQuota(f"{prefix}:day", rule.requests_per_day, 86400)
+            ]
+            self._rule_quotas[rule.name] = quotas
+        return quotas
     
     async def _validate_and_sanitize_input(
         self,
@@ -614,7 +613,7 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
     
     async def _add_security_headers(
         self,
-        response: Response,
+        response: ResponseInfo,
         security_policy: SecurityPolicy
     ):
         """Add comprehensive security headers"""
@@ -658,7 +657,7 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
         for header, value in security_headers.items():
             response.headers[header] = value
     
-    async def _sanitize_response(self, response: Response):
+    async def _sanitize_response(self, response: ResponseInfo):
         """Sanitize response to prevent information disclosure"""
         # Remove server identification headers
         headers_to_remove = [
@@ -739,7 +738,11 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
     
     def update_rate_limit_rule(self, rule_name: str, rule: RateLimitRule):
         """Update rate limiting rule"""
+        previous = self.rate_limit_rules.get(rule_name)
+        if previous:
+            self._rule_quotas.pop(previous.name, None)
         self.rate_limit_rules[rule_name] = rule
+        self._rule_quotas.pop(rule.name, None)
         self.logger.info("Rate limit rule updated", rule_name=rule_name)
     
     def add_security_policy(self, policy: SecurityPolicy):
@@ -749,27 +752,9 @@ class APISecurityMiddleware(BaseHTTPMiddleware):
     
     def clear_rate_limit_cache(self):
         """Clear rate limiting cache"""
-        self.rate_limit_storage.clear()
+        self.rate_limiter.clear_local()
         self.logger.info("Rate limit cache cleared")
     
     def get_rate_limit_status(self, identifier: str) -> Dict[str, Any]:
         """Get rate limit status for identifier"""
-        requests = self.rate_limit_storage.get(identifier, [])
-        current_time = datetime.utcnow()
-        
-        return {
-            "identifier": identifier,
-            "total_requests": len(requests),
-            "requests_last_minute": len([
-                r for r in requests
-                if current_time - r < timedelta(minutes=1)
-            ]),
-            "requests_last_hour": len([
-                r for r in requests
-                if current_time - r < timedelta(hours=1)
-            ]),
-            "requests_today": len([
-                r for r in requests
-                if current_time - r < timedelta(days=1)
-            ])
-        }
\ No newline at end of file
+        return self.rate_limiter.get_local_status(identifier)
@@ -0,0 +1,280 @@
+"""
+Pure ASGI Middleware Pipeline
+Hook-based middleware layers composed into a single ASGI callable without task hops or body buffering
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Type
+
+from starlette.datastructures import MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class ResponseInfo:
+    """Response status and mutable headers captured at ``http.response.start``"""
+
+    def __init__(self, message: Message):
+        self.status_code: int = message["status"]
+        self.headers = MutableHeaders(scope=message)
+
+
+class HTTPContext:
+    """Per-request state shared by every layer of the pipeline"""
+
+    def __init__(self, scope: Scope, receive: Receive):
+        self.scope = scope
+        self._receive = receive
+        self._body_replayed = False
+
+        self.request = Request(scope, receive)
+        self.response: Optional[ResponseInfo] = None
+        self.response_size = 0
+        self.started_at = time.time()
+
+        # Per-layer scratch space, keyed by layer instance
+        self.state: Dict[Any, Dict[str, Any]] = {}
+
+    async def body(self) -> bytes:
+        """Read the full request body once; downstream receives a replay of it"""
+        return await self.request.body()
+
+    async def receive(self) -> Message:
+        """Receive channel handed downstream, replaying any body read by a layer"""
+        body = getattr(self.request, "_body", None)
+        if body is not None and not self._body_replayed:
+            self._body_replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await self._receive()
+
+    def layer_state(self, layer: Any) -> Dict[str, Any]:
+        """Scratch dict private to ``layer`` for this request"""
+        return self.state.setdefault(layer, {})
+
+    @property
+    def status_code(self) -> Optional[int]:
+        return self.response.status_code if self.response else None
+
+
+class ASGIMiddleware:
+    """Base class for pure ASGI middleware layers
+
+    Subclasses override any of the hooks below. A layer can be mounted on its
+    own with ``app.add_middleware`` or composed with others in ``ASGIPipeline``;
+    either way the downstream app runs in the caller's task and response
+    bodies stream straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await run_pipeline([self], self.app, scope, receive, send)
+
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Runs before the request is forwarded; returning a response short-circuits"""
+        return None
+
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        """Runs when downstream starts its response; headers may be modified here"""
+
+    async def on_response_body(self, ctx: HTTPContext, chunk: bytes, more_body: bool) -> None:
+        """Runs for every response body chunk (only called if overridden)"""
+
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        """Runs when an exception propagates through this layer; a response handles it"""
+        return None
+
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        """Runs after the exchange; ``error`` is set if the exception (including
+        cancellation) passed through this layer"""
+
+
+def http_exception_response(exc: HTTPException) -> JSONResponse:
+    """Render an ``HTTPException`` raised inside a layer as a JSON error response"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": exc.detail, "status_code": exc.status_code},
+        headers=getattr(exc, "headers", None)
+    )
+
+
+@dataclass
+class MiddlewareLayer:
+    """Layer class plus constructor options, mirroring ``app.add_middleware``"""
+    cls: Type[ASGIMiddleware]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class LayerTiming:
+    """Accumulated hook time for one layer"""
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    def record(self, elapsed_ns: int):
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+
+class PipelineTimings:
+    """Per-layer overhead collected when the pipeline runs in benchmark mode"""
+
+    def __init__(self):
+        self.requests = 0
+        self.layers: Dict[str, LayerTiming] = {}
+        self.pre_router = LayerTiming()
+
+    def record(self, layer_name: str, elapsed_ns: int):
+        timing = self.layers.get(layer_name)
+        if timing is None:
+            timing = self.layers[layer_name] = LayerTiming()
+        timing.record(elapsed_ns)
+
+    def reset(self):
+        self.requests = 0
+        self.layers.clear()
+        self.pre_router = LayerTiming()
+
+    def get_report(self) -> Dict[str, Any]:
+        """Mean and max overhead per request, in microseconds"""
+        requests = max(self.requests, 1)
+        layers = {
+            name: {
+                "mean_us": round(timing.total_ns / requests / 1000, 2),
+                "max_hook_us": round(timing.max_ns / 1000, 2),
+                "hook_calls": timing.calls
+            }
+            for name, timing in self.layers.items()
+        }
+        return {
+            "requests": self.requests,
+            "layers": layers,
+            "total_mean_us": round(sum(t.total_ns for t in self.layers.values()) / requests / 1000, 2),
+            "pre_router_mean_us": round(self.pre_router.total_ns / max(self.pre_router.calls, 1) / 1000, 2)
+        }
+
+
+class ASGIPipeline:
+    """Composes middleware layers into a single ASGI app
+
+    Layers are listed outermost first, matching the order in which nested
+    middleware would see the request. All layers share one send wrapper and
+    the downstream app is awaited exactly once.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        layers: Sequence[MiddlewareLayer],
+        timings: Optional[PipelineTimings] = None
+    ):
+        self.app = app
+        self.layers: List[ASGIMiddleware] = [layer.cls(app, **layer.options) for layer in layers]
+        self.timings = timings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await run_pipeline(self.layers, self.app, scope, receive, send, self.timings)
+
+
+def _overrides(layer: ASGIMiddleware, hook: str) -> bool:
+    return getattr(type(layer), hook) is not getattr(ASGIMiddleware, hook)
+
+
+async def _call_hook(timings: Optional[PipelineTimings], layer: ASGIMiddleware, hook, *args):
+    if timings is None:
+        return await hook(*args)
+    start = time.perf_counter_ns()
+    try:
+        return await hook(*args)
+    finally:
+        timings.record(type(layer).__name__, time.perf_counter_ns() - start)
+
+
+async def run_pipeline(
+    layers: Sequence[ASGIMiddleware],
+    app: ASGIApp,
+    scope: Scope,
+    receive: Receive,
+    send: Send,
+    timings: Optional[PipelineTimings] = None
+):
+    """Run one HTTP exchange through ``layers`` (outermost first) and ``app``"""
+    ctx = HTTPContext(scope, receive)
+    pipeline_start = time.perf_counter_ns()
+    entered = 0           # layers whose on_request has run
+    responders = 0        # layers that post-process the response that is sent
+    handled_at: Optional[int] = None
+    error: Optional[BaseException] = None
+    body_layers = [(index, layer) for index, layer in enumerate(layers)
+                   if _overrides(layer, "on_response_body")]
+
+    if timings is not None:
+        timings.requests += 1
+
+    async def send_wrapper(message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            ctx.response = ResponseInfo(message)
+            for index in range(responders - 1, -1, -1):
+                layer = layers[index]
+                await _call_hook(timings, layer, layer.on_response_start, ctx, ctx.response)
+        elif message_type == "http.response.body":
+            chunk = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            ctx.response_size += len(chunk)
+            for index, layer in body_layers:
+                if index < responders:
+                    await _call_hook(timings, layer, layer.on_response_body, ctx, chunk, more_body)
+        await send(message)
+
+    try:
+        short_circuit: Optional[Response] = None
+        for index, layer in enumerate(layers):
+            entered = index + 1
+            short_circuit = await _call_hook(timings, layer, layer.on_request, ctx)
+            if short_circuit is not None:
+                responders = index
+                break
+
+        if short_circuit is not None:
+            await short_circuit(scope, ctx.receive, send_wrapper)
+        else:
+            responders = len(layers)
+            if timings is not None:
+                timings.pre_router.record(time.perf_counter_ns() - pipeline_start)
+            await app(scope, ctx.receive, send_wrapper)
+
+    except BaseException as exc:
+        error = exc
+        # Innermost entered layer gets the first chance to turn the error into a response;
+        # cancellation is only propagated so a cut-short response is never completed
+        if isinstance(exc, Exception):
+            for index in range(entered - 1, -1, -1):
+                layer = layers[index]
+                response = await _call_hook(timings, layer, layer.on_error, ctx, exc)
+                if response is not None and ctx.response is None:
+                    handled_at = index
+                    responders = index
+                    await response(scope, ctx.receive, send_wrapper)
+                    break
+
+    finally:
+        for index in range(entered - 1, -1, -1):
+            layer = layers[index]
+            seen_error = error if handled_at is None or index >= handled_at else None
+            await _call_hook(timings, layer, layer.on_complete, ctx, seen_error)
+
+    if error is not None and handled_at is None:
+        raise error
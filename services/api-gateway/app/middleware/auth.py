@@ -3,15 +3,15 @@ Authentication Middleware
 JWT token validation and user authentication
 """
 import jwt
-from typing import Callable, Optional, Dict, Any
+from typing import Optional, Dict, Any
 
 from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.core.config import Settings
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, http_exception_response
 from shared.monitoring.correlation import get_correlation_id
 
-class AuthenticationMiddleware(BaseHTTPMiddleware):
+class AuthenticationMiddleware(ASGIMiddleware):
     """Middleware for JWT authentication"""
     
     # Public endpoints that don't require authentication
@@ -29,10 +29,12 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
         super().__init__(app)
         self.settings = settings
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        request = ctx.request
+        
         # Skip authentication for public endpoints
         if not self.settings.enable_authentication or self._is_public_endpoint(request.url.path):
-            return await call_next(request)
+            return None
         
         # Extract and validate JWT token
         try:
@@ -66,9 +68,13 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                 }
             )
         
-        # Process request
-        response = await call_next(request)
-        return response
+        return None
+    
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        # Authentication failures are answered here instead of escaping as a 500
+        if isinstance(exc, HTTPException) and exc.status_code == 401:
+            return http_exception_response(exc)
+        return None
     
     def _is_public_endpoint(self, path: str) -> bool:
         """Check if endpoint is public (doesn't require authentication)"""
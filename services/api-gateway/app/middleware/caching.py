@@ -5,16 +5,19 @@ Intelligent request/response caching with content-aware strategies
 import time
 import hashlib
 import json
+import math
+import random
+import statistics
 from typing import Optional, Dict, Any, List, Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import asyncio
 
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 from starlette.responses import Response as StarletteResponse
 
 from app.caching.redis_cache import AdvancedRedisCache
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
 from app.performance.optimizer import PerformanceOptimizer
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import get_correlation_id
@@ -29,8 +32,17 @@ class CacheRule:
     cache_authenticated: bool = False
     invalidate_on: List[str] = None  # Invalidate on these patterns
     condition: Optional[Callable] = None
+    stale_while_revalidate: int = 0  # Seconds past expiry served stale while one request refreshes
+    stale_if_error: int = 0  # Seconds past expiry served stale when the refresh fails
+    early_refresh_beta: float = 0.0  # > 0 refreshes hot entries probabilistically before expiry
 
-class CachingMiddleware(BaseHTTPMiddleware):
+# Responses larger than this are streamed through without being cached
+MAX_CACHED_BODY_BYTES = 10 * 1024 * 1024
+
+# How long a request waits for another request already fetching the same key
+COALESCE_WAIT_SECONDS = 10.0
+
+class CachingMiddleware(ASGIMiddleware):
     """Advanced caching middleware with intelligent strategies"""
     
     def __init__(
@@ -54,9 +66,15 @@ class CachingMiddleware(BaseHTTPMiddleware):
             'misses': 0,
             'sets': 0,
             'bypassed': 0,
-            'errors': 0
+            'errors': 0,
+            'coalesced': 0,
+            'stale_served': 0,
+            'early_refreshes': 0
         }
         
+        # Single-flight: one downstream fetch per cache key, others await its result
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
         # Performance tracking
         self.response_times = {}
         
@@ -72,7 +90,10 @@ class CachingMiddleware(BaseHTTPMiddleware):
                 ttl=30,
                 vary_headers=[],
                 cache_post=False,
-                cache_authenticated=True
+                cache_authenticated=True,
+                stale_while_revalidate=30,
+                stale_if_error=300,
+                early_refresh_beta=1.0
             ),
             
             # API documentation - long cache
@@ -99,7 +120,9 @@ class CachingMiddleware(BaseHTTPMiddleware):
                 ttl=10,
                 vary_headers=[],
                 cache_post=False,
-                cache_authenticated=False
+                cache_authenticated=False,
+                stale_while_revalidate=10,
+                early_refresh_beta=1.0
             ),
             
             # Code generation results - medium cache
@@ -128,7 +151,10 @@ class CachingMiddleware(BaseHTTPMiddleware):
                 ttl=60,  # 1 minute
                 vary_headers=[],
                 cache_post=False,
-                cache_authenticated=False
+                cache_authenticated=False,
+                stale_while_revalidate=60,
+                stale_if_error=300,
+                early_refresh_beta=1.0
             ),
             
             # Alert information - very short cache
@@ -146,56 +172,32 @@ class CachingMiddleware(BaseHTTPMiddleware):
                 ttl=60,
                 vary_headers=[],
                 cache_post=False,
-                cache_authenticated=False
+                cache_authenticated=False,
+                stale_while_revalidate=60,
+                stale_if_error=300,
+                early_refresh_beta=1.0
             )
         ]
     
-    async def dispatch(self, request: Request, call_next):
-        """Process request with intelligent caching"""
-        start_time = time.time()
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Serve cache hits and prepare cache misses for capture"""
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["start_time"] = time.time()
         correlation_id = get_correlation_id()
         
         # Check if request should be cached
         cache_rule = self._match_cache_rule(request)
-        if not cache_rule:
-            # No cache rule, pass through
-            self.stats['bypassed'] += 1
-            response = await call_next(request)
-            
-            # Record performance data
-            if self.optimizer:
-                duration = time.time() - start_time
-                await self.optimizer.record_request(
-                    endpoint=request.url.path,
-                    method=request.method,
-                    duration=duration,
-                    status_code=response.status_code,
-                    cache_hit=False
-                )
-            
-            return response
-        
-        # Check cache condition
-        if cache_rule.condition and not cache_rule.condition(request):
+        if not cache_rule or (cache_rule.condition and not cache_rule.condition(request)):
+            # No cache rule or condition not met, pass through
             self.stats['bypassed'] += 1
-            response = await call_next(request)
-            
-            if self.optimizer:
-                duration = time.time() - start_time
-                await self.optimizer.record_request(
-                    endpoint=request.url.path,
-                    method=request.method,
-                    duration=duration,
-                    status_code=response.status_code,
-                    cache_hit=False
-                )
-            
-            return response
+            return None
         
         # Generate cache key
         cache_key = await self._generate_cache_key(request, cache_rule)
         
         # Try to get from cache
+        stale_response = None
         try:
             cached_response = await self.cache.get(
                 key=cache_key,
@@ -203,29 +205,21 @@ class CachingMiddleware(BaseHTTPMiddleware):
             )
             
             if cached_response:
-                # Cache hit
-                self.stats['hits'] += 1
-                duration = time.time() - start_time
-                
-                self.logger.debug("Cache hit",
-                                path=request.url.path,
-                                method=request.method,
-                                cache_key=cache_key[:50],
-                                duration_ms=duration * 1000,
-                                correlation_id=correlation_id)
-                
-                # Record performance data
-                if self.optimizer:
-                    await self.optimizer.record_request(
-                        endpoint=request.url.path,
-                        method=request.method,
-                        duration=duration,
-                        status_code=cached_response['status_code'],
-                        cache_hit=True
-                    )
-                
-                # Return cached response
-                return self._create_response_from_cache(cached_response)
+                now = time.time()
+                refreshing = cache_key in self._inflight
+                if self._is_fresh(cached_response, now):
+                    if refreshing or not self._should_refresh_early(cached_response, cache_rule, now):
+                        return await self._serve_cached(ctx, cached_response, cache_key, "HIT")
+                    
+                    # Refresh ahead of expiry; the entry is still good if this fetch fails
+                    self.stats['early_refreshes'] += 1
+                    stale_response = cached_response
+                elif refreshing and self._is_within_stale_window(
+                    cached_response, cache_rule.stale_while_revalidate, now
+                ):
+                    return await self._serve_cached(ctx, cached_response, cache_key, "STALE")
+                elif self._is_within_stale_window(cached_response, cache_rule.stale_if_error, now):
+                    stale_response = cached_response
             
         except Exception as e:
             self.logger.warning("Cache get error",
@@ -235,48 +229,207 @@ class CachingMiddleware(BaseHTTPMiddleware):
                               correlation_id=correlation_id)
             self.stats['errors'] += 1
         
-        # Cache miss - execute request
+        state["stale_response"] = stale_response
+        
+        # Coalesce with a request already fetching this key
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            coalesced = await self._wait_for_inflight(inflight, cache_key)
+            if coalesced:
+                self.stats['coalesced'] += 1
+                return await self._serve_cached(ctx, coalesced, cache_key, "HIT")
+            if stale_response:
+                return await self._serve_cached(ctx, stale_response, cache_key, "STALE")
+        else:
+            self._inflight[cache_key] = asyncio.get_running_loop().create_future()
+            state["inflight_owner"] = True
+        
+        # Cache miss - capture the response as it streams through
         self.stats['misses'] += 1
-        response = await call_next(request)
-        request_duration = time.time() - start_time
+        state["cache_rule"] = cache_rule
+        state["cache_key"] = cache_key
+        return None
+    
+    async def _serve_cached(
+        self,
+        ctx: HTTPContext,
+        cached_response: Dict[str, Any],
+        cache_key: str,
+        cache_status: str
+    ) -> Response:
+        """Short-circuit the request with a cached, stale or coalesced response"""
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["cache_hit"] = True
+        if cache_status == "STALE":
+            self.stats['stale_served'] += 1
+        else:
+            self.stats['hits'] += 1
+        duration = time.time() - state["start_time"]
+        
+        self.logger.debug("Cache hit",
+                        path=request.url.path,
+                        method=request.method,
+                        cache_key=cache_key[:50],
+                        cache_status=cache_status,
+                        duration_ms=duration * 1000,
+                        correlation_id=get_correlation_id())
         
         # Record performance data
         if self.optimizer:
             await self.optimizer.record_request(
                 endpoint=request.url.path,
                 method=request.method,
-                duration=request_duration,
-                status_code=response.status_code,
-                cache_hit=False
+                duration=duration,
+                status_code=cached_response['status_code'],
+                cache_hit=True
             )
         
+        return self._create_response_from_cache(cached_response, cache_status)
+    
+    async def _wait_for_inflight(self, inflight: asyncio.Future, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Wait for the request fetching ``cache_key``; None if it did not produce a cacheable response"""
+        try:
+            # Shielded so a follower timing out does not cancel the result for the others
+            return await asyncio.wait_for(asyncio.shield(inflight), COALESCE_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            self.logger.warning("Timed out waiting for coalesced request",
+                              cache_key=cache_key[:50])
+            return None
+    
+    def _is_fresh(self, cached_data: Dict[str, Any], now: float) -> bool:
+        """Entries without an expiry are fresh for as long as the cache keeps them"""
+        expires_at = cached_data.get("expires_at")
+        return expires_at is None or now < expires_at
+    
+    def _is_within_stale_window(self, cached_data: Dict[str, Any], window: int, now: float) -> bool:
+        expires_at = cached_data.get("expires_at")
+        return expires_at is not None and now < expires_at + window
+    
+    def _should_refresh_early(self, cached_data: Dict[str, Any], cache_rule: CacheRule, now: float) -> bool:
+        """Probabilistic early expiration (XFetch)
+
+        The chance of refreshing grows as expiry nears and with the time the
+        response took to compute, so one request refreshes a hot entry before
+        it expires instead of all of them missing together afterwards.
+        """
+        expires_at = cached_data.get("expires_at")
+        if cache_rule.early_refresh_beta <= 0 or expires_at is None:
+            return False
+        compute_seconds = cached_data.get("compute_seconds", 0.0)
+        return now - compute_seconds * cache_rule.early_refresh_beta * math.log(1.0 - random.random()) >= expires_at
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        state = ctx.layer_state(self)
+        cache_key = state.get("cache_key")
+        if cache_key is None:
+            return
+        
         # Cache response if appropriate
-        if self._should_cache_response(request, response, cache_rule):
-            try:
-                await self._cache_response(request, response, cache_rule, cache_key)
-                self.stats['sets'] += 1
-                
-                self.logger.debug("Response cached",
-                                path=request.url.path,
-                                method=request.method,
-                                status_code=response.status_code,
-                                cache_key=cache_key[:50],
-                                ttl=cache_rule.ttl,
-                                correlation_id=correlation_id)
-                
-            except Exception as e:
-                self.logger.warning("Cache set error",
-                                  path=request.url.path,
-                                  cache_key=cache_key[:50],
-                                  error=str(e),
-                                  correlation_id=correlation_id)
-                self.stats['errors'] += 1
+        if self._should_cache_response(ctx.request, response, state["cache_rule"]):
+            state["cached_headers"] = dict(response.headers)
+            state["body_chunks"] = []
+            state["body_size"] = 0
         
         # Add cache headers
         response.headers["X-Cache-Status"] = "MISS"
         response.headers["X-Cache-Key"] = cache_key[:50]
+    
+    async def on_response_body(self, ctx: HTTPContext, chunk: bytes, more_body: bool) -> None:
+        state = ctx.layer_state(self)
+        chunks = state.get("body_chunks")
+        if chunks is None:
+            return
+        if not more_body:
+            state["body_complete"] = True
+        if not chunk:
+            return
+        
+        state["body_size"] += len(chunk)
+        if state["body_size"] > MAX_CACHED_BODY_BYTES:
+            # Too large to cache; stop buffering but keep streaming
+            state["body_chunks"] = None
+            return
+        chunks.append(chunk)
+    
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        """Serve the stale entry, if still allowed, instead of a failed refresh"""
+        state = ctx.layer_state(self)
+        stale_response = state.get("stale_response")
+        if not stale_response or ctx.response is not None:
+            return None
+        
+        self.logger.warning("Serving stale response after error",
+                          path=ctx.request.url.path,
+                          error=str(exc),
+                          correlation_id=get_correlation_id())
+        self.stats['stale_served'] += 1
+        state["cache_hit"] = True
+        return self._create_response_from_cache(stale_response, "STALE")
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        state = ctx.layer_state(self)
+        try:
+            await self._store_response(ctx, error, state)
+        finally:
+            # Always release waiters, with None if nothing was cached
+            if state.get("inflight_owner"):
+                inflight = self._inflight.pop(state["cache_key"], None)
+                if inflight is not None and not inflight.done():
+                    inflight.set_result(state.get("cache_data"))
+    
+    async def _store_response(self, ctx: HTTPContext, error: Optional[BaseException], state: Dict[str, Any]) -> None:
+        if error is not None or state.get("cache_hit") or ctx.response is None:
+            return
         
-        return response
+        request = ctx.request
+        request_duration = time.time() - state["start_time"]
+        
+        # Record performance data
+        if self.optimizer:
+            await self.optimizer.record_request(
+                endpoint=request.url.path,
+                method=request.method,
+                duration=request_duration,
+                status_code=ctx.response.status_code,
+                cache_hit=False
+            )
+        
+        chunks = state.get("body_chunks")
+        if chunks is None or not state.get("body_complete"):
+            # Never cache a body the app did not finish sending
+            return
+        
+        cache_rule = state["cache_rule"]
+        cache_key = state["cache_key"]
+        correlation_id = get_correlation_id()
+        try:
+            state["cache_data"] = await self._cache_response(
+                request,
+                ctx.response.status_code,
+                state["cached_headers"],
+                b"".join(chunks),
+                cache_rule,
+                cache_key,
+                compute_seconds=request_duration
+            )
+            self.stats['sets'] += 1
+            
+            self.logger.debug("Response cached",
+                            path=request.url.path,
+                            method=request.method,
+                            status_code=ctx.response.status_code,
+                            cache_key=cache_key[:50],
+                            ttl=cache_rule.ttl,
+                            correlation_id=correlation_id)
+            
+        except Exception as e:
+            self.logger.warning("Cache set error",
+                              path=request.url.path,
+                              cache_key=cache_key[:50],
+                              error=str(e),
+                              correlation_id=correlation_id)
+            self.stats['errors'] += 1
     
     def _match_cache_rule(self, request: Request) -> Optional[CacheRule]:
         """Find matching cache rule for request"""
@@ -346,7 +499,7 @@ class CachingMiddleware(BaseHTTPMiddleware):
     def _should_cache_response(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         cache_rule: CacheRule
     ) -> bool:
         """Determine if response should be cached"""
@@ -362,7 +515,7 @@ class CachingMiddleware(BaseHTTPMiddleware):
         
         # Check response size (don't cache very large responses)
         content_length = response.headers.get("content-length")
-        if content_length and int(content_length) > 10 * 1024 * 1024:  # 10MB
+        if content_length and int(content_length) > MAX_CACHED_BODY_BYTES:
             return False
         
         # Check content type (cache JSON, HTML, but be careful with binary)
@@ -385,30 +538,25 @@ class CachingMiddleware(BaseHTTPMiddleware):
     async def _cache_response(
         self,
         request: Request,
-        response: Response,
+        status_code: int,
+        headers: Dict[str, str],
+        body: bytes,
         cache_rule: CacheRule,
-        cache_key: str
-    ):
-        """Cache response data"""
-        
-        # Read response body
-        body = b""
-        if hasattr(response, 'body'):
-            body = response.body
-        elif hasattr(response, 'body_iterator'):
-            # For streaming responses, we might need to buffer
-            chunks = []
-            async for chunk in response.body_iterator:
-                chunks.append(chunk)
-                body = b"".join(chunks)
+        cache_key: str,
+        compute_seconds: float = 0.0
+    ) -> Dict[str, Any]:
+        """Cache response data captured while it was streamed to the client"""
         
         # Prepare cache data
+        cached_at = time.time()
         cache_data = {
-            "status_code": response.status_code,
-            "headers": dict(response.headers),
+            "status_code": status_code,
+            "headers": headers,
             "body": body.decode('utf-8', errors='ignore') if body else "",
-            "content_type": response.headers.get("content-type", ""),
-            "cached_at": time.time(),
+            "content_type": headers.get("content-type", ""),
+            "cached_at": cached_at,
+            "expires_at": cached_at + cache_rule.ttl,
+            "compute_seconds": compute_seconds,
             "cache_rule": cache_rule.pattern
         }
         
@@ -420,16 +568,21 @@ class CachingMiddleware(BaseHTTPMiddleware):
         # Add endpoint-specific tag
         tags.append(f"endpoint:{request.url.path}")
         
+        # Keep the entry past its expiry for as long as it may be served stale
+        stale_window = max(cache_rule.stale_while_revalidate, cache_rule.stale_if_error)
+        
         # Cache the response
         await self.cache.set(
             key=cache_key,
             value=cache_data,
-            ttl=cache_rule.ttl,
+            ttl=cache_rule.ttl + stale_window,
             namespace="http_responses",
             tags=tags
         )
+        
+        return cache_data
     
-    def _create_response_from_cache(self, cached_data: Dict[str, Any]) -> Response:
+    def _create_response_from_cache(self, cached_data: Dict[str, Any], cache_status: str = "HIT") -> Response:
         """Create response from cached data"""
         
         # Create response
@@ -441,7 +594,7 @@ class CachingMiddleware(BaseHTTPMiddleware):
         )
         
         # Add cache headers
-        response.headers["X-Cache-Status"] = "HIT"
+        response.headers["X-Cache-Status"] = cache_status
         response.headers["X-Cache-Age"] = str(int(time.time() - cached_data.get("cached_at", 0)))
         
         return response
@@ -512,8 +665,10 @@ class CachingMiddleware(BaseHTTPMiddleware):
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get caching middleware statistics"""
-        total_requests = sum(self.stats.values())
-        hit_rate = self.stats['hits'] / max(total_requests, 1)
+        # Sets, errors, coalesced requests and early refreshes overlap the served counts
+        total_requests = (self.stats['hits'] + self.stats['stale_served'] +
+                          self.stats['misses'] + self.stats['bypassed'])
+        hit_rate = (self.stats['hits'] + self.stats['stale_served']) / max(total_requests, 1)
         
         return {
             "statistics": {
@@ -522,6 +677,9 @@ class CachingMiddleware(BaseHTTPMiddleware):
                 "sets": self.stats['sets'],
                 "bypassed": self.stats['bypassed'],
                 "errors": self.stats['errors'],
+                "coalesced": self.stats['coalesced'],
+                "stale_served": self.stats['stale_served'],
+                "early_refreshes": self.stats['early_refreshes'],
                 "total_requests": total_requests,
                 "hit_rate": hit_rate,
                 "miss_rate": 1.0 - hit_rate
@@ -532,7 +690,9 @@ class CachingMiddleware(BaseHTTPMiddleware):
                     "ttl": rule.ttl,
                     "vary_headers": rule.vary_headers,
                     "cache_post": rule.cache_post,
-                    "cache_authenticated": rule.cache_authenticated
+                    "cache_authenticated": rule.cache_authenticated,
+                    "stale_while_revalidate": rule.stale_while_revalidate,
+                    "stale_if_error": rule.stale_if_error
                 }
                 for rule in self.cache_rules
             ]
@@ -557,10 +717,9 @@ class SmartCachingMiddleware(CachingMiddleware):
         
         self.logger.info("Smart caching middleware initialized")
     
-    async def dispatch(self, request: Request, call_next):
-        """Process request with smart caching decisions"""
-        
-        # Record endpoint access patterns
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Record endpoint access patterns before the caching decision"""
+        request = ctx.request
         endpoint = f"{request.method} {request.url.path}"
         current_time = time.time()
         
@@ -575,22 +734,26 @@ class SmartCachingMiddleware(CachingMiddleware):
         self.endpoint_performance[endpoint]['access_count'] += 1
         self.endpoint_performance[endpoint]['last_access'] = current_time
         
-        # Use parent dispatch with enhancements
-        start_time = time.time()
-        response = await super().dispatch(request, call_next)
-        duration = time.time() - start_time
+        return await super().on_request(ctx)
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        await super().on_complete(ctx, error)
+        if error is not None or ctx.response is None:
+            return
+        
+        request = ctx.request
+        endpoint = f"{request.method} {request.url.path}"
+        duration = time.time() - ctx.layer_state(self)["start_time"]
         
         # Update performance tracking
         self.endpoint_performance[endpoint]['total_duration'] += duration
         
         # Check if this was a cache hit
-        if response.headers.get("X-Cache-Status") == "HIT":
+        if ctx.response.headers.get("X-Cache-Status") in ("HIT", "STALE"):
             self.endpoint_performance[endpoint]['cache_hits'] += 1
         
         # Adaptive TTL adjustment
-        await self._adjust_adaptive_ttl(endpoint, response.status_code, duration)
-        
-        return response
+        await self._adjust_adaptive_ttl(endpoint, ctx.response.status_code, duration)
     
     async def _adjust_adaptive_ttl(self, endpoint: str, status_code: int, duration: float):
         """Adjust TTL based on endpoint performance"""
@@ -637,16 +800,7 @@ class SmartCachingMiddleware(CachingMiddleware):
             endpoint = f"{request.method} {request.url.path}"
             if endpoint in self.adaptive_ttl:
                 # Create modified rule with adaptive TTL
-                adaptive_rule = CacheRule(
-                    pattern=rule.pattern,
-                    ttl=self.adaptive_ttl[endpoint],
-                    vary_headers=rule.vary_headers,
-                    cache_post=rule.cache_post,
-                    cache_authenticated=rule.cache_authenticated,
-                    invalidate_on=rule.invalidate_on,
-                    condition=rule.condition
-                )
-                return adaptive_rule
+                return replace(rule, ttl=self.adaptive_ttl[endpoint])
         
         return rule
     
@@ -3,24 +3,26 @@ Logging Middleware
 Request/response logging with performance metrics
 """
 import time
-from typing import Callable
+from typing import Optional
 
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import get_correlation_id
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware(ASGIMiddleware):
     """Middleware for request/response logging"""
     
     def __init__(self, app, logger: StructuredLogger):
         super().__init__(app)
         self.logger = logger
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        correlation_id = get_correlation_id()
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["start_time"] = time.time()
+        state["correlation_id"] = get_correlation_id()
         
         # Log incoming request
         self.logger.info("Incoming request",
@@ -29,39 +31,37 @@ class LoggingMiddleware(BaseHTTPMiddleware):
                         query_params=str(request.query_params),
                         client_ip=self._get_client_ip(request),
                         user_agent=request.headers.get("User-Agent", ""),
-                        correlation_id=correlation_id)
+                        correlation_id=state["correlation_id"])
         
-        # Process request
-        try:
-            response = await call_next(request)
-            duration_ms = (time.time() - start_time) * 1000
-            
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        # Add performance headers (time to first byte)
+        duration_ms = (time.time() - ctx.layer_state(self)["start_time"]) * 1000
+        response.headers["X-Response-Time"] = f"{round(duration_ms, 2)}ms"
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        request = ctx.request
+        state = ctx.layer_state(self)
+        duration_ms = (time.time() - state["start_time"]) * 1000
+        
+        if error is None:
             # Log response
             self.logger.info("Request completed",
                            method=request.method,
                            path=request.url.path,
-                           status_code=response.status_code,
+                           status_code=ctx.status_code,
                            duration_ms=round(duration_ms, 2),
-                           correlation_id=correlation_id)
-            
-            # Add performance headers
-            response.headers["X-Response-Time"] = f"{round(duration_ms, 2)}ms"
-            
-            return response
-            
-        except Exception as e:
-            duration_ms = (time.time() - start_time) * 1000
-            
+                           correlation_id=state["correlation_id"])
+        else:
             # Log error
             self.logger.error("Request failed",
                             method=request.method,
                             path=request.url.path,
-                            error=str(e),
-                            error_type=type(e).__name__,
+                            error=str(error),
+                            error_type=type(error).__name__,
                             duration_ms=round(duration_ms, 2),
-                            correlation_id=correlation_id)
-            
-            raise
+                            correlation_id=state["correlation_id"])
     
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP address from request"""
@@ -4,20 +4,22 @@ Integrates Prometheus metrics, OpenTelemetry tracing, and alerting
 """
 import time
 import asyncio
+from contextlib import AsyncExitStack
 from typing import Optional, Dict, Any
 import json
 
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
+
 from app.monitoring.prometheus_metrics import PrometheusMetrics
 from app.monitoring.opentelemetry_tracing import TracingManager
 from app.monitoring.alerting import AlertManager
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import get_correlation_id
 
-class MonitoringMiddleware(BaseHTTPMiddleware):
+class MonitoringMiddleware(ASGIMiddleware):
     """Comprehensive monitoring middleware"""
     
     def __init__(
@@ -40,20 +42,22 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
         
         self.logger.info("Monitoring middleware initialized")
     
-    async def dispatch(self, request: Request, call_next):
-        """Process request with comprehensive monitoring"""
-        start_time = time.time()
-        correlation_id = get_correlation_id()
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Open the tracing span and start request accounting"""
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["start_time"] = time.time()
+        state["correlation_id"] = correlation_id = get_correlation_id()
         
         # Extract request information
         method = request.method
         path = self._get_route_path(request)
-        request_size = self._get_request_size(request)
+        state["request_size"] = self._get_request_size(request)
         
         # Update active requests counter
         self.active_requests += 1
         
-        # Start tracing span
+        # Start tracing span; it stays open until the response completes
         span_attributes = {
             "http.method": method,
             "http.url": str(request.url),
@@ -62,19 +66,44 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
             "correlation.id": correlation_id
         }
         
-        async with self.tracing.trace_request(
+        stack = AsyncExitStack()
+        state["span"] = await stack.enter_async_context(self.tracing.trace_request(
             operation_name=f"{method} {path}",
             attributes=span_attributes
-        ) as span:
-            
-            try:
-                # Process request
-                response = await call_next(request)
-                
-                # Calculate response time
-                duration = time.time() - start_time
-                status_code = response.status_code
-                response_size = self._get_response_size(response)
+        ))
+        state["exit_stack"] = stack
+        
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        """Add response headers for observability"""
+        state = ctx.layer_state(self)
+        duration = time.time() - state["start_time"]
+        span_context = state["span"].get_span_context()
+        
+        response.headers["X-Response-Time"] = f"{duration*1000:.2f}ms"
+        response.headers["X-Trace-Id"] = str(span_context.trace_id) if span_context else ""
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        """Record metrics, close the span and check alert conditions"""
+        state = ctx.layer_state(self)
+        if "exit_stack" not in state:
+            return
+        
+        request = ctx.request
+        method = request.method
+        path = self._get_route_path(request)
+        span = state["span"]
+        correlation_id = state["correlation_id"]
+        request_size = state["request_size"]
+        duration = time.time() - state["start_time"]
+        
+        try:
+            if error is None:
+                status_code = ctx.status_code or 500
+                response_size = self._get_response_size(ctx.response) if ctx.response else None
+                if response_size is None:
+                    response_size = ctx.response_size
                 
                 # Record metrics
                 self.metrics.record_http_request(
@@ -90,10 +119,6 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
                 span.set_attribute("http.status_code", status_code)
                 span.set_attribute("http.response_size", response_size or 0)
                 
-                # Add response headers for observability
-                response.headers["X-Response-Time"] = f"{duration*1000:.2f}ms"
-                response.headers["X-Trace-Id"] = span.get_span_context().trace_id if span.get_span_context() else ""
-                
                 # Log request completion
                 self.logger.info("Request completed",
                                method=method,
@@ -106,13 +131,7 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
                 
                 # Check for alert conditions
                 await self._check_alert_conditions(method, path, status_code, duration)
-                
-                return response
-                
-            except Exception as e:
-                # Calculate error duration
-                duration = time.time() - start_time
-                
+            else:
                 # Record error metrics
                 self.metrics.record_http_request(
                     method=method,
@@ -125,24 +144,28 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
                 # Update span with error
                 span.set_attribute("http.status_code", 500)
                 span.set_attribute("error", True)
-                span.set_attribute("error.message", str(e))
+                span.set_attribute("error.message", str(error))
                 
                 # Log error
                 self.logger.error("Request failed",
                                 method=method,
                                 path=path,
                                 duration_ms=duration * 1000,
-                                error=str(e),
+                                error=str(error),
                                 correlation_id=correlation_id)
                 
                 # Check for error alert conditions
-                await self._check_alert_conditions(method, path, 500, duration, error=str(e))
-                
-                raise
-                
-            finally:
-                # Update active requests counter
-                self.active_requests -= 1
+                await self._check_alert_conditions(method, path, 500, duration, error=str(error))
+        
+        finally:
+            # Close the span (records the exception on it if one passed through)
+            if error is None:
+                await state["exit_stack"].aclose()
+            else:
+                await state["exit_stack"].__aexit__(type(error), error, error.__traceback__)
+            
+            # Update active requests counter
+            self.active_requests -= 1
     
     def _get_route_path(self, request: Request) -> str:
         """Extract route path for consistent metrics"""
@@ -175,7 +198,7 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
                 pass
         return None
     
-    def _get_response_size(self, response: Response) -> Optional[int]:
+    def _get_response_size(self, response: ResponseInfo) -> Optional[int]:
         """Get response content length"""
         content_length = response.headers.get("content-length")
         if content_length:
@@ -269,7 +292,7 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
             }
         }
 
-class MetricsCollectionMiddleware(BaseHTTPMiddleware):
+class MetricsCollectionMiddleware(ASGIMiddleware):
     """Lightweight metrics collection middleware for specific use cases"""
     
     def __init__(self, app: ASGIApp, metrics: PrometheusMetrics):
@@ -277,39 +300,24 @@ class MetricsCollectionMiddleware(BaseHTTPMiddleware):
         self.metrics = metrics
         self.request_counter = 0
     
-    async def dispatch(self, request: Request, call_next):
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
         """Collect basic metrics without full tracing overhead"""
-        start_time = time.time()
         self.request_counter += 1
+        ctx.layer_state(self)["start_time"] = time.time()
+        return None
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        duration = time.time() - ctx.layer_state(self)["start_time"]
         
-        method = request.method
-        path = request.url.path
-        
-        try:
-            response = await call_next(request)
-            duration = time.time() - start_time
-            
-            # Record only essential metrics
-            self.metrics.record_http_request(
-                method=method,
-                endpoint=path,
-                status_code=response.status_code,
-                duration=duration
-            )
-            
-            return response
-            
-        except Exception:
-            duration = time.time() - start_time
-            self.metrics.record_http_request(
-                method=method,
-                endpoint=path,
-                status_code=500,
-                duration=duration
-            )
-            raise
+        # Record only essential metrics
+        self.metrics.record_http_request(
+            method=ctx.request.method,
+            endpoint=ctx.request.url.path,
+            status_code=500 if error is not None else (ctx.status_code or 500),
+            duration=duration
+        )
 
-class BusinessMetricsMiddleware(BaseHTTPMiddleware):
+class BusinessMetricsMiddleware(ASGIMiddleware):
     """Middleware for tracking business-specific metrics"""
     
     def __init__(self, app: ASGIApp, metrics: PrometheusMetrics, logger: StructuredLogger):
@@ -317,20 +325,21 @@ class BusinessMetricsMiddleware(BaseHTTPMiddleware):
         self.metrics = metrics
         self.logger = logger
     
-    async def dispatch(self, request: Request, call_next):
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        ctx.layer_state(self)["start_time"] = time.time()
+        return None
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
         """Track business metrics"""
-        start_time = time.time()
-        path = request.url.path
+        if error is not None or ctx.response is None:
+            return
         
-        response = await call_next(request)
-        duration = time.time() - start_time
+        duration = time.time() - ctx.layer_state(self)["start_time"]
         
         # Track business-specific metrics
-        await self._track_business_metrics(request, response, duration)
-        
-        return response
+        await self._track_business_metrics(ctx.request, ctx.response, duration)
     
-    async def _track_business_metrics(self, request: Request, response: Response, duration: float):
+    async def _track_business_metrics(self, request: Request, response: ResponseInfo, duration: float):
         """Track business-specific metrics based on endpoints"""
         path = request.url.path
         method = request.method
@@ -376,17 +385,17 @@ class BusinessMetricsMiddleware(BaseHTTPMiddleware):
         except:
             return "unknown"
 
-class HealthCheckMiddleware(BaseHTTPMiddleware):
+class HealthCheckMiddleware(ASGIMiddleware):
     """Middleware for health check endpoint optimization"""
     
     def __init__(self, app: ASGIApp):
         super().__init__(app)
         self.health_paths = {"/health", "/health/live", "/health/ready", "/health/detailed"}
     
-    async def dispatch(self, request: Request, call_next):
-        """Optimize health check requests"""
-        if request.url.path in self.health_paths:
-            # Skip heavy monitoring for health checks
-            return await call_next(request)
+    async def __call__(self, scope, receive, send):
+        """Health checks skip the hook machinery entirely"""
+        if scope["type"] == "http" and scope["path"] in self.health_paths:
+            await self.app(scope, receive, send)
+            return
         
-        return await call_next(request)
\ No newline at end of file
+        await super().__call__(scope, receive, send)
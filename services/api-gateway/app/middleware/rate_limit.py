@@ -1,48 +1,42 @@
 """
 Rate Limiting Middleware
-Request rate limiting with Redis backend
+Request rate limiting backed by the shared gateway rate limiter
 """
 import time
-from typing import Callable, Dict, Any
+from typing import Optional
 
 from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-import redis.asyncio as redis
 
 from app.core.config import Settings
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo, http_exception_response
+from app.security.rate_limiter import (
+    RateLimitAlgorithm,
+    RateLimitQuota,
+    UnifiedRateLimiter,
+    create_rate_limiter
+)
 from shared.monitoring.correlation import get_correlation_id
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware(ASGIMiddleware):
     """Middleware for request rate limiting"""
     
-    def __init__(self, app, settings: Settings):
+    def __init__(self, app, settings: Settings, rate_limiter: Optional[UnifiedRateLimiter] = None):
         super().__init__(app)
         self.settings = settings
-        self.redis_client = None
-        self._initialize_redis()
+        self.rate_limiter = rate_limiter or create_rate_limiter(settings)
+        self.quota = RateLimitQuota(
+            name="gateway",
+            limit=settings.rate_limit_requests,
+            period_seconds=settings.rate_limit_window_seconds,
+            algorithm=RateLimitAlgorithm(settings.rate_limit_algorithm)
+        )
     
-    def _initialize_redis(self):
-        """Initialize Redis client for rate limiting"""
-        try:
-            # Simple Redis connection for now
-            # In production, use Redis from data layer
-            self.redis_client = redis.Redis(
-                host="localhost",
-                port=6379,
-                db=1,  # Use different DB for rate limiting
-                decode_responses=True
-            )
-        except Exception as e:
-            # Fallback to in-memory rate limiting
-            self.redis_client = None
-            self._rate_limit_cache: Dict[str, Dict[str, Any]] = {}
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
         if not self.settings.enable_rate_limiting:
-            return await call_next(request)
+            return None
         
         # Get client identifier
-        client_id = self._get_client_identifier(request)
+        client_id = self._get_client_identifier(ctx.request)
         
         # Check rate limit
         is_allowed, remaining_requests, reset_time = await self._check_rate_limit(client_id)
@@ -61,15 +55,23 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 }
             )
         
-        # Process request
-        response = await call_next(request)
+        ctx.layer_state(self).update(remaining=remaining_requests, reset_time=reset_time)
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        state = ctx.layer_state(self)
+        if "remaining" not in state:
+            return
         
         # Add rate limit headers to response
         response.headers["X-RateLimit-Limit"] = str(self.settings.rate_limit_requests)
-        response.headers["X-RateLimit-Remaining"] = str(remaining_requests)
-        response.headers["X-RateLimit-Reset"] = str(int(reset_time))
-        
-        return response
+        response.headers["X-RateLimit-Remaining"] = str(state["remaining"])
+        response.headers["X-RateLimit-Reset"] = str(int(state["reset_time"]))
+    
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        if isinstance(exc, HTTPException) and exc.status_code == 429:
+            return http_exception_response(exc)
+        return None
     
     def _get_client_identifier(self, request: Request) -> str:
         """Get client identifier for rate limiting"""
@@ -99,59 +101,9 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     
     async def _check_rate_limit(self, client_id: str) -> tuple[bool, int, float]:
         """Check if client is within rate limits"""
-        current_time = time.time()
-        window_start = current_time - self.settings.rate_limit_window_seconds
-        
-        if self.redis_client:
-            return await self._check_rate_limit_redis(client_id, current_time, window_start)
-        else:
-            return self._check_rate_limit_memory(client_id, current_time, window_start)
-    
-    async def _check_rate_limit_redis(self, client_id: str, current_time: float, window_start: float) -> tuple[bool, int, float]:
-        """Redis-based rate limiting using sliding window"""
-        key = f"rate_limit:{client_id}"
-        
-        try:
-            # Remove expired entries
-            await self.redis_client.zremrangebyscore(key, 0, window_start)
-            
-            # Count current requests in window
-            current_requests = await self.redis_client.zcard(key)
-            
-            if current_requests >= self.settings.rate_limit_requests:
-                # Get oldest request time to calculate reset time
-                oldest_requests = await self.redis_client.zrange(key, 0, 0, withscores=True)
-                reset_time = oldest_requests[0][1] + self.settings.rate_limit_window_seconds if oldest_requests else current_time + self.settings.rate_limit_window_seconds
-                return False, 0, reset_time
-            
-            # Add current request
-            await self.redis_client.zadd(key, {str(current_time): current_time})
-            await self.redis_client.expire(key, self.settings.rate_limit_window_seconds)
-            
-            remaining = self.settings.rate_limit_requests - current_requests - 1
-            reset_time = current_time + self.settings.rate_limit_window_seconds
-            
-            return True, remaining, reset_time
-            
-        except Exception:
-            # Fallback to allowing request if Redis fails
-            return True, self.settings.rate_limit_requests - 1, current_time + self.settings.rate_limit_window_seconds
-    
-    def _check_rate_limit_memory(self, client_id: str, current_time: float, window_start: float) -> tuple[bool, int, float]:
-        """In-memory rate limiting (fallback)"""
-        if client_id not in self._rate_limit_cache:
-            self._rate_limit_cache[client_id] = {"requests": [], "reset_time": current_time + self.settings.rate_limit_window_seconds}
-        
-        client_data = self._rate_limit_cache[client_id]
-        
-        # Remove expired requests
-        client_data["requests"] = [req_time for req_time in client_data["requests"] if req_time > window_start]
-        
-        if len(client_data["requests"]) >= self.settings.rate_limit_requests:
-            return False, 0, client_data["reset_time"]
+        decision = await self.rate_limiter.check(client_id, [self.quota])
         
-        # Add current request
-        client_data["requests"].append(current_time)
+        if not decision.allowed:
+            return False, 0, time.time() + decision.retry_after
         
-        remaining = self.settings.rate_limit_requests - len(client_data["requests"])
-        return True, remaining, client_data["reset_time"]
\ No newline at end of file
+        return True, decision.remaining, time.time() + decision.reset_after
@@ -3,22 +3,22 @@ Request ID Middleware
 Generates and tracks unique request IDs for correlation
 """
 import uuid
-from typing import Callable
+from typing import Optional
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Response
 
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
 from shared.monitoring.correlation import set_correlation_id, get_correlation_id
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+class RequestIDMiddleware(ASGIMiddleware):
     """Middleware to generate and track request IDs"""
     
     def __init__(self, app):
         super().__init__(app)
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
         # Get or generate correlation ID
-        correlation_id = request.headers.get("X-Correlation-ID")
+        correlation_id = ctx.request.headers.get("X-Correlation-ID")
         if not correlation_id:
             correlation_id = str(uuid.uuid4())
         
@@ -26,12 +26,11 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
         set_correlation_id(correlation_id)
         
         # Add correlation ID to request state
-        request.state.correlation_id = correlation_id
-        
-        # Process request
-        response = await call_next(request)
+        ctx.request.state.correlation_id = correlation_id
+        ctx.layer_state(self)["correlation_id"] = correlation_id
         
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
         # Add correlation ID to response headers
-        response.headers["X-Correlation-ID"] = correlation_id
-        
-        return response
\ No newline at end of file
+        response.headers["X-Correlation-ID"] = ctx.layer_state(self)["correlation_id"]
@@ -10,10 +10,12 @@ import ipaddress
 from datetime import datetime, timedelta
 
 from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 from starlette.responses import JSONResponse
 
+from app.middleware.asgi import ASGIMiddleware, HTTPContext, ResponseInfo
+from app.security.rate_limiter import RateLimitQuota, UnifiedRateLimiter
+
 from app.security.advanced_auth import AdvancedAuthManager, AuthContext, SecurityLevel
 from app.security.security_scanner import SecurityScanner, SecurityThreat, ThreatLevel
 from app.security.compliance import ComplianceManager, AuditEventType, DataClassification
@@ -51,7 +53,7 @@ class SecurityContext:
     block_reason: Optional[str] = None
     security_level: SecurityLevel = SecurityLevel.MEDIUM
 
-class SecurityMiddleware(BaseHTTPMiddleware):
+class SecurityMiddleware(ASGIMiddleware):
     """Advanced security middleware with comprehensive threat protection"""
     
     def __init__(
@@ -61,7 +63,8 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         security_scanner: SecurityScanner,
         compliance_manager: ComplianceManager,
         logger: StructuredLogger,
-        config: Optional[SecurityConfig] = None
+        config: Optional[SecurityConfig] = None,
+        rate_limiter: Optional[UnifiedRateLimiter] = None
     ):
         super().__init__(app)
         self.auth_manager = auth_manager
@@ -71,7 +74,12 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         self.config = config or SecurityConfig()
         
         # Rate limiting and blocking state
-        self.rate_limits: Dict[str, List[datetime]] = {}
+        self.rate_limiter = rate_limiter or UnifiedRateLimiter(logger=logger)
+        self.rate_limit_quotas = [
+            RateLimitQuota("security:minute", self.config.max_requests_per_minute, 60),
+            RateLimitQuota("security:hour", self.config.max_requests_per_hour, 3600)
+        ]
+        self.rate_limit_strikes: Dict[str, List[Any]] = {}  # ip -> [rejections, window start]
         self.blocked_ips: Dict[str, datetime] = {}
         self.threat_counts: Dict[str, int] = {}
         
@@ -90,9 +98,11 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                         rate_limiting=self.config.enable_rate_limiting,
                         compliance_logging=self.config.enable_compliance_logging)
     
-    async def dispatch(self, request: Request, call_next):
-        """Process request through security layers"""
-        start_time = time.time()
+    async def on_request(self, ctx: HTTPContext) -> Optional[Response]:
+        """Run the request-side security layers"""
+        request = ctx.request
+        state = ctx.layer_state(self)
+        state["start_time"] = time.time()
         correlation_id = get_correlation_id()
         
         # Extract request information
@@ -111,105 +121,119 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             threat_level=ThreatLevel.LOW,
             threats_detected=[]
         )
+        state["security_context"] = security_context
         
-        try:
-            # Security Layer 1: IP-based filtering
-            if self.config.enable_ip_blocking:
-                if await self._check_ip_blocking(security_context):
-                    return self._create_blocked_response("IP blocked", security_context)
-            
-            # Security Layer 2: Rate limiting
-            if self.config.enable_rate_limiting:
-                if await self._check_rate_limiting(security_context):
-                    return self._create_blocked_response("Rate limit exceeded", security_context)
-            
-            # Security Layer 3: Threat detection
-            if self.config.enable_threat_detection:
-                await self._detect_threats(request, security_context)
-                
-                # Block high-severity threats
-                critical_threats = [t for t in security_context.threats_detected 
-                                  if t.threat_level in [ThreatLevel.HIGH, ThreatLevel.CRITICAL]]
-                
-                if critical_threats:
-                    await self._handle_critical_threats(security_context, critical_threats)
-                    if security_context.blocked:
-                        return self._create_blocked_response(security_context.block_reason, security_context)
-            
-            # Security Layer 4: Authentication (if required)
-            if self._requires_authentication(path):
-                auth_context = await self.auth_manager.authenticate_request(request)
-                security_context.auth_context = auth_context
-                
-                if not auth_context:
-                    self.auth_failures += 1
-                    await self._log_security_event(
-                        security_context,
-                        "authentication_failed",
-                        "Authentication required but not provided"
-                    )
-                    return self._create_auth_required_response()
-                
-                # Authorization check
-                if not await self._check_authorization(auth_context, path, method):
-                    await self._log_security_event(
-                        security_context,
-                        "authorization_failed",
-                        "Insufficient permissions"
-                    )
-                    return self._create_forbidden_response()
-            
-            # Security Layer 5: Endpoint-specific security
-            security_context.security_level = self._determine_security_level(path)
-            
-            # Add security context to request state
-            request.state.security_context = security_context
-            
-            # Process request
-            response = await call_next(request)
-            
-            # Post-processing security checks
-            await self._post_process_security(request, response, security_context)
+        # Security Layer 1: IP-based filtering
+        if self.config.enable_ip_blocking:
+            if await self._check_ip_blocking(security_context):
+                return self._create_blocked_response("IP blocked", security_context)
+        
+        # Security Layer 2: Rate limiting
+        if self.config.enable_rate_limiting:
+            if await self._check_rate_limiting(security_context):
+                return self._create_blocked_response("Rate limit exceeded", security_context)
+        
+        # Security Layer 3: Threat detection
+        if self.config.enable_threat_detection:
+            await self._detect_threats(request, security_context)
             
-            # Add security headers
-            self._add_security_headers(response, security_context)
+            # Bodies the scanner could not inspect in full, when configured to reject them
+            if any(t.reject_request for t in security_context.threats_detected):
+                return self._create_unscannable_response(security_context)
             
-            # Log compliance events
-            if self.config.enable_compliance_logging:
-                await self._log_compliance_event(request, response, security_context)
+            # Block high-severity threats
+            critical_threats = [t for t in security_context.threats_detected 
+                              if t.threat_level in [ThreatLevel.HIGH, ThreatLevel.CRITICAL]]
             
-            return response
+            if critical_threats:
+                await self._handle_critical_threats(security_context, critical_threats)
+                if security_context.blocked:
+                    return self._create_blocked_response(security_context.block_reason, security_context)
+        
+        # Security Layer 4: Authentication (if required)
+        if self._requires_authentication(path):
+            auth_context = await self.auth_manager.authenticate_request(request)
+            security_context.auth_context = auth_context
             
-        except Exception as e:
-            self.logger.error("Security middleware error",
-                            correlation_id=correlation_id,
-                            error=str(e),
-                            ip_address=ip_address)
+            if not auth_context:
+                self.auth_failures += 1
+                await self._log_security_event(
+                    security_context,
+                    "authentication_failed",
+                    "Authentication required but not provided"
+                )
+                return self._create_auth_required_response()
             
-            # Log security incident
+            # Authorization check
+            if not await self._check_authorization(auth_context, path, method):
+                await self._log_security_event(
+                    security_context,
+                    "authorization_failed",
+                    "Insufficient permissions"
+                )
+                return self._create_forbidden_response()
+        
+        # Security Layer 5: Endpoint-specific security
+        security_context.security_level = self._determine_security_level(path)
+        
+        # Add security context to request state
+        request.state.security_context = security_context
+        state["forwarded"] = True
+        
+        return None
+    
+    async def on_response_start(self, ctx: HTTPContext, response: ResponseInfo) -> None:
+        """Add security headers to the downstream response"""
+        self._add_security_headers(response, ctx.layer_state(self)["security_context"])
+    
+    async def on_error(self, ctx: HTTPContext, exc: Exception) -> Optional[Response]:
+        security_context = ctx.layer_state(self).get("security_context")
+        correlation_id = security_context.request_id if security_context else get_correlation_id()
+        
+        self.logger.error("Security middleware error",
+                        correlation_id=correlation_id,
+                        error=str(exc),
+                        ip_address=security_context.ip_address if security_context else None)
+        
+        # Log security incident
+        if security_context is not None:
             await self._log_security_event(
                 security_context,
                 "middleware_error",
-                f"Security middleware error: {str(e)}"
-            )
-            
-            # Return generic error to avoid information disclosure
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "error": "Internal server error",
-                    "correlation_id": correlation_id
-                }
+                f"Security middleware error: {str(exc)}"
             )
         
-        finally:
-            # Record processing time
-            processing_time = time.time() - start_time
-            self.logger.debug("Security middleware processed request",
-                            correlation_id=correlation_id,
-                            processing_time_ms=processing_time * 1000,
-                            threats_detected=len(security_context.threats_detected),
-                            blocked=security_context.blocked)
+        # Return generic error to avoid information disclosure
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": "Internal server error",
+                "correlation_id": correlation_id
+            }
+        )
+    
+    async def on_complete(self, ctx: HTTPContext, error: Optional[BaseException]) -> None:
+        state = ctx.layer_state(self)
+        security_context = state.get("security_context")
+        if security_context is None:
+            return
+        
+        # Response checks only apply to responses produced downstream
+        if error is None and state.get("forwarded") and ctx.response is not None:
+            # Post-processing security checks
+            await self._post_process_security(ctx.request, ctx.response, security_context)
+            
+            # Log compliance events
+            if self.config.enable_compliance_logging:
+                await self._log_compliance_event(ctx.request, ctx.response, security_context)
+        
+        # Record processing time
+        processing_time = time.time() - state["start_time"]
+        self.logger.debug("Security middleware processed request",
+                        correlation_id=security_context.request_id,
+                        processing_time_ms=processing_time * 1000,
+                        threats_detected=len(security_context.threats_detected),
+                        blocked=security_context.blocked)
     
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP address considering proxies"""
@@ -268,49 +292,43 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     async def _check_rate_limiting(self, security_context: SecurityContext) -> bool:
         """Check rate limiting violations"""
         ip = security_context.ip_address
-        current_time = datetime.utcnow()
-        
-        # Initialize rate limit tracking for IP
-        if ip not in self.rate_limits:
-            self.rate_limits[ip] = []
         
-        # Clean old requests (older than 1 hour)
-        self.rate_limits[ip] = [
-            req_time for req_time in self.rate_limits[ip]
-            if current_time - req_time < timedelta(hours=1)
-        ]
-        
-        # Add current request
-        self.rate_limits[ip].append(current_time)
-        
-        # Check per-minute limit
-        recent_requests = [
-            req_time for req_time in self.rate_limits[ip]
-            if current_time - req_time < timedelta(minutes=1)
-        ]
+        decision = await self.rate_limiter.check(f"ip:{ip}", self.rate_limit_quotas)
+        if decision.allowed:
+            return False
         
-        if len(recent_requests) > self.config.max_requests_per_minute:
-            self.rate_limit_violations += 1
-            security_context.blocked = True
-            security_context.block_reason = f"Rate limit exceeded: {len(recent_requests)} requests per minute"
-            
-            # Temporary block for repeat offenders
-            if len(recent_requests) > self.config.max_requests_per_minute * 2:
-                self.blocked_ips[ip] = current_time + timedelta(minutes=15)
-            
-            return True
+        self.rate_limit_violations += 1
+        security_context.blocked = True
+        current_time = datetime.utcnow()
         
-        # Check per-hour limit
-        if len(self.rate_limits[ip]) > self.config.max_requests_per_hour:
-            self.rate_limit_violations += 1
-            security_context.blocked = True
-            security_context.block_reason = f"Hourly rate limit exceeded: {len(self.rate_limits[ip])} requests per hour"
+        if decision.quota == "security:hour":
+            security_context.block_reason = (
+                f"Hourly rate limit exceeded: {self.config.max_requests_per_hour} requests per hour"
+            )
             
             # Longer block for excessive hourly usage
             self.blocked_ips[ip] = current_time + timedelta(hours=1)
             return True
         
-        return False
+        security_context.block_reason = (
+            f"Rate limit exceeded: {self.config.max_requests_per_minute} requests per minute"
+        )
+        
+        # Temporary block for repeat offenders: rejected more than the limit again within a minute
+        now = time.time()
+        strikes = self.rate_limit_strikes.get(ip)
+        if strikes is None or now - strikes[1] > 60:
+            if len(self.rate_limit_strikes) > 10000:
+                self.rate_limit_strikes = {
+                    k: v for k, v in self.rate_limit_strikes.items() if now - v[1] <= 60
+                }
+            strikes = self.rate_limit_strikes[ip] = [0, now]
+        strikes[0] += 1
+        if strikes[0] > self.config.max_requests_per_minute:
+            self.blocked_ips[ip] = current_time + timedelta(minutes=15)
+            del self.rate_limit_strikes[ip]
+        
+        return True
     
     async def _detect_threats(self, request: Request, security_context: SecurityContext):
         """Detect security threats in request"""
@@ -438,7 +456,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     async def _post_process_security(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         security_context: SecurityContext
     ):
         """Post-process security after request handling"""
@@ -454,7 +472,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     async def _check_error_response_security(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         security_context: SecurityContext
     ):
         """Check error responses for information disclosure"""
@@ -475,7 +493,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     async def _monitor_response_patterns(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         security_context: SecurityContext
     ):
         """Monitor response patterns for anomalies"""
@@ -487,7 +505,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         
         pass  # Placeholder for advanced monitoring
     
-    def _add_security_headers(self, response: Response, security_context: SecurityContext):
+    def _add_security_headers(self, response: ResponseInfo, security_context: SecurityContext):
         """Add security headers to response"""
         
         # Basic security headers
@@ -557,7 +575,7 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     async def _log_compliance_event(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         security_context: SecurityContext
     ):
         """Log compliance event for audit trail"""
@@ -607,6 +625,16 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 data_classification=data_classification
             )
     
+    def _create_unscannable_response(self, security_context: SecurityContext) -> JSONResponse:
+        """Create response for request bodies too large to scan"""
+        return JSONResponse(
+            status_code=413,
+            content={
+                "error": "Request body too large to scan",
+                "correlation_id": security_context.request_id
+            }
+        )
+    
     def _create_blocked_response(self, reason: str, security_context: SecurityContext) -> JSONResponse:
         """Create response for blocked requests"""
         return JSONResponse(
@@ -656,7 +684,8 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             "auth_failures": self.auth_failures,
             "rate_limit_violations": self.rate_limit_violations,
             "blocked_ips_count": len(self.blocked_ips),
-            "monitored_ips_count": len(self.rate_limits),
+            "monitored_ips_count": self.rate_limiter.count_local_keys(self.rate_limit_quotas[0]),
+            "rate_limiter": self.rate_limiter.get_stats(),
             "whitelist_size": len(self.ip_whitelist),
             "blacklist_size": len(self.ip_blacklist)
         }
@@ -731,7 +760,7 @@ class ComplianceSecurityMiddleware(SecurityMiddleware):
     async def _log_compliance_event(
         self,
         request: Request,
-        response: Response,
+        response: ResponseInfo,
         security_context: SecurityContext
     ):
         """Enhanced compliance logging with additional privacy checks"""
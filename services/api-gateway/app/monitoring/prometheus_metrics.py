@@ -266,6 +266,21 @@ class PrometheusMetrics:
             labelnames=base_labels + ['service_name', 'result'],
             registry=self.registry
         )
+        
+        self.connection_pool_acquire_seconds = Histogram(
+            'connection_pool_acquire_seconds',
+            'Time requests wait for a connection pool slot',
+            labelnames=base_labels + ['service_name', 'endpoint'],
+            buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+            registry=self.registry
+        )
+        
+        self.connection_pool_limit = Gauge(
+            'connection_pool_limit',
+            'Current concurrency limit of the connection pool',
+            labelnames=base_labels + ['service_name', 'endpoint'],
+            registry=self.registry
+        )
     
     def _init_security_metrics(self):
         """Initialize security metrics"""
@@ -457,6 +472,27 @@ class PrometheusMetrics:
         
         self.service_health_checks_total.labels(**labels).inc()
     
+    def record_connection_pool_acquire(self, service_name: str, endpoint: str, wait_seconds: float):
+        """Record how long a request waited for a connection pool slot"""
+        labels = {
+            **self.base_labels.to_dict(),
+            'service_name': service_name,
+            'endpoint': endpoint
+        }
+        
+        self.connection_pool_acquire_seconds.labels(**labels).observe(wait_seconds)
+    
+    def update_connection_pool(self, service_name: str, active: int, limits: Dict[str, int]):
+        """Update in-flight requests of a service and the pool limit of each endpoint"""
+        labels = {
+            **self.base_labels.to_dict(),
+            'service_name': service_name
+        }
+        
+        self.connection_pool_connections_active.labels(**labels).set(active)
+        for endpoint, limit in limits.items():
+            self.connection_pool_limit.labels(**labels, endpoint=endpoint).set(limit)
+    
     # Security Metrics Methods
     def record_auth_attempt(self, success: bool, method: str):
         """Record authentication attempt"""
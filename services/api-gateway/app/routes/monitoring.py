@@ -468,6 +468,32 @@ async def get_debug_trace_context(
             status_code=500
         )
 
+@router.get("/debug/middleware-timings")
+async def get_middleware_timings(
+    request: Request,
+    reset: bool = Query(False, description="Reset counters after reading"),
+    logger: StructuredLogger = Depends(get_logger)
+) -> JSONResponse:
+    """Per-layer middleware overhead (requires MIDDLEWARE_BENCHMARK_MODE)"""
+    correlation_id = get_correlation_id()
+    timings = getattr(request.app.state, "middleware_timings", None)
+    
+    if timings is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Middleware benchmark mode is disabled"
+        )
+    
+    report = timings.get_report()
+    if reset:
+        timings.reset()
+    
+    return JSONResponse(content={
+        "timestamp": logger._get_timestamp(),
+        "correlation_id": correlation_id,
+        "middleware_timings": report
+    })
+
 @router.post("/test/alert")
 async def trigger_test_alert(
     request: Request,
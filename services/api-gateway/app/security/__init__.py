@@ -55,6 +55,14 @@ from .vulnerability_scanner import (
     ScanResult
 )
 
+from .rate_limiter import (
+    UnifiedRateLimiter,
+    RateLimitAlgorithm,
+    RateLimitQuota,
+    RateLimitDecision,
+    create_rate_limiter
+)
+
 __all__ = [
     # Advanced Authentication
     "AdvancedAuthManager",
@@ -101,5 +109,12 @@ __all__ = [
     "ScanType",
     "VulnerabilitySeverity",
     "SecurityVulnerability",
-    "ScanResult"
+    "ScanResult",
+    
+    # Rate Limiting
+    "UnifiedRateLimiter",
+    "RateLimitAlgorithm",
+    "RateLimitQuota",
+    "RateLimitDecision",
+    "create_rate_limiter"
 ]
\ No newline at end of file
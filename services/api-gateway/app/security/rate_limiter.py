@@ -0,0 +1,423 @@
+"""
+Unified Rate Limiter
+Single-round-trip GCRA / token-bucket limiter shared by every gateway rate-limiting layer
+"""
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+from shared.monitoring.structured_logger import StructuredLogger
+
+
+class RateLimitAlgorithm(str, Enum):
+    """Supported limiting algorithms"""
+    GCRA = "gcra"
+    TOKEN_BUCKET = "token_bucket"
+
+
+@dataclass(frozen=True)
+class RateLimitQuota:
+    """A rate of ``limit`` requests per ``period_seconds`` with an optional burst size"""
+    name: str
+    limit: int
+    period_seconds: float
+    burst: Optional[int] = None
+    algorithm: RateLimitAlgorithm = RateLimitAlgorithm.GCRA
+
+    @property
+    def capacity(self) -> int:
+        """Requests that may be admitted back-to-back from an idle state"""
+        return self.burst if self.burst is not None else self.limit
+
+    @property
+    def interval_ms(self) -> float:
+        """Milliseconds between requests at the sustained rate"""
+        return self.period_seconds * 1000.0 / self.limit
+
+
+@dataclass
+class RateLimitDecision:
+    """Outcome of one limiter call, reported for the most restrictive quota"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0   # seconds until the request would be admitted
+    reset_after: float = 0.0   # seconds until the quota is fully replenished
+    quota: Optional[str] = None
+    key: Optional[str] = None
+    source: str = "memory"     # "redis", "memory" or "local"
+
+
+# One (key, quota) pair; a limiter call admits a request only if every pair admits it
+RateLimitTarget = Tuple[str, RateLimitQuota]
+
+
+# KEYS[i]: state key per (key, quota) pair
+# ARGV[1]: cost of this request, ARGV[2]: debt already admitted by the local tier
+# ARGV[3i..3i+2]: algorithm, emission interval (ms), capacity for KEYS[i]
+# Returns {allowed, remaining_1, retry_ms_1, reset_ms_1, remaining_2, ...}
+RATE_LIMIT_SCRIPT = """
+if redis.replicate_commands then pcall(redis.replicate_commands) end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local cost = tonumber(ARGV[1])
+local debt = tonumber(ARGV[2])
+local allowed = 1
+local algos, intervals, capacities, keep, nxt, ok = {}, {}, {}, {}, {}, {}
+
+for i = 1, #KEYS do
+  local base = 2 + (i - 1) * 3
+  local algo = ARGV[base + 1]
+  local interval = tonumber(ARGV[base + 2])
+  local capacity = tonumber(ARGV[base + 3])
+  algos[i], intervals[i], capacities[i] = algo, interval, capacity
+  if algo == 'gcra' then
+    local tat = tonumber(redis.call('GET', KEYS[i])) or now
+    if tat < now then tat = now end
+    keep[i] = tat + debt * interval
+    nxt[i] = keep[i] + cost * interval
+    ok[i] = nxt[i] - interval * capacity <= now
+  else
+    local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(now - ts, 0) / interval)
+    keep[i] = tokens - debt
+    nxt[i] = keep[i] - cost
+    ok[i] = nxt[i] >= 0
+  end
+  if not ok[i] then allowed = 0 end
+end
+
+local out = {allowed}
+for i = 1, #KEYS do
+  local interval, capacity = intervals[i], capacities[i]
+  local state = keep[i]
+  if allowed == 1 then state = nxt[i] end
+  local remaining, retry, reset
+  if algos[i] == 'gcra' then
+    remaining = math.floor((interval * capacity - (state - now)) / interval + 1e-9)
+    reset = state - now
+    retry = 0
+    if not ok[i] then retry = nxt[i] - interval * capacity - now end
+    redis.call('SET', KEYS[i], tostring(state), 'PX', math.ceil(reset) + 1000)
+  else
+    remaining = math.floor(state + 1e-9)
+    reset = (capacity - state) * interval
+    retry = 0
+    if not ok[i] then retry = (cost - keep[i]) * interval end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(state), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(reset) + 1000)
+  end
+  if remaining < 0 then remaining = 0 end
+  out[#out + 1] = remaining
+  out[#out + 1] = math.ceil(retry)
+  out[#out + 1] = math.ceil(reset)
+end
+return out
+"""
+
+
+@dataclass
+class _LocalLease:
+    """Admission budget handed to this process by the last authoritative decision"""
+    budget: int
+    expires_at: float
+    decision: RateLimitDecision
+    pending: int = 0
+
+
+class _MemoryBackend:
+    """In-process implementation of the script, used without Redis and as its fallback"""
+
+    PRUNE_EVERY = 1024
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # state key -> (algorithm state, expires_at in ms)
+        self.states: Dict[str, Tuple[Any, float]] = {}
+        self._operations = 0
+
+    def evaluate(self, keys: List[str], quotas: List[RateLimitQuota], cost: int, debt: int,
+                 now_ms: float) -> List[Tuple[bool, int, float, float]]:
+        """Mirror of ``RATE_LIMIT_SCRIPT``; returns (allowed, remaining, retry_ms, reset_ms) per key"""
+        self._operations += 1
+        if self._operations % self.PRUNE_EVERY == 0 or len(self.states) > self.max_keys:
+            self._prune(now_ms)
+
+        keep, nxt, ok = [], [], []
+        for key, quota in zip(keys, quotas):
+            interval, capacity = quota.interval_ms, quota.capacity
+            stored = self.states.get(key)
+            if quota.algorithm == RateLimitAlgorithm.GCRA:
+                tat = max(stored[0] if stored else now_ms, now_ms)
+                kept = tat + debt * interval
+                advanced = kept + cost * interval
+                ok.append(advanced - interval * capacity <= now_ms)
+            else:
+                tokens, ts = stored[0] if stored else (capacity, now_ms)
+                tokens = min(capacity, tokens + max(now_ms - ts, 0) / interval)
+                kept = tokens - debt
+                advanced = kept - cost
+                ok.append(advanced >= 0)
+            keep.append(kept)
+            nxt.append(advanced)
+
+        allowed = all(ok)
+        results = []
+        for i, (key, quota) in enumerate(zip(keys, quotas)):
+            interval, capacity = quota.interval_ms, quota.capacity
+            state = nxt[i] if allowed else keep[i]
+            if quota.algorithm == RateLimitAlgorithm.GCRA:
+                remaining = math.floor((interval * capacity - (state - now_ms)) / interval + 1e-9)
+                reset = state - now_ms
+                retry = 0.0 if ok[i] else nxt[i] - interval * capacity - now_ms
+                self.states[key] = (state, now_ms + reset + 1000)
+            else:
+                remaining = math.floor(state + 1e-9)
+                reset = (capacity - state) * interval
+                retry = 0.0 if ok[i] else (cost - keep[i]) * interval
+                self.states[key] = ((state, now_ms), now_ms + reset + 1000)
+            results.append((allowed, max(remaining, 0), retry, reset))
+        return results
+
+    def _prune(self, now_ms: float):
+        expired = [key for key, (_, expires_at) in self.states.items() if expires_at <= now_ms]
+        for key in expired:
+            del self.states[key]
+        # Still over budget: drop the oldest states (they restart with a full quota)
+        overflow = len(self.states) - self.max_keys
+        if overflow > 0:
+            for key in list(self.states)[:overflow]:
+                del self.states[key]
+
+
+class UnifiedRateLimiter:
+    """Rate limiter shared by the gateway middleware layers
+
+    Every call evaluates all of its (key, quota) targets atomically: with Redis
+    that is one ``EVALSHA`` round trip using server time, otherwise the same
+    algorithm runs in process. When an authoritative decision shows a client
+    far below its limits, this process is leased a small admission budget so
+    the following requests are admitted locally; the admitted count is
+    charged to Redis as debt on the next round trip. Across N gateway
+    replicas the overshoot is bounded by N leases per lease period.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[Any] = None,
+        logger: Optional[StructuredLogger] = None,
+        key_prefix: str = "ratelimit",
+        local_budget_fraction: float = 0.1,
+        local_min_headroom: float = 0.5,
+        local_lease_seconds: float = 1.0,
+        max_local_keys: int = 100_000
+    ):
+        self.redis_client = redis_client
+        self.logger = logger
+        self.key_prefix = key_prefix
+        self.local_budget_fraction = local_budget_fraction
+        self.local_min_headroom = local_min_headroom
+        self.local_lease_seconds = local_lease_seconds
+        self.max_local_keys = max_local_keys
+
+        self._script = redis_client.register_script(RATE_LIMIT_SCRIPT) if redis_client is not None else None
+        self._memory = _MemoryBackend(max_local_keys)
+        self._leases: "OrderedDict[Tuple[RateLimitTarget, ...], _LocalLease]" = OrderedDict()
+        self._redis_healthy = True
+
+        self.stats = {
+            "decisions": 0,
+            "denied": 0,
+            "redis_calls": 0,
+            "redis_errors": 0,
+            "memory_decisions": 0,
+            "local_admissions": 0,
+            "dropped_debt": 0
+        }
+
+    async def check(self, key: str, quotas: Sequence[RateLimitQuota], cost: int = 1) -> RateLimitDecision:
+        """Admit one request for ``key`` against every quota in ``quotas``"""
+        return await self.acquire([(key, quota) for quota in quotas], cost)
+
+    async def acquire(self, targets: Sequence[RateLimitTarget], cost: int = 1) -> RateLimitDecision:
+        """Admit one request against all ``targets`` in a single atomic step"""
+        self.stats["decisions"] += 1
+        targets = tuple(targets)
+        if not targets:
+            return RateLimitDecision(allowed=True, limit=0, remaining=0)
+
+        now = time.time()
+        debt = 0
+
+        if self._script is not None:
+            lease = self._leases.get(targets)
+            if lease is not None:
+                if now < lease.expires_at and lease.budget >= cost:
+                    lease.budget -= cost
+                    lease.pending += cost
+                    self.stats["local_admissions"] += 1
+                    return replace(
+                        lease.decision,
+                        remaining=max(lease.decision.remaining - lease.pending, 0),
+                        source="local"
+                    )
+                debt = lease.pending
+                del self._leases[targets]
+
+        keys = [self._state_key(key, quota) for key, quota in targets]
+        quotas = [quota for _, quota in targets]
+
+        results = None
+        source = "redis"
+        if self._script is not None:
+            results = await self._evaluate_redis(keys, quotas, cost, debt)
+        if results is None:
+            source = "memory"
+            self.stats["memory_decisions"] += 1
+            results = self._memory.evaluate(keys, quotas, cost, debt, now * 1000)
+
+        decision = self._summarise(targets, results, source)
+        if not decision.allowed:
+            self.stats["denied"] += 1
+        elif source == "redis":
+            self._maybe_lease(targets, results, decision, now)
+
+        return decision
+
+    async def _evaluate_redis(self, keys: List[str], quotas: List[RateLimitQuota], cost: int,
+                              debt: int) -> Optional[List[Tuple[bool, int, float, float]]]:
+        """Run the limiter script; None means Redis is unavailable"""
+        args: List[Any] = [cost, debt]
+        for quota in quotas:
+            args.extend([quota.algorithm.value, quota.interval_ms, quota.capacity])
+
+        try:
+            self.stats["redis_calls"] += 1
+            raw = await self._script(keys=keys, args=args)
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            if self._redis_healthy and self.logger:
+                self.logger.warning("Rate limiter falling back to local state", error=str(e))
+            self._redis_healthy = False
+            return None
+
+        if not self._redis_healthy and self.logger:
+            self.logger.info("Rate limiter Redis backend recovered")
+        self._redis_healthy = True
+
+        allowed = bool(int(raw[0]))
+        return [
+            (allowed, int(raw[1 + i * 3]), float(raw[2 + i * 3]), float(raw[3 + i * 3]))
+            for i in range(len(keys))
+        ]
+
+    def _maybe_lease(self, targets: Tuple[RateLimitTarget, ...], results: List[Tuple[bool, int, float, float]],
+                     decision: RateLimitDecision, now: float):
+        """Grant a local budget when every quota still has ample headroom"""
+        budget = None
+        for (_, quota), (_, remaining, _, _) in zip(targets, results):
+            if remaining < quota.capacity * self.local_min_headroom:
+                return
+            quota_budget = int(remaining * self.local_budget_fraction)
+            budget = quota_budget if budget is None else min(budget, quota_budget)
+        if not budget:
+            return
+
+        self._leases[targets] = _LocalLease(
+            budget=budget,
+            expires_at=now + self.local_lease_seconds,
+            decision=decision
+        )
+        while len(self._leases) > self.max_local_keys:
+            _, evicted = self._leases.popitem(last=False)
+            self.stats["dropped_debt"] += evicted.pending
+
+    @staticmethod
+    def _summarise(targets: Tuple[RateLimitTarget, ...], results: List[Tuple[bool, int, float, float]],
+                   source: str) -> RateLimitDecision:
+        allowed = results[0][0]
+        if allowed:
+            # Report the quota closest to exhaustion
+            index = min(range(len(results)), key=lambda i: results[i][1] / targets[i][1].capacity)
+        else:
+            # Report the quota that keeps the client waiting longest
+            index = max(range(len(results)), key=lambda i: results[i][2])
+
+        key, quota = targets[index]
+        _, remaining, retry_ms, reset_ms = results[index]
+        return RateLimitDecision(
+            allowed=allowed,
+            limit=quota.limit,
+            remaining=remaining,
+            retry_after=max(retry_ms, 0.0) / 1000.0,
+            reset_after=max(reset_ms, 0.0) / 1000.0,
+            quota=quota.name,
+            key=key,
+            source=source
+        )
+
+    def _state_key(self, key: str, quota: RateLimitQuota) -> str:
+        return f"{self.key_prefix}:{quota.algorithm.value}:{quota.name}:{key}"
+
+    async def close(self):
+        """Close the Redis connection pool"""
+        if self.redis_client is not None:
+            await self.redis_client.close()
+
+    def clear_local(self):
+        """Drop in-process limiter state and outstanding leases"""
+        self._memory.states.clear()
+        self._leases.clear()
+
+    def get_local_status(self, key: str) -> Dict[str, Any]:
+        """In-process view of the quotas tracked for ``key``"""
+        suffix = f":{key}"
+        return {
+            "identifier": key,
+            "tracked_quotas": [
+                state_key[len(self.key_prefix) + 1:-len(suffix)]
+                for state_key in self._memory.states
+                if state_key.endswith(suffix)
+            ],
+            "active_leases": sum(1 for targets in self._leases if any(k == key for k, _ in targets))
+        }
+
+    def count_local_keys(self, quota: RateLimitQuota) -> int:
+        """Number of keys with in-process state for ``quota``"""
+        prefix = self._state_key("", quota)
+        return sum(1 for state_key in self._memory.states if state_key.startswith(prefix))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Limiter statistics"""
+        decisions = max(self.stats["decisions"], 1)
+        return {
+            **self.stats,
+            "backend": "redis" if self._script is not None else "memory",
+            "redis_healthy": self._redis_healthy,
+            "active_leases": len(self._leases),
+            "local_keys": len(self._memory.states),
+            "local_admission_rate": self.stats["local_admissions"] / decisions,
+            "redis_calls_per_decision": self.stats["redis_calls"] / decisions
+        }
+
+
+def create_rate_limiter(settings: Any, logger: Optional[StructuredLogger] = None) -> UnifiedRateLimiter:
+    """Build the gateway limiter from settings; without a Redis URL it is process-local"""
+    redis_client = None
+    if settings.rate_limit_redis_url:
+        # Connections are opened lazily on the first script call
+        redis_client = redis.Redis.from_url(settings.rate_limit_redis_url, decode_responses=True)
+
+    return UnifiedRateLimiter(
+        redis_client=redis_client,
+        logger=logger,
+        local_budget_fraction=settings.rate_limit_local_budget_fraction,
+        local_lease_seconds=settings.rate_limit_local_lease_seconds
+    )
@@ -19,6 +19,7 @@ from fastapi import Request, Response
 import httpx
 
 from app.core.config import Settings
+from app.security.scan_engine import BodyScanPlan, BodySegment, CompiledPatternSet, RequestBodyExtractor, ScanLimits
 from shared.monitoring.structured_logger import StructuredLogger
 
 class ThreatLevel(str, Enum):
@@ -76,6 +77,7 @@ class SecurityThreat:
     attack_patterns: List[AttackPattern] = field(default_factory=list)
     remediation: List[str] = field(default_factory=list)
     confidence_score: float = 0.0
+    reject_request: bool = False
 
 @dataclass
 class SecurityScanResult:
@@ -92,10 +94,13 @@ class SecurityScanResult:
     completed_at: datetime
     recommendations: List[str] = field(default_factory=list)
 
+# Whole-string base64, decoded before XSS / path traversal matching
+_BASE64_TEXT = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
+
 class SecurityScanner:
     """Advanced security scanner for threat detection and vulnerability assessment"""
     
-    def __init__(self, settings: Settings, logger: StructuredLogger):
+    def __init__(self, settings: Settings, logger: StructuredLogger, scan_limits: Optional[ScanLimits] = None):
         self.settings = settings
         self.logger = logger
         
@@ -105,6 +110,15 @@ class SecurityScanner:
         self.path_traversal_patterns = self._load_path_traversal_patterns()
         self.command_injection_patterns = self._load_command_injection_patterns()
         
+        # Each pattern set is compiled once into a single combined matcher
+        self.sql_injection_matcher = CompiledPatternSet(self.sql_injection_patterns)
+        self.xss_matcher = CompiledPatternSet(self.xss_patterns)
+        self.path_traversal_matcher = CompiledPatternSet(self.path_traversal_patterns)
+        self.command_injection_matcher = CompiledPatternSet(self.command_injection_patterns)
+        
+        # Budgeted body extraction that skips opaque payloads such as screenshots
+        self.body_extractor = RequestBodyExtractor(scan_limits or ScanLimits.from_settings(settings))
+        
         # IP reputation and geolocation data
         self.malicious_ips: Set[str] = set()
         self.suspicious_ips: Set[str] = set()
@@ -112,6 +126,7 @@ class SecurityScanner:
         
         # Bot detection patterns
         self.bot_patterns = self._load_bot_patterns()
+        self.bot_matcher = CompiledPatternSet(self.bot_patterns)
         self.suspicious_user_agents = self._load_suspicious_user_agents()
         
         # Attack tracking
@@ -325,21 +340,25 @@ class SecurityScanner:
         url = str(request.url)
         headers = dict(request.headers)
         
-        # Get request body if available
-        body = None
+        # Select the request body text to scan, skipping opaque payloads
+        body_segments: List[BodySegment] = []
         try:
             if method in ["POST", "PUT", "PATCH"]:
                 body = await request.body()
                 if body:
-                    body = body.decode('utf-8', errors='ignore')
+                    plan = self.body_extractor.extract(body, headers.get("content-type", ""))
+                    body_segments = plan.segments
+                    if plan.truncated:
+                        # Unscanned text must never pass silently
+                        threats.append(self._truncated_body_threat(request, plan, len(body)))
         except Exception:
             pass
         
         # Scan for various threats
-        threats.extend(await self._scan_sql_injection(request, url, headers, body))
-        threats.extend(await self._scan_xss(request, url, headers, body))
+        threats.extend(await self._scan_sql_injection(request, url, headers, body_segments))
+        threats.extend(await self._scan_xss(request, url, headers, body_segments))
         threats.extend(await self._scan_path_traversal(request, url, headers))
-        threats.extend(await self._scan_command_injection(request, url, headers, body))
+        threats.extend(await self._scan_command_injection(request, url, headers, body_segments))
         threats.extend(await self._scan_bot_activity(request, user_agent, ip_address))
         threats.extend(await self._scan_brute_force(request, ip_address))
         threats.extend(await self._scan_suspicious_headers(request, headers))
@@ -351,12 +370,44 @@ class SecurityScanner:
         
         return threats
     
+    def _truncated_body_threat(self, request: Request, plan: BodyScanPlan, body_bytes: int) -> SecurityThreat:
+        """Report a body whose text did not fit in the scan budget"""
+        reject = self.body_extractor.limits.reject_truncated
+        self.logger.warning("Request body scan truncated at budget",
+                            path=request.url.path,
+                            scanned_chars=plan.scanned_chars,
+                            body_bytes=body_bytes,
+                            rejected=reject)
+        return SecurityThreat(
+            threat_id=self._generate_threat_id(),
+            threat_type=VulnerabilityType.SUSPICIOUS_ACTIVITY,
+            threat_level=ThreatLevel.HIGH if reject else ThreatLevel.MEDIUM,
+            title="Request Body Not Fully Scanned",
+            description="Request body exceeds the scan budget; content past the budget was not inspected",
+            evidence={
+                "scanned_chars": plan.scanned_chars,
+                "body_bytes": body_bytes,
+                "max_body_chars": self.body_extractor.limits.max_body_chars,
+                "max_fields": self.body_extractor.limits.max_fields
+            },
+            source_ip=request.client.host if request.client else None,
+            endpoint=request.url.path,
+            confidence_score=0.5,
+            attack_patterns=[AttackPattern.DEFENSE_EVASION],
+            remediation=[
+                "Reject oversized request bodies",
+                "Raise SECURITY_SCAN_MAX_BODY_CHARS / SECURITY_SCAN_MAX_FIELDS if legitimate",
+                "Mark binary upload fields with SECURITY_SCAN_OPAQUE_PATHS"
+            ],
+            reject_request=reject
+        )
+    
     async def _scan_sql_injection(
         self,
         request: Request,
         url: str,
         headers: Dict[str, str],
-        body: Optional[str]
+        body_segments: List[BodySegment]
     ) -> List[SecurityThreat]:
         """Scan for SQL injection attempts"""
         threats = []
@@ -373,13 +424,14 @@ class SecurityScanner:
                         threat.source_ip = request.client.host if request.client else None
                         threats.append(threat)
         
-        # Scan request body
-        if body:
-            threat = self._check_sql_patterns(body, "Request body")
+        # Scan request body; one threat per body, located by JSON path
+        for segment in body_segments:
+            threat = self._check_sql_patterns(segment.text, segment.location)
             if threat:
                 threat.endpoint = parsed_url.path
                 threat.source_ip = request.client.host if request.client else None
                 threats.append(threat)
+                break
         
         # Scan specific headers
         suspicious_headers = ["x-forwarded-for", "x-real-ip", "referer", "user-agent"]
@@ -398,32 +450,31 @@ class SecurityScanner:
         if not content:
             return None
         
-        for pattern_info in self.sql_injection_patterns:
+        hit = self.sql_injection_matcher.search(content)
+        if hit:
+            pattern_info, _ = hit
             pattern = pattern_info["pattern"]
-            flags = pattern_info.get("flags", 0)
-            
-            if re.search(pattern, content, flags):
-                return SecurityThreat(
-                    threat_id=self._generate_threat_id(),
-                    threat_type=VulnerabilityType.SQL_INJECTION,
-                    threat_level=ThreatLevel.HIGH,
-                    title="SQL Injection Attempt Detected",
-                    description=f"Potential SQL injection detected in {location}: {pattern_info['description']}",
-                    evidence={
-                        "pattern": pattern,
-                        "matched_content": content[:200],  # First 200 chars
-                        "location": location,
-                        "confidence": pattern_info["confidence"]
-                    },
-                    confidence_score=pattern_info["confidence"],
-                    attack_patterns=[AttackPattern.EXPLOITATION],
-                    remediation=[
-                        "Use parameterized queries or prepared statements",
-                        "Implement input validation and sanitization",
-                        "Apply principle of least privilege to database accounts",
-                        "Enable SQL injection detection in WAF"
-                    ]
-                )
+            return SecurityThreat(
+                threat_id=self._generate_threat_id(),
+                threat_type=VulnerabilityType.SQL_INJECTION,
+                threat_level=ThreatLevel.HIGH,
+                title="SQL Injection Attempt Detected",
+                description=f"Potential SQL injection detected in {location}: {pattern_info['description']}",
+                evidence={
+                    "pattern": pattern,
+                    "matched_content": content[:200],  # First 200 chars
+                    "location": location,
+                    "confidence": pattern_info["confidence"]
+                },
+                confidence_score=pattern_info["confidence"],
+                attack_patterns=[AttackPattern.EXPLOITATION],
+                remediation=[
+                    "Use parameterized queries or prepared statements",
+                    "Implement input validation and sanitization",
+                    "Apply principle of least privilege to database accounts",
+                    "Enable SQL injection detection in WAF"
+                ]
+            )
         
         return None
     
@@ -432,7 +483,7 @@ class SecurityScanner:
         request: Request,
         url: str,
         headers: Dict[str, str],
-        body: Optional[str]
+        body_segments: List[BodySegment]
     ) -> List[SecurityThreat]:
         """Scan for XSS attempts"""
         threats = []
@@ -449,13 +500,14 @@ class SecurityScanner:
                         threat.source_ip = request.client.host if request.client else None
                         threats.append(threat)
         
-        # Scan request body
-        if body:
-            threat = self._check_xss_patterns(body, "Request body")
+        # Scan request body; one threat per body, located by JSON path
+        for segment in body_segments:
+            threat = self._check_xss_patterns(segment.text, segment.location)
             if threat:
                 threat.endpoint = parsed_url.path
                 threat.source_ip = request.client.host if request.client else None
                 threats.append(threat)
+                break
         
         return threats
     
@@ -467,33 +519,32 @@ class SecurityScanner:
         # Decode common encodings
         decoded_content = self._decode_common_encodings(content)
         
-        for pattern_info in self.xss_patterns:
+        hit = self.xss_matcher.search(decoded_content)
+        if hit:
+            pattern_info, _ = hit
             pattern = pattern_info["pattern"]
-            flags = pattern_info.get("flags", 0)
-            
-            if re.search(pattern, decoded_content, flags):
-                return SecurityThreat(
-                    threat_id=self._generate_threat_id(),
-                    threat_type=VulnerabilityType.XSS,
-                    threat_level=ThreatLevel.HIGH,
-                    title="Cross-Site Scripting (XSS) Attempt Detected",
-                    description=f"Potential XSS attack detected in {location}: {pattern_info['description']}",
-                    evidence={
-                        "pattern": pattern,
-                        "matched_content": decoded_content[:200],
-                        "original_content": content[:200],
-                        "location": location,
-                        "confidence": pattern_info["confidence"]
-                    },
-                    confidence_score=pattern_info["confidence"],
-                    attack_patterns=[AttackPattern.EXPLOITATION],
-                    remediation=[
-                        "Implement proper output encoding/escaping",
-                        "Use Content Security Policy (CSP)",
-                        "Validate and sanitize all user inputs",
-                        "Use secure frameworks with built-in XSS protection"
-                    ]
-                )
+            return SecurityThreat(
+                threat_id=self._generate_threat_id(),
+                threat_type=VulnerabilityType.XSS,
+                threat_level=ThreatLevel.HIGH,
+                title="Cross-Site Scripting (XSS) Attempt Detected",
+                description=f"Potential XSS attack detected in {location}: {pattern_info['description']}",
+                evidence={
+                    "pattern": pattern,
+                    "matched_content": decoded_content[:200],
+                    "original_content": content[:200],
+                    "location": location,
+                    "confidence": pattern_info["confidence"]
+                },
+                confidence_score=pattern_info["confidence"],
+                attack_patterns=[AttackPattern.EXPLOITATION],
+                remediation=[
+                    "Implement proper output encoding/escaping",
+                    "Use Content Security Policy (CSP)",
+                    "Validate and sanitize all user inputs",
+                    "Use secure frameworks with built-in XSS protection"
+                ]
+            )
         
         return None
     
@@ -537,33 +588,32 @@ class SecurityScanner:
         # Decode common encodings
         decoded_content = self._decode_common_encodings(content)
         
-        for pattern_info in self.path_traversal_patterns:
+        hit = self.path_traversal_matcher.search(decoded_content)
+        if hit:
+            pattern_info, _ = hit
             pattern = pattern_info["pattern"]
-            flags = pattern_info.get("flags", 0)
-            
-            if re.search(pattern, decoded_content, flags):
-                return SecurityThreat(
-                    threat_id=self._generate_threat_id(),
-                    threat_type=VulnerabilityType.PATH_TRAVERSAL,
-                    threat_level=ThreatLevel.HIGH,
-                    title="Path Traversal Attempt Detected",
-                    description=f"Potential path traversal attack detected in {location}: {pattern_info['description']}",
-                    evidence={
-                        "pattern": pattern,
-                        "matched_content": decoded_content[:200],
-                        "original_content": content[:200],
-                        "location": location,
-                        "confidence": pattern_info["confidence"]
-                    },
-                    confidence_score=pattern_info["confidence"],
-                    attack_patterns=[AttackPattern.EXPLOITATION],
-                    remediation=[
-                        "Implement proper input validation",
-                        "Use allow-lists for file access",
-                        "Sanitize file paths and names",
-                        "Implement access controls on file system"
-                    ]
-                )
+            return SecurityThreat(
+                threat_id=self._generate_threat_id(),
+                threat_type=VulnerabilityType.PATH_TRAVERSAL,
+                threat_level=ThreatLevel.HIGH,
+                title="Path Traversal Attempt Detected",
+                description=f"Potential path traversal attack detected in {location}: {pattern_info['description']}",
+                evidence={
+                    "pattern": pattern,
+                    "matched_content": decoded_content[:200],
+                    "original_content": content[:200],
+                    "location": location,
+                    "confidence": pattern_info["confidence"]
+                },
+                confidence_score=pattern_info["confidence"],
+                attack_patterns=[AttackPattern.EXPLOITATION],
+                remediation=[
+                    "Implement proper input validation",
+                    "Use allow-lists for file access",
+                    "Sanitize file paths and names",
+                    "Implement access controls on file system"
+                ]
+            )
         
         return None
     
@@ -572,7 +622,7 @@ class SecurityScanner:
         request: Request,
         url: str,
         headers: Dict[str, str],
-        body: Optional[str]
+        body_segments: List[BodySegment]
     ) -> List[SecurityThreat]:
         """Scan for command injection attempts"""
         threats = []
@@ -589,13 +639,14 @@ class SecurityScanner:
                         threat.source_ip = request.client.host if request.client else None
                         threats.append(threat)
         
-        # Scan request body
-        if body:
-            threat = self._check_command_injection_patterns(body, "Request body")
+        # Scan request body; one threat per body, located by JSON path
+        for segment in body_segments:
+            threat = self._check_command_injection_patterns(segment.text, segment.location)
             if threat:
                 threat.endpoint = parsed_url.path
                 threat.source_ip = request.client.host if request.client else None
                 threats.append(threat)
+                break
         
         return threats
     
@@ -604,32 +655,31 @@ class SecurityScanner:
         if not content:
             return None
         
-        for pattern_info in self.command_injection_patterns:
+        hit = self.command_injection_matcher.search(content)
+        if hit:
+            pattern_info, _ = hit
             pattern = pattern_info["pattern"]
-            flags = pattern_info.get("flags", 0)
-            
-            if re.search(pattern, content, flags):
-                return SecurityThreat(
-                    threat_id=self._generate_threat_id(),
-                    threat_type=VulnerabilityType.COMMAND_INJECTION,
-                    threat_level=ThreatLevel.CRITICAL,
-                    title="Command Injection Attempt Detected",
-                    description=f"Potential command injection detected in {location}: {pattern_info['description']}",
-                    evidence={
-                        "pattern": pattern,
-                        "matched_content": content[:200],
-                        "location": location,
-                        "confidence": pattern_info["confidence"]
-                    },
-                    confidence_score=pattern_info["confidence"],
-                    attack_patterns=[AttackPattern.EXPLOITATION, AttackPattern.PRIVILEGE_ESCALATION],
-                    remediation=[
-                        "Never execute user input as system commands",
-                        "Use parameterized APIs instead of shell commands",
-                        "Implement strict input validation",
-                        "Apply principle of least privilege"
-                    ]
-                )
+            return SecurityThreat(
+                threat_id=self._generate_threat_id(),
+                threat_type=VulnerabilityType.COMMAND_INJECTION,
+                threat_level=ThreatLevel.CRITICAL,
+                title="Command Injection Attempt Detected",
+                description=f"Potential command injection detected in {location}: {pattern_info['description']}",
+                evidence={
+                    "pattern": pattern,
+                    "matched_content": content[:200],
+                    "location": location,
+                    "confidence": pattern_info["confidence"]
+                },
+                confidence_score=pattern_info["confidence"],
+                attack_patterns=[AttackPattern.EXPLOITATION, AttackPattern.PRIVILEGE_ESCALATION],
+                remediation=[
+                    "Never execute user input as system commands",
+                    "Use parameterized APIs instead of shell commands",
+                    "Implement strict input validation",
+                    "Apply principle of least privilege"
+                ]
+            )
         
         return None
     
@@ -646,33 +696,30 @@ class SecurityScanner:
             return threats
         
         # Check against bot patterns
-        for pattern_info in self.bot_patterns:
+        for pattern_info in self.bot_matcher.search_all(user_agent):
             pattern = pattern_info["pattern"]
-            flags = pattern_info.get("flags", 0)
-            
-            if re.search(pattern, user_agent, flags):
-                threats.append(SecurityThreat(
-                    threat_id=self._generate_threat_id(),
-                    threat_type=VulnerabilityType.BOT_ATTACK,
-                    threat_level=ThreatLevel.MEDIUM,
-                    title="Bot Activity Detected",
-                    description=f"Potential bot activity detected: {pattern_info['description']}",
-                    evidence={
-                        "user_agent": user_agent,
-                        "pattern": pattern,
-                        "confidence": pattern_info["confidence"]
-                    },
-                    source_ip=ip_address,
-                    user_agent=user_agent,
-                    confidence_score=pattern_info["confidence"],
-                    attack_patterns=[AttackPattern.RECONNAISSANCE],
-                    remediation=[
-                        "Implement bot detection and blocking",
-                        "Use CAPTCHAs for suspicious requests",
-                        "Rate limit automated requests",
-                        "Monitor for unusual request patterns"
-                    ]
-                ))
+            threats.append(SecurityThreat(
+                threat_id=self._generate_threat_id(),
+                threat_type=VulnerabilityType.BOT_ATTACK,
+                threat_level=ThreatLevel.MEDIUM,
+                title="Bot Activity Detected",
+                description=f"Potential bot activity detected: {pattern_info['description']}",
+                evidence={
+                    "user_agent": user_agent,
+                    "pattern": pattern,
+                    "confidence": pattern_info["confidence"]
+                },
+                source_ip=ip_address,
+                user_agent=user_agent,
+                confidence_score=pattern_info["confidence"],
+                attack_patterns=[AttackPattern.RECONNAISSANCE],
+                remediation=[
+                    "Implement bot detection and blocking",
+                    "Use CAPTCHAs for suspicious requests",
+                    "Rate limit automated requests",
+                    "Monitor for unusual request patterns"
+                ]
+            ))
         
         # Check against known malicious user agents
         user_agent_lower = user_agent.lower()
@@ -855,7 +902,7 @@ class SecurityScanner:
             decoded = html.unescape(decoded)
             
             # Base64 decode (if it looks like base64)
-            if re.match(r'^[A-Za-z0-9+/]*={0,2}$', decoded) and len(decoded) % 4 == 0:
+            if len(decoded) % 4 == 0 and _BASE64_TEXT.match(decoded):
                 try:
                     decoded_bytes = base64.b64decode(decoded)
                     decoded = decoded_bytes.decode('utf-8', errors='ignore')
@@ -1108,6 +1155,7 @@ class SecurityScanner:
                 "command_injection": len(self.command_injection_patterns),
                 "bot_patterns": len(self.bot_patterns)
             },
+            "body_scanning": self.body_extractor.get_stats(),
             "blocked_ips": len(self.blocked_ips),
             "tracked_ips": len(self.attack_attempts)
         }
\ No newline at end of file
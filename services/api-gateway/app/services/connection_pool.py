@@ -1,10 +1,21 @@
 """
 Connection Pool Manager
 Advanced HTTP connection pooling with intelligent management
+
+One pool per downstream endpoint (service instance). httpx can't resize a
+pool, so each client is created with the service's connection ceiling and
+an adaptive concurrency limit in front of it decides how many requests run at
+once; connections beyond what that limit uses expire after keepalive_expiry.
+The limit grows when requests wait for a slot and shrinks when measured
+concurrency stays well below it.
 """
 import asyncio
+import bisect
+import importlib.util
+import math
 import time
-from typing import Dict, List, Optional, Any
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 import httpx
@@ -13,6 +24,9 @@ from urllib.parse import urlparse
 from app.core.config import Settings
 from shared.monitoring.structured_logger import StructuredLogger
 
+# HTTP/2 needs the optional h2 package (httpx[http2])
+H2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 class ConnectionStatus(str, Enum):
     ACTIVE = "active"
     IDLE = "idle"
@@ -34,15 +48,230 @@ class ConnectionStats:
     last_used: float = field(default_factory=time.time)
     created_at: float = field(default_factory=time.time)
 
+@dataclass
+class PoolConfig:
+    """Sizing and protocol settings for the pools of one service"""
+    min_connections: int = 2
+    max_connections: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    http2: bool = False
+    prewarm_connections: int = 0
+    
+    @property
+    def initial_limit(self) -> int:
+        return max(self.min_connections, min(self.max_keepalive, self.max_connections))
+
+class AcquireLatencyHistogram:
+    """Histogram of the time requests wait for a pool slot (seconds)"""
+    
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding quantile q"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return self.BUCKETS[index] if index < len(self.BUCKETS) else math.inf
+        return math.inf
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Cumulative buckets in Prometheus form, plus estimated quantiles"""
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.BUCKETS, self.counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+class AdaptiveConcurrencyLimit:
+    """Counting semaphore whose limit can be changed while it is in use"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+    
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+    
+    async def acquire(self) -> bool:
+        """Take a slot; returns whether the caller had to queue for it"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return False
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        return True
+    
+    def release(self):
+        self.in_flight = max(0, self.in_flight - 1)
+        self._wake()
+    
+    def set_limit(self, limit: int):
+        self.limit = limit
+        self._wake()
+    
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+class EndpointPool:
+    """Connections to one endpoint behind an adaptive concurrency limit
+    
+    Has the request/get interface of httpx.AsyncClient that ServiceClient
+    uses, and records how long each request waited for a slot.
+    """
+    
+    def __init__(self, service_name: str, base_url: str, client: httpx.AsyncClient,
+                 config: PoolConfig, http2: bool,
+                 on_acquire: Optional[Callable[[str, str, float], None]] = None):
+        self.service_name = service_name
+        self.base_url = base_url
+        self.client = client
+        self.config = config
+        self.http2 = http2
+        self.limit = AdaptiveConcurrencyLimit(config.initial_limit)
+        self.histogram = AcquireLatencyHistogram()
+        self.on_acquire = on_acquire
+        self.prewarmed = 0
+        self.resizes = 0
+        self._reset_window()
+    
+    def _reset_window(self):
+        self.window_acquires = 0
+        self.window_waits = 0
+        self.window_wait_seconds = 0.0
+        self.window_peak_in_flight = self.limit.in_flight
+    
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        queued = await self.limit.acquire()
+        self._record_acquire(time.perf_counter() - start, queued)
+        try:
+            return await self.client.request(method, url, **kwargs)
+        finally:
+            self.limit.release()
+    
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+    
+    def _record_acquire(self, waited: float, queued: bool):
+        self.histogram.observe(waited)
+        if self.on_acquire:
+            self.on_acquire(self.service_name, self.base_url, waited)
+        self.window_acquires += 1
+        if queued:
+            self.window_waits += 1
+            self.window_wait_seconds += waited
+        self.window_peak_in_flight = max(self.window_peak_in_flight, self.limit.in_flight)
+    
+    def resize(self) -> Optional[Tuple[int, int]]:
+        """Adjust the limit from the window since the last resize
+        
+        Grows by half when more than 5% of requests waited for a slot, shrinks
+        by a quarter (not below peak concurrency plus headroom) when nothing
+        waited and peak concurrency used under half the limit. Returns
+        (old, new) if the limit changed.
+        """
+        old_limit = self.limit.limit
+        new_limit = old_limit
+        
+        # Requests still queued count even if none got through this window
+        wait_ratio = self.window_waits / self.window_acquires if self.window_acquires else 0.0
+        if wait_ratio > 0.05 or self.limit.waiting:
+            new_limit = min(self.config.max_connections, math.ceil(old_limit * 1.5))
+        elif self.window_acquires and self.window_waits == 0 and self.window_peak_in_flight < old_limit / 2:
+            new_limit = max(
+                self.config.min_connections,
+                self.window_peak_in_flight + 2,
+                int(old_limit * 0.75)
+            )
+        
+        self._reset_window()
+        if new_limit == old_limit:
+            return None
+        
+        self.limit.set_limit(new_limit)
+        self.resizes += 1
+        return old_limit, new_limit
+    
+    async def prewarm(self, connections: int, path: str = "/health/live", timeout: float = 5.0) -> int:
+        """Open connections ahead of traffic; returns how many requests succeeded
+        
+        HTTP/2 multiplexes over one connection, so a single request is enough.
+        """
+        count = 1 if self.http2 else min(connections, self.config.max_keepalive)
+        results = await asyncio.gather(
+            *(self.client.get(path, timeout=timeout) for _ in range(count)),
+            return_exceptions=True
+        )
+        self.prewarmed = sum(1 for r in results if not isinstance(r, Exception))
+        return self.prewarmed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "service_name": self.service_name,
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "limit": self.limit.limit,
+            "in_flight": self.limit.in_flight,
+            "waiting": self.limit.waiting,
+            "min_connections": self.config.min_connections,
+            "max_connections": self.config.max_connections,
+            "prewarmed_connections": self.prewarmed,
+            "resizes": self.resizes,
+            "acquire_latency_seconds": self.histogram.to_dict()
+        }
+
 class ConnectionPoolManager:
     """Advanced HTTP connection pool manager with intelligent optimization"""
     
-    def __init__(self, settings: Settings, logger: StructuredLogger):
+    def __init__(self, settings: Settings, logger: StructuredLogger, metrics: Optional[Any] = None):
         self.settings = settings
         self.logger = logger
+        # Optional PrometheusMetrics for acquire latency and pool size export
+        self.metrics = metrics
         
-        # Connection pools by service
-        self.pools: Dict[str, httpx.AsyncClient] = {}
+        # Connection pools by (service, endpoint base URL)
+        self.pools: Dict[Tuple[str, str], EndpointPool] = {}
         self.pool_stats: Dict[str, ConnectionStats] = {}
         
         # Pool configuration
@@ -51,26 +280,35 @@ class ConnectionPoolManager:
             max_connections=100,
             keepalive_expiry=30.0
         )
+        self.http2_enabled = settings.connection_pool_http2
+        self.prewarm_connections = settings.connection_pool_prewarm_connections
+        self.resize_interval = settings.connection_pool_resize_interval_seconds
         
-        # Service-specific configurations
+        # Service-specific configurations; code generation holds long streaming
+        # requests, so it multiplexes over HTTP/2 and keeps connections longer
         self.service_configs = {
             "code_generator": {
+                "min_connections": 4,
                 "max_keepalive": 15,
                 "max_connections": 50,
                 "keepalive_expiry": 60.0,
-                "timeout": 120.0
+                "timeout": 120.0,
+                "http2": True
             },
             "image_generator": {
+                "min_connections": 2,
                 "max_keepalive": 10,
                 "max_connections": 30,
                 "keepalive_expiry": 45.0,
-                "timeout": 180.0
+                "timeout": 180.0,
+                "http2": True
             }
         }
         
         # Cleanup task
         self._cleanup_task: Optional[asyncio.Task] = None
         self._running = False
+        self._last_optimization = time.time()
     
     async def start(self):
         """Start the connection pool manager"""
@@ -79,7 +317,8 @@ class ConnectionPoolManager:
         
         self.logger.info("Connection pool manager started",
                         default_max_keepalive=self.default_limits.max_keepalive_connections,
-                        default_max_connections=self.default_limits.max_connections)
+                        default_max_connections=self.default_limits.max_connections,
+                        http2_available=H2_AVAILABLE)
     
     async def stop(self):
         """Stop the connection pool manager and close all pools"""
@@ -93,40 +332,64 @@ class ConnectionPoolManager:
                 pass
         
         # Close all pools
-        for service_name, pool in self.pools.items():
-            await pool.aclose()
-            self.logger.info("Connection pool closed", service=service_name)
+        for (service_name, base_url), pool in self.pools.items():
+            await pool.client.aclose()
+            self.logger.info("Connection pool closed", service=service_name, base_url=base_url)
         
         self.pools.clear()
         self.pool_stats.clear()
     
-    def get_pool(self, service_name: str, base_url: str) -> httpx.AsyncClient:
-        """Get or create connection pool for a service"""
-        if service_name not in self.pools:
-            self.pools[service_name] = self._create_pool(service_name, base_url)
-            self.pool_stats[service_name] = ConnectionStats()
+    def get_pool_config(self, service_name: str) -> PoolConfig:
+        """Pool settings for a service, falling back to the defaults"""
+        config = self.service_configs.get(service_name, {})
+        return PoolConfig(
+            min_connections=config.get("min_connections", PoolConfig.min_connections),
+            max_connections=config.get("max_connections", self.default_limits.max_connections),
+            max_keepalive=config.get("max_keepalive", self.default_limits.max_keepalive_connections),
+            keepalive_expiry=config.get("keepalive_expiry", self.default_limits.keepalive_expiry),
+            timeout=config.get("timeout", PoolConfig.timeout),
+            http2=config.get("http2", False) and self.http2_enabled,
+            prewarm_connections=config.get("prewarm_connections", self.prewarm_connections)
+        )
+    
+    def get_pool(self, service_name: str, base_url: str) -> EndpointPool:
+        """Get or create the connection pool for an endpoint of a service"""
+        key = (service_name, base_url)
+        if key not in self.pools:
+            self.pools[key] = self._create_pool(service_name, base_url)
+            if service_name not in self.pool_stats:
+                self.pool_stats[service_name] = ConnectionStats()
             
             self.logger.info("Created connection pool",
                            service=service_name,
-                           base_url=base_url)
+                           base_url=base_url,
+                           http2=self.pools[key].http2,
+                           limit=self.pools[key].limit.limit)
         
-        return self.pools[service_name]
+        return self.pools[key]
     
-    def _create_pool(self, service_name: str, base_url: str) -> httpx.AsyncClient:
-        """Create a new connection pool for a service"""
-        config = self.service_configs.get(service_name, {})
+    def _create_pool(self, service_name: str, base_url: str) -> EndpointPool:
+        """Create a new connection pool for an endpoint"""
+        config = self.get_pool_config(service_name)
         
-        # Create custom limits for this service
+        http2 = config.http2
+        if http2 and not H2_AVAILABLE:
+            self.logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1",
+                              service=service_name)
+            http2 = False
+        
+        # The client gets the ceiling; the adaptive limit decides how much of
+        # it is used
         limits = httpx.Limits(
-            max_keepalive_connections=config.get("max_keepalive", self.default_limits.max_keepalive_connections),
-            max_connections=config.get("max_connections", self.default_limits.max_connections),
-            keepalive_expiry=config.get("keepalive_expiry", self.default_limits.keepalive_expiry)
+            max_keepalive_connections=config.max_keepalive,
+            max_connections=config.max_connections,
+            keepalive_expiry=config.keepalive_expiry
         )
         
         # Create timeout configuration
         timeout = httpx.Timeout(
             connect=10.0,
-            read=config.get("timeout", 60.0),
+            read=config.timeout,
             write=10.0,
             pool=5.0
         )
@@ -138,14 +401,38 @@ class ConnectionPoolManager:
             timeout=timeout,
             follow_redirects=True,
             verify=True,
-            http2=True,  # Enable HTTP/2 for better performance
+            http2=http2,
             headers={
                 "User-Agent": f"{self.settings.service_name}/1.0",
                 "Connection": "keep-alive"
             }
         )
         
-        return client
+        on_acquire = self.metrics.record_connection_pool_acquire if self.metrics else None
+        return EndpointPool(service_name, base_url, client, config, http2, on_acquire)
+    
+    async def prewarm(self, endpoints: Dict[str, List[str]]):
+        """Open connections to every endpoint before traffic arrives, so the
+        first burst on a cold gateway doesn't pay for connection setup"""
+        pools = []
+        for service_name, base_urls in endpoints.items():
+            for base_url in base_urls:
+                pool = self.get_pool(service_name, base_url)
+                if pool.config.prewarm_connections > 0:
+                    pools.append(pool)
+        
+        if not pools:
+            return
+        
+        results = await asyncio.gather(
+            *(pool.prewarm(pool.config.prewarm_connections) for pool in pools),
+            return_exceptions=True
+        )
+        for pool, result in zip(pools, results):
+            self.logger.info("Connection pool pre-warmed",
+                           service=pool.service_name,
+                           base_url=pool.base_url,
+                           connections=0 if isinstance(result, Exception) else result)
     
     async def record_request(self, service_name: str, success: bool, response_time: float):
         """Record request statistics"""
@@ -170,32 +457,42 @@ class ConnectionPoolManager:
     
     async def get_pool_stats(self, service_name: str) -> Optional[ConnectionStats]:
         """Get statistics for a specific pool"""
-        if service_name not in self.pools:
+        if service_name not in self.pool_stats:
             return None
         
         stats = self.pool_stats[service_name]
         
-        # Update connection counts from the actual pool
-        try:
-            pool = self.pools[service_name]
-            if hasattr(pool, '_pool'):
-                # Access internal connection pool stats if available
-                pass  # httpx doesn't expose detailed connection stats
-        except:
-            pass
+        # Connection counts from the endpoint pools of the service
+        pools = self._service_pools(service_name)
+        stats.active_connections = sum(pool.limit.in_flight for pool in pools)
+        stats.total_connections = sum(pool.limit.limit for pool in pools)
+        stats.idle_connections = max(0, stats.total_connections - stats.active_connections)
         
         return stats
     
     async def get_all_stats(self) -> Dict[str, ConnectionStats]:
         """Get statistics for all pools"""
+        for service_name in list(self.pool_stats):
+            await self.get_pool_stats(service_name)
         return self.pool_stats.copy()
     
+    def get_endpoint_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Size, concurrency and acquire latency histogram of every endpoint pool"""
+        return {
+            f"{service_name} {base_url}": pool.get_stats()
+            for (service_name, base_url), pool in self.pools.items()
+        }
+    
+    def _service_pools(self, service_name: str) -> List[EndpointPool]:
+        return [pool for (name, _), pool in self.pools.items() if name == service_name]
+    
     async def optimize_pools(self):
         """Optimize connection pools based on usage patterns"""
         current_time = time.time()
         
         for service_name, stats in self.pool_stats.items():
-            if service_name not in self.pools:
+            pools = self._service_pools(service_name)
+            if not pools:
                 continue
             
             # Calculate usage metrics
@@ -207,47 +504,66 @@ class ConnectionPoolManager:
                 await self._reduce_pool_size(service_name)
             elif success_rate < 0.5 and stats.total_requests > 10:
                 await self._handle_problematic_pool(service_name)
-            elif stats.average_response_time > 10000:  # 10 seconds
-                await self._optimize_slow_pool(service_name)
+        
+        self._last_optimization = current_time
+    
+    async def resize_pools(self):
+        """Grow or shrink every endpoint pool from its measured concurrency and wait"""
+        for pool in self.pools.values():
+            change = pool.resize()
+            if change:
+                self.logger.info("Connection pool resized",
+                               service=pool.service_name,
+                               base_url=pool.base_url,
+                               old_limit=change[0],
+                               new_limit=change[1])
+        self._export_metrics()
+    
+    def _export_metrics(self):
+        if not self.metrics:
+            return
+        for service_name in {name for name, _ in self.pools}:
+            pools = self._service_pools(service_name)
+            self.metrics.update_connection_pool(
+                service_name,
+                active=sum(pool.limit.in_flight for pool in pools),
+                limits={pool.base_url: pool.limit.limit for pool in pools}
+            )
     
     async def _reduce_pool_size(self, service_name: str):
         """Reduce pool size for idle services"""
-        self.logger.info("Reducing pool size for idle service",
-                        service=service_name)
-        
-        # Note: httpx doesn't allow dynamic pool resizing
-        # This is where we would implement pool size reduction
-        # For now, we log the optimization opportunity
+        for pool in self._service_pools(service_name):
+            if pool.limit.limit > pool.config.min_connections:
+                self.logger.info("Reducing pool size for idle service",
+                                service=service_name,
+                                base_url=pool.base_url,
+                                limit=pool.config.min_connections)
+                pool.limit.set_limit(pool.config.min_connections)
     
     async def _handle_problematic_pool(self, service_name: str):
         """Handle pools with high failure rates"""
         self.logger.warning("High failure rate detected",
                            service=service_name,
-                           success_rate=self.pool_stats[service_name].successful_requests / 
+                           success_rate=self.pool_stats[service_name].successful_requests /
                                        max(self.pool_stats[service_name].total_requests, 1))
         
         # Could implement connection refresh logic here
     
-    async def _optimize_slow_pool(self, service_name: str):
-        """Optimize pools with slow response times"""
-        self.logger.warning("Slow response times detected",
-                           service=service_name,
-                           avg_response_time=self.pool_stats[service_name].average_response_time)
-        
-        # Could implement timeout adjustments here
-    
     async def _periodic_cleanup(self):
-        """Periodic cleanup and optimization task"""
+        """Periodic resizing, cleanup and optimization task"""
         while self._running:
             try:
-                await asyncio.sleep(60)  # Run every minute
+                await asyncio.sleep(self.resize_interval)
                 
                 if not self._running:
                     break
                 
-                await self.optimize_pools()
-                await self._cleanup_stale_stats()
+                await self.resize_pools()
                 
+                if time.time() - self._last_optimization >= 60:  # Run every minute
+                    await self.optimize_pools()
+                    await self._cleanup_stale_stats()
+            
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -265,9 +581,8 @@ class ConnectionPoolManager:
                 stale_services.append(service_name)
         
         for service_name in stale_services:
-            if service_name in self.pools:
-                await self.pools[service_name].aclose()
-                del self.pools[service_name]
+            for key in [key for key in self.pools if key[0] == service_name]:
+                await self.pools.pop(key).client.aclose()
             
             del self.pool_stats[service_name]
             
@@ -275,25 +590,29 @@ class ConnectionPoolManager:
                            service=service_name)
     
     async def health_check_pools(self) -> Dict[str, bool]:
-        """Perform health checks on all connection pools"""
+        """Perform health checks on all connection pools; a service is healthy
+        when all of its endpoints are"""
         results = {}
         
-        for service_name, pool in self.pools.items():
+        for (service_name, base_url), pool in self.pools.items():
             try:
                 # Simple connectivity test
                 response = await pool.get("/health/live", timeout=5.0)
-                results[service_name] = response.status_code == 200
+                healthy = response.status_code == 200
             except Exception as e:
-                results[service_name] = False
+                healthy = False
                 self.logger.warning("Pool health check failed",
                                   service=service_name,
+                                  base_url=base_url,
                                   error=str(e))
+            results[service_name] = results.get(service_name, True) and healthy
         
         return results
     
     def get_pool_info(self, service_name: str) -> Dict[str, Any]:
         """Get detailed information about a connection pool"""
-        if service_name not in self.pools:
+        pools = self._service_pools(service_name)
+        if not pools:
             return {}
         
         stats = self.pool_stats.get(service_name)
@@ -309,5 +628,6 @@ class ConnectionPoolManager:
             "average_response_time_ms": stats.average_response_time,
             "last_used": stats.last_used,
             "age_seconds": time.time() - stats.created_at,
-            "pool_config": self.service_configs.get(service_name, {})
-        }
\ No newline at end of file
+            "pool_config": self.service_configs.get(service_name, {}),
+            "endpoints": [pool.get_stats() for pool in pools]
+        }
@@ -0,0 +1,233 @@
+"""
+Load Balancing for downstream service instances
+Smooth weighted round-robin, power-of-two-choices over peak EWMA latency,
+and outlier ejection of endpoints that keep failing
+"""
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Protocol, Sequence, TypeVar
+
+from app.core.config import LoadBalancingStrategy
+
+class Endpoint(Protocol):
+    """Anything with a unique name and a weight (ServiceEndpoint, ServiceInstance)"""
+    name: str
+    weight: int
+
+E = TypeVar("E", bound=Endpoint)
+
+@dataclass
+class OutlierDetectionConfig:
+    """Configuration for outlier ejection"""
+    consecutive_failures: int = 5
+    base_ejection_seconds: float = 30.0
+    max_ejection_seconds: float = 300.0
+    # Never eject more than this share of a service's endpoints
+    max_ejection_percent: float = 50.0
+
+@dataclass
+class EndpointStats:
+    """Live statistics for one endpoint"""
+    in_flight: int = 0
+    ewma_ms: float = 0.0
+    samples: int = 0
+    last_sample: float = 0.0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    ejections: int = 0
+    current_weight: float = 0.0
+    
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+    
+    def record_latency(self, response_time_ms: float, now: float, decay_seconds: float):
+        """Peak EWMA: slower samples are taken at once, faster ones decay in
+        with a weight that grows with the time since the previous sample"""
+        if self.samples == 0 or response_time_ms > self.ewma_ms:
+            self.ewma_ms = response_time_ms
+        else:
+            weight = math.exp(-max(0.0, now - self.last_sample) / decay_seconds)
+            self.ewma_ms = self.ewma_ms * weight + response_time_ms * (1 - weight)
+        self.samples += 1
+        self.last_sample = now
+
+class LoadBalancer:
+    """Load balancer for service endpoints
+    
+    Endpoints are identified by name, so one balancer can serve every
+    downstream service as long as endpoint names are unique.
+    """
+    
+    def __init__(self,
+                 strategy: LoadBalancingStrategy,
+                 outlier_detection: Optional[OutlierDetectionConfig] = None,
+                 decay_seconds: float = 10.0,
+                 default_latency_ms: float = 100.0):
+        self.strategy = strategy
+        self.outlier_detection = outlier_detection or OutlierDetectionConfig()
+        self.decay_seconds = decay_seconds
+        # Latency assumed for endpoints without samples, so they are tried
+        self.default_latency_ms = default_latency_ms
+        self.current_index = 0
+        self.stats: Dict[str, EndpointStats] = {}
+    
+    @property
+    def connection_counts(self) -> Dict[str, int]:
+        return {name: stats.in_flight for name, stats in self.stats.items()}
+    
+    def _stats(self, endpoint_name: str) -> EndpointStats:
+        stats = self.stats.get(endpoint_name)
+        if stats is None:
+            stats = self.stats[endpoint_name] = EndpointStats()
+        return stats
+    
+    def available_endpoints(self, endpoints: Sequence[E]) -> List[E]:
+        """Endpoints that are not ejected; all of them if every one is"""
+        now = time.monotonic()
+        available = [ep for ep in endpoints if not self._stats(ep.name).is_ejected(now)]
+        return available or list(endpoints)
+    
+    def select_endpoint(self, endpoints: Sequence[E]) -> Optional[E]:
+        """Select an endpoint based on the load balancing strategy"""
+        if not endpoints:
+            return None
+        
+        available = self.available_endpoints(endpoints)
+        
+        if self.strategy == LoadBalancingStrategy.ROUND_ROBIN:
+            return self._round_robin(available)
+        elif self.strategy == LoadBalancingStrategy.WEIGHTED_ROUND_ROBIN:
+            return self._weighted_round_robin(available)
+        elif self.strategy == LoadBalancingStrategy.LEAST_CONNECTIONS:
+            return self._least_connections(available)
+        elif self.strategy == LoadBalancingStrategy.P2C_EWMA:
+            return self._p2c_ewma(available)
+        elif self.strategy == LoadBalancingStrategy.RANDOM:
+            return self._random(available)
+        else:
+            return available[0]
+    
+    def _round_robin(self, endpoints: List[E]) -> E:
+        endpoint = endpoints[self.current_index % len(endpoints)]
+        self.current_index += 1
+        return endpoint
+    
+    def _weighted_round_robin(self, endpoints: List[E]) -> E:
+        """Smooth weighted round-robin (as in nginx)
+        
+        Every pick adds each endpoint's weight to its current weight, selects
+        the highest and takes the total weight off it. Weights 5:1:1 give
+        a a b a c a a rather than bursts of the heaviest endpoint.
+        """
+        total_weight = 0
+        selected = None
+        selected_stats = None
+        for endpoint in endpoints:
+            weight = max(0, endpoint.weight)
+            stats = self._stats(endpoint.name)
+            stats.current_weight += weight
+            total_weight += weight
+            if selected_stats is None or stats.current_weight > selected_stats.current_weight:
+                selected, selected_stats = endpoint, stats
+        
+        if total_weight == 0:
+            return self._round_robin(endpoints)
+        
+        selected_stats.current_weight -= total_weight
+        return selected
+    
+    def _least_connections(self, endpoints: List[E]) -> E:
+        """Fewest requests in flight, ties broken by latency"""
+        return min(endpoints, key=lambda ep: (self._stats(ep.name).in_flight, self._latency(ep.name)))
+    
+    def _p2c_ewma(self, endpoints: List[E]) -> E:
+        """Power of two choices: of two random endpoints, the one with the
+        lower peak EWMA latency scaled by its requests in flight"""
+        if len(endpoints) == 1:
+            return endpoints[0]
+        
+        first, second = random.sample(endpoints, 2)
+        return first if self._cost(first) <= self._cost(second) else second
+    
+    def _random(self, endpoints: List[E]) -> E:
+        return random.choice(endpoints)
+    
+    def _latency(self, endpoint_name: str) -> float:
+        stats = self._stats(endpoint_name)
+        return stats.ewma_ms if stats.samples else self.default_latency_ms
+    
+    def _cost(self, endpoint: Endpoint) -> float:
+        stats = self._stats(endpoint.name)
+        return self._latency(endpoint.name) * (stats.in_flight + 1) / max(1, endpoint.weight)
+    
+    def increment_connections(self, endpoint_name: str):
+        self._stats(endpoint_name).in_flight += 1
+    
+    def decrement_connections(self, endpoint_name: str):
+        stats = self._stats(endpoint_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+    
+    def record_result(self, endpoint_name: str, success: bool, response_time_ms: float,
+                      peers: Optional[Sequence[Endpoint]] = None):
+        """Record the outcome of a request to an endpoint
+        
+        Failures count towards ejection; `peers` (the endpoints of the same
+        service) bound how many can be ejected at once.
+        """
+        now = time.monotonic()
+        stats = self._stats(endpoint_name)
+        # Fast failures (refused connections, 503s) must not make an endpoint
+        # look quick, so failures can only raise the estimate
+        if success or response_time_ms > stats.ewma_ms:
+            stats.record_latency(response_time_ms, now, self.decay_seconds)
+        
+        if success:
+            stats.consecutive_failures = 0
+            return
+        
+        stats.consecutive_failures += 1
+        if stats.consecutive_failures >= self.outlier_detection.consecutive_failures:
+            self._eject(endpoint_name, stats, now, peers)
+    
+    def _eject(self, endpoint_name: str, stats: EndpointStats, now: float,
+               peers: Optional[Sequence[Endpoint]]):
+        config = self.outlier_detection
+        if stats.is_ejected(now):
+            return
+        
+        if peers:
+            ejected = sum(
+                1 for peer in peers
+                if peer.name != endpoint_name and self._stats(peer.name).is_ejected(now)
+            )
+            if (ejected + 1) * 100 > config.max_ejection_percent * len(peers):
+                return
+        
+        # Ejection time doubles with each ejection, and starts over once the
+        # endpoint has stayed in for the longest ejection time
+        if stats.ejections and now - stats.ejected_until > config.max_ejection_seconds:
+            stats.ejections = 0
+        stats.ejections += 1
+        duration = min(
+            config.base_ejection_seconds * 2 ** (stats.ejections - 1),
+            config.max_ejection_seconds
+        )
+        stats.ejected_until = now + duration
+        stats.consecutive_failures = 0
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint balancing statistics"""
+        now = time.monotonic()
+        return {
+            name: {
+                "in_flight": stats.in_flight,
+                "ewma_ms": stats.ewma_ms,
+                "samples": stats.samples,
+                "consecutive_failures": stats.consecutive_failures,
+                "ejected": stats.is_ejected(now),
+                "ejections": stats.ejections
+            }
+            for name, stats in self.stats.items()
+        }
@@ -11,8 +11,9 @@ from enum import Enum
 import httpx
 from urllib.parse import urljoin
 
-from app.core.config import Settings, LoadBalancingStrategy
-from app.services.connection_pool import ConnectionPoolManager
+from app.core.config import Settings
+from app.services.connection_pool import ConnectionPoolManager, EndpointPool
+from app.services.load_balancing import LoadBalancer, OutlierDetectionConfig
 from app.services.service_discovery import ServiceDiscovery, ServiceInstance
 from app.services.advanced_circuit_breaker import (
     AdvancedCircuitBreaker, CircuitBreakerConfig, FailureType, CircuitBreakerOpenError
@@ -95,89 +96,27 @@ class RequestResult:
     service_name: str = ""
     endpoint: str = ""
 
-class LoadBalancer:
-    """Load balancer for service endpoints"""
-    
-    def __init__(self, strategy: LoadBalancingStrategy):
-        self.strategy = strategy
-        self.current_index = 0
-        self.connection_counts: Dict[str, int] = {}
-    
-    def select_endpoint(self, endpoints: List[ServiceEndpoint]) -> Optional[ServiceEndpoint]:
-        """Select an endpoint based on the load balancing strategy"""
-        if not endpoints:
-            return None
-        
-        healthy_endpoints = [ep for ep in endpoints if ep.name not in self.connection_counts or self.connection_counts[ep.name] < 10]
-        if not healthy_endpoints:
-            healthy_endpoints = endpoints
-        
-        if self.strategy == LoadBalancingStrategy.ROUND_ROBIN:
-            return self._round_robin(healthy_endpoints)
-        elif self.strategy == LoadBalancingStrategy.WEIGHTED_ROUND_ROBIN:
-            return self._weighted_round_robin(healthy_endpoints)
-        elif self.strategy == LoadBalancingStrategy.LEAST_CONNECTIONS:
-            return self._least_connections(healthy_endpoints)
-        elif self.strategy == LoadBalancingStrategy.RANDOM:
-            return self._random(healthy_endpoints)
-        else:
-            return healthy_endpoints[0]
-    
-    def _round_robin(self, endpoints: List[ServiceEndpoint]) -> ServiceEndpoint:
-        endpoint = endpoints[self.current_index % len(endpoints)]
-        self.current_index += 1
-        return endpoint
-    
-    def _weighted_round_robin(self, endpoints: List[ServiceEndpoint]) -> ServiceEndpoint:
-        total_weight = sum(ep.weight for ep in endpoints)
-        if total_weight == 0:
-            return endpoints[0]
-            
-        # Simple weighted selection
-        weights = [ep.weight for ep in endpoints]
-        selected_index = 0
-        current_weight = weights[0]
-        
-        for i, weight in enumerate(weights[1:], 1):
-            if weight > current_weight:
-                selected_index = i
-                current_weight = weight
-        
-        return endpoints[selected_index]
-    
-    def _least_connections(self, endpoints: List[ServiceEndpoint]) -> ServiceEndpoint:
-        min_connections = float('inf')
-        selected_endpoint = endpoints[0]
-        
-        for endpoint in endpoints:
-            connections = self.connection_counts.get(endpoint.name, 0)
-            if connections < min_connections:
-                min_connections = connections
-                selected_endpoint = endpoint
-        
-        return selected_endpoint
-    
-    def _random(self, endpoints: List[ServiceEndpoint]) -> ServiceEndpoint:
-        import random
-        return random.choice(endpoints)
-    
-    def increment_connections(self, endpoint_name: str):
-        self.connection_counts[endpoint_name] = self.connection_counts.get(endpoint_name, 0) + 1
-    
-    def decrement_connections(self, endpoint_name: str):
-        if endpoint_name in self.connection_counts:
-            self.connection_counts[endpoint_name] = max(0, self.connection_counts[endpoint_name] - 1)
-
 class ServiceClient:
     """Advanced client for communicating with downstream services"""
     
-    def __init__(self, settings: Settings, logger: StructuredLogger):
+    def __init__(self, settings: Settings, logger: StructuredLogger, metrics: Optional[Any] = None):
         self.settings = settings
         self.logger = logger
         
+        # Initialize load balancer; service discovery selects instances
+        # through it and feeds it request latencies and failures
+        self.load_balancer = LoadBalancer(
+            settings.load_balancing_strategy,
+            outlier_detection=OutlierDetectionConfig(
+                consecutive_failures=settings.outlier_consecutive_failures,
+                base_ejection_seconds=settings.outlier_base_ejection_seconds,
+                max_ejection_percent=settings.outlier_max_ejection_percent
+            )
+        )
+        
         # Initialize advanced components
-        self.connection_pool = ConnectionPoolManager(settings, logger)
-        self.service_discovery = ServiceDiscovery(settings, logger)
+        self.connection_pool = ConnectionPoolManager(settings, logger, metrics=metrics)
+        self.service_discovery = ServiceDiscovery(settings, logger, load_balancer=self.load_balancer)
         
         # Initialize advanced circuit breakers
         self.circuit_breakers: Dict[str, AdvancedCircuitBreaker] = {}
@@ -201,9 +140,6 @@ class ServiceClient:
                 self._on_circuit_breaker_state_change
             )
         
-        # Initialize load balancer
-        self.load_balancer = LoadBalancer(settings.load_balancing_strategy)
-        
         # Service health status (now managed by service discovery)
         self.service_health: Dict[str, ServiceStatus] = {}
         
@@ -215,6 +151,12 @@ class ServiceClient:
         await self.connection_pool.start()
         await self.service_discovery.start()
         
+        # Open connections to every known instance before traffic arrives
+        await self.connection_pool.prewarm({
+            service_name: [instance.url for instance in instances]
+            for service_name, instances in self.service_discovery.services.items()
+        })
+        
         self.logger.info("Service client started with advanced features")
     
     async def close(self):
@@ -265,11 +207,12 @@ class ServiceClient:
         if headers:
             request_headers.update(headers)
         
-        # Get connection pool for this service
+        # Get connection pool for this instance
         http_client = self.connection_pool.get_pool(service_name, service_instance.url)
         
         # Execute request through circuit breaker
         start_time = time.time()
+        self.load_balancer.increment_connections(service_instance.name)
         
         try:
             self.logger.info("Making request to downstream service",
@@ -337,10 +280,12 @@ class ServiceClient:
         except Exception as e:
             duration_ms = (time.time() - start_time) * 1000
             
-            # Update statistics for failure
+            # Update statistics for failure; client errors say nothing about
+            # the instance's health
+            instance_ok = isinstance(e, HTTPError) and 400 <= e.status_code < 500 and e.status_code != 429
             await self.connection_pool.record_request(service_name, False, duration_ms)
             self.service_discovery.update_instance_stats(
-                service_name, service_instance.name, False, duration_ms
+                service_name, service_instance.name, instance_ok, duration_ms
             )
             
             self.service_health[service_name] = ServiceStatus.UNHEALTHY
@@ -359,10 +304,13 @@ class ServiceClient:
                 service_name=service_name,
                 endpoint=path
             )
+        
+        finally:
+            self.load_balancer.decrement_connections(service_instance.name)
     
     async def _make_request_with_circuit_breaker(
         self,
-        http_client: httpx.AsyncClient,
+        http_client: EndpointPool,
         method: str,
         url: str,
         data: Optional[Any] = None,
@@ -591,7 +539,9 @@ class ServiceClient:
             "service_health": {k: v.value for k, v in self.service_health.items()},
             "circuit_breakers": await self.get_circuit_breaker_status(),
             "connection_pools": await self.get_connection_pool_stats(),
-            "service_discovery": await self.get_service_discovery_stats()
+            "connection_pool_endpoints": self.connection_pool.get_endpoint_stats(),
+            "service_discovery": await self.get_service_discovery_stats(),
+            "load_balancer": self.load_balancer.get_stats()
         }
     
     # Convenience methods for specific services
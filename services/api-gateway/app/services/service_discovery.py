@@ -3,15 +3,19 @@ Service Discovery and Health Management
 Dynamic service discovery with health monitoring and failover
 """
 import asyncio
+import random
+import statistics
 import time
 import json
-from typing import Dict, List, Optional, Any, Set
+from collections import deque
+from typing import Deque, Dict, List, Optional, Any, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 import httpx
 from urllib.parse import urlparse
 
 from app.core.config import Settings
+from app.services.load_balancing import LoadBalancer
 from shared.monitoring.structured_logger import StructuredLogger
 
 class ServiceHealth(str, Enum):
@@ -32,6 +36,18 @@ class ServiceInstance:
     failure_count: int = 0
     success_count: int = 0
     metadata: Dict[str, Any] = field(default_factory=dict)
+    
+    # Passive health: (timestamp, success, response time ms) of recent requests
+    outcomes: Deque[Tuple[float, bool, float]] = field(default_factory=lambda: deque(maxlen=100))
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    ejection_count: int = 0
+    readmitted_at: float = 0.0
+    next_probe: float = 0.0
+    
+    @property
+    def is_ejected(self) -> bool:
+        return self.ejected_until > 0.0
 
 @dataclass
 class ServiceDiscoveryConfig:
@@ -41,13 +57,32 @@ class ServiceDiscoveryConfig:
     failure_threshold: int = 3
     recovery_threshold: int = 2
     max_response_time: float = 5000.0  # ms
+    # Probe times are spread by +/- this fraction of the interval per instance
+    probe_jitter: float = 0.2
+    
+    # Passive health: outcomes of real requests within this window
+    passive_window_seconds: float = 60.0
+    passive_min_requests: int = 5
+    passive_error_rate: float = 0.5
+    passive_consecutive_failures: int = 3
+    # Median latency this many times the median of the other instances
+    passive_latency_factor: float = 3.0
+    
+    # Ejected instances are probed after the ejection time, which doubles with
+    # each ejection in a row
+    base_ejection_seconds: float = 10.0
+    max_ejection_seconds: float = 300.0
+    # Share of a service's instances that may be ejected (at least one always can)
+    max_ejection_percent: float = 50.0
 
 class ServiceDiscovery:
     """Dynamic service discovery with health monitoring"""
     
-    def __init__(self, settings: Settings, logger: StructuredLogger):
+    def __init__(self, settings: Settings, logger: StructuredLogger,
+                 load_balancer: Optional[LoadBalancer] = None):
         self.settings = settings
         self.logger = logger
+        self.load_balancer = load_balancer
         
         # Service registry
         self.services: Dict[str, List[ServiceInstance]] = {}
@@ -55,13 +90,15 @@ class ServiceDiscovery:
         
         # HTTP client for health checks
         self.http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(connect=2.0, read=5.0),
+            timeout=httpx.Timeout(5.0, connect=2.0),
             limits=httpx.Limits(max_connections=10)
         )
         
         # Background tasks
         self._health_check_task: Optional[asyncio.Task] = None
         self._running = False
+        # Set when an ejection brings a probe forward
+        self._probe_schedule_changed = asyncio.Event()
         
         # Service change callbacks
         self._callbacks: List[callable] = []
@@ -175,6 +212,9 @@ class ServiceDiscovery:
                 return min(all_instances, key=lambda x: x.failure_count)
             return None
         
+        if self.load_balancer:
+            return self.load_balancer.select_endpoint(healthy_instances)
+        
         # Select based on weighted response time
         # Lower response time and higher weight = better score
         def calculate_score(instance: ServiceInstance) -> float:
@@ -222,7 +262,10 @@ class ServiceDiscovery:
                     "response_time_ms": i.response_time,
                     "failure_count": i.failure_count,
                     "success_count": i.success_count,
-                    "last_check": i.last_check
+                    "last_check": i.last_check,
+                    "ejected": i.is_ejected,
+                    "ejection_count": i.ejection_count,
+                    "passive_error_rate": self._error_rate(i)
                 }
                 for i in instances
             ]
@@ -275,35 +318,88 @@ class ServiceDiscovery:
             return ServiceHealth.UNHEALTHY
     
     async def _health_monitor(self):
-        """Background health monitoring task"""
+        """Background health monitoring task
+        
+        Every instance is probed on its own jittered schedule, so probes of
+        replicas don't line up; ejected instances are probed when their
+        ejection time is up.
+        """
         while self._running:
             try:
-                await self._check_all_services()
-                await asyncio.sleep(self.config.health_check_interval)
+                await self._check_due_instances()
+                
+                self._probe_schedule_changed.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._probe_schedule_changed.wait(),
+                        timeout=self._seconds_until_next_probe()
+                    )
+                except asyncio.TimeoutError:
+                    pass
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 self.logger.error("Health monitor error", error=str(e))
                 await asyncio.sleep(5)  # Short delay on error
     
+    def _seconds_until_next_probe(self) -> float:
+        next_probe = min(
+            (instance.next_probe for instances in self.services.values() for instance in instances),
+            default=time.time() + self.config.health_check_interval
+        )
+        return max(0.0, next_probe - time.time())
+    
+    def _schedule_probe(self, instance: ServiceInstance, now: float):
+        if instance.is_ejected:
+            instance.next_probe = instance.ejected_until
+        else:
+            jitter = random.uniform(-self.config.probe_jitter, self.config.probe_jitter)
+            instance.next_probe = now + self.config.health_check_interval * (1 + jitter)
+    
+    async def _check_due_instances(self):
+        """Check health of the instances whose probe is due"""
+        now = time.time()
+        tasks = []
+        
+        for service_name, instances in self.services.items():
+            for instance in instances:
+                if instance.next_probe <= now:
+                    self._schedule_probe(instance, now)
+                    tasks.append(asyncio.create_task(self._check_instance_health(instance, service_name)))
+        
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
     async def _check_all_services(self):
         """Check health of all service instances"""
         tasks = []
         
         for service_name, instances in self.services.items():
             for instance in instances:
-                task = asyncio.create_task(self._check_instance_health(instance))
+                task = asyncio.create_task(self._check_instance_health(instance, service_name))
                 tasks.append(task)
         
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
     
-    async def _check_instance_health(self, instance: ServiceInstance):
+    async def _check_instance_health(self, instance: ServiceInstance, service_name: Optional[str] = None):
         """Check health of a single instance and update status"""
+        service_name = service_name or instance.name.split('_')[0]
         try:
             new_health = await self.check_service_health(instance)
             old_health = instance.health
             
+            if instance.is_ejected:
+                # Re-admit on the first good probe once the ejection time is
+                # up; a failed probe ejects it again for longer
+                if time.time() < instance.ejected_until:
+                    return
+                if new_health == ServiceHealth.UNHEALTHY:
+                    self._eject(service_name, instance, "probe failed after ejection")
+                else:
+                    self._readmit(service_name, instance, new_health)
+                return
+            
             # Update health status with hysteresis
             if new_health == ServiceHealth.HEALTHY:
                 instance.success_count += 1
@@ -335,11 +431,7 @@ class ServiceDiscovery:
                                response_time_ms=instance.response_time)
                 
                 # Trigger callbacks
-                self._notify_service_change(
-                    instance.name.split('_')[0],  # Extract service name
-                    "health_changed",
-                    instance
-                )
+                self._notify_service_change(service_name, "health_changed", instance)
                 
         except Exception as e:
             self.logger.error("Instance health check failed",
@@ -384,12 +476,126 @@ class ServiceDiscovery:
         
         if success:
             instance.success_count += 1
+            instance.consecutive_failures = 0
         else:
             instance.failure_count += 1
+            instance.consecutive_failures += 1
         
         # Update response time with exponential moving average
         if instance.response_time == 0:
             instance.response_time = response_time
         else:
             # Alpha = 0.2 for moderate smoothing
-            instance.response_time = (0.8 * instance.response_time) + (0.2 * response_time)
\ No newline at end of file
+            instance.response_time = (0.8 * instance.response_time) + (0.2 * response_time)
+        
+        if self.load_balancer:
+            self.load_balancer.record_result(
+                instance_name, success, response_time, peers=self.services[service_name]
+            )
+        
+        self._record_outcome(service_name, instance, success, response_time)
+    
+    def _record_outcome(self, service_name: str, instance: ServiceInstance, success: bool, response_time: float):
+        """Passive health: add a request outcome to the instance's window and
+        eject the instance at once if it crosses a threshold"""
+        now = time.time()
+        instance.outcomes.append((now, success, response_time))
+        cutoff = now - self.config.passive_window_seconds
+        while instance.outcomes and instance.outcomes[0][0] < cutoff:
+            instance.outcomes.popleft()
+        
+        if instance.is_ejected:
+            return
+        
+        if instance.consecutive_failures >= self.config.passive_consecutive_failures:
+            self._eject(service_name, instance,
+                        f"{instance.consecutive_failures} consecutive failures")
+            return
+        
+        if len(instance.outcomes) < self.config.passive_min_requests:
+            return
+        
+        error_rate = self._error_rate(instance)
+        if error_rate >= self.config.passive_error_rate:
+            self._eject(service_name, instance, f"error rate {error_rate:.0%}")
+            return
+        
+        latency = self._median_latency(instance)
+        peer_latencies = []
+        for peer in self.services[service_name]:
+            if peer is instance or peer.is_ejected or len(peer.outcomes) < self.config.passive_min_requests:
+                continue
+            peer_latency = self._median_latency(peer)
+            if peer_latency is not None:
+                peer_latencies.append(peer_latency)
+        
+        if latency is not None and peer_latencies:
+            typical_latency = statistics.median(peer_latencies)
+            if latency > typical_latency * self.config.passive_latency_factor:
+                self._eject(service_name, instance,
+                            f"median latency {latency:.0f}ms vs {typical_latency:.0f}ms on peers")
+    
+    def _error_rate(self, instance: ServiceInstance) -> float:
+        if not instance.outcomes:
+            return 0.0
+        return sum(1 for _, success, _ in instance.outcomes if not success) / len(instance.outcomes)
+    
+    def _median_latency(self, instance: ServiceInstance) -> Optional[float]:
+        latencies = [response_time for _, success, response_time in instance.outcomes if success]
+        return statistics.median(latencies) if latencies else None
+    
+    def _eject(self, service_name: str, instance: ServiceInstance, reason: str):
+        """Take an instance out of rotation until a probe after the ejection time succeeds"""
+        now = time.time()
+        instances = self.services.get(service_name, [])
+        
+        if not instance.is_ejected:
+            ejected = sum(1 for i in instances if i.is_ejected)
+            if ejected and (ejected + 1) * 100 > self.config.max_ejection_percent * len(instances):
+                return
+        
+        # Back-off starts over once the instance has stayed in rotation for
+        # the longest ejection time
+        if (instance.ejection_count and not instance.is_ejected
+                and now - instance.readmitted_at > self.config.max_ejection_seconds):
+            instance.ejection_count = 0
+        instance.ejection_count += 1
+        duration = min(
+            self.config.base_ejection_seconds * 2 ** (instance.ejection_count - 1),
+            self.config.max_ejection_seconds
+        )
+        
+        old_health = instance.health
+        instance.health = ServiceHealth.UNHEALTHY
+        instance.ejected_until = now + duration
+        instance.next_probe = instance.ejected_until
+        instance.consecutive_failures = 0
+        instance.outcomes.clear()
+        self._probe_schedule_changed.set()
+        
+        self.logger.warning("Service instance ejected",
+                          service=service_name,
+                          instance=instance.name,
+                          reason=reason,
+                          ejection_seconds=duration,
+                          ejection_count=instance.ejection_count)
+        
+        if old_health != instance.health:
+            self._notify_service_change(service_name, "health_changed", instance)
+    
+    def _readmit(self, service_name: str, instance: ServiceInstance, health: ServiceHealth):
+        """Return an ejected instance to rotation"""
+        instance.ejected_until = 0.0
+        instance.readmitted_at = time.time()
+        instance.health = health
+        instance.failure_count = 0
+        instance.consecutive_failures = 0
+        instance.outcomes.clear()
+        self._schedule_probe(instance, time.time())
+        
+        self.logger.info("Service instance re-admitted",
+                        service=service_name,
+                        instance=instance.name,
+                        ejection_count=instance.ejection_count)
+        
+        self._notify_service_change(service_name, "health_changed", instance)
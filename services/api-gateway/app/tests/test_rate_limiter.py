@@ -0,0 +1,138 @@
+"""
+Unified Rate Limiter Tests
+Tests for GCRA / token-bucket decisions, local pre-admission leases and Redis fallback
+"""
+import time
+import pytest
+
+from app.security.rate_limiter import (
+    UnifiedRateLimiter, RateLimitQuota, RateLimitAlgorithm, _MemoryBackend
+)
+
+
+class FakeRedis:
+    """Redis stand-in whose limiter script runs the in-process mirror"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+        self.backend = _MemoryBackend(max_keys=1000)
+
+    def register_script(self, script):
+        async def run(keys, args):
+            if self.fail:
+                raise ConnectionError("redis down")
+            self.calls.append((list(keys), list(args)))
+            cost, debt = args[0], args[1]
+            quotas = []
+            for i in range(len(keys)):
+                algorithm, interval_ms, capacity = args[2 + i * 3:5 + i * 3]
+                quotas.append(RateLimitQuota(
+                    name=keys[i],
+                    limit=capacity,
+                    period_seconds=interval_ms * capacity / 1000.0,
+                    algorithm=RateLimitAlgorithm(algorithm)
+                ))
+            results = self.backend.evaluate(keys, quotas, cost, debt, time.time() * 1000)
+            flat = [1 if results[0][0] else 0]
+            for _, remaining, retry, reset in results:
+                flat.extend([remaining, int(retry), int(reset)])
+            return flat
+        return run
+
+
+class TestUnifiedRateLimiter:
+    """Test cases for the shared rate limiter"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("algorithm", list(RateLimitAlgorithm))
+    async def test_burst_then_deny(self, algorithm):
+        """A full quota admits exactly its burst, then reports a retry delay"""
+        limiter = UnifiedRateLimiter()
+        quota = RateLimitQuota("test:minute", limit=10, period_seconds=60, algorithm=algorithm)
+
+        for expected_remaining in range(9, -1, -1):
+            decision = await limiter.check("ip:1", [quota])
+            assert decision.allowed is True
+            assert decision.remaining == expected_remaining
+
+        decision = await limiter.check("ip:1", [quota])
+        assert decision.allowed is False
+        assert decision.remaining == 0
+        assert 5.0 < decision.retry_after <= 6.0
+        assert decision.quota == "test:minute"
+
+    @pytest.mark.asyncio
+    async def test_multiple_quotas_are_atomic(self):
+        """A request denied by one quota is not charged to the others"""
+        limiter = UnifiedRateLimiter()
+        minute = RateLimitQuota("minute", limit=100, period_seconds=60)
+        hour = RateLimitQuota("hour", limit=3, period_seconds=3600)
+
+        for _ in range(3):
+            assert (await limiter.check("ip:2", [minute, hour])).allowed
+
+        denied = await limiter.check("ip:2", [minute, hour])
+        assert denied.allowed is False
+        assert denied.quota == "hour"
+
+        # The minute quota only saw the three admitted requests
+        decision = await limiter.check("ip:2", [minute])
+        assert decision.remaining == 100 - 4
+
+    @pytest.mark.asyncio
+    async def test_local_lease_skips_redis(self):
+        """Clients far below their limit are admitted without a Redis round trip"""
+        redis_client = FakeRedis()
+        limiter = UnifiedRateLimiter(redis_client, local_budget_fraction=0.1, local_lease_seconds=60)
+        quota = RateLimitQuota("big", limit=1000, period_seconds=60)
+
+        for _ in range(100):
+            assert (await limiter.check("ip:3", [quota])).allowed
+
+        stats = limiter.get_stats()
+        assert stats["local_admissions"] > 80
+        assert len(redis_client.calls) < 20
+
+    @pytest.mark.asyncio
+    async def test_lease_debt_is_charged(self):
+        """Locally admitted requests are charged to Redis on the next round trip"""
+        redis_client = FakeRedis()
+        limiter = UnifiedRateLimiter(redis_client, local_budget_fraction=0.1, local_lease_seconds=60)
+        quota = RateLimitQuota("big", limit=1000, period_seconds=60)
+
+        await limiter.check("ip:4", [quota])
+        lease_budget = 999 // 10
+        for _ in range(lease_budget + 1):
+            await limiter.check("ip:4", [quota])
+
+        # Second round trip carried the lease's admissions as debt
+        assert len(redis_client.calls) == 2
+        assert redis_client.calls[1][1][1] == lease_budget
+
+    @pytest.mark.asyncio
+    async def test_no_lease_near_limit(self):
+        """Clients close to their limit always reach the authoritative store"""
+        redis_client = FakeRedis()
+        limiter = UnifiedRateLimiter(redis_client, local_min_headroom=0.5)
+        quota = RateLimitQuota("small", limit=10, period_seconds=60)
+
+        for _ in range(10):
+            await limiter.check("ip:5", [quota])
+
+        assert limiter.get_stats()["local_admissions"] == 0
+        assert len(redis_client.calls) == 10
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_falls_back_to_memory(self):
+        """Redis errors degrade to process-local enforcement instead of failing open"""
+        limiter = UnifiedRateLimiter(FakeRedis(fail=True))
+        quota = RateLimitQuota("minute", limit=2, period_seconds=60)
+
+        assert (await limiter.check("ip:6", [quota])).allowed
+        assert (await limiter.check("ip:6", [quota])).allowed
+        decision = await limiter.check("ip:6", [quota])
+
+        assert decision.allowed is False
+        assert decision.source == "memory"
+        assert limiter.get_stats()["redis_errors"] == 3
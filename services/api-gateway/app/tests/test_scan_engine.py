@@ -0,0 +1,206 @@
+"""
+Threat Scan Engine Tests
+Tests for combined pattern matching, opaque payload skipping and per-request scan budgets
+"""
+import base64
+import json
+import re
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from starlette.requests import Request
+
+from app.security.scan_engine import CompiledPatternSet, RequestBodyExtractor, ScanLimits
+from app.security.security_scanner import SecurityScanner, ThreatLevel, VulnerabilityType
+from shared.monitoring.structured_logger import StructuredLogger
+
+
+def screenshot(size: int = 8192) -> str:
+    return base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * (size // 256)).decode()
+
+
+def make_request(body: dict, path: str = "/api/v1/generate") -> Request:
+    raw = json.dumps(body).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "scheme": "http",
+        "server": ("gateway", 80),
+        "client": ("10.0.0.1", 40000),
+        "headers": [(b"content-type", b"application/json"), (b"user-agent", b"Mozilla/5.0")],
+    }, receive)
+
+
+class TestCompiledPatternSet:
+    """Test the combined alternation matcher"""
+
+    PATTERNS = [
+        {"pattern": r"\bUNION\b", "flags": re.IGNORECASE, "description": "union"},
+        {"pattern": r"<script>.*</script>", "flags": re.IGNORECASE | re.DOTALL, "description": "script"},
+        {"pattern": r"(a)\1", "flags": 0, "description": "backreference"},
+        {"pattern": r"--", "flags": 0, "description": "comment"},
+    ]
+
+    def legacy(self, content):
+        return next(
+            (p for p in self.PATTERNS if re.search(p["pattern"], content, p.get("flags", 0))),
+            None
+        )
+
+    @pytest.mark.parametrize("content", [
+        "clean text",
+        "-- then union",
+        "x <SCRIPT>\n</script> -- union",
+        "aa",
+        "--aa",
+        "Union",
+    ])
+    def test_reports_same_pattern_as_sequential_search(self, content):
+        """The first pattern in list order is reported, not the leftmost match"""
+        matcher = CompiledPatternSet(self.PATTERNS)
+        hit = matcher.search(content)
+        assert (hit[0] if hit else None) is self.legacy(content)
+
+    def test_search_all(self):
+        """All matching patterns are returned in order"""
+        matcher = CompiledPatternSet(self.PATTERNS)
+        assert [p["description"] for p in matcher.search_all("aa -- union")] == ["union", "backreference", "comment"]
+        assert matcher.search_all("clean") == []
+
+
+class TestRequestBodyExtractor:
+    """Test body segmentation and budgets"""
+
+    def test_data_url_is_skipped(self):
+        """Image data URLs are skipped; sibling fields are scanned with their path"""
+        extractor = RequestBodyExtractor()
+        body = json.dumps({"image": f"data:image/png;base64,{screenshot()}", "prompt": "make it blue"}).encode()
+
+        plan = extractor.extract(body, "application/json")
+
+        assert plan.opaque_fields == 1
+        assert [s.path for s in plan.segments if s.text == "make it blue"] == ["prompt"]
+        assert all(len(s.text) < 100 for s in plan.segments)
+
+    def test_bare_base64_needs_path_or_signature(self):
+        """Bare base64 is opaque at configured paths or with a file signature"""
+        extractor = RequestBodyExtractor()
+        text_b64 = base64.b64encode(b"plain text " * 200).decode()
+
+        at_path = extractor.extract(json.dumps({"image_data": text_b64}).encode(), "application/json")
+        elsewhere = extractor.extract(json.dumps({"notes": text_b64}).encode(), "application/json")
+        signed = extractor.extract(json.dumps({"notes": screenshot()}).encode(), "application/json")
+
+        assert at_path.opaque_fields == 1
+        assert elsewhere.opaque_fields == 0
+        assert signed.opaque_fields == 1
+
+    def test_opaque_path_with_markup_is_scanned(self):
+        """Non-base64 content at an opaque path is not skipped"""
+        extractor = RequestBodyExtractor()
+        value = "<script>alert(1)</script>" + "x" * 2000
+
+        plan = extractor.extract(json.dumps({"image": value}).encode(), "application/json")
+
+        assert plan.opaque_fields == 0
+        assert plan.segments[-1].path == "image"
+
+    def test_budget_caps_scanned_text(self):
+        """Text past the per-request budget is not scanned"""
+        extractor = RequestBodyExtractor(ScanLimits(max_body_chars=1000, max_fields=50))
+        body = json.dumps({"items": ["word " * 100 for _ in range(100)]}).encode()
+
+        plan = extractor.extract(body, "application/json")
+
+        assert plan.truncated is True
+        assert plan.scanned_chars <= 1000
+        assert extractor.get_stats()["truncated"] == 1
+
+    def test_non_json_body_strips_data_urls(self):
+        """Data URLs inside non-JSON bodies keep only their header"""
+        extractor = RequestBodyExtractor()
+        body = f"image=data:image/png;base64,{screenshot()}&q=1".encode()
+
+        plan = extractor.extract(body, "application/x-www-form-urlencoded")
+
+        assert plan.segments[0].text == "image=data:image/png;base64,&q=1"
+
+
+class TestScannerBodyScanning:
+    """Test SecurityScanner request scanning with the engine"""
+
+    @pytest.fixture
+    def scanner(self):
+        return SecurityScanner(SimpleNamespace(), Mock(spec=StructuredLogger))
+
+    @pytest.mark.asyncio
+    async def test_screenshot_upload_is_clean(self, scanner):
+        """A screenshot upload with a plain prompt raises no body threats"""
+        request = make_request({
+            "image": f"data:image/png;base64,{screenshot(200_000)}",
+            "prompt": "Build this landing page",
+        })
+
+        threats = await scanner.scan_request(request)
+
+        assert not [t for t in threats if "Request body" in t.description]
+        assert scanner.get_security_metrics()["body_scanning"]["opaque_fields"] == 1
+
+    @pytest.mark.asyncio
+    async def test_threat_located_by_json_path(self, scanner):
+        """Injected markup next to a screenshot is reported at its JSON path"""
+        request = make_request({
+            "image": f"data:image/png;base64,{screenshot()}",
+            "history": ["ok", "<script>alert(document.cookie)</script>"],
+        })
+
+        threats = await scanner.scan_request(request)
+
+        xss = [t for t in threats if t.threat_type == VulnerabilityType.XSS]
+        assert len(xss) == 1
+        assert xss[0].evidence["location"] == "Request body: history[1]"
+
+    @pytest.mark.asyncio
+    async def test_padding_past_char_budget_is_reported(self, scanner):
+        """Text pushed past the character budget raises a threat instead of passing"""
+        request = make_request({"pad": "word " * 52_429, "q": "1' OR '1'='1; DROP TABLE users--"})
+
+        threats = await scanner.scan_request(request)
+
+        truncated = [t for t in threats if t.title == "Request Body Not Fully Scanned"]
+        assert len(truncated) == 1
+        assert truncated[0].threat_type == VulnerabilityType.SUSPICIOUS_ACTIVITY
+        assert truncated[0].reject_request is False
+        scanner.logger.warning.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_padding_past_field_budget_is_reported(self, scanner):
+        """Payloads hidden behind many dummy keys raise a threat instead of passing"""
+        body = {f"k{index}": "v" for index in range(1_100)}
+        body["q"] = "<script>alert(1)</script>"
+        request = make_request(body)
+
+        threats = await scanner.scan_request(request)
+
+        assert not [t for t in threats if t.threat_type == VulnerabilityType.XSS]
+        assert [t for t in threats if t.title == "Request Body Not Fully Scanned"]
+
+    @pytest.mark.asyncio
+    async def test_truncated_body_can_be_rejected(self):
+        """With reject_truncated set the threat asks for the request to be rejected"""
+        scanner = SecurityScanner(SimpleNamespace(), Mock(spec=StructuredLogger),
+                                  ScanLimits(reject_truncated=True))
+        request = make_request({"pad": "word " * 52_429, "q": "x"})
+
+        threats = await scanner.scan_request(request)
+
+        truncated = [t for t in threats if t.reject_request]
+        assert len(truncated) == 1
+        assert truncated[0].threat_level == ThreatLevel.HIGH
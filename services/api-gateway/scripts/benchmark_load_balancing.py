@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Load Balancing Simulation
+Sends requests through each balancing strategy to simulated replicas, one of
+them slow, and reports the latency percentiles seen by clients
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.core.config import LoadBalancingStrategy
+from app.services.load_balancing import LoadBalancer
+
+
+@dataclass
+class Replica:
+    name: str
+    mean_ms: float
+    weight: int = 1
+    fail_rate: float = 0.0
+
+    def __post_init__(self):
+        # Each replica serves a few requests at once; the rest queue
+        self.slots = asyncio.Semaphore(4)
+        self.served = 0
+
+    async def handle(self) -> bool:
+        async with self.slots:
+            self.served += 1
+            await asyncio.sleep(random.expovariate(1000.0 / self.mean_ms))
+            return random.random() >= self.fail_rate
+
+
+def percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def simulate(strategy: LoadBalancingStrategy, args) -> dict:
+    replicas = [Replica(f"replica-{i}", args.mean_ms) for i in range(args.replicas)]
+    replicas[0].mean_ms *= args.slow_factor
+    replicas[0].fail_rate = args.slow_fail_rate
+    balancer = LoadBalancer(strategy)
+    latencies = []
+    failures = 0
+    queue = iter(range(args.requests))
+
+    async def client():
+        nonlocal failures
+        for _ in queue:
+            replica = balancer.select_endpoint(replicas)
+            balancer.increment_connections(replica.name)
+            start = time.perf_counter()
+            try:
+                success = await replica.handle()
+            finally:
+                balancer.decrement_connections(replica.name)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            balancer.record_result(replica.name, success, elapsed_ms, peers=replicas)
+            latencies.append(elapsed_ms)
+            failures += not success
+
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "p999": percentile(latencies, 0.999),
+        "slow_share": replicas[0].served / args.requests,
+        "failures": failures
+    }
+
+
+async def main_async(args):
+    random.seed(args.seed)
+    print(f"{args.replicas} replicas, replica-0 {args.slow_factor:g}x slower, "
+          f"{args.requests} requests from {args.concurrency} clients")
+    print(f"{'strategy':<22} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'to slow':>8} {'failed':>7}")
+    for strategy in LoadBalancingStrategy:
+        result = await simulate(strategy, args)
+        print(f"{strategy.value:<22} {result['p50']:>8.1f} {result['p99']:>8.1f} {result['p999']:>9.1f} "
+              f"{result['slow_share']:>8.1%} {result['failures']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate load balancing strategies with one slow replica")
+    parser.add_argument("--replicas", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--mean-ms", type=float, default=5.0, help="Mean service time of a healthy replica")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="How much slower replica-0 is")
+    parser.add_argument("--slow-fail-rate", type=float, default=0.0,
+                        help="Share of replica-0 requests that fail, to exercise outlier ejection")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+L1 Memory Cache Microbenchmark
+Measures get/set cost of the L1 engine as the number of cached items grows
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.caching.memory_cache import MemoryCacheEngine
+from app.caching.redis_cache import CacheEntry
+
+LEGACY_MAX_ITEMS = 20_000
+
+
+class LegacyListLRU:
+    """Reproduction of the previous dict + list LRU for comparison"""
+
+    def __init__(self, max_items: int):
+        self.entries: Dict[str, CacheEntry] = {}
+        self.order: List[str] = []
+        self.max_items = max_items
+
+    def put(self, key: str, entry: CacheEntry):
+        now = time.time()
+        for k in [k for k, e in self.entries.items() if now - e.created_at > e.ttl]:
+            self._remove(k)
+        while len(self.entries) >= self.max_items and self.order:
+            self._remove(self.order[0])
+        self.entries[key] = entry
+        self._touch(key)
+
+    def get_entry(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._touch(key)
+        return entry
+
+    def _touch(self, key: str):
+        if key in self.order:
+            self.order.remove(key)
+        self.order.append(key)
+
+    def _remove(self, key: str):
+        del self.entries[key]
+        if key in self.order:
+            self.order.remove(key)
+
+
+def make_entry(key: str) -> CacheEntry:
+    return CacheEntry(key=key, value=key, created_at=time.time(), ttl=3600, size_bytes=64)
+
+
+def bench(cache, item_count: int, operations: int) -> Dict[str, float]:
+    """Fill the cache to ``item_count`` then time steady-state get/set"""
+    for i in range(item_count):
+        cache.put(f"key:{i}", make_entry(f"key:{i}"))
+
+    rng = random.Random(42)
+    keys = [f"key:{rng.randrange(item_count)}" for _ in range(operations)]
+
+    start = time.perf_counter()
+    for key in keys:
+        cache.get_entry(key)
+    get_ns = (time.perf_counter() - start) * 1e9 / operations
+
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        cache.put(f"new:{i}", make_entry(key))
+    set_ns = (time.perf_counter() - start) * 1e9 / operations
+
+    return {"get_ns": get_ns, "set_ns": set_ns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the L1 memory cache engine")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 500_000],
+                        help="Item counts to benchmark")
+    parser.add_argument("--operations", type=int, default=20_000, help="Timed operations per size")
+    parser.add_argument("--compare-legacy", action="store_true",
+                        help="Also run the previous list-based LRU (slow at large sizes)")
+    args = parser.parse_args()
+
+    print(f"{'items':>10} {'impl':>8} {'get ns/op':>12} {'set ns/op':>12}")
+    for size in args.sizes:
+        # Budget sized so the cache stays full and every set also evicts
+        engine = MemoryCacheEngine(max_bytes=size * 64)
+        result = bench(engine, size, args.operations)
+        print(f"{size:>10} {'engine':>8} {result['get_ns']:>12.0f} {result['set_ns']:>12.0f}")
+
+        if args.compare_legacy:
+            if size > LEGACY_MAX_ITEMS:
+                print(f"{size:>10} {'legacy':>8}   skipped (fill is O(n^2))")
+                continue
+            legacy_ops = max(100, args.operations * 1_000 // size)
+            result = bench(LegacyListLRU(size), size, min(legacy_ops, args.operations))
+            print(f"{size:>10} {'legacy':>8} {result['get_ns']:>12.0f} {result['set_ns']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
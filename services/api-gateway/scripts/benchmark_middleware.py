@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Middleware Pipeline Microbenchmark
+Drives the gateway middleware stack over raw ASGI and reports per-layer overhead
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.asgi import ASGIPipeline, MiddlewareLayer, PipelineTimings
+from app.middleware.api_security import APISecurityMiddleware
+from app.middleware.caching import SmartCachingMiddleware
+from app.middleware.logging import LoggingMiddleware
+from app.middleware.monitoring import BusinessMetricsMiddleware, MonitoringMiddleware
+from app.middleware.request_id import RequestIDMiddleware
+
+BODY = b'{"status": "ok", "items": [1, 2, 3]}'
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class NullSink:
+    """Logger/metrics stand-in that drops every call so only middleware cost is measured"""
+
+    def __getattr__(self, name):
+        return _noop
+
+
+class NullSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def get_span_context(self):
+        return None
+
+
+class NullTracing:
+    @asynccontextmanager
+    async def trace_request(self, operation_name, attributes=None):
+        yield NullSpan()
+
+
+class NullCache:
+    """Always-miss cache so the caching layer runs its capture path"""
+
+    async def get(self, key, namespace=None):
+        return None
+
+    async def set(self, key, value, ttl=None, namespace=None, tags=None):
+        return True
+
+
+async def endpoint(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(BODY)).encode())],
+    })
+    await send({"type": "http.response.body", "body": BODY, "more_body": False})
+
+
+def build_layers():
+    logger = NullSink()
+    metrics = NullSink()
+    cache = NullCache()
+
+    return [
+        MiddlewareLayer(LoggingMiddleware, {"logger": logger}),
+        MiddlewareLayer(RequestIDMiddleware),
+        MiddlewareLayer(BusinessMetricsMiddleware, {"metrics": metrics, "logger": logger}),
+        MiddlewareLayer(SmartCachingMiddleware, {"cache": cache, "optimizer": None, "logger": logger}),
+        MiddlewareLayer(MonitoringMiddleware, {
+            "metrics": metrics, "tracing": NullTracing(), "alerting": NullSink(), "logger": logger
+        }),
+        MiddlewareLayer(APISecurityMiddleware, {"logger": logger, "enable_rate_limiting": False}),
+    ]
+
+
+class PassThroughMiddleware(BaseHTTPMiddleware):
+    """No-op BaseHTTPMiddleware, used to measure the cost of the previous layering"""
+
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def make_scope(path: str):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 40000),
+        "headers": [(b"host", b"bench"), (b"user-agent", b"benchmark")],
+    }
+
+
+async def drive(app, requests: int, path: str) -> float:
+    """Send ``requests`` sequential requests and return mean microseconds per request"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = make_scope(path)
+    for _ in range(min(requests, 200)):
+        await app(dict(scope), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) * 1e6 / requests
+
+
+async def main_async(args):
+    # Uncached path so every layer does its full work
+    path = "/api/v1/bench"
+
+    baseline = await drive(endpoint, args.requests, path)
+
+    timings = PipelineTimings()
+    pipeline = ASGIPipeline(endpoint, build_layers(), timings=timings)
+    await drive(pipeline, args.requests, path)
+    timings.reset()
+    total = await drive(pipeline, args.requests, path)
+
+    report = timings.get_report()
+    print(f"{'layer':<30} {'mean us':>10} {'max hook us':>12}")
+    for name, layer in report["layers"].items():
+        print(f"{name:<30} {layer['mean_us']:>10.2f} {layer['max_hook_us']:>12.2f}")
+    print(f"{'hooks total':<30} {report['total_mean_us']:>10.2f}")
+    print(f"{'pre-router':<30} {report['pre_router_mean_us']:>10.2f}")
+    print(f"{'endpoint only':<30} {baseline:>10.2f}")
+    print(f"{'pipeline end-to-end':<30} {total:>10.2f}")
+
+    if args.compare_base_http:
+        app = endpoint
+        for _ in range(len(report["layers"])):
+            app = PassThroughMiddleware(app)
+        nested = await drive(app, args.requests, path)
+        print(f"{'nested BaseHTTPMiddleware x' + str(len(report['layers'])):<30} {nested:>10.2f}  (no-op layers)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gateway middleware pipeline")
+    parser.add_argument("--requests", type=int, default=5_000, help="Timed requests per run")
+    parser.add_argument("--compare-base-http", action="store_true",
+                        help="Also time the same number of no-op BaseHTTPMiddleware layers")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
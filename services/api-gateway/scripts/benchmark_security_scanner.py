@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Security Scanner Body Benchmark
+Compares the legacy per-pattern body scan with the compiled, budgeted scan engine on screenshot uploads
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.security.security_scanner import SecurityScanner
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class NullSink:
+    """Logger stand-in that drops every call"""
+
+    def __getattr__(self, name):
+        return _noop
+
+
+def screenshot_base64(size_bytes: int) -> str:
+    """Base64 of a PNG-signed, incompressible payload the size of a real screenshot upload"""
+    raw = b"\x89PNG\r\n\x1a\n" + os.urandom(max(size_bytes * 3 // 4 - 8, 0))
+    return base64.b64encode(raw).decode("ascii")
+
+
+def build_payloads(size_bytes: int):
+    """Request bodies in the shapes the gateway receives"""
+    image = screenshot_base64(size_bytes)
+    prompt = "Generate the HTML/Tailwind code for this screenshot. Keep the layout responsive."
+    return {
+        "data-url field": {
+            "image": f"data:image/png;base64,{image}",
+            "stack": "html_tailwind",
+            "prompt": prompt,
+        },
+        "chat messages": {
+            "model": "gpt-4o",
+            "messages": [
+                {"role": "system", "content": "You are an expert frontend developer."},
+                {"role": "user", "content": [
+                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+                    {"type": "text", "text": prompt},
+                ]},
+            ],
+        },
+        "bare base64 field": {
+            "image_data": image,
+            "framework": "react",
+            "description": prompt,
+        },
+    }
+
+
+def legacy_body_scan(scanner: SecurityScanner, body: bytes) -> int:
+    """The previous body path: decode everything, one re.search per pattern per category"""
+    text = body.decode("utf-8", errors="ignore")
+    threats = 0
+    for patterns, decode in (
+        (scanner.sql_injection_patterns, False),
+        (scanner.xss_patterns, True),
+        (scanner.command_injection_patterns, False),
+    ):
+        content = scanner._decode_common_encodings(text) if decode else text
+        for pattern_info in patterns:
+            if re.search(pattern_info["pattern"], content, pattern_info.get("flags", 0)):
+                threats += 1
+                break
+    return threats
+
+
+def engine_body_scan(scanner: SecurityScanner, body: bytes) -> int:
+    """The current body path: budgeted extraction, then one combined matcher per category"""
+    plan = scanner.body_extractor.extract(body, "application/json")
+    threats = 0
+    for check in (
+        scanner._check_sql_patterns,
+        scanner._check_xss_patterns,
+        scanner._check_command_injection_patterns,
+    ):
+        for segment in plan.segments:
+            if check(segment.text, segment.location):
+                threats += 1
+                break
+    return threats
+
+
+def measure(fn, scanner: SecurityScanner, body: bytes, iterations: int):
+    """Run ``fn`` and return (median ms, threats reported)"""
+    threats = fn(scanner, body)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(scanner, body)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), threats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request body threat scanning")
+    parser.add_argument("--size-mb", type=float, default=5.0, help="Encoded screenshot size in MB")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed runs per payload")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the scan engine")
+    args = parser.parse_args()
+
+    scanner = SecurityScanner(SimpleNamespace(), NullSink())
+    payloads = build_payloads(int(args.size_mb * 1024 * 1024))
+
+    print(f"{'payload':<20} {'body MB':>8} {'legacy ms':>10} {'threats':>8} {'engine ms':>10} {'threats':>8} {'speedup':>8}")
+    for name, document in payloads.items():
+        body = json.dumps(document).encode()
+        engine_ms, engine_threats = measure(engine_body_scan, scanner, body, args.iterations)
+        if args.skip_legacy:
+            legacy = f"{'-':>10} {'-':>8}"
+            speedup = "-"
+        else:
+            legacy_ms, legacy_threats = measure(legacy_body_scan, scanner, body, args.iterations)
+            legacy = f"{legacy_ms:>10.1f} {legacy_threats:>8}"
+            speedup = f"{legacy_ms / max(engine_ms, 1e-6):.0f}x"
+        print(f"{name:<20} {len(body) / 1e6:>8.2f} {legacy} {engine_ms:>10.2f} {engine_threats:>8} {speedup:>8}")
+
+    stats = scanner.body_extractor.get_stats()
+    print(f"\nopaque fields skipped: {stats['opaque_fields']}, skipped fraction: {stats['skipped_fraction']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
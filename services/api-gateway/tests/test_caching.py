@@ -16,6 +16,7 @@ from app.caching.redis_cache import (
     CacheEntry,
     CacheStats
 )
+from app.caching.memory_cache import MemoryCacheEngine
 from app.middleware.caching import CachingMiddleware, SmartCachingMiddleware, CacheRule
 
 
@@ -257,6 +258,105 @@ class TestAdvancedRedisCache:
         assert stats["statistics"]["sets"] >= 1
 
 
+
+class TestMemoryCacheEngine:
+    """Test the L1 memory cache engine"""
+    
+    def _entry(self, key, size=10, ttl=300, created_at=None, namespace=None):
+        return CacheEntry(
+            key=key,
+            value="x" * size,
+            created_at=created_at if created_at is not None else time.time(),
+            ttl=ttl,
+            size_bytes=size,
+            namespace=namespace
+        )
+    
+    def test_lru_order_and_touch(self):
+        """Test recency order is updated on access"""
+        engine = MemoryCacheEngine(max_bytes=1000)
+        for key in ("a", "b", "c"):
+            engine.put(key, self._entry(key))
+        
+        assert engine.get_entry("a") is not None
+        assert list(engine.keys()) == ["b", "c", "a"]
+    
+    def test_byte_budget_eviction(self):
+        """Test least recently used entries are evicted when over the byte budget"""
+        evicted = []
+        engine = MemoryCacheEngine(
+            max_bytes=30,
+            on_evict=lambda key, entry, reason: evicted.append((key, reason))
+        )
+        for key in ("a", "b", "c"):
+            engine.put(key, self._entry(key, size=10))
+        engine.get_entry("a")
+        engine.put("d", self._entry("d", size=10))
+        
+        assert "b" not in engine
+        assert set(engine.keys()) == {"a", "c", "d"}
+        assert engine.total_bytes == 30
+        assert evicted == [("b", "capacity")]
+    
+    def test_oversized_entry_rejected(self):
+        """Test entries larger than the budget are not stored"""
+        engine = MemoryCacheEngine(max_bytes=10)
+        engine.put("small", self._entry("small", size=5))
+        
+        assert engine.put("huge", self._entry("huge", size=50)) is False
+        assert "small" in engine
+        assert engine.rejections == 1
+    
+    def test_namespace_limits(self):
+        """Test per-namespace byte limits evict only within the namespace"""
+        engine = MemoryCacheEngine(max_bytes=1000, namespace_max_bytes={"api": 20})
+        engine.put("other", self._entry("other", size=10, namespace="models"))
+        for key in ("api1", "api2", "api3"):
+            engine.put(key, self._entry(key, size=10, namespace="api"))
+        
+        assert "api1" not in engine
+        assert "other" in engine
+        assert engine.namespace_usage() == {"models": 10, "api": 20}
+    
+    def test_expiry_heap(self):
+        """Test expired entries are reclaimed without touching live ones"""
+        engine = MemoryCacheEngine(max_bytes=1000)
+        now = time.time()
+        engine.put("fresh", self._entry("fresh", ttl=300, created_at=now))
+        engine.put("old", self._entry("old", ttl=10, created_at=now - 100))
+        
+        assert engine.evict_expired(now) == 1
+        assert "old" not in engine
+        assert "fresh" in engine
+        assert engine.get_entry("fresh", now + 301) is None
+        assert len(engine) == 0
+    
+    def test_replace_keeps_accounting(self):
+        """Test replacing a key does not leak bytes or stale expiry items"""
+        engine = MemoryCacheEngine(max_bytes=1000)
+        now = time.time()
+        engine.put("k", self._entry("k", size=10, ttl=10, created_at=now))
+        engine.put("k", self._entry("k", size=20, ttl=300, created_at=now))
+        
+        assert engine.total_bytes == 20
+        assert engine.evict_expired(now + 60) == 0
+        assert "k" in engine
+    
+    @pytest.mark.asyncio
+    async def test_byte_budget_from_config(self, test_settings, mock_logger):
+        """Test AdvancedRedisCache derives the L1 budget from CacheConfig"""
+        config = CacheConfig(max_memory_mb=1, namespace_memory_limits={"api": 64})
+        cache = AdvancedRedisCache(test_settings, mock_logger, config)
+        
+        assert cache.memory_cache.max_bytes == 1024 * 1024
+        
+        await cache.set("a", "x" * 40, namespace="api")
+        await cache.set("b", "y" * 40, namespace="api")
+        
+        assert len(cache.memory_cache) == 1
+        assert cache.stats.memory_usage == 40
+        assert cache.stats.evictions == 1
+
 class TestCacheRule:
     """Test cache rule functionality"""
     
@@ -0,0 +1,175 @@
+"""
+Tests for adaptive per-endpoint connection pools
+"""
+import asyncio
+import pytest
+import httpx
+from unittest.mock import Mock, patch
+
+from app.services.connection_pool import (
+    AcquireLatencyHistogram,
+    AdaptiveConcurrencyLimit,
+    ConnectionPoolManager,
+    EndpointPool,
+    PoolConfig
+)
+
+
+class PoolSettings:
+    service_name = "api-gateway"
+    connection_pool_http2 = True
+    connection_pool_prewarm_connections = 3
+    connection_pool_resize_interval_seconds = 10.0
+
+
+def make_pool(handler, config=None, http2=False, on_acquire=None):
+    client = httpx.AsyncClient(base_url="http://replica:8002", transport=httpx.MockTransport(handler))
+    config = config or PoolConfig(min_connections=2, max_connections=20, max_keepalive=2)
+    return EndpointPool("code_generator", "http://replica:8002", client, config, http2, on_acquire)
+
+
+def slow_handler(delay=0.01):
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"status": "ok"})
+
+    handler.calls = calls
+    return handler
+
+
+class TestAdaptiveConcurrencyLimit:
+    """Test the resizable semaphore"""
+
+    @pytest.mark.asyncio
+    async def test_raising_limit_admits_waiters(self):
+        """Waiters get in as soon as the limit grows"""
+        limit = AdaptiveConcurrencyLimit(1)
+        assert await limit.acquire() is False
+        waiter = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0)
+        assert limit.waiting == 1
+
+        limit.set_limit(2)
+
+        assert await waiter is True
+        assert limit.in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        """Cancelling a queued acquire leaves the counts intact"""
+        limit = AdaptiveConcurrencyLimit(1)
+        await limit.acquire()
+        waiter = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limit.release()
+
+        assert limit.in_flight == 0
+        assert limit.waiting == 0
+
+
+class TestEndpointPool:
+    """Test adaptive sizing and acquire latency tracking"""
+
+    @pytest.mark.asyncio
+    async def test_limit_bounds_concurrency_and_records_waits(self):
+        """Requests beyond the limit queue and their wait is recorded"""
+        observed = []
+        pool = make_pool(slow_handler(), on_acquire=lambda *args: observed.append(args))
+
+        responses = await asyncio.gather(*(pool.get("/generate") for _ in range(6)))
+
+        assert all(r.status_code == 200 for r in responses)
+        assert pool.window_peak_in_flight == 2
+        assert pool.window_waits == 4
+        histogram = pool.get_stats()["acquire_latency_seconds"]
+        assert histogram["count"] == 6
+        assert histogram["buckets"]["+Inf"] == 6
+        assert histogram["p99"] >= 0.01
+        assert len(observed) == 6 and observed[0][:2] == ("code_generator", "http://replica:8002")
+
+    @pytest.mark.asyncio
+    async def test_grows_under_contention(self):
+        """Waiting requests grow the limit, up to max_connections"""
+        pool = make_pool(slow_handler())
+
+        await asyncio.gather(*(pool.get("/generate") for _ in range(10)))
+
+        assert pool.resize() == (2, 3)
+        for _ in range(10):
+            pool.window_acquires, pool.window_waits = 10, 5
+            pool.resize()
+        assert pool.limit.limit == 20
+
+    @pytest.mark.asyncio
+    async def test_shrinks_when_underused(self):
+        """Low concurrency without waits shrinks the limit, not below the minimum"""
+        pool = make_pool(slow_handler(0), config=PoolConfig(min_connections=2, max_connections=20, max_keepalive=16))
+
+        for _ in range(20):
+            await pool.get("/generate")
+            pool.resize()
+
+        assert pool.limit.limit == 3
+
+    @pytest.mark.asyncio
+    async def test_prewarm_opens_connections(self):
+        """HTTP/1.1 pools open one connection per request, HTTP/2 needs one"""
+        handler = slow_handler()
+        pool = make_pool(handler, config=PoolConfig(max_keepalive=10))
+        assert await pool.prewarm(4) == 4
+        assert handler.calls == ["/health/live"] * 4
+
+        handler2 = slow_handler()
+        pool2 = make_pool(handler2, http2=True)
+        assert await pool2.prewarm(4) == 1
+        assert len(handler2.calls) == 1
+
+
+class TestAcquireLatencyHistogram:
+    """Test histogram export"""
+
+    def test_cumulative_buckets(self):
+        """Buckets are cumulative like Prometheus"""
+        histogram = AcquireLatencyHistogram()
+        for seconds in (0.0, 0.002, 0.002, 0.3, 10.0):
+            histogram.observe(seconds)
+
+        data = histogram.to_dict()
+
+        assert data["buckets"]["0.0005"] == 1
+        assert data["buckets"]["0.0025"] == 3
+        assert data["buckets"]["0.5"] == 4
+        assert data["buckets"]["+Inf"] == 5
+        assert data["p50"] == 0.0025
+
+
+class TestConnectionPoolManager:
+    """Test per-endpoint pool creation"""
+
+    def test_pools_per_endpoint(self):
+        """Each instance of a service gets its own pool"""
+        manager = ConnectionPoolManager(PoolSettings(), Mock())
+
+        first = manager.get_pool("code_generator", "http://replica-a:8002")
+        second = manager.get_pool("code_generator", "http://replica-b:8002")
+
+        assert first is not second
+        assert manager.get_pool("code_generator", "http://replica-a:8002") is first
+        assert first.limit.limit == 15
+        assert set(manager.pool_stats) == {"code_generator"}
+
+    def test_http2_falls_back_without_h2(self):
+        """HTTP/2 is only used when the h2 package is installed"""
+        with patch("app.services.connection_pool.H2_AVAILABLE", False):
+            manager = ConnectionPoolManager(PoolSettings(), Mock())
+            pool = manager.get_pool("code_generator", "http://replica-a:8002")
+
+        assert manager.get_pool_config("code_generator").http2 is True
+        assert pool.http2 is False
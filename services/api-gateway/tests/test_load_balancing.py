@@ -0,0 +1,147 @@
+"""
+Tests for service instance load balancing
+"""
+import pytest
+from collections import Counter
+from dataclasses import dataclass
+from unittest.mock import patch
+
+from app.core.config import LoadBalancingStrategy
+from app.services.load_balancing import LoadBalancer, OutlierDetectionConfig
+
+
+@dataclass
+class Instance:
+    name: str
+    weight: int = 1
+
+
+class TestSmoothWeightedRoundRobin:
+    """Test smooth weighted round-robin"""
+
+    def test_interleaves_by_weight(self):
+        """Weights 5:1:1 give the nginx sequence"""
+        balancer = LoadBalancer(LoadBalancingStrategy.WEIGHTED_ROUND_ROBIN)
+        endpoints = [Instance("a", 5), Instance("b", 1), Instance("c", 1)]
+
+        picks = [balancer.select_endpoint(endpoints).name for _ in range(7)]
+
+        assert picks == ["a", "a", "b", "a", "c", "a", "a"]
+
+    def test_spreads_load_in_proportion(self):
+        """Every endpoint gets its weighted share"""
+        balancer = LoadBalancer(LoadBalancingStrategy.WEIGHTED_ROUND_ROBIN)
+        endpoints = [Instance("a", 3), Instance("b", 2), Instance("c", 1)]
+
+        counts = Counter(balancer.select_endpoint(endpoints).name for _ in range(600))
+
+        assert counts == {"a": 300, "b": 200, "c": 100}
+
+
+class TestP2CEwma:
+    """Test power-of-two-choices over peak EWMA latency"""
+
+    def test_prefers_faster_endpoint(self):
+        """Of the two sampled endpoints the faster one is chosen"""
+        balancer = LoadBalancer(LoadBalancingStrategy.P2C_EWMA)
+        endpoints = [Instance("slow"), Instance("fast")]
+        balancer.record_result("slow", True, 500.0)
+        balancer.record_result("fast", True, 20.0)
+
+        picks = Counter(balancer.select_endpoint(endpoints).name for _ in range(50))
+
+        assert picks == {"fast": 50}
+
+    def test_in_flight_requests_raise_cost(self):
+        """A fast endpoint with a queue loses to an idle one"""
+        balancer = LoadBalancer(LoadBalancingStrategy.P2C_EWMA)
+        endpoints = [Instance("busy"), Instance("idle")]
+        balancer.record_result("busy", True, 20.0)
+        balancer.record_result("idle", True, 30.0)
+        for _ in range(3):
+            balancer.increment_connections("busy")
+
+        assert balancer.select_endpoint(endpoints).name == "idle"
+
+    def test_latency_spikes_count_at_once(self):
+        """Slower samples replace the estimate, faster ones decay in"""
+        balancer = LoadBalancer(LoadBalancingStrategy.P2C_EWMA, decay_seconds=10.0)
+
+        with patch("app.services.load_balancing.time.monotonic", side_effect=[0.0, 1.0, 2.0]):
+            balancer.record_result("a", True, 20.0)
+            balancer.record_result("a", True, 200.0)
+            balancer.record_result("a", True, 20.0)
+
+        ewma = balancer.get_stats()["a"]["ewma_ms"]
+        assert 20.0 < ewma < 200.0
+        assert ewma > 150.0
+
+    def test_fast_failures_do_not_lower_latency(self):
+        """Failing quickly does not attract traffic"""
+        balancer = LoadBalancer(LoadBalancingStrategy.P2C_EWMA)
+        balancer.record_result("a", True, 100.0)
+        balancer.record_result("a", False, 1.0)
+
+        assert balancer.get_stats()["a"]["ewma_ms"] == 100.0
+
+
+class TestOutlierEjection:
+    """Test ejecting endpoints that keep failing"""
+
+    def make_balancer(self):
+        return LoadBalancer(
+            LoadBalancingStrategy.ROUND_ROBIN,
+            outlier_detection=OutlierDetectionConfig(consecutive_failures=3, base_ejection_seconds=30.0)
+        )
+
+    def test_consecutive_failures_eject(self):
+        """An ejected endpoint gets no traffic until the ejection expires"""
+        balancer = self.make_balancer()
+        endpoints = [Instance("bad"), Instance("good")]
+
+        with patch("app.services.load_balancing.time.monotonic", return_value=100.0):
+            for _ in range(3):
+                balancer.record_result("bad", False, 10.0, peers=endpoints)
+            picks = {balancer.select_endpoint(endpoints).name for _ in range(4)}
+        assert picks == {"good"}
+
+        with patch("app.services.load_balancing.time.monotonic", return_value=131.0):
+            picks = {balancer.select_endpoint(endpoints).name for _ in range(4)}
+        assert picks == {"bad", "good"}
+
+    def test_success_resets_failure_streak(self):
+        """Only consecutive failures count"""
+        balancer = self.make_balancer()
+        endpoints = [Instance("a"), Instance("b")]
+
+        for success in (False, False, True, False, False):
+            balancer.record_result("a", success, 10.0, peers=endpoints)
+
+        assert balancer.get_stats()["a"]["ejected"] is False
+
+    def test_ejection_time_grows(self):
+        """Repeat offenders are ejected for longer"""
+        balancer = self.make_balancer()
+        endpoints = [Instance("bad"), Instance("good")]
+
+        with patch("app.services.load_balancing.time.monotonic", return_value=0.0):
+            for _ in range(3):
+                balancer.record_result("bad", False, 10.0, peers=endpoints)
+        with patch("app.services.load_balancing.time.monotonic", return_value=31.0):
+            for _ in range(3):
+                balancer.record_result("bad", False, 10.0, peers=endpoints)
+        with patch("app.services.load_balancing.time.monotonic", return_value=61.0):
+            assert balancer.get_stats()["bad"]["ejected"] is True
+            assert balancer.get_stats()["bad"]["ejections"] == 2
+
+    def test_ejection_is_capped(self):
+        """At most half the endpoints are ejected"""
+        balancer = self.make_balancer()
+        endpoints = [Instance("a"), Instance("b")]
+
+        for name in ("a", "b"):
+            for _ in range(3):
+                balancer.record_result(name, False, 10.0, peers=endpoints)
+
+        stats = balancer.get_stats()
+        assert [stats["a"]["ejected"], stats["b"]["ejected"]] == [True, False]
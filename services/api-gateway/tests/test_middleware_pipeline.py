@@ -0,0 +1,425 @@
+"""
+Tests for the pure ASGI middleware pipeline
+"""
+import asyncio
+import time
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from app.middleware.asgi import (
+    ASGIMiddleware,
+    ASGIPipeline,
+    MiddlewareLayer,
+    PipelineTimings,
+)
+from app.middleware.caching import CachingMiddleware
+
+
+def make_scope(path="/api/v1/test", method="GET", headers=None):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 12345),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+
+
+async def run_request(app, scope=None, body=b""):
+    """Drive one request through an ASGI app and collect the sent messages"""
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope or make_scope(), receive, send)
+    return messages
+
+
+def response_headers(messages):
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    return {k.decode(): v.decode() for k, v in start["headers"]}
+
+
+async def streaming_app(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": b'{"part": ', "more_body": True})
+    await send({"type": "http.response.body", "body": b'"done"}', "more_body": False})
+
+
+class RecordingLayer(ASGIMiddleware):
+    """Layer that records hook order and tags responses"""
+
+    def __init__(self, app, name, events, short_circuit=False, handle_errors=False):
+        super().__init__(app)
+        self.name = name
+        self.events = events
+        self.short_circuit = short_circuit
+        self.handle_errors = handle_errors
+
+    async def on_request(self, ctx):
+        self.events.append(f"{self.name}:request")
+        if self.short_circuit:
+            return PlainTextResponse("blocked", status_code=403)
+        return None
+
+    async def on_response_start(self, ctx, response):
+        self.events.append(f"{self.name}:start")
+        response.headers[f"X-{self.name}"] = "1"
+
+    async def on_error(self, ctx, exc):
+        self.events.append(f"{self.name}:error")
+        if self.handle_errors:
+            return JSONResponse({"error": str(exc)}, status_code=500)
+        return None
+
+    async def on_complete(self, ctx, error):
+        self.events.append(f"{self.name}:complete:{'error' if error else 'ok'}")
+
+
+class TestASGIPipeline:
+    """Test layer composition semantics"""
+
+    @pytest.mark.asyncio
+    async def test_hook_order_and_streaming(self):
+        """Layers run outermost first on request and innermost first on response"""
+        events = []
+        pipeline = ASGIPipeline(streaming_app, [
+            MiddlewareLayer(RecordingLayer, {"name": "outer", "events": events}),
+            MiddlewareLayer(RecordingLayer, {"name": "inner", "events": events}),
+        ])
+
+        messages = await run_request(pipeline)
+
+        assert events == [
+            "outer:request", "inner:request",
+            "inner:start", "outer:start",
+            "inner:complete:ok", "outer:complete:ok",
+        ]
+        headers = response_headers(messages)
+        assert headers["x-outer"] == "1"
+        assert headers["x-inner"] == "1"
+        # Body chunks are forwarded unbuffered
+        bodies = [m for m in messages if m["type"] == "http.response.body"]
+        assert len(bodies) == 2
+
+    @pytest.mark.asyncio
+    async def test_short_circuit_skips_inner_layers(self):
+        """A short-circuit response is only post-processed by outer layers"""
+        events = []
+        app = AsyncMock()
+        pipeline = ASGIPipeline(app, [
+            MiddlewareLayer(RecordingLayer, {"name": "outer", "events": events}),
+            MiddlewareLayer(RecordingLayer, {"name": "guard", "events": events, "short_circuit": True}),
+            MiddlewareLayer(RecordingLayer, {"name": "inner", "events": events}),
+        ])
+
+        messages = await run_request(pipeline)
+
+        app.assert_not_called()
+        assert "inner:request" not in events
+        assert messages[0]["status"] == 403
+        headers = response_headers(messages)
+        assert "x-outer" in headers
+        assert "x-guard" not in headers
+
+    @pytest.mark.asyncio
+    async def test_error_handled_by_innermost_handler(self):
+        """Errors are offered innermost first and outer layers see a normal response"""
+        events = []
+
+        async def failing_app(scope, receive, send):
+            raise RuntimeError("boom")
+
+        pipeline = ASGIPipeline(failing_app, [
+            MiddlewareLayer(RecordingLayer, {"name": "outer", "events": events}),
+            MiddlewareLayer(RecordingLayer, {"name": "handler", "events": events, "handle_errors": True}),
+            MiddlewareLayer(RecordingLayer, {"name": "inner", "events": events}),
+        ])
+
+        messages = await run_request(pipeline)
+
+        assert messages[0]["status"] == 500
+        assert events.index("inner:error") < events.index("handler:error")
+        assert "outer:error" not in events
+        assert "inner:complete:error" in events
+        assert "handler:complete:error" in events
+        assert "outer:complete:ok" in events
+
+    @pytest.mark.asyncio
+    async def test_unhandled_error_propagates(self):
+        """Errors no layer handles are re-raised"""
+        async def failing_app(scope, receive, send):
+            raise RuntimeError("boom")
+
+        pipeline = ASGIPipeline(failing_app, [
+            MiddlewareLayer(RecordingLayer, {"name": "only", "events": []}),
+        ])
+
+        with pytest.raises(RuntimeError):
+            await run_request(pipeline)
+
+    @pytest.mark.asyncio
+    async def test_cancellation_reported_as_error(self):
+        """A cancelled endpoint completes every layer with the error and is re-raised"""
+        events = []
+
+        async def cancelled_app(scope, receive, send):
+            raise asyncio.CancelledError()
+
+        pipeline = ASGIPipeline(cancelled_app, [
+            MiddlewareLayer(RecordingLayer, {"name": "only", "events": events, "handle_errors": True}),
+        ])
+
+        with pytest.raises(asyncio.CancelledError):
+            await run_request(pipeline)
+        assert events == ["only:request", "only:complete:error"]
+
+    @pytest.mark.asyncio
+    async def test_body_read_by_layer_is_replayed(self):
+        """A layer reading the request body does not starve the endpoint"""
+        seen = {}
+
+        class BodyReader(ASGIMiddleware):
+            async def on_request(self, ctx):
+                seen["layer"] = await ctx.body()
+                return None
+
+        async def echo_app(scope, receive, send):
+            message = await receive()
+            seen["app"] = message["body"]
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        pipeline = ASGIPipeline(echo_app, [MiddlewareLayer(BodyReader)])
+        await run_request(pipeline, make_scope(method="POST"), body=b'{"a": 1}')
+
+        assert seen["layer"] == b'{"a": 1}'
+        assert seen["app"] == b'{"a": 1}'
+
+    @pytest.mark.asyncio
+    async def test_benchmark_timings(self):
+        """Benchmark mode records per-layer overhead"""
+        timings = PipelineTimings()
+        pipeline = ASGIPipeline(streaming_app, [
+            MiddlewareLayer(RecordingLayer, {"name": "outer", "events": []}),
+        ], timings=timings)
+
+        for _ in range(3):
+            await run_request(pipeline)
+
+        report = timings.get_report()
+        assert report["requests"] == 3
+        assert report["layers"]["RecordingLayer"]["hook_calls"] == 9
+        assert report["total_mean_us"] >= 0
+
+        timings.reset()
+        assert timings.get_report()["requests"] == 0
+
+
+class TestCachingMiddlewarePipeline:
+    """Test response capture in the ASGI caching layer"""
+
+    @pytest.mark.asyncio
+    async def test_streamed_response_is_cached(self, mock_logger):
+        """Streamed chunks are captured and cached without buffering the client"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=None)
+        mock_cache.set = AsyncMock(return_value=True)
+
+        middleware = CachingMiddleware(streaming_app, mock_cache, None, mock_logger)
+        messages = await run_request(middleware, make_scope(path="/api/v1/metrics"))
+
+        headers = response_headers(messages)
+        assert headers["x-cache-status"] == "MISS"
+        mock_cache.set.assert_called_once()
+        cached = mock_cache.set.call_args.kwargs["value"]
+        assert cached["body"] == '{"part": "done"}'
+        assert cached["status_code"] == 200
+        assert "x-cache-status" not in cached["headers"]
+
+    @pytest.mark.asyncio
+    async def test_truncated_response_is_not_cached(self, mock_logger):
+        """A body cut short by cancellation is neither cached nor handed to waiters"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=None)
+        mock_cache.set = AsyncMock(return_value=True)
+
+        async def cancelled_app(scope, receive, send):
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"partial":', "more_body": True})
+            raise asyncio.CancelledError()
+
+        middleware = CachingMiddleware(cancelled_app, mock_cache, None, mock_logger)
+        with pytest.raises(asyncio.CancelledError):
+            await run_request(middleware, make_scope(path="/api/v1/metrics"))
+
+        mock_cache.set.assert_not_called()
+        assert middleware._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_short_circuits(self, mock_logger):
+        """Cache hits are served without calling the downstream app"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value={
+            "status_code": 200,
+            "headers": {},
+            "body": '{"cached": true}',
+            "content_type": "application/json",
+            "cached_at": 0,
+        })
+        app = AsyncMock()
+
+        middleware = CachingMiddleware(app, mock_cache, None, mock_logger)
+        messages = await run_request(middleware, make_scope(path="/api/v1/metrics"))
+
+        app.assert_not_called()
+        assert response_headers(messages)["x-cache-status"] == "HIT"
+        assert middleware.stats["hits"] == 1
+
+
+def cached_entry(body='{"cached": true}', expires_in=60.0, compute_seconds=0.1):
+    now = time.time()
+    return {
+        "status_code": 200,
+        "headers": {},
+        "body": body,
+        "content_type": "application/json",
+        "cached_at": now - 1,
+        "expires_at": now + expires_in,
+        "compute_seconds": compute_seconds,
+    }
+
+
+def slow_app(calls, release=None, fail=False):
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        if release is not None:
+            await release.wait()
+        await asyncio.sleep(0.01)
+        if fail:
+            raise RuntimeError("upstream down")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": b'{"fresh": true}'})
+    return app
+
+
+class TestCacheStampedeProtection:
+    """Test single-flight, stale serving and early refresh in the caching layer"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_coalesce(self, mock_logger):
+        """Only one of many concurrent misses reaches the downstream app"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=None)
+        mock_cache.set = AsyncMock(return_value=True)
+        calls = []
+
+        middleware = CachingMiddleware(slow_app(calls), mock_cache, None, mock_logger)
+        results = await asyncio.gather(*(
+            run_request(middleware, make_scope(path="/api/v1/metrics")) for _ in range(5)
+        ))
+
+        assert calls == ["/api/v1/metrics"]
+        statuses = sorted(response_headers(messages)["x-cache-status"] for messages in results)
+        assert statuses == ["HIT"] * 4 + ["MISS"]
+        assert all(messages[-1]["body"] == b'{"fresh": true}' for messages in results)
+        assert middleware.stats["coalesced"] == 4
+        assert middleware._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_stale_served_while_revalidating(self, mock_logger):
+        """Expired entries inside the window are served while one request refreshes"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=cached_entry(expires_in=-5))
+        mock_cache.set = AsyncMock(return_value=True)
+        calls = []
+        release = asyncio.Event()
+
+        middleware = CachingMiddleware(slow_app(calls, release), mock_cache, None, mock_logger)
+        refresh = asyncio.create_task(run_request(middleware, make_scope(path="/api/v1/metrics")))
+        await asyncio.sleep(0)
+        stale = await run_request(middleware, make_scope(path="/api/v1/metrics"))
+        release.set()
+        refreshed = await refresh
+
+        assert calls == ["/api/v1/metrics"]
+        assert response_headers(stale)["x-cache-status"] == "STALE"
+        assert stale[-1]["body"] == b'{"cached": true}'
+        assert response_headers(refreshed)["x-cache-status"] == "MISS"
+        assert mock_cache.set.call_args.kwargs["ttl"] == 20  # ttl plus the stale window
+
+    @pytest.mark.asyncio
+    async def test_stale_if_error(self, mock_logger):
+        """A failed refresh falls back to the stale entry"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=cached_entry(expires_in=-120))
+        mock_cache.set = AsyncMock(return_value=True)
+        calls = []
+
+        middleware = CachingMiddleware(slow_app(calls, fail=True), mock_cache, None, mock_logger)
+        messages = await run_request(middleware, make_scope(path="/health"))
+
+        assert calls == ["/health"]
+        assert response_headers(messages)["x-cache-status"] == "STALE"
+        assert messages[0]["status"] == 200
+        assert middleware.stats["stale_served"] == 1
+        mock_cache.set.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_error_without_stale_entry_propagates(self, mock_logger):
+        """Outside the stale-if-error window the error is not hidden"""
+        mock_cache = Mock()
+        mock_cache.get = AsyncMock(return_value=cached_entry(expires_in=-30))
+        calls = []
+
+        middleware = CachingMiddleware(slow_app(calls, fail=True), mock_cache, None, mock_logger)
+        with pytest.raises(RuntimeError):
+            await run_request(middleware, make_scope(path="/api/v1/metrics"))
+        assert middleware._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_early_refresh_near_expiry(self, mock_logger):
+        """Entries close to expiry are refreshed early, fresh ones are served"""
+        mock_cache = Mock()
+        mock_cache.set = AsyncMock(return_value=True)
+        calls = []
+        middleware = CachingMiddleware(slow_app(calls), mock_cache, None, mock_logger)
+
+        with patch("app.middleware.caching.random.random", return_value=0.9):
+            mock_cache.get = AsyncMock(return_value=cached_entry(expires_in=60, compute_seconds=0.5))
+            hit = await run_request(middleware, make_scope(path="/api/v1/metrics"))
+            mock_cache.get = AsyncMock(return_value=cached_entry(expires_in=0.5, compute_seconds=0.5))
+            refreshed = await run_request(middleware, make_scope(path="/api/v1/metrics"))
+
+        assert response_headers(hit)["x-cache-status"] == "HIT"
+        assert response_headers(refreshed)["x-cache-status"] == "MISS"
+        assert calls == ["/api/v1/metrics"]
+        assert middleware.stats["early_refreshes"] == 1
@@ -0,0 +1,137 @@
+"""
+Tests for latency-aware model routing
+"""
+import pytest
+from unittest.mock import Mock, patch
+
+from app.ai.model_manager import (
+    ModelRegistry,
+    ModelPerformanceTracker,
+    ModelLoadBalancer,
+    StreamingLatencyStats
+)
+from app.ai.model_types import (
+    AIModelCapability,
+    AIModelType,
+    ModelConfiguration,
+    ModelProvider
+)
+
+
+CAPABILITIES = {AIModelCapability.CODE_GENERATION}
+
+
+def make_balancer(*model_ids, **kwargs):
+    logger = Mock()
+    registry = ModelRegistry(logger)
+    for model_id in model_ids:
+        registry.register_model(ModelConfiguration(
+            model_id=model_id,
+            provider=ModelProvider.OPENAI,
+            model_type=AIModelType.VISION_TO_CODE,
+            capabilities=set(CAPABILITIES)
+        ))
+    tracker = ModelPerformanceTracker(logger)
+    return ModelLoadBalancer(registry, tracker, logger, **kwargs)
+
+
+def record(balancer, model_id, ttft_ms, inter_token_ms, samples=3, output_tokens=101):
+    for _ in range(samples):
+        balancer.performance_tracker.track_stream_timing(
+            model_id,
+            ttft_ms=ttft_ms,
+            output_tokens=output_tokens,
+            duration_ms=ttft_ms + (output_tokens - 1) * inter_token_ms
+        )
+
+
+class TestStreamingLatencyStats:
+    """Test the decayed latency profile"""
+
+    def test_first_sample_sets_estimates(self):
+        """The first sample is taken as is"""
+        stats = StreamingLatencyStats()
+        stats.update(duration_ms=1200, output_tokens=101, ttft_ms=200, now=0.0)
+
+        assert stats.ttft_ms == 200
+        assert stats.inter_token_ms == pytest.approx(10.0)
+        assert stats.tokens_per_second == pytest.approx(101.0)
+        assert stats.predict_ms(51) == pytest.approx(700.0)
+
+    def test_old_samples_decay(self):
+        """A sample after a long gap outweighs the history"""
+        stats = StreamingLatencyStats()
+        stats.update(duration_ms=1200, output_tokens=101, ttft_ms=200, now=0.0)
+        stats.update(duration_ms=2400, output_tokens=101, ttft_ms=400, now=0.1)
+        recent = stats.ttft_ms
+        stats.update(duration_ms=2400, output_tokens=101, ttft_ms=400, now=600.0)
+
+        # Back to back samples move the estimate by the minimum weight only
+        assert 200 < recent < 250
+        assert stats.ttft_ms == pytest.approx(400, abs=1)
+
+    def test_non_streaming_response_updates_speed_only(self):
+        """Without a TTFT the known TTFT is taken off the duration"""
+        stats = StreamingLatencyStats()
+        stats.update(duration_ms=1200, output_tokens=101, ttft_ms=200, now=0.0)
+        stats.update(duration_ms=2200, output_tokens=101, now=600.0)
+
+        assert stats.ttft_ms == 200
+        assert stats.inter_token_ms == pytest.approx(20.0, rel=0.01)
+
+
+class TestLatencyRouting:
+    """Test selecting models by predicted latency"""
+
+    @pytest.mark.asyncio
+    async def test_routes_to_fastest_model(self):
+        """The model with the lowest predicted completion time wins"""
+        balancer = make_balancer("slow", "fast", exploration_rate=0.0)
+        record(balancer, "slow", ttft_ms=800, inter_token_ms=30)
+        record(balancer, "fast", ttft_ms=300, inter_token_ms=10)
+
+        selected = await balancer.select_model(CAPABILITIES, expected_output_tokens=1000)
+
+        assert selected == "fast"
+
+    @pytest.mark.asyncio
+    async def test_expected_output_size_changes_choice(self):
+        """Short outputs favour low TTFT, long outputs favour throughput"""
+        balancer = make_balancer("quick-start", "high-throughput", exploration_rate=0.0)
+        record(balancer, "quick-start", ttft_ms=100, inter_token_ms=20)
+        record(balancer, "high-throughput", ttft_ms=1000, inter_token_ms=5)
+
+        assert await balancer.select_model(CAPABILITIES, expected_output_tokens=10) == "quick-start"
+        assert await balancer.select_model(CAPABILITIES, expected_output_tokens=2000) == "high-throughput"
+
+    @pytest.mark.asyncio
+    async def test_load_inflates_prediction(self):
+        """Busy models are predicted slower"""
+        balancer = make_balancer("a", "b", exploration_rate=0.0)
+        record(balancer, "a", ttft_ms=300, inter_token_ms=10)
+        record(balancer, "b", ttft_ms=350, inter_token_ms=10)
+        idle_prediction = balancer.predict_latency_ms("a", 100)
+
+        balancer.registry.get_model_status("a").current_load = 5
+
+        assert balancer.predict_latency_ms("a", 100) == pytest.approx(idle_prediction * 1.5)
+        assert await balancer.select_model(CAPABILITIES, expected_output_tokens=100) == "b"
+
+    @pytest.mark.asyncio
+    async def test_unmeasured_models_are_explored(self):
+        """New models get the exploration share of traffic"""
+        balancer = make_balancer("known", "new", exploration_rate=0.5)
+        record(balancer, "known", ttft_ms=300, inter_token_ms=10)
+
+        with patch("app.ai.model_manager.random.random", return_value=0.1):
+            assert await balancer.select_model(CAPABILITIES) == "new"
+        with patch("app.ai.model_manager.random.random", return_value=0.9):
+            assert await balancer.select_model(CAPABILITIES) == "known"
+
+    @pytest.mark.asyncio
+    async def test_falls_back_without_samples(self):
+        """Without latency data the performance ranking is used"""
+        balancer = make_balancer("a", "b")
+
+        assert balancer.predict_latency_ms("a") is None
+        assert await balancer.select_model(CAPABILITIES) in {"a", "b"}
@@ -0,0 +1,168 @@
+"""
+Tests for passive health detection in service discovery
+"""
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.services.service_discovery import ServiceDiscovery, ServiceHealth, ServiceInstance
+
+
+class DiscoverySettings:
+    service_urls = {"code_generator": "http://replica-a:8002"}
+
+
+def make_discovery(replicas=2):
+    discovery = ServiceDiscovery(DiscoverySettings(), Mock())
+    for i in range(1, replicas):
+        discovery.register_service(
+            "code_generator", ServiceInstance(name=f"code_generator_{i}", url=f"http://replica-{i}:8002")
+        )
+    for instance in discovery.services["code_generator"]:
+        instance.health = ServiceHealth.HEALTHY
+    return discovery
+
+
+def record(discovery, instance, success, response_time=100.0, times=1):
+    for _ in range(times):
+        discovery.update_instance_stats("code_generator", instance.name, success, response_time)
+
+
+class TestPassiveHealth:
+    """Test ejecting instances from real request outcomes"""
+
+    def test_consecutive_failures_eject_at_once(self):
+        """A replica that starts failing is out after a few requests"""
+        discovery = make_discovery()
+        callback = Mock()
+        discovery.add_service_change_callback(callback)
+        bad, good = discovery.services["code_generator"]
+
+        record(discovery, bad, False, times=3)
+
+        assert bad.is_ejected
+        assert bad.health == ServiceHealth.UNHEALTHY
+        assert discovery.get_healthy_instances("code_generator") == [good]
+        callback.assert_called_with("code_generator", "health_changed", bad)
+
+    def test_error_rate_over_window_ejects(self):
+        """Intermittent failures eject once the error rate crosses the threshold"""
+        discovery = make_discovery()
+        bad = discovery.services["code_generator"][0]
+
+        for success in (True, False, True, False, True):
+            record(discovery, bad, success)
+        assert not bad.is_ejected
+
+        record(discovery, bad, False)
+        assert bad.is_ejected
+
+    def test_success_resets_failure_streak(self):
+        """Failures between successes stay below both thresholds"""
+        discovery = make_discovery()
+        instance = discovery.services["code_generator"][0]
+
+        for success in (False, False, True, True, True, True, True, False, False):
+            record(discovery, instance, success)
+
+        assert not instance.is_ejected
+
+    def test_latency_outlier_ejected(self):
+        """A replica much slower than its peers is ejected"""
+        discovery = make_discovery(replicas=3)
+        slow, fast, other = discovery.services["code_generator"]
+        record(discovery, fast, True, 1000.0, times=5)
+        record(discovery, other, True, 1200.0, times=5)
+
+        record(discovery, slow, True, 8000.0, times=5)
+
+        assert slow.is_ejected
+        assert not fast.is_ejected and not other.is_ejected
+
+    def test_at_most_half_ejected(self):
+        """Ejection stops at max_ejection_percent, but one instance always can go"""
+        discovery = make_discovery()
+        first, second = discovery.services["code_generator"]
+
+        record(discovery, first, False, times=3)
+        record(discovery, second, False, times=3)
+
+        assert first.is_ejected
+        assert not second.is_ejected
+
+        single = make_discovery(replicas=1)
+        only = single.services["code_generator"][0]
+        record(single, only, False, times=3)
+        assert only.is_ejected
+
+
+class TestReadmission:
+    """Test back-off re-admission of ejected instances"""
+
+    @pytest.mark.asyncio
+    async def test_probe_after_ejection_readmits(self):
+        """A good probe once the ejection is over brings the instance back"""
+        discovery = make_discovery()
+        instance = discovery.services["code_generator"][0]
+        with patch("app.services.service_discovery.time.time", return_value=1000.0):
+            record(discovery, instance, False, times=3)
+        assert instance.next_probe == instance.ejected_until == 1010.0
+
+        discovery.check_service_health = AsyncMock(return_value=ServiceHealth.HEALTHY)
+        with patch("app.services.service_discovery.time.time", return_value=1005.0):
+            await discovery._check_instance_health(instance, "code_generator")
+        assert instance.is_ejected
+
+        with patch("app.services.service_discovery.time.time", return_value=1010.0):
+            await discovery._check_instance_health(instance, "code_generator")
+        assert not instance.is_ejected
+        assert instance.health == ServiceHealth.HEALTHY
+
+    @pytest.mark.asyncio
+    async def test_failed_probe_doubles_ejection(self):
+        """Each ejection in a row lasts twice as long"""
+        discovery = make_discovery()
+        instance = discovery.services["code_generator"][0]
+        discovery.check_service_health = AsyncMock(return_value=ServiceHealth.UNHEALTHY)
+
+        with patch("app.services.service_discovery.time.time", return_value=0.0):
+            record(discovery, instance, False, times=3)
+        with patch("app.services.service_discovery.time.time", return_value=10.0):
+            await discovery._check_instance_health(instance, "code_generator")
+        assert instance.ejected_until == 30.0
+        with patch("app.services.service_discovery.time.time", return_value=30.0):
+            await discovery._check_instance_health(instance, "code_generator")
+        assert instance.ejected_until == 70.0
+        assert instance.ejection_count == 3
+
+
+class TestProbeSchedule:
+    """Test per-instance probe scheduling"""
+
+    @pytest.mark.asyncio
+    async def test_probes_are_jittered_per_instance(self):
+        """Instances are probed at spread-out times within the jitter"""
+        discovery = make_discovery(replicas=5)
+        discovery.check_service_health = AsyncMock(return_value=ServiceHealth.HEALTHY)
+
+        with patch("app.services.service_discovery.time.time", return_value=100.0):
+            await discovery._check_due_instances()
+
+        interval = discovery.config.health_check_interval
+        jitter = discovery.config.probe_jitter
+        probes = [instance.next_probe for instance in discovery.services["code_generator"]]
+        assert discovery.check_service_health.await_count == 5
+        assert all(100 + interval * (1 - jitter) <= p <= 100 + interval * (1 + jitter) for p in probes)
+        assert len(set(probes)) == 5
+
+    @pytest.mark.asyncio
+    async def test_only_due_instances_are_probed(self):
+        """Ejected instances wait for the end of their ejection"""
+        discovery = make_discovery()
+        discovery.check_service_health = AsyncMock(return_value=ServiceHealth.HEALTHY)
+        ejected, healthy = discovery.services["code_generator"]
+        with patch("app.services.service_discovery.time.time", return_value=100.0):
+            record(discovery, ejected, False, times=3)
+            await discovery._check_due_instances()
+
+        assert discovery.check_service_health.await_count == 1
+        assert ejected.is_ejected
@@ -113,6 +113,17 @@ class Settings(BaseSettings):
     retry_attempts: int = Field(default=3, env="RETRY_ATTEMPTS")
     retry_delay_seconds: float = Field(default=1.0, env="RETRY_DELAY_SECONDS")
     
+    # Hedging: when the provider hasn't answered within its usual latency,
+    # send the request to the next available provider too and keep the first
+    enable_hedging: bool = Field(default=False, env="ENABLE_HEDGING")
+    # Latency percentile (of the provider's recent requests) to wait before hedging
+    hedge_percentile: float = Field(default=0.95, env="HEDGE_PERCENTILE")
+    # Wait used until enough latency samples have been collected
+    hedge_default_delay_seconds: float = Field(default=5.0, env="HEDGE_DEFAULT_DELAY_SECONDS")
+    hedge_min_delay_seconds: float = Field(default=0.5, env="HEDGE_MIN_DELAY_SECONDS")
+    # Hedged requests allowed per request, e.g. 0.1 caps extra spend at ~10%
+    hedge_budget_ratio: float = Field(default=0.1, env="HEDGE_BUDGET_RATIO")
+    
     # Image Processing
     max_image_size_mb: int = Field(default=20, env="MAX_IMAGE_SIZE_MB")
     supported_image_formats: List[str] = Field(
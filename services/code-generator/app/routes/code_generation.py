@@ -12,7 +12,7 @@ import structlog
 
 from app.core.config import Settings, CodeStack, AIProvider
 from app.services.provider_manager import ProviderManager, GenerationRequest, GenerationMode
-from app.services.prompt_engine import PromptEngine, PromptRequest, InputMode, GenerationType
+from app.services.prompt_engine import get_prompt_engine, PromptRequest, InputMode, GenerationType
 from shared.monitoring.correlation import get_correlation_id, set_correlation_id
 from shared.monitoring.structured_logger import StructuredLogger
 
@@ -132,7 +132,7 @@ async def get_available_providers(
 @router.get("/stacks", response_model=StacksResponse)
 async def get_supported_stacks():
     """Get list of supported code stacks"""
-    prompt_engine = PromptEngine()
+    prompt_engine = get_prompt_engine()
     supported_stacks = prompt_engine.get_supported_stacks()
     
     stacks_info = []
@@ -166,8 +166,8 @@ async def generate_code(
                 correlation_id=correlation_id)
     
     try:
-        # Initialize prompt engine
-        prompt_engine = PromptEngine()
+        # Shared prompt engine
+        prompt_engine = get_prompt_engine()
         
         # Create prompt request
         prompt_request = PromptRequest(
@@ -283,8 +283,8 @@ async def stream_generate_code(
     
     async def generate():
         try:
-            # Initialize prompt engine
-            prompt_engine = PromptEngine()
+            # Shared prompt engine
+            prompt_engine = get_prompt_engine()
             
             # Create prompt request
             prompt_request = PromptRequest(
@@ -368,8 +368,8 @@ async def websocket_generate_code(
                 # Parse request
                 request = CodeGenerationRequest(**message)
                 
-                # Initialize prompt engine
-                prompt_engine = PromptEngine()
+                # Shared prompt engine
+                prompt_engine = get_prompt_engine()
                 
                 # Create prompt request
                 prompt_request = PromptRequest(
@@ -562,8 +562,8 @@ async def generate_variant(
 ):
     """Generate a single variant for multi-generation"""
     try:
-        # Initialize prompt engine
-        prompt_engine = PromptEngine()
+        # Shared prompt engine
+        prompt_engine = get_prompt_engine()
         
         # Create prompt request
         prompt_request = PromptRequest(
@@ -588,7 +588,9 @@ async def generate_variant(
             temperature=request.temperature,
             max_tokens=request.max_tokens,
             stream=True,
-            correlation_id=correlation_id
+            correlation_id=correlation_id,
+            # Each variant is meant to come from its own provider
+            hedge=False
         )
         
         # Send variant start message
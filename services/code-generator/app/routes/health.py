@@ -63,7 +63,8 @@ async def health_check(
             "providers": {
                 "status": provider_status,
                 "available_count": len(available_providers),
-                "providers": [p.value for p in available_providers]
+                "providers": [p.value for p in available_providers],
+                "hedging": provider_manager.get_hedging_stats()
             },
             "uptime_seconds": health_status["uptime_seconds"],
             "start_time": health_status["start_time"]
@@ -0,0 +1,70 @@
+"""
+Request hedging support
+Latency tracking and the spend budget used by ProviderManager to decide when
+to send a backup request to another provider
+"""
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from app.core.config import AIProvider
+
+class LatencyTracker:
+    """Recent latencies per provider, for percentile estimates"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples: Dict[AIProvider, Deque[float]] = {}
+
+    def record(self, provider: AIProvider, seconds: float) -> None:
+        self.samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, provider: AIProvider, q: float) -> Optional[float]:
+        """Latency at quantile q (0-1), or None until min_samples are recorded"""
+        samples = self.samples.get(provider)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+class HedgeBudget:
+    """Token bucket limiting hedged requests to a fraction of all requests
+
+    Every request deposits `ratio` tokens and every hedge spends one, so over
+    time at most `ratio` hedges are sent per request. `burst` caps the tokens
+    saved up while traffic is fast.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = min(1.0, burst)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+@dataclass
+class HedgingStats:
+    """Counters for hedged requests"""
+    requests: int = 0
+    hedged: int = 0
+    backup_wins: int = 0
+    budget_exhausted: int = 0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "backup_wins": self.backup_wins,
+            "budget_exhausted": self.budget_exhausted,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0
+        }
@@ -2,9 +2,11 @@
 Prompt Engineering Service
 Manages prompt templates and generation for different code stacks
 """
-from typing import List, Dict, Any, Optional, Union
+import re
+from typing import List, Dict, Any, Optional, Tuple, Union
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionContentPartParam
 from app.core.config import CodeStack
@@ -30,12 +32,43 @@ class PromptRequest:
     imported_code: Optional[str] = None
     additional_instructions: Optional[str] = None
 
+# Markdown fences stripped by extract_html_content
+_OPENING_FENCE = re.compile(r'^```(?:html|xml|svg)?\s*\n?', flags=re.MULTILINE)
+_CLOSING_FENCE = re.compile(r'\n?```\s*$', flags=re.MULTILINE)
+
+# Average characters per token for English prompt text with markup
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text, for budget planning"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """Fixed part of the prompt for a stack, input mode and generation type"""
+    system_content: str
+    user_prompt: Optional[str]
+    system_tokens: int
+    user_prompt_tokens: int
+
+    @property
+    def token_count(self) -> int:
+        return self.system_tokens + self.user_prompt_tokens
+
+PrefixKey = Tuple[CodeStack, InputMode, GenerationType]
+
 class PromptEngine:
-    """Manages prompt templates and generation for code generation"""
+    """Manages prompt templates and generation for code generation
+
+    Templates are built once, and the prompt prefix for every stack, input mode
+    and generation type is assembled up front, so use the shared instance from
+    get_prompt_engine() rather than constructing one per request.
+    """
     
     def __init__(self):
         self.system_prompts = self._initialize_system_prompts()
         self.imported_code_prompts = self._initialize_imported_code_prompts()
+        self.prefixes = self._initialize_prefixes()
     
     def _initialize_system_prompts(self) -> Dict[CodeStack, str]:
         """Initialize system prompts for different code stacks"""
@@ -258,6 +291,36 @@ Make sure the styling adheres to the provided framework.
         
         return framework_specific
     
+    def _initialize_prefixes(self) -> Dict[PrefixKey, PromptPrefix]:
+        """Assemble the prompt prefix and its token counts for every combination"""
+        prefixes: Dict[PrefixKey, PromptPrefix] = {}
+        for stack, system_prompt in self.system_prompts.items():
+            user_prompt = self._get_user_prompt(stack)
+            for input_mode in InputMode:
+                for generation_type in GenerationType:
+                    if input_mode == InputMode.IMPORT:
+                        prefix = PromptPrefix(
+                            system_content=self.imported_code_prompts[stack],
+                            user_prompt=None,
+                            system_tokens=estimate_tokens(self.imported_code_prompts[stack]),
+                            user_prompt_tokens=0,
+                        )
+                    else:
+                        prefix = PromptPrefix(
+                            system_content=system_prompt,
+                            user_prompt=user_prompt,
+                            system_tokens=estimate_tokens(system_prompt),
+                            user_prompt_tokens=estimate_tokens(user_prompt),
+                        )
+                    prefixes[(stack, input_mode, generation_type)] = prefix
+        return prefixes
+    
+    def get_prompt_prefix(
+        self, stack: CodeStack, input_mode: InputMode, generation_type: GenerationType
+    ) -> PromptPrefix:
+        """Precomputed prompt prefix, with token counts for budget planning"""
+        return self.prefixes[(stack, input_mode, generation_type)]
+    
     def generate_prompt(self, request: PromptRequest) -> List[ChatCompletionMessageParam]:
         """Generate complete prompt messages for code generation"""
         
@@ -268,13 +331,16 @@ Make sure the styling adheres to the provided framework.
     
     def _generate_screenshot_prompt(self, request: PromptRequest) -> List[ChatCompletionMessageParam]:
         """Generate prompt for screenshot-based code generation"""
-        system_content = self.system_prompts[request.code_stack]
+        # IMPORT without imported code also falls back to the screenshot prompt
+        input_mode = InputMode.IMAGE if request.input_mode == InputMode.IMPORT else request.input_mode
+        prefix = self.get_prompt_prefix(request.code_stack, input_mode, request.generation_type)
+        system_content = prefix.system_content
         
         # Add additional instructions if provided
         if request.additional_instructions:
             system_content += f"\n\nAdditional instructions: {request.additional_instructions}"
         
-        user_prompt = self._get_user_prompt(request.code_stack)
+        user_prompt = prefix.user_prompt
         
         # Build user content with image(s)
         user_content: List[ChatCompletionContentPartParam] = []
@@ -323,7 +389,9 @@ Make sure the styling adheres to the provided framework.
     
     def _generate_imported_code_prompt(self, request: PromptRequest) -> List[ChatCompletionMessageParam]:
         """Generate prompt for imported code modifications"""
-        system_content = self.imported_code_prompts[request.code_stack]
+        system_content = self.get_prompt_prefix(
+            request.code_stack, InputMode.IMPORT, request.generation_type
+        ).system_content
         
         # Add additional instructions if provided
         if request.additional_instructions:
@@ -401,13 +469,16 @@ Make sure the styling adheres to the provided framework.
     
     def extract_html_content(self, generated_code: str) -> str:
         """Extract HTML content from generated code, removing markdown formatting"""
-        import re
-        
         # Remove markdown code blocks
-        code = re.sub(r'^```(?:html|xml|svg)?\s*\n?', '', generated_code, flags=re.MULTILINE)
-        code = re.sub(r'\n?```\s*$', '', code, flags=re.MULTILINE)
+        code = _OPENING_FENCE.sub('', generated_code)
+        code = _CLOSING_FENCE.sub('', code)
         
         # Clean up any extra whitespace
         code = code.strip()
         
-        return code
\ No newline at end of file
+        return code
+
+@lru_cache(maxsize=None)
+def get_prompt_engine() -> PromptEngine:
+    """Process-wide prompt engine"""
+    return PromptEngine()
@@ -3,8 +3,9 @@ Provider Manager for handling multiple AI providers
 Manages OpenAI, Azure OpenAI, Anthropic Claude, and Google Gemini
 """
 import asyncio
+import dataclasses
 import time
-from typing import Dict, List, Optional, Any, AsyncGenerator
+from typing import Awaitable, Callable, Dict, List, Optional, Any, AsyncGenerator, Tuple, TypeVar
 from dataclasses import dataclass
 from enum import Enum
 
@@ -14,9 +15,12 @@ import google.generativeai as genai
 from openai.types.chat import ChatCompletionMessageParam
 
 from app.core.config import Settings, AIProvider
+from app.services.hedging import HedgeBudget, HedgingStats, LatencyTracker
 from shared.monitoring.structured_logger import StructuredLogger
 from shared.monitoring.correlation import get_correlation_id
 
+T = TypeVar("T")
+
 class GenerationMode(str, Enum):
     CREATE = "create"
     UPDATE = "update"
@@ -32,6 +36,8 @@ class GenerationRequest:
     max_tokens: int = 4096
     stream: bool = True
     correlation_id: Optional[str] = None
+    # Allow a backup request to another provider; None uses settings.enable_hedging
+    hedge: Optional[bool] = None
 
 @dataclass
 class GenerationResult:
@@ -76,6 +82,12 @@ class ProviderManager:
                 "temperature": settings.gemini_temperature
             }
         }
+        
+        # Hedging state: time to first token (streaming) and to completion
+        self.first_token_latency = LatencyTracker()
+        self.completion_latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget(settings.hedge_budget_ratio)
+        self.hedging_stats = HedgingStats()
     
     async def initialize(self):
         """Initialize all configured providers"""
@@ -171,23 +183,18 @@ class ProviderManager:
         start_time = time.time()
         
         try:
-            if request.provider == AIProvider.OPENAI:
-                result = await self._generate_openai(request, correlation_id)
-            elif request.provider == AIProvider.AZURE_OPENAI:
-                result = await self._generate_azure_openai(request, correlation_id)
-            elif request.provider == AIProvider.CLAUDE:
-                result = await self._generate_claude(request, correlation_id)
-            elif request.provider == AIProvider.GEMINI:
-                result = await self._generate_gemini(request, correlation_id)
+            if self._should_hedge(request):
+                result = await self._generate_hedged(request, correlation_id)
             else:
-                raise ValueError(f"Unsupported provider: {request.provider.value}")
+                result = await self._generate_with(request, correlation_id)
+                self.completion_latency.record(request.provider, time.time() - start_time)
             
             duration = time.time() - start_time
             result.duration_seconds = duration
             result.correlation_id = correlation_id
             
             self.logger.info("Code generation completed",
-                            provider=request.provider.value,
+                            provider=result.provider.value,
                             duration_seconds=duration,
                             correlation_id=correlation_id)
             
@@ -218,20 +225,12 @@ class ProviderManager:
         correlation_id = request.correlation_id or get_correlation_id()
         
         try:
-            if request.provider == AIProvider.OPENAI:
-                async for chunk in self._stream_openai(request, correlation_id):
-                    yield chunk
-            elif request.provider == AIProvider.AZURE_OPENAI:
-                async for chunk in self._stream_azure_openai(request, correlation_id):
-                    yield chunk
-            elif request.provider == AIProvider.CLAUDE:
-                async for chunk in self._stream_claude(request, correlation_id):
-                    yield chunk
-            elif request.provider == AIProvider.GEMINI:
-                async for chunk in self._stream_gemini(request, correlation_id):
-                    yield chunk
+            if self._should_hedge(request):
+                stream = self._stream_hedged(request, correlation_id)
             else:
-                raise ValueError(f"Streaming not supported for provider: {request.provider.value}")
+                stream = self._timed_stream(request, correlation_id)
+            async for chunk in stream:
+                yield chunk
                 
         except Exception as e:
             self.logger.error("Streaming generation failed",
@@ -240,6 +239,174 @@ class ProviderManager:
                              correlation_id=correlation_id)
             raise
     
+    def _generate_with(self, request: GenerationRequest, correlation_id: str) -> Awaitable[GenerationResult]:
+        """Non-streaming call to request.provider"""
+        if request.provider == AIProvider.OPENAI:
+            return self._generate_openai(request, correlation_id)
+        elif request.provider == AIProvider.AZURE_OPENAI:
+            return self._generate_azure_openai(request, correlation_id)
+        elif request.provider == AIProvider.CLAUDE:
+            return self._generate_claude(request, correlation_id)
+        elif request.provider == AIProvider.GEMINI:
+            return self._generate_gemini(request, correlation_id)
+        else:
+            raise ValueError(f"Unsupported provider: {request.provider.value}")
+    
+    def _stream_with(self, request: GenerationRequest, correlation_id: str) -> AsyncGenerator[str, None]:
+        """Streaming call to request.provider"""
+        if request.provider == AIProvider.OPENAI:
+            return self._stream_openai(request, correlation_id)
+        elif request.provider == AIProvider.AZURE_OPENAI:
+            return self._stream_azure_openai(request, correlation_id)
+        elif request.provider == AIProvider.CLAUDE:
+            return self._stream_claude(request, correlation_id)
+        elif request.provider == AIProvider.GEMINI:
+            return self._stream_gemini(request, correlation_id)
+        else:
+            raise ValueError(f"Streaming not supported for provider: {request.provider.value}")
+    
+    async def _timed_stream(self, request: GenerationRequest, correlation_id: str) -> AsyncGenerator[str, None]:
+        """Stream from request.provider, recording its time to first token"""
+        start_time = time.monotonic()
+        first = True
+        async for chunk in self._stream_with(request, correlation_id):
+            if first:
+                self.first_token_latency.record(request.provider, time.monotonic() - start_time)
+                first = False
+            yield chunk
+    
+    # Hedging
+    
+    def _should_hedge(self, request: GenerationRequest) -> bool:
+        hedge = self.settings.enable_hedging if request.hedge is None else request.hedge
+        if not hedge or self._backup_provider(request.provider) is None:
+            return False
+        self.hedging_stats.requests += 1
+        self.hedge_budget.deposit()
+        return True
+    
+    def _backup_provider(self, provider: AIProvider) -> Optional[AIProvider]:
+        """Next available provider after `provider`"""
+        if provider not in self.available_providers or len(self.available_providers) < 2:
+            return None
+        index = self.available_providers.index(provider)
+        return self.available_providers[(index + 1) % len(self.available_providers)]
+    
+    def _hedge_delay(self, tracker: LatencyTracker, provider: AIProvider) -> float:
+        """How long to wait for `provider` before sending the backup request"""
+        delay = tracker.percentile(provider, self.settings.hedge_percentile)
+        if delay is None:
+            delay = self.settings.hedge_default_delay_seconds
+        return max(delay, self.settings.hedge_min_delay_seconds)
+    
+    async def _hedge(
+        self,
+        request: GenerationRequest,
+        tracker: LatencyTracker,
+        start: Callable[[GenerationRequest], Awaitable[T]],
+        correlation_id: str
+    ) -> Tuple[AIProvider, T]:
+        """Run `start` against request.provider and, if it is slower than its
+        usual latency (or fails), against the backup provider as well
+        
+        Returns the provider that succeeded first with its result; the other
+        attempt is cancelled. Latencies are recorded in `tracker`.
+        """
+        primary = request.provider
+        start_time = time.monotonic()
+        attempts: Dict["asyncio.Task[T]", AIProvider] = {
+            asyncio.create_task(start(request)): primary
+        }
+        try:
+            done, _ = await asyncio.wait(set(attempts), timeout=self._hedge_delay(tracker, primary))
+            # A primary that failed early is retried on the backup straight away
+            primary_failed = any(task.exception() is not None for task in done)
+            backup = self._backup_provider(primary)
+            if (not done or primary_failed) and backup is not None:
+                if self.hedge_budget.try_spend():
+                    self.hedging_stats.hedged += 1
+                    self.logger.info("Hedging slow provider",
+                                    provider=primary.value,
+                                    backup_provider=backup.value,
+                                    correlation_id=correlation_id)
+                    attempts[asyncio.create_task(start(dataclasses.replace(request, provider=backup)))] = backup
+                else:
+                    self.hedging_stats.budget_exhausted += 1
+            
+            pending = set(attempts)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # If both finished together, prefer the primary
+                for task in sorted(done, key=lambda t: attempts[t] != primary):
+                    provider = attempts[task]
+                    error = task.exception()
+                    if error is None:
+                        tracker.record(provider, time.monotonic() - start_time)
+                        if provider != primary:
+                            self.hedging_stats.backup_wins += 1
+                            # The primary took at least this long
+                            tracker.record(primary, time.monotonic() - start_time)
+                        return provider, task.result()
+                    self.logger.warning("Hedged attempt failed",
+                                       provider=provider.value,
+                                       error=str(error),
+                                       correlation_id=correlation_id)
+                    if first_error is None or provider == primary:
+                        first_error = error
+            raise first_error
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+    
+    async def _generate_hedged(self, request: GenerationRequest, correlation_id: str) -> GenerationResult:
+        _, result = await self._hedge(
+            request,
+            self.completion_latency,
+            lambda attempt: self._generate_with(attempt, correlation_id),
+            correlation_id
+        )
+        return result
+    
+    async def _stream_hedged(self, request: GenerationRequest, correlation_id: str) -> AsyncGenerator[str, None]:
+        """Stream from whichever provider produces its first chunk first"""
+        streams: Dict[AIProvider, AsyncGenerator[str, None]] = {}
+        
+        async def first_chunk(attempt: GenerationRequest) -> Optional[str]:
+            stream = streams[attempt.provider] = self._stream_with(attempt, correlation_id)
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return None
+        
+        try:
+            provider, chunk = await self._hedge(request, self.first_token_latency, first_chunk, correlation_id)
+            for other, stream in streams.items():
+                if other != provider:
+                    await stream.aclose()
+            if chunk is None:
+                return
+            if provider != request.provider:
+                self.logger.info("Hedged stream won by backup provider",
+                                provider=provider.value,
+                                correlation_id=correlation_id)
+            yield chunk
+            async for chunk in streams[provider]:
+                yield chunk
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+    
+    def get_hedging_stats(self) -> Dict[str, Any]:
+        """Hedging counters and the current per-provider hedge delays"""
+        stats = self.hedging_stats.to_dict()
+        stats["first_token_delay_seconds"] = {
+            provider.value: self._hedge_delay(self.first_token_latency, provider)
+            for provider in self.available_providers
+        }
+        return stats
+    
     async def _generate_openai(self, request: GenerationRequest, correlation_id: str) -> GenerationResult:
         """Generate code using OpenAI"""
         client = self.providers[AIProvider.OPENAI]
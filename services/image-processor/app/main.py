@@ -43,12 +43,15 @@ async def initialize_image_processors():
         Image.MAX_IMAGE_PIXELS = None  # Remove PIL size limit for large images
     except ImportError:
         pass
+    
+    # Start execution backend workers before the first request arrives
+    await image_processing.image_processor.start()
 
 
 async def cleanup_image_processors():
     """Cleanup image processing resources"""
-    # Cleanup temporary files, connections, etc.
-    pass
+    # Stop execution backend workers
+    await image_processing.image_processor.shutdown()
 
 
 def create_application() -> FastAPI:
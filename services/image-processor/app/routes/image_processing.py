@@ -9,6 +9,7 @@ from shared.auth.azure_ad import get_current_user, require_role
 from shared.security.input_validation import SecurityValidator
 from shared.monitoring.correlation import get_correlation_id
 from app.services.image_processor import ImageProcessor, ImageProcessingResult, ImageValidationResult
+from app.services.executor import ExecutorSaturatedError, OperationTimeoutError
 
 router = APIRouter()
 
@@ -16,6 +17,20 @@ router = APIRouter()
 image_processor = ImageProcessor()
 
 
+def capacity_exception(error: Exception) -> HTTPException:
+    """Map execution backend backpressure and timeouts to HTTP errors"""
+    if isinstance(error, ExecutorSaturatedError):
+        return HTTPException(
+            status_code=error.status_code,
+            detail=str(error),
+            headers={"Retry-After": str(error.retry_after)}
+        )
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=str(error)
+    )
+
+
 class ImageProcessingRequest(BaseModel):
     """Request model for image processing"""
     image: str
@@ -168,6 +183,8 @@ async def process_image(
             correlation_id=correlation_id
         )
         
+    except (ExecutorSaturatedError, OperationTimeoutError) as e:
+        raise capacity_exception(e)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -247,6 +264,8 @@ async def analyze_image(
             "correlation_id": get_correlation_id()
         }
         
+    except (ExecutorSaturatedError, OperationTimeoutError) as e:
+        raise capacity_exception(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -284,6 +303,8 @@ async def create_thumbnail(
             "correlation_id": get_correlation_id()
         }
         
+    except (ExecutorSaturatedError, OperationTimeoutError) as e:
+        raise capacity_exception(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -330,6 +351,7 @@ async def get_processing_stats(
     - Average processing times
     - Provider usage
     - Error rates
+    - Execution backend queue wait and compute times
     """
     
     # This would typically query a metrics database
@@ -339,7 +361,8 @@ async def get_processing_stats(
         "average_processing_time_ms": 0,
         "provider_usage": {},
         "error_rate": 0,
-        "success_rate": 100
+        "success_rate": 100,
+        "execution": image_processor.get_execution_metrics()
     }
 
 
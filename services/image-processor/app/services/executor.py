@@ -0,0 +1,300 @@
+"""
+Image operation executor
+Runs CPU-bound Pillow work off the event loop with bounded admission, per-operation timeouts
+and separate queue-wait / compute metrics
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class ExecutionBackend(str, Enum):
+    """Where image operations run"""
+    PROCESS = "process"  # separate interpreter per worker, no GIL contention with the event loop
+    THREAD = "thread"    # Pillow releases the GIL in its codecs and resamplers
+    INLINE = "inline"    # on the event loop (debugging and tests only)
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+    def __init__(self, operation: str, in_flight: int, capacity: int, retry_after: int, status_code: int):
+        super().__init__(
+            f"Image processing capacity exhausted ({in_flight}/{capacity} operations in flight), "
+            f"retry in {retry_after}s"
+        )
+        self.operation = operation
+        self.in_flight = in_flight
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class OperationTimeoutError(Exception):
+    """Raised when an operation does not finish (queue wait included) within its timeout"""
+
+    def __init__(self, operation: str, timeout_seconds: float):
+        super().__init__(f"Image operation '{operation}' timed out after {timeout_seconds:.1f}s")
+        self.operation = operation
+        self.timeout_seconds = timeout_seconds
+
+
+@dataclass
+class ExecutorConfig:
+    """Execution backend configuration"""
+    backend: ExecutionBackend = ExecutionBackend.PROCESS
+    max_workers: int = field(default_factory=lambda: os.cpu_count() or 2)
+    max_queue_depth: int = 32          # operations allowed to wait for a worker
+    default_timeout_seconds: float = 30.0
+    operation_timeouts: Dict[str, float] = field(default_factory=lambda: {
+        "process": 30.0,
+        "analyze": 20.0,
+        "thumbnail": 10.0
+    })
+    reject_status_code: int = 503      # 503 (service busy) or 429 (caller should back off)
+
+    @classmethod
+    def from_env(cls) -> "ExecutorConfig":
+        """Build from ``IMAGE_EXECUTOR_*`` environment variables"""
+        config = cls()
+        config.backend = ExecutionBackend(os.getenv("IMAGE_EXECUTOR_BACKEND", config.backend.value).lower())
+        config.max_workers = int(os.getenv("IMAGE_EXECUTOR_WORKERS", config.max_workers))
+        config.max_queue_depth = int(os.getenv("IMAGE_EXECUTOR_QUEUE_DEPTH", config.max_queue_depth))
+        config.default_timeout_seconds = float(
+            os.getenv("IMAGE_EXECUTOR_TIMEOUT_SECONDS", config.default_timeout_seconds)
+        )
+        for operation in list(config.operation_timeouts):
+            value = os.getenv(f"IMAGE_EXECUTOR_TIMEOUT_{operation.upper()}")
+            if value is not None:
+                config.operation_timeouts[operation] = float(value)
+        config.reject_status_code = int(os.getenv("IMAGE_EXECUTOR_REJECT_STATUS", config.reject_status_code))
+        return config
+
+    @property
+    def capacity(self) -> int:
+        """Operations admitted at once: one running per worker plus the wait queue"""
+        return self.max_workers + self.max_queue_depth
+
+    def timeout_for(self, operation: str) -> float:
+        return self.operation_timeouts.get(operation, self.default_timeout_seconds)
+
+
+@dataclass
+class OperationTiming:
+    """Where one operation spent its time"""
+    queue_wait_ms: float
+    compute_ms: float
+
+
+@dataclass
+class OperationMetrics:
+    """Counters and recent timing samples for one operation type"""
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    queue_wait_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+    compute_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record(self, timing: OperationTiming):
+        self.completed += 1
+        self.queue_wait_ms.append(timing.queue_wait_ms)
+        self.compute_ms.append(timing.compute_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "queue_wait_ms": _distribution(self.queue_wait_ms),
+            "compute_ms": _distribution(self.compute_ms)
+        }
+
+
+def _distribution(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 2),
+        "max": round(ordered[-1], 2)
+    }
+
+
+def _timed_call(fn: Callable, args: Tuple, kwargs: Dict[str, Any]) -> Tuple[Any, float, float]:
+    """Worker-side wrapper reporting when the call actually started and finished"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started, time.time()
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+class ImageOperationExecutor:
+    """Bounded execution backend for image operations
+
+    At most ``max_workers + max_queue_depth`` operations are admitted; further
+    calls fail fast with ``ExecutorSaturatedError`` so the API can answer
+    429/503 instead of letting requests pile up behind one large screenshot.
+    A slot is released only when the worker really finishes, so operations
+    that outlive their timeout still count against capacity. Callables and
+    arguments must be picklable for the process backend.
+    """
+
+    def __init__(self, config: Optional[ExecutorConfig] = None):
+        self.config = config or ExecutorConfig.from_env()
+        self._pool: Optional[Executor] = None
+        self._initializer: Optional[Callable] = None
+        self._initargs: Tuple = ()
+        self._in_flight = 0
+        self._metrics: Dict[str, OperationMetrics] = {}
+
+    async def start(self, initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        """Create the pool and start its workers ahead of the first request
+
+        ``initializer(*initargs)`` runs once in every worker, e.g. to copy
+        library settings a spawned process would not inherit.
+        """
+        self._initializer = initializer
+        self._initargs = initargs
+        pool = self._ensure_pool()
+        if pool is None:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(pool, _warm_up) for _ in range(self.config.max_workers)
+        ))
+
+    async def shutdown(self):
+        """Stop the pool, dropping operations that have not started"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, operation: str, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the backend and return its result"""
+        result, _ = await self.run_timed(operation, fn, *args, timeout=timeout, **kwargs)
+        return result
+
+    async def run_timed(self, operation: str, fn: Callable, *args, timeout: Optional[float] = None,
+                        **kwargs) -> Tuple[Any, OperationTiming]:
+        """Like ``run`` but also returns the queue-wait / compute split"""
+        metrics = self._metrics.setdefault(operation, OperationMetrics())
+
+        if self._in_flight >= self.config.capacity:
+            metrics.rejected += 1
+            raise ExecutorSaturatedError(
+                operation=operation,
+                in_flight=self._in_flight,
+                capacity=self.config.capacity,
+                retry_after=self._estimate_retry_after(),
+                status_code=self.config.reject_status_code
+            )
+
+        metrics.submitted += 1
+        submitted_at = time.time()
+
+        if self.config.backend == ExecutionBackend.INLINE:
+            try:
+                result, started, finished = _timed_call(fn, args, kwargs)
+            except Exception:
+                metrics.failed += 1
+                raise
+            timing = OperationTiming((started - submitted_at) * 1000, (finished - started) * 1000)
+            metrics.record(timing)
+            return result, timing
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._ensure_pool().submit(_timed_call, fn, args, kwargs)
+        except (BrokenProcessPool, RuntimeError):
+            # Pool died or was shut down; rebuild it for the next caller
+            metrics.failed += 1
+            self._pool = None
+            raise
+
+        self._in_flight += 1
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+        limit = timeout if timeout is not None else self.config.timeout_for(operation)
+        try:
+            result, started, finished = await asyncio.wait_for(asyncio.wrap_future(future), limit)
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            raise OperationTimeoutError(operation, limit)
+        except BrokenProcessPool:
+            metrics.failed += 1
+            self._pool = None
+            raise
+        except Exception:
+            metrics.failed += 1
+            raise
+
+        timing = OperationTiming(
+            queue_wait_ms=max(started - submitted_at, 0.0) * 1000,
+            compute_ms=(finished - started) * 1000
+        )
+        metrics.record(timing)
+        return result, timing
+
+    def _release(self):
+        self._in_flight -= 1
+
+    def _ensure_pool(self) -> Optional[Executor]:
+        if self.config.backend == ExecutionBackend.INLINE:
+            return None
+        if self._pool is None:
+            if self.config.backend == ExecutionBackend.PROCESS:
+                # spawn: workers must not inherit the event loop's threads and locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.config.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self._initializer,
+                    initargs=self._initargs
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.config.max_workers,
+                    thread_name_prefix="image-op",
+                    initializer=self._initializer,
+                    initargs=self._initargs
+                )
+        return self._pool
+
+    def _estimate_retry_after(self) -> int:
+        """Seconds until the queue ahead of a new caller should have drained"""
+        samples = [s for m in self._metrics.values() for s in m.compute_ms]
+        mean_compute_s = (sum(samples) / len(samples) / 1000) if samples else 1.0
+        backlog = max(self._in_flight - self.config.max_workers, 0) + 1
+        return max(1, math.ceil(mean_compute_s * backlog / self.config.max_workers))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Executor state and per-operation metrics"""
+        return {
+            "backend": self.config.backend.value,
+            "max_workers": self.config.max_workers,
+            "max_queue_depth": self.config.max_queue_depth,
+            "in_flight": self._in_flight,
+            "queued": max(self._in_flight - self.config.max_workers, 0),
+            "utilization": round(min(self._in_flight, self.config.max_workers) / self.config.max_workers, 3),
+            "operations": {name: metrics.summary() for name, metrics in self._metrics.items()}
+        }
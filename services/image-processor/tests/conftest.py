@@ -13,6 +13,8 @@ import tempfile
 # Set test environment
 os.environ["ENVIRONMENT"] = "testing"
 os.environ["LOG_LEVEL"] = "DEBUG"
+# Run Pillow work on threads so patches and fixtures apply to it
+os.environ["IMAGE_EXECUTOR_BACKEND"] = "thread"
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -0,0 +1,114 @@
+"""
+Unit tests for the image operation executor
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+import pytest_asyncio
+
+from app.services.executor import (
+    ExecutionBackend,
+    ExecutorConfig,
+    ExecutorSaturatedError,
+    ImageOperationExecutor,
+    OperationTimeoutError,
+)
+
+
+def blocking_call(event: threading.Event) -> str:
+    event.wait(5)
+    return "done"
+
+
+def sleeping_call(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+class TestImageOperationExecutor:
+    """Test cases for bounded execution of image operations"""
+
+    @pytest_asyncio.fixture
+    async def executor(self):
+        executor = ImageOperationExecutor(ExecutorConfig(
+            backend=ExecutionBackend.THREAD,
+            max_workers=1,
+            max_queue_depth=1,
+            reject_status_code=429
+        ))
+        yield executor
+        await executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self, executor):
+        """Calls beyond workers + queue depth fail fast with the configured status"""
+        release = threading.Event()
+        running = [
+            asyncio.ensure_future(executor.run("process", blocking_call, release)),
+            asyncio.ensure_future(executor.run("process", blocking_call, release)),
+        ]
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(ExecutorSaturatedError) as exc_info:
+            await executor.run("process", blocking_call, release)
+
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.retry_after >= 1
+        release.set()
+        assert await asyncio.gather(*running) == ["done", "done"]
+        assert executor.get_metrics()["operations"]["process"]["rejected"] == 1
+        assert executor.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_timeout_keeps_slot_until_worker_finishes(self, executor):
+        """A timed-out operation still occupies capacity while its worker runs"""
+        release = threading.Event()
+
+        with pytest.raises(OperationTimeoutError):
+            await executor.run("thumbnail", blocking_call, release, timeout=0.05)
+
+        assert executor.in_flight == 1
+        release.set()
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 0
+        assert executor.get_metrics()["operations"]["thumbnail"]["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_is_separated_from_compute(self, executor):
+        """An operation waiting behind another reports the wait separately"""
+        first = asyncio.ensure_future(executor.run_timed("analyze", sleeping_call, 0.1))
+        await asyncio.sleep(0.01)
+        _, timing = await executor.run_timed("analyze", sleeping_call, 0.1)
+        await first
+
+        assert timing.queue_wait_ms >= 50
+        assert 80 <= timing.compute_ms < 1000
+        summary = executor.get_metrics()["operations"]["analyze"]
+        assert summary["completed"] == 2
+        assert summary["queue_wait_ms"]["max"] >= 50
+
+    @pytest.mark.asyncio
+    async def test_process_backend(self):
+        """The process backend runs picklable callables in worker processes"""
+        executor = ImageOperationExecutor(ExecutorConfig(backend=ExecutionBackend.PROCESS, max_workers=1))
+        try:
+            await executor.start()
+            assert await executor.run("process", sum, [1, 2, 3]) == 6
+        finally:
+            await executor.shutdown()
+
+    def test_config_from_env(self, monkeypatch):
+        """Backend, sizes and per-operation timeouts are read from the environment"""
+        monkeypatch.setenv("IMAGE_EXECUTOR_BACKEND", "THREAD")
+        monkeypatch.setenv("IMAGE_EXECUTOR_WORKERS", "3")
+        monkeypatch.setenv("IMAGE_EXECUTOR_QUEUE_DEPTH", "5")
+        monkeypatch.setenv("IMAGE_EXECUTOR_TIMEOUT_PROCESS", "12.5")
+
+        config = ExecutorConfig.from_env()
+
+        assert config.backend == ExecutionBackend.THREAD
+        assert config.capacity == 8
+        assert config.timeout_for("process") == 12.5
+        assert config.timeout_for("unknown") == config.default_timeout_seconds
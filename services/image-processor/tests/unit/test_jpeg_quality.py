@@ -0,0 +1,77 @@
+"""
+Unit tests for JPEG quality fitting
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from app.services.jpeg_quality import estimate_quality, fit_jpeg, relative_size
+
+
+def noisy_image(width: int, height: int) -> Image.Image:
+    """Photo-like content that does not compress well"""
+    return Image.effect_noise((width, height), 60).convert("RGB")
+
+
+def encoded_size(img: Image.Image, quality: int) -> int:
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=quality)
+    return output.tell()
+
+
+class TestJpegQualityFitting:
+    """Test cases for fitting images into a byte budget"""
+
+    def test_fitting_image_is_encoded_once(self):
+        """An image under the budget at max quality needs a single encode"""
+        img = Image.new("RGB", (400, 300), (30, 120, 200))
+
+        fit = fit_jpeg(img, 1024 * 1024)
+
+        assert fit.encodes == 1
+        assert fit.quality == 95
+        assert not fit.downscaled
+
+    def test_finds_highest_fitting_quality(self):
+        """The chosen quality fits and the next quality above it does not"""
+        img = noisy_image(600, 400)
+        budget = encoded_size(img, 70)
+
+        fit = fit_jpeg(img, budget, tolerance=1)
+
+        assert len(fit.data) <= budget
+        assert encoded_size(img, fit.quality + 1) > budget
+        assert fit.encodes <= 6
+        assert fit.size == img.size
+
+    def test_downscales_before_dropping_quality(self):
+        """A budget far below the floor quality is met by downscaling"""
+        img = noisy_image(1200, 900)
+        budget = encoded_size(img, 95) // 8
+
+        fit = fit_jpeg(img, budget)
+
+        assert len(fit.data) <= budget
+        assert fit.downscaled
+        assert fit.quality >= 60
+        assert Image.open(io.BytesIO(fit.data)).size == fit.size
+
+    def test_fewer_encodes_than_linear_search(self):
+        """Across budgets, fitting needs far fewer encodes than stepping down by 5"""
+        fit_encodes = linear_encodes = 0
+        for target_quality in range(15, 95, 10):
+            img = noisy_image(500, 400)
+            budget = encoded_size(img, target_quality)
+            fit_encodes += fit_jpeg(img, budget).encodes
+            fitting = max(q for q in range(10, 96, 5) if encoded_size(img, q) <= budget)
+            linear_encodes += 1 + (95 - fitting) // 5
+
+        assert fit_encodes * 2 <= linear_encodes
+
+    @pytest.mark.parametrize("quality", [15, 45, 72, 88])
+    def test_estimate_inverts_size_curve(self, quality):
+        """Estimating from the curve's own prediction returns the same quality"""
+        measured = 1_000_000
+        target = measured * relative_size(quality) / relative_size(95)
+        assert estimate_quality(95, measured, int(target)) == pytest.approx(quality, abs=0.5)